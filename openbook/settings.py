@@ -129,6 +129,7 @@ INSTALLED_APPS = [
     'openbook_invitations',
     'openbook_tags',
     'openbook_hashtags',
+    'openbook_search',
     'openbook_categories',
     'openbook_notifications',
     'openbook_devices',
@@ -281,6 +282,7 @@ if IS_BUILD or TESTING:
             'NAME': 'open-book-api'
         }
     }
+    DATABASE_REPLICAS = {}
 else:
     RDS_DB_NAME = os.environ.get('RDS_DB_NAME')
     RDS_USERNAME = os.environ.get('RDS_USERNAME')
@@ -290,6 +292,8 @@ else:
 
     RDS_HOSTNAME_WRITER = os.environ.get('RDS_HOSTNAME_WRITER', RDS_HOSTNAME)
     RDS_HOSTNAME_READER = os.environ.get('RDS_HOSTNAME_READER', RDS_HOSTNAME_WRITER)
+    # Comma separated hostname:weight pairs, defaults to RDS_HOSTNAME_READER with weight 1
+    RDS_HOSTNAMES_READERS = os.environ.get('RDS_HOSTNAMES_READERS', '%s:1' % RDS_HOSTNAME_READER)
 
     db_options = {
         'init_command': "SET sql_mode='STRICT_TRANS_TABLES'",
@@ -308,26 +312,38 @@ else:
 
     DATABASES = {
         'default': writer_db_config,
-        'Reader': {
+    }
+
+    # Database alias -> weight of the replica when picking one for a request
+    DATABASE_REPLICAS = {}
+
+    for reader_index, reader in enumerate(RDS_HOSTNAMES_READERS.split(',')):
+        reader_hostname, reader_weight = reader.strip().rsplit(':', 1)
+        reader_alias = 'Reader' if reader_index == 0 else 'Reader%d' % (reader_index + 1)
+
+        DATABASES[reader_alias] = {
             'ENGINE': 'django.db.backends.mysql',
             'NAME': RDS_DB_NAME,
             'USER': RDS_USERNAME,
             'PASSWORD': RDS_PASSWORD,
-            'HOST': RDS_HOSTNAME_READER,
+            'HOST': reader_hostname,
             'PORT': RDS_PORT,
             'OPTIONS': db_options,
         }
-    }
+        DATABASE_REPLICAS[reader_alias] = int(reader_weight)
 
-    DATABASE_ROUTERS = ['django_replicated.router.ReplicationRouter']
+    DATABASE_ROUTERS = ['openbook_common.db_router.ReplicaRouter']
 
-    REPLICATED_DATABASE_SLAVES = ['Reader', ]
+    MIDDLEWARE.append('openbook_common.middleware.ReadYourWritesMiddleware', )
 
-    MIDDLEWARE.append('django_replicated.middleware.ReplicationMiddleware', )
-
-    REPLICATED_VIEWS_OVERRIDES = {
-        '/admin/*': 'master',
-    }
+# Reads of a client go to the writer for this long after it wrote
+DATABASE_WRITER_PIN_SECONDS = int(os.environ.get('DATABASE_WRITER_PIN_SECONDS', '5'))
+DATABASE_WRITER_PIN_COOKIE_NAME = 'ob_pin_writer'
+DATABASE_WRITER_PIN_HEADER = 'HTTP_X_PIN_WRITER'
+DATABASE_WRITER_PINNED_PATHS = ['/admin/']
+# A replica that can't be connected to is skipped for this long
+DATABASE_REPLICA_DOWNTIME = int(os.environ.get('DATABASE_REPLICA_DOWNTIME', '30'))
+DATABASE_ROUTING_METRICS_ENABLED = os.environ.get('DATABASE_ROUTING_METRICS_ENABLED', 'True') == 'True'
 
 # Password validation
 # https://docs.djangoproject.com/en/1.11/ref/settings/#auth-password-validators
@@ -359,7 +375,10 @@ REST_FRAMEWORK = {
         'rest_framework.renderers.JSONRenderer',
     ),
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
+        'openbook_auth.authentication.CachedTokenAuthentication',
+    ),
+    'DEFAULT_THROTTLE_CLASSES': (
+        'openbook_common.throttles.WriteRateThrottle',
     ),
     'DEFAULT_VERSIONING_CLASS': 'rest_framework.versioning.AcceptHeaderVersioning'
 }
@@ -381,6 +400,23 @@ OS_TRANSLATION_CONFIG = {
     }
 }
 
+# Search
+# Users, communities and hashtags are searched in the database with icontains unless a backend of OS_SEARCH_CONFIG
+# is named here. The 'default' one keeps its index in a SQLite file on each host, which rebuild_search_indexes fills.
+OS_SEARCH_BACKEND_NAME = os.environ.get('OS_SEARCH_BACKEND_NAME')
+OS_SEARCH_CONFIG = {
+    'default': {
+        'BACKEND': 'openbook_search.backends.sqlite_fts.SQLiteFTSSearchBackend',
+        'PATH': os.environ.get('SEARCH_SQLITE_PATH', os.path.join(BASE_DIR, 'search-index.sqlite3')),
+        'RESULTS_LIMIT': int(os.environ.get('SEARCH_RESULTS_LIMIT', '500')),
+    },
+    'testing': {
+        'BACKEND': 'openbook_search.backends.sqlite_fts.SQLiteFTSSearchBackend',
+        'PATH': 'file:openbook-search-testing?mode=memory&cache=shared',
+        'RESULTS_LIMIT': 500,
+    }
+}
+
 UNICODE_JSON = True
 
 # The sentry DSN for error reporting
@@ -444,6 +480,12 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 
 # Video encoding
 
+# Also encodes videos to an HLS ladder of the VIDEO_ENCODING_HLS_RENDITIONS no taller than them, with a master playlist
+VIDEO_ENCODING_HLS_ENABLED = os.environ.get('VIDEO_ENCODING_HLS_ENABLED', 'False') == 'True'
+
+# Formats are encoded concurrently, by default as many as cores are available
+VIDEO_ENCODING_MAX_WORKERS = int(os.environ.get('VIDEO_ENCODING_MAX_WORKERS', '0')) or None
+
 VIDEO_ENCODING_FORMATS = {
     'FFmpeg': [
         {
@@ -504,6 +546,68 @@ DEVICE_NAME_MAX_LENGTH = 32
 DEVICE_UUID_MAX_LENGTH = 64
 SEARCH_QUERIES_MAX_LENGTH = 120
 FEATURE_IMPORTER_ENABLED = os.environ.get('FEATURE_IMPORTER_ENABLED', 'True') == 'True'
+FEATURE_MATERIALIZED_TIMELINE_ENABLED = os.environ.get('FEATURE_MATERIALIZED_TIMELINE_ENABLED', 'False') == 'True'
+TIMELINE_MAX_POSTS = int(os.environ.get('TIMELINE_MAX_POSTS', '800'))
+TIMELINE_TTL = int(os.environ.get('TIMELINE_TTL', str(60 * 60 * 24 * 7)))
+
+# Notifying the subscribers of a new post runs in jobs of SUBSCRIBERS_FAN_OUT_CHUNK_SIZE subscribers each
+POST_SUBSCRIBERS_FAN_OUT_ASYNC = os.environ.get('POST_SUBSCRIBERS_FAN_OUT_ASYNC', 'True') == 'True'
+SUBSCRIBERS_FAN_OUT_CHUNK_SIZE = int(os.environ.get('SUBSCRIBERS_FAN_OUT_CHUNK_SIZE', '2000'))
+SUBSCRIBERS_FAN_OUT_PROGRESS_TTL = int(os.environ.get('SUBSCRIBERS_FAN_OUT_PROGRESS_TTL', str(60 * 60 * 24)))
+
+# A post processing its media for longer than POST_MEDIA_PROCESSING_HEARTBEAT_TTL seconds without progress is taken
+# as interrupted by resume_interrupted_post_media_processing
+POST_MEDIA_PROCESSING_HEARTBEAT_TTL = int(os.environ.get('POST_MEDIA_PROCESSING_HEARTBEAT_TTL', str(60 * 15)))
+# A post whose processing was interrupted POST_MEDIA_PROCESSING_MAX_ATTEMPTS times is moved back to a draft
+POST_MEDIA_PROCESSING_MAX_ATTEMPTS = int(os.environ.get('POST_MEDIA_PROCESSING_MAX_ATTEMPTS', '3'))
+POST_MEDIA_PROCESSING_ATTEMPTS_TTL = int(os.environ.get('POST_MEDIA_PROCESSING_ATTEMPTS_TTL', str(60 * 60 * 24)))
+
+# Soft deleting or restoring a post, community or user with more than SOFT_DELETION_ASYNC_THRESHOLD posts or
+# post comments runs in jobs of SOFT_DELETION_CHUNK_SIZE rows each
+SOFT_DELETION_ASYNC_THRESHOLD = int(os.environ.get('SOFT_DELETION_ASYNC_THRESHOLD', '1000'))
+SOFT_DELETION_CHUNK_SIZE = int(os.environ.get('SOFT_DELETION_CHUNK_SIZE', '1000'))
+SOFT_DELETION_PROGRESS_TTL = int(os.environ.get('SOFT_DELETION_PROGRESS_TTL', str(60 * 60 * 24)))
+
+# Copying the first image of a post to its hashtags without image runs in a low priority job
+HASHTAGS_IMAGES_UPDATE_ASYNC = os.environ.get('HASHTAGS_IMAGES_UPDATE_ASYNC', 'True') == 'True'
+
+# Images are stored normalised to the largest of their widths and their derivatives of each width and format
+# generated when first requested, by a pool of IMAGE_DERIVATIVES_MAX_WORKERS threads per process. Each lookup waits
+# up to IMAGE_DERIVATIVES_WAIT_TIMEOUT seconds for them.
+IMAGE_DERIVATIVES_MAX_WORKERS = int(os.environ.get('IMAGE_DERIVATIVES_MAX_WORKERS', '2'))
+IMAGE_DERIVATIVES_WAIT_TIMEOUT = float(os.environ.get('IMAGE_DERIVATIVES_WAIT_TIMEOUT', '0'))
+IMAGE_DERIVATIVES_GENERATION_TTL = int(os.environ.get('IMAGE_DERIVATIVES_GENERATION_TTL', '60'))
+IMAGE_DERIVATIVES_CACHE_TTL = int(os.environ.get('IMAGE_DERIVATIVES_CACHE_TTL', str(60 * 60 * 24 * 7)))
+IMAGE_DERIVATIVES_JPEG_QUALITY = int(os.environ.get('IMAGE_DERIVATIVES_JPEG_QUALITY', '80'))
+IMAGE_DERIVATIVES_WEBP_QUALITY = int(os.environ.get('IMAGE_DERIVATIVES_WEBP_QUALITY', '75'))
+
+# Unread notifications counters are rebuilt from the database once they expire, which bounds any drift
+UNREAD_NOTIFICATIONS_COUNT_TTL = int(os.environ.get('UNREAD_NOTIFICATIONS_COUNT_TTL', str(60 * 60 * 24)))
+
+# Token -> user id and suspension expiration caches of the authentication, in Redis and in process memory.
+# The process memory entries can't be invalidated from other processes, keep their TTL short.
+AUTH_CACHE_TTL = int(os.environ.get('AUTH_CACHE_TTL', str(60 * 5)))
+AUTH_CACHE_LOCAL_TTL = int(os.environ.get('AUTH_CACHE_LOCAL_TTL', '5'))
+AUTH_CACHE_LOCAL_MAX_ENTRIES = int(os.environ.get('AUTH_CACHE_LOCAL_MAX_ENTRIES', '10000'))
+
+# Per user exclusion sets (blocked users, reported posts, banned communities) used to filter feeds.
+# Sets bigger than EXCLUSION_SETS_MAX_IDS are filtered with joins instead.
+EXCLUSION_SETS_TTL = int(os.environ.get('EXCLUSION_SETS_TTL', str(60 * 60 * 24)))
+EXCLUSION_SETS_MAX_IDS = int(os.environ.get('EXCLUSION_SETS_MAX_IDS', '1000'))
+
+# Token bucket rates of the write endpoints, per user and scope, as requests/second|minute|hour|day.
+# The rate of a scope can be replaced for a user with the set_throttle_user_rate command.
+THROTTLE_ENABLED = os.environ.get('THROTTLE_ENABLED', 'True') == 'True'
+THROTTLE_RATES = {
+    'create_post': os.environ.get('THROTTLE_RATE_CREATE_POST', '60/hour'),
+    'comment': os.environ.get('THROTTLE_RATE_COMMENT', '300/hour'),
+    'react': os.environ.get('THROTTLE_RATE_REACT', '600/hour'),
+    'follow': os.environ.get('THROTTLE_RATE_FOLLOW', '200/hour'),
+    'connect': os.environ.get('THROTTLE_RATE_CONNECT', '100/hour'),
+    'report': os.environ.get('THROTTLE_RATE_REPORT', '60/hour'),
+    'import': os.environ.get('THROTTLE_RATE_IMPORT', '30/hour'),
+}
+
 MODERATION_REPORT_DESCRIPTION_MAX_LENGTH = 1000
 MODERATED_OBJECT_DESCRIPTION_MAX_LENGTH = 1000
 GLOBAL_HIDE_CONTENT_AFTER_REPORTS_AMOUNT = int(os.environ.get('GLOBAL_HIDE_CONTENT_AFTER_REPORTS_AMOUNT', '20'))
@@ -548,9 +652,17 @@ AWS_DEFAULT_ACL = None
 # Testing overrides
 if TESTING:
     OS_TRANSLATION_STRATEGY_NAME = 'testing'
+    OS_SEARCH_BACKEND_NAME = 'testing'
     MIN_UNIQUE_TOP_POST_REACTIONS_COUNT = 1
     MIN_UNIQUE_TOP_POST_COMMENTS_COUNT = 1
     MIN_UNIQUE_TRENDING_POST_REACTIONS_COUNT = 1
+    # Test cases run in a transaction which never commits
+    POST_SUBSCRIBERS_FAN_OUT_ASYNC = False
+    HASHTAGS_IMAGES_UPDATE_ASYNC = False
+    # Responses are asserted with the derivatives generated
+    IMAGE_DERIVATIVES_WAIT_TIMEOUT = None
+    # Test cases make many writes with the same user in a burst
+    THROTTLE_ENABLED = False
 
 if IS_PRODUCTION:
     AWS_ACCESS_KEY_ID = os.environ.get('AWS_ACCESS_KEY_ID')
@@ -579,3 +691,16 @@ if IS_PRODUCTION:
 # ONE SIGNAL
 ONE_SIGNAL_APP_ID = os.environ.get('ONE_SIGNAL_APP_ID')
 ONE_SIGNAL_API_KEY = os.environ.get('ONE_SIGNAL_API_KEY')
+ONE_SIGNAL_API_URL = os.environ.get('ONE_SIGNAL_API_URL', 'https://onesignal.com/api/v1/notifications')
+
+# Push notifications are queued for PUSH_NOTIFICATIONS_BATCH_WINDOW seconds and the ones with the same payload and
+# language are sent together, up to PUSH_NOTIFICATIONS_MAX_DEVICES_PER_REQUEST devices per request.
+# OneSignal accepts up to 200 filters, each device takes 2 plus the OR joining it with the previous one.
+# The flush is scheduled with rqscheduler, which must poll more often than the window, see --interval.
+PUSH_NOTIFICATIONS_BATCH_WINDOW = int(os.environ.get('PUSH_NOTIFICATIONS_BATCH_WINDOW', '2'))
+PUSH_NOTIFICATIONS_MAX_BATCH_SIZE = int(os.environ.get('PUSH_NOTIFICATIONS_MAX_BATCH_SIZE', '1000'))
+PUSH_NOTIFICATIONS_MAX_DEVICES_PER_REQUEST = int(os.environ.get('PUSH_NOTIFICATIONS_MAX_DEVICES_PER_REQUEST', '66'))
+PUSH_NOTIFICATIONS_POOL_SIZE = int(os.environ.get('PUSH_NOTIFICATIONS_POOL_SIZE', '4'))
+PUSH_NOTIFICATIONS_REQUEST_TIMEOUT = int(os.environ.get('PUSH_NOTIFICATIONS_REQUEST_TIMEOUT', '10'))
+PUSH_NOTIFICATIONS_REQUEST_RETRIES = int(os.environ.get('PUSH_NOTIFICATIONS_REQUEST_RETRIES', '3'))
+PUSH_NOTIFICATIONS_RETRY_BACKOFF_FACTOR = float(os.environ.get('PUSH_NOTIFICATIONS_RETRY_BACKOFF_FACTOR', '0.5'))
@@ -0,0 +1,213 @@
+import copy
+import hashlib
+import time
+from datetime import datetime
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.functional import SimpleLazyObject, empty
+from django.utils.translation import ugettext_lazy as _
+from django_redis import get_redis_connection
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+
+from openbook_common.utils.model_loaders import get_user_model, get_moderation_penalty_model
+
+# Stored instead of a suspension expiration when the user is not suspended
+NOT_SUSPENDED_EXPIRATION = 0
+
+# Process memory cache in front of Redis, key -> (expires at, value)
+_local_auth_cache = {}
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Token authentication which caches the token -> user id lookup in process memory and Redis.
+    The user is only loaded from the database once something other than its id is needed.
+    """
+
+    def authenticate_credentials(self, key):
+        user_id = get_user_id_for_auth_token(key=key)
+
+        if user_id is None:
+            raise AuthenticationFailed(_('Invalid token.'))
+
+        return CachedTokenUser(user_id=user_id), key
+
+
+class CachedTokenUser(SimpleLazyObject):
+    """
+    The authenticated user, loaded from the database on first access to anything other than its id
+    """
+
+    def __init__(self, user_id):
+        self.__dict__['_user_id'] = user_id
+        super().__init__(lambda: get_user_model().objects.get(pk=user_id))
+
+    @property
+    def pk(self):
+        return self.__dict__['_user_id']
+
+    @property
+    def id(self):
+        return self.__dict__['_user_id']
+
+    is_authenticated = True
+
+    is_anonymous = False
+
+    def __copy__(self):
+        if self._wrapped is empty:
+            return type(self)(user_id=self.pk)
+        return copy.copy(self._wrapped)
+
+    def __deepcopy__(self, memo):
+        if self._wrapped is empty:
+            result = type(self)(user_id=self.pk)
+            memo[id(self)] = result
+            return result
+        return copy.deepcopy(self._wrapped, memo)
+
+
+def make_auth_token_key(key):
+    # Tokens are credentials, keep them out of the key space
+    return 'ob-api-auth-token-%s' % hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def make_suspension_expiration_key_for_user_with_id(user_id):
+    return 'ob-api-suspension-expiration-%d' % user_id
+
+
+def get_user_id_for_auth_token(key):
+    """
+    Returns None if there is no token with the given key or its user is inactive
+    """
+
+    def get_user_id():
+        User = get_user_model()
+        user = User.objects.filter(auth_token__key=key).values('id', 'is_active').first()
+
+        if not user or not user['is_active']:
+            return None
+
+        return user['id']
+
+    user_id = _get_cached(key=make_auth_token_key(key), get_value=get_user_id)
+
+    if user_id is None:
+        return None
+
+    return int(user_id)
+
+
+def invalidate_auth_token(key):
+    _invalidate_cached(keys=[make_auth_token_key(key)])
+
+
+def invalidate_auth_tokens_for_user_with_id(user_id):
+    """
+    Drops the cached tokens of the user, whose is_active changed
+    """
+    from rest_framework.authtoken.models import Token
+
+    keys = Token.objects.filter(user_id=user_id).values_list('key', flat=True)
+
+    if keys:
+        _invalidate_cached_on_commit(keys=[make_auth_token_key(key) for key in keys])
+
+
+def get_suspension_expiration_for_user_with_id(user_id):
+    """
+    Returns the expiration of the longest running suspension of the user, None if not suspended
+    """
+
+    def get_suspension_expiration():
+        ModerationPenalty = get_moderation_penalty_model()
+        suspension_penalty = ModerationPenalty.objects.filter(user_id=user_id,
+                                                              type=ModerationPenalty.TYPE_SUSPENSION,
+                                                              expiration__gt=timezone.now()) \
+            .order_by('-expiration').values('expiration').first()
+
+        if not suspension_penalty:
+            return NOT_SUSPENDED_EXPIRATION
+
+        return suspension_penalty['expiration'].timestamp()
+
+    suspension_expiration = float(_get_cached(key=make_suspension_expiration_key_for_user_with_id(user_id),
+                                              get_value=get_suspension_expiration))
+
+    if suspension_expiration == NOT_SUSPENDED_EXPIRATION:
+        return None
+
+    return datetime.fromtimestamp(suspension_expiration, tz=timezone.utc)
+
+
+def is_user_with_id_suspended(user_id):
+    suspension_expiration = get_suspension_expiration_for_user_with_id(user_id=user_id)
+    return suspension_expiration is not None and suspension_expiration > timezone.now()
+
+
+def invalidate_suspension_for_user_with_id(user_id):
+    _invalidate_cached_on_commit(keys=[make_suspension_expiration_key_for_user_with_id(user_id)])
+
+
+def invalidate_suspension_for_users_with_ids(users_ids):
+    if not users_ids:
+        return
+
+    _invalidate_cached_on_commit(
+        keys=[make_suspension_expiration_key_for_user_with_id(user_id) for user_id in users_ids])
+
+
+def clear_local_auth_cache():
+    _local_auth_cache.clear()
+
+
+def _get_cached(key, get_value):
+    now = time.monotonic()
+
+    local_entry = _local_auth_cache.get(key)
+
+    if local_entry and local_entry[0] > now:
+        return local_entry[1]
+
+    redis = _get_auth_redis_connection()
+    value = redis.get(key)
+
+    if value is not None:
+        value = value.decode('utf-8')
+    else:
+        value = get_value()
+
+        if value is None:
+            # Don't cache misses, a token could be created right after
+            return None
+
+        redis.set(key, value, ex=settings.AUTH_CACHE_TTL)
+
+    if len(_local_auth_cache) >= settings.AUTH_CACHE_LOCAL_MAX_ENTRIES:
+        _local_auth_cache.clear()
+
+    _local_auth_cache[key] = (now + settings.AUTH_CACHE_LOCAL_TTL, value)
+
+    return value
+
+
+def _invalidate_cached(keys):
+    for key in keys:
+        _local_auth_cache.pop(key, None)
+
+    redis = _get_auth_redis_connection()
+    redis.delete(*keys)
+
+
+def _invalidate_cached_on_commit(keys):
+    # Right away for the rest of the transaction, and again once committed as a concurrent request could have
+    # cached the state it replaces meanwhile
+    _invalidate_cached(keys=keys)
+    transaction.on_commit(lambda: _invalidate_cached(keys=keys))
+
+
+def _get_auth_redis_connection():
+    return get_redis_connection('default')
@@ -0,0 +1,144 @@
+from openbook_common.utils.model_loaders import get_follow_model, get_connection_model, get_user_block_model, \
+    get_moderated_object_model, get_moderation_report_model, get_circle_model
+
+USERS_RELATIONSHIP_STATE_CONTEXT_KEY = 'users_relationship_state'
+
+
+class UsersRelationshipStateBatchLoader:
+    """
+    Request scoped loader of the relationship of a page of users with the viewer.
+    Each relationship is fetched for the whole page with a single set based query the first time a field asks for it.
+    """
+
+    def __init__(self, viewer, users):
+        self.viewer = viewer
+        self.users_ids = {user.pk for user in users}
+        self._following_users_ids = None
+        self._followed_by_users_ids = None
+        self._connections_by_user_id = None
+        self._fully_connected_users_ids = None
+        self._blocked_users_ids = None
+        self._reported_users_ids = None
+
+    def has_user_with_id(self, user_id):
+        return user_id in self.users_ids
+
+    def is_following_user_with_id(self, user_id):
+        if self._following_users_ids is None:
+            Follow = get_follow_model()
+            self._following_users_ids = set(Follow.objects.filter(user_id=self.viewer.pk,
+                                                                  followed_user_id__in=self.users_ids).values_list(
+                'followed_user_id', flat=True))
+
+        return user_id in self._following_users_ids
+
+    def is_followed_by_user_with_id(self, user_id):
+        if self._followed_by_users_ids is None:
+            Follow = get_follow_model()
+            self._followed_by_users_ids = set(Follow.objects.filter(followed_user_id=self.viewer.pk,
+                                                                    user_id__in=self.users_ids).values_list(
+                'user_id', flat=True))
+
+        return user_id in self._followed_by_users_ids
+
+    def is_connected_with_user_with_id(self, user_id):
+        return user_id in self._get_connections_by_user_id()
+
+    def is_fully_connected_with_user_with_id(self, user_id):
+        self._get_connections_by_user_id()
+        return user_id in self._fully_connected_users_ids
+
+    def is_pending_confirm_connection_for_user_with_id(self, user_id):
+        connection = self._get_connections_by_user_id().get(user_id)
+
+        if connection is None:
+            return False
+
+        return not connection.circles.all()
+
+    def get_circles_for_connection_with_user_with_id(self, user_id):
+        connection = self._get_connections_by_user_id().get(user_id)
+
+        if connection is None:
+            Circle = get_circle_model()
+            return Circle.objects.none()
+
+        return connection.circles.all()
+
+    def has_blocked_user_with_id(self, user_id):
+        if self._blocked_users_ids is None:
+            UserBlock = get_user_block_model()
+            self._blocked_users_ids = set(UserBlock.objects.filter(blocker_id=self.viewer.pk,
+                                                                   blocked_user_id__in=self.users_ids).values_list(
+                'blocked_user_id', flat=True))
+
+        return user_id in self._blocked_users_ids
+
+    def has_reported_user_with_id(self, user_id):
+        if self._reported_users_ids is None:
+            ModeratedObject = get_moderated_object_model()
+            ModerationReport = get_moderation_report_model()
+            self._reported_users_ids = set(ModerationReport.objects.filter(
+                reporter_id=self.viewer.pk,
+                moderated_object__object_type=ModeratedObject.OBJECT_TYPE_USER,
+                moderated_object__object_id__in=self.users_ids).values_list('moderated_object__object_id',
+                                                                            flat=True))
+
+        return user_id in self._reported_users_ids
+
+    def _get_connections_by_user_id(self):
+        if self._connections_by_user_id is None:
+            Connection = get_connection_model()
+
+            connections = list(Connection.objects.filter(user_id=self.viewer.pk,
+                                                         target_connection__user_id__in=self.users_ids).
+                               prefetch_related('circles'))
+
+            self._connections_by_user_id = {connection.target_user_id: connection for connection in connections}
+
+            confirmed_connections = [connection for connection in connections if connection.circles.all()]
+
+            if confirmed_connections:
+                # The target connection has circles once the other user confirmed the connection
+                confirmed_target_connections_ids = set(Connection.objects.filter(
+                    id__in=[connection.target_connection_id for connection in confirmed_connections],
+                    circles__isnull=False).values_list('id', flat=True))
+            else:
+                confirmed_target_connections_ids = set()
+
+            self._fully_connected_users_ids = {connection.target_user_id for connection in confirmed_connections if
+                                               connection.target_connection_id in confirmed_target_connections_ids}
+
+        return self._connections_by_user_id
+
+
+def make_users_relationship_state_context(request, users, context=None):
+    """
+    Makes the serializer context for a page of users, priming the relationship batch loader when authenticated
+    """
+    if context is None:
+        context = {}
+
+    context['request'] = request
+
+    if not request.user.is_anonymous:
+        context[USERS_RELATIONSHIP_STATE_CONTEXT_KEY] = UsersRelationshipStateBatchLoader(viewer=request.user,
+                                                                                          users=users)
+
+    return context
+
+
+def get_users_relationship_state_for_user(context, user):
+    """
+    Returns the primed relationship loader from the serializer context if it covers the user
+    """
+    users_relationship_state = context.get(USERS_RELATIONSHIP_STATE_CONTEXT_KEY)
+
+    if users_relationship_state is None or not users_relationship_state.has_user_with_id(user.pk):
+        return None
+
+    request = context.get('request')
+    if request is None or request.user.pk != users_relationship_state.viewer.pk:
+        return None
+
+    return users_relationship_state
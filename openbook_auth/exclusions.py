@@ -0,0 +1,162 @@
+from django.conf import settings
+from django.db.models import Q
+from django_redis import get_redis_connection
+
+from openbook_common.utils.model_loaders import get_user_block_model, get_moderation_report_model, \
+    get_moderated_object_model, get_community_model
+
+# Every cached exclusion set holds this member so that a warm but empty set can be told apart from a
+# cold (missing) one. Real ids are always >= 1.
+EXCLUSION_SET_SENTINEL_MEMBER = 0
+
+# Held instead of the ids when the set grew past EXCLUSION_SETS_MAX_IDS. Queries then fall back to joins,
+# as a huge NOT IN list costs more than the join it replaces.
+EXCLUSION_SET_OVERFLOW_MEMBER = -1
+
+BLOCKED_USERS_EXCLUSION_SET = 'blocked-users'
+REPORTED_POSTS_EXCLUSION_SET = 'reported-posts'
+BANNED_COMMUNITIES_EXCLUSION_SET = 'banned-communities'
+
+
+def make_exclusion_set_key_for_user_with_id(exclusion_set, user_id):
+    return 'ob-api-exclusions-%s-%d' % (exclusion_set, user_id)
+
+
+def make_approved_posts_exclusion_set_key():
+    return 'ob-api-exclusions-approved-posts'
+
+
+def get_blocked_users_ids_for_user_with_id(user_id):
+    """
+    Returns the ids of the users blocked by the user and of the users that blocked the user.
+    Returns None if there are too many of them to be used as a filter.
+    """
+
+    def get_blocked_users_ids():
+        UserBlock = get_user_block_model()
+        blocks = UserBlock.objects.filter(Q(blocker_id=user_id) | Q(blocked_user_id=user_id)).values_list(
+            'blocker_id', 'blocked_user_id')
+        blocked_users_ids = set()
+        for blocker_id, blocked_user_id in blocks:
+            blocked_users_ids.add(blocked_user_id if blocker_id == user_id else blocker_id)
+        return blocked_users_ids
+
+    return _get_exclusion_set(
+        key=make_exclusion_set_key_for_user_with_id(exclusion_set=BLOCKED_USERS_EXCLUSION_SET, user_id=user_id),
+        get_ids=get_blocked_users_ids)
+
+
+def get_reported_posts_ids_for_user_with_id(user_id):
+    """
+    Returns the ids of the posts reported by the user.
+    Returns None if there are too many of them to be used as a filter.
+    """
+
+    def get_reported_posts_ids():
+        ModerationReport = get_moderation_report_model()
+        ModeratedObject = get_moderated_object_model()
+        return ModerationReport.objects.filter(reporter_id=user_id,
+                                               moderated_object__object_type=ModeratedObject.OBJECT_TYPE_POST) \
+            .values_list('moderated_object__object_id', flat=True)
+
+    return _get_exclusion_set(
+        key=make_exclusion_set_key_for_user_with_id(exclusion_set=REPORTED_POSTS_EXCLUSION_SET, user_id=user_id),
+        get_ids=get_reported_posts_ids)
+
+
+def get_banned_communities_ids_for_user_with_id(user_id):
+    """
+    Returns the ids of the communities the user is banned from.
+    Returns None if there are too many of them to be used as a filter.
+    """
+
+    def get_banned_communities_ids():
+        Community = get_community_model()
+        return Community.objects.filter(banned_users__id=user_id).values_list('id', flat=True)
+
+    return _get_exclusion_set(
+        key=make_exclusion_set_key_for_user_with_id(exclusion_set=BANNED_COMMUNITIES_EXCLUSION_SET,
+                                                    user_id=user_id),
+        get_ids=get_banned_communities_ids)
+
+
+def get_approved_posts_ids():
+    """
+    Returns the ids of the posts with an approved but not yet verified moderated object.
+    Verifying an approved post soft deletes it, so queries excluding soft deleted posts don't need the rest.
+    Returns None if there are too many of them to be used as a filter.
+    """
+
+    def get_approved_posts_ids():
+        ModeratedObject = get_moderated_object_model()
+        return ModeratedObject.objects.filter(object_type=ModeratedObject.OBJECT_TYPE_POST,
+                                              status=ModeratedObject.STATUS_APPROVED,
+                                              verified=False).values_list('object_id', flat=True)
+
+    return _get_exclusion_set(key=make_approved_posts_exclusion_set_key(), get_ids=get_approved_posts_ids)
+
+
+def invalidate_blocked_users_ids_for_users_with_ids(users_ids):
+    _invalidate_exclusion_sets(keys=[
+        make_exclusion_set_key_for_user_with_id(exclusion_set=BLOCKED_USERS_EXCLUSION_SET, user_id=user_id)
+        for user_id in users_ids])
+
+
+def invalidate_reported_posts_ids_for_user_with_id(user_id):
+    _invalidate_exclusion_sets(keys=[
+        make_exclusion_set_key_for_user_with_id(exclusion_set=REPORTED_POSTS_EXCLUSION_SET, user_id=user_id)])
+
+
+def invalidate_banned_communities_ids_for_users_with_ids(users_ids):
+    _invalidate_exclusion_sets(keys=[
+        make_exclusion_set_key_for_user_with_id(exclusion_set=BANNED_COMMUNITIES_EXCLUSION_SET, user_id=user_id)
+        for user_id in users_ids])
+
+
+def invalidate_approved_posts_ids():
+    _invalidate_exclusion_sets(keys=[make_approved_posts_exclusion_set_key()])
+
+
+def _get_exclusion_set(key, get_ids):
+    redis = _get_exclusions_redis_connection()
+    members = redis.smembers(key)
+
+    if not members:
+        ids = set(get_ids())
+        _set_exclusion_set(redis=redis, key=key, ids=ids)
+        if len(ids) > settings.EXCLUSION_SETS_MAX_IDS:
+            return None
+        return ids
+
+    ids = {int(member) for member in members}
+
+    if EXCLUSION_SET_OVERFLOW_MEMBER in ids:
+        return None
+
+    ids.discard(EXCLUSION_SET_SENTINEL_MEMBER)
+    return ids
+
+
+def _set_exclusion_set(redis, key, ids):
+    if len(ids) > settings.EXCLUSION_SETS_MAX_IDS:
+        members = [EXCLUSION_SET_OVERFLOW_MEMBER]
+    else:
+        members = [EXCLUSION_SET_SENTINEL_MEMBER, *ids]
+
+    pipeline = redis.pipeline(transaction=True)
+    pipeline.delete(key)
+    pipeline.sadd(key, *members)
+    pipeline.expire(key, settings.EXCLUSION_SETS_TTL)
+    pipeline.execute()
+
+
+def _invalidate_exclusion_sets(keys):
+    if not keys:
+        return
+
+    redis = _get_exclusions_redis_connection()
+    redis.delete(*keys)
+
+
+def _get_exclusions_redis_connection():
+    return get_redis_connection('default')
@@ -0,0 +1,24 @@
+# Generated by Django 2.2.5 on 2020-01-08 10:12
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('openbook_auth', '0051_auto_20191209_1338'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserCounts',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='counts', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('followers_count', models.IntegerField(default=0)),
+                ('following_count', models.IntegerField(default=0)),
+                ('posts_count', models.IntegerField(default=0)),
+            ],
+        ),
+    ]
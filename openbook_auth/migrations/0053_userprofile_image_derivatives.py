@@ -0,0 +1,23 @@
+from django.db import migrations
+import openbook_common.fields
+import openbook_auth.helpers
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('openbook_auth', '0052_usercounts'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='userprofile',
+            name='avatar',
+            field=openbook_common.fields.DerivativeImageField(null=True, upload_to=openbook_auth.helpers.upload_to_user_avatar_directory, verbose_name='avatar'),
+        ),
+        migrations.AlterField(
+            model_name='userprofile',
+            name='cover',
+            field=openbook_common.fields.DerivativeImageField(null=True, upload_to=openbook_auth.helpers.upload_to_user_cover_directory, verbose_name='cover'),
+        ),
+    ]
@@ -6,25 +6,39 @@ from django.contrib.auth.validators import UnicodeUsernameValidator, ASCIIUserna
 from django.contrib.contenttypes.fields import GenericRelation
 from django.db import models
 from django.contrib.auth.models import AbstractUser
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.utils import six, timezone, translation
 from django.template.loader import render_to_string
 from django.utils.translation import ugettext_lazy as _
-from imagekit.models import ProcessedImageField
-from pilkit.processors import ResizeToFill, ResizeToFit
 from rest_framework.authtoken.models import Token
 from django.db.models import Q, F, Count
 from django.core.mail import EmailMultiAlternatives
 
 from openbook.settings import USERNAME_MAX_LENGTH
+from openbook_auth.authentication import is_user_with_id_suspended, invalidate_auth_token, \
+    invalidate_auth_tokens_for_user_with_id
+from openbook_auth.exclusions import invalidate_blocked_users_ids_for_users_with_ids, \
+    get_blocked_users_ids_for_user_with_id
 from openbook_auth.helpers import upload_to_user_cover_directory, upload_to_user_avatar_directory
 from openbook_hashtags.queries import make_search_hashtag_query_for_user_with_id, \
     make_get_hashtag_with_name_for_user_with_id_query
 from openbook_notifications.helpers import get_notification_language_code_for_target_user
-from openbook_posts.queries import make_get_hashtag_posts_for_user_with_id_query
+from openbook_posts.jobs import rebuild_timeline_for_user_with_id
+from openbook_posts.queries import make_get_hashtag_posts_for_user_with_id_query, make_only_published_posts_query, \
+    make_exclude_soft_deleted_posts_query, make_exclude_reported_posts_by_user_with_id_query, \
+    make_exclude_reported_and_approved_posts_query, make_exclude_blocked_posts_for_user_with_id_query, \
+    make_exclude_community_posts_banned_from_for_user_with_id_query, \
+    make_exclude_closed_posts_in_community_for_user_with_id_query, \
+    make_exclude_blocked_community_posts_for_user_and_community_with_ids
+from openbook_posts.timelines import is_materialized_timeline_enabled, get_timeline_posts_ids_for_user_with_id, \
+    invalidate_timeline_for_user_with_id
 from openbook_posts.query_collections import get_posts_for_user_collection
+from openbook_posts.soft_deletion import start_soft_deletion, SOFT_DELETION_TARGET_USER
+from openbook_search.helpers import search_users_ids, search_hashtags_ids, order_by_search_rank, \
+    index_users_with_ids, delete_users_with_ids_from_index
 from openbook_translation import translation_strategy
+from openbook_common.fields import DerivativeImageField
 from openbook_common.helpers import get_supported_translation_language
 from openbook_common.models import Badge, Language
 from openbook_common.utils.helpers import delete_file_field
@@ -34,11 +48,14 @@ from openbook_common.utils.model_loaders import get_connection_model, get_circle
     get_connection_request_notification_model, get_post_reaction_notification_model, get_device_model, \
     get_post_mute_model, get_community_invite_notification_model, get_user_block_model, get_emoji_model, \
     get_post_comment_reply_notification_model, get_moderated_object_model, get_moderation_report_model, \
-    get_moderation_penalty_model, get_post_comment_mute_model, get_post_comment_reaction_model, \
+    get_post_comment_mute_model, get_post_comment_reaction_model, \
     get_post_comment_reaction_notification_model, get_top_post_model, get_top_post_community_exclusion_model, \
-    get_hashtag_model
+    get_hashtag_model, get_post_reaction_emoji_count_model, get_post_comment_reaction_emoji_count_model, \
+    get_post_reaction_model, get_community_membership_model, get_hashtag_public_post_model
 from openbook_common.validators import name_characters_validator
 from openbook_notifications import helpers
+from openbook_notifications.counters import get_unread_notifications_count_for_user_with_id, \
+    set_unread_notifications_count_for_user_with_id, decrement_unread_notifications_count_for_user_with_id
 from openbook_auth.checkers import *
 
 
@@ -278,13 +295,24 @@ class User(AbstractUser):
     def count_unread_notifications(self):
         return self.notifications.filter(read=False).count()
 
+    def get_unread_notifications_count(self):
+        """
+        Same result as count_unread_notifications, read from the cached counter
+        """
+        unread_notifications_count = get_unread_notifications_count_for_user_with_id(user_id=self.pk)
+
+        if unread_notifications_count is None:
+            unread_notifications_count = self.count_unread_notifications()
+            set_unread_notifications_count_for_user_with_id(user_id=self.pk, count=unread_notifications_count)
+
+        return unread_notifications_count
+
     def count_public_posts_for_user(self, user):
         """
         Returns count of public posts for not connected users
         """
         Post = get_post_model()
         Circle = get_circle_model()
-        ModeratedObject = get_moderated_object_model()
         world_circle_id = Circle.get_world_circle_id()
 
         posts_prefetch_related = 'circles'
@@ -293,12 +321,11 @@ class User(AbstractUser):
 
         user_query = Q(creator_id=user.pk)
 
-        exclude_reported_and_approved_posts_query = ~Q(moderated_object__status=ModeratedObject.STATUS_APPROVED)
+        exclude_reported_and_approved_posts_query = make_exclude_reported_and_approved_posts_query()
 
-        exclude_reported_posts_query = ~Q(moderated_object__reports__reporter_id=self.pk)
+        exclude_reported_posts_query = make_exclude_reported_posts_by_user_with_id_query(user_id=self.pk)
 
-        exclude_blocked_posts_query = ~Q(Q(creator__blocked_by_users__blocker_id=self.pk) | Q(
-            creator__user_blocks__blocked_user_id=self.pk))
+        exclude_blocked_posts_query = make_exclude_blocked_posts_for_user_with_id_query(user_id=self.pk)
 
         exclude_deleted_posts_query = Q(is_deleted=False, status=Post.STATUS_PUBLISHED)
 
@@ -347,12 +374,10 @@ class User(AbstractUser):
 
     def count_posts_for_hashtag(self, hashtag):
         """
-        Count how many posts are with the given hashtag name relative to the user
+        Count how many posts are with the given hashtag name, from the counter of its publicly visible posts.
+        Posts hidden from the user by blocks, reports or bans are still counted.
         """
-        Post = get_post_model()
-        hashtag_posts_query = make_get_hashtag_posts_for_user_with_id_query(user_id=self.pk, hashtag=hashtag)
-
-        return Post.objects.filter(hashtag_posts_query).distinct().cache().count()
+        return hashtag.count_posts()
 
     def count_posts_for_user_with_id(self, user_id):
         """
@@ -374,6 +399,24 @@ class User(AbstractUser):
     def count_following(self):
         return self.follows.count()
 
+    def get_followers_count(self):
+        """
+        Same result as count_followers, read from the denormalized counters
+        """
+        return UserCounts.get_counts_for_user_with_id(user_id=self.pk).followers_count
+
+    def get_following_count(self):
+        """
+        Same result as count_following, read from the denormalized counters
+        """
+        return UserCounts.get_counts_for_user_with_id(user_id=self.pk).following_count
+
+    def get_posts_count(self):
+        """
+        Same result as count_posts, read from the denormalized counters
+        """
+        return UserCounts.get_counts_for_user_with_id(user_id=self.pk).posts_count
+
     def count_connections(self):
         return self.connections.count()
 
@@ -386,24 +429,16 @@ class User(AbstractUser):
         return super(User, self).save(*args, **kwargs)
 
     def soft_delete(self):
-        for post in self.posts.all().iterator():
-            post.soft_delete()
-
-        for community in self.created_communities.all().iterator():
-            community.soft_delete()
-
         self.is_deleted = True
         self.save()
+        self.created_communities.update(is_deleted=True)
+        start_soft_deletion(target_type=SOFT_DELETION_TARGET_USER, target_id=self.pk, is_deleted=True)
 
     def unsoft_delete(self):
-        for post in self.posts.all.iterator():
-            post.unsoft_delete()
-
-        for community in self.created_communities.all().iterator():
-            community.unsoft_delete()
-
         self.is_deleted = False
         self.save()
+        self.created_communities.update(is_deleted=False)
+        start_soft_deletion(target_type=SOFT_DELETION_TARGET_USER, target_id=self.pk, is_deleted=False)
 
     def update_profile_cover(self, cover, save=True):
         if cover is None:
@@ -708,9 +743,7 @@ class User(AbstractUser):
         return self.communities_memberships.filter(community__name=community_name, is_moderator=True).exists()
 
     def is_suspended(self):
-        ModerationPenalty = get_moderation_penalty_model()
-        return self.moderation_penalties.filter(type=ModerationPenalty.TYPE_SUSPENSION,
-                                                expiration__gt=timezone.now()).exists()
+        return is_user_with_id_suspended(user_id=self.pk)
 
     def get_longest_moderation_suspension(self):
         return self.moderation_penalties.order_by('expiration')[0:1][0]
@@ -930,6 +963,29 @@ class User(AbstractUser):
     def get_emoji_counts_for_post(self, post, emoji_id=None):
         check_can_get_reactions_for_post(user=self, post=post)
 
+        blocked_users_ids = get_blocked_users_ids_for_user_with_id(user_id=self.pk)
+
+        if blocked_users_ids is None:
+            # Too many blocks to filter them by id
+            return self._get_emoji_counts_for_post_with_joins(post=post, emoji_id=emoji_id)
+
+        PostReactionEmojiCount = get_post_reaction_emoji_count_model()
+        counts_by_emoji_id = PostReactionEmojiCount.get_counts_for_posts_with_ids(posts_ids=[post.pk],
+                                                                                  emoji_id=emoji_id).get(post.pk, {})
+
+        if blocked_users_ids and counts_by_emoji_id:
+            PostReaction = get_post_reaction_model()
+            blocked_users_reactions = PostReaction.objects.filter(post_id=post.pk,
+                                                                  emoji_id__in=list(counts_by_emoji_id.keys()),
+                                                                  reactor_id__in=sorted(blocked_users_ids))
+            counts_by_emoji_id = self._subtract_hidden_reactions_from_emoji_counts(
+                counts_by_emoji_id=counts_by_emoji_id, blocked_users_reactions=blocked_users_reactions,
+                community=post.community)
+
+        Emoji = get_emoji_model()
+        return Emoji.make_emoji_counts(counts_by_emoji_id=counts_by_emoji_id)
+
+    def _get_emoji_counts_for_post_with_joins(self, post, emoji_id=None):
         Emoji = get_emoji_model()
 
         emoji_query = Q(post_reactions__post_id=post.pk, )
@@ -971,6 +1027,29 @@ class User(AbstractUser):
     def get_emoji_counts_for_post_comment(self, post_comment, emoji_id=None):
         check_can_get_reactions_for_post_comment(user=self, post_comment=post_comment)
 
+        blocked_users_ids = get_blocked_users_ids_for_user_with_id(user_id=self.pk)
+
+        if blocked_users_ids is None:
+            # Too many blocks to filter them by id
+            return self._get_emoji_counts_for_post_comment_with_joins(post_comment=post_comment, emoji_id=emoji_id)
+
+        PostCommentReactionEmojiCount = get_post_comment_reaction_emoji_count_model()
+        counts_by_emoji_id = PostCommentReactionEmojiCount.get_counts_for_post_comments_with_ids(
+            post_comments_ids=[post_comment.pk], emoji_id=emoji_id).get(post_comment.pk, {})
+
+        if blocked_users_ids and counts_by_emoji_id:
+            PostCommentReaction = get_post_comment_reaction_model()
+            blocked_users_reactions = PostCommentReaction.objects.filter(
+                post_comment_id=post_comment.pk, emoji_id__in=list(counts_by_emoji_id.keys()),
+                reactor_id__in=sorted(blocked_users_ids))
+            counts_by_emoji_id = self._subtract_hidden_reactions_from_emoji_counts(
+                counts_by_emoji_id=counts_by_emoji_id, blocked_users_reactions=blocked_users_reactions,
+                community=post_comment.post.community)
+
+        Emoji = get_emoji_model()
+        return Emoji.make_emoji_counts(counts_by_emoji_id=counts_by_emoji_id)
+
+    def _get_emoji_counts_for_post_comment_with_joins(self, post_comment, emoji_id=None):
         Emoji = get_emoji_model()
 
         emoji_query = Q(post_comment_reactions__post_comment_id=post_comment.pk, )
@@ -1004,6 +1083,27 @@ class User(AbstractUser):
 
         return [{'emoji': emoji, 'count': emoji.post_comment_reactions__count} for emoji in emojis]
 
+    def _subtract_hidden_reactions_from_emoji_counts(self, counts_by_emoji_id, blocked_users_reactions, community):
+        """
+        Reactions of blocked users are hidden, except in communities where they or we are staff
+        """
+        if community:
+            if self.is_staff_of_community_with_name(community_name=community.name):
+                return counts_by_emoji_id
+
+            CommunityMembership = get_community_membership_model()
+            community_staff_ids = CommunityMembership.objects.filter(
+                Q(is_administrator=True) | Q(is_moderator=True), community_id=community.pk).values('user_id')
+            blocked_users_reactions = blocked_users_reactions.exclude(reactor_id__in=community_staff_ids)
+
+        counts_by_emoji_id = dict(counts_by_emoji_id)
+
+        for emoji_id, count in blocked_users_reactions.values('emoji_id').annotate(count=Count('id')).order_by(). \
+                values_list('emoji_id', 'count'):
+            counts_by_emoji_id[emoji_id] -= count
+
+        return counts_by_emoji_id
+
     def get_reaction_for_post_comment_with_id(self, post_comment_id):
         return self.post_comment_reactions.filter(post_comment_id=post_comment_id).get()
 
@@ -1543,6 +1643,7 @@ class User(AbstractUser):
         Community = get_community_model()
         community_to_join = Community.objects.get(name=community_name)
         community_to_join.add_member(self)
+        invalidate_timeline_for_user_with_id(user_id=self.pk)
 
         # Clean up_full any invites
         CommunityInvite = get_community_invite_model()
@@ -1567,6 +1668,7 @@ class User(AbstractUser):
             self.unsubscribe_from_community_notifications(community=community_to_leave)
 
         community_to_leave.remove_member(self)
+        invalidate_timeline_for_user_with_id(user_id=self.pk)
 
         return community_to_leave
 
@@ -1818,21 +1920,30 @@ class User(AbstractUser):
         return self.lists.get(id=list_id)
 
     def search_hashtags_with_query(self, query):
-        hashtags_query = make_search_hashtag_query_for_user_with_id(search_query=query, user_id=self.pk)
+        hashtags_ids = search_hashtags_ids(query=query)
+        hashtags_query = make_search_hashtag_query_for_user_with_id(search_query=query, user_id=self.pk,
+                                                                    hashtags_ids=hashtags_ids)
         Hashtag = get_hashtag_model()
 
-        return Hashtag.objects.filter(hashtags_query)
+        return order_by_search_rank(Hashtag.objects.filter(hashtags_query), ranked_ids=hashtags_ids)
 
     def search_users_with_query(self, query):
-        users_query = self._make_search_users_query(query=query)
+        users_ids = search_users_ids(query=query)
+        users_query = self._make_search_users_query(query=query, users_ids=users_ids)
 
-        return User.objects.filter(users_query)
+        return order_by_search_rank(User.objects.filter(users_query), ranked_ids=users_ids)
 
-    def _make_search_users_query(self, query):
+    def _make_search_users_query(self, query, users_ids=None):
+        """
+        Matches the given users found by the search backend, else the users whose username or name contain the query
+        """
         users_query = self._make_users_query()
 
-        search_users_query = Q(username__icontains=query)
-        search_users_query.add(Q(profile__name__icontains=query), Q.OR)
+        if users_ids is not None:
+            search_users_query = Q(id__in=users_ids)
+        else:
+            search_users_query = Q(username__icontains=query)
+            search_users_query.add(Q(profile__name__icontains=query), Q.OR)
 
         users_query.add(search_users_query, Q.AND)
         return users_query
@@ -2129,6 +2240,9 @@ class User(AbstractUser):
         post.is_closed = False
         post.save()
 
+        HashtagPublicPost = get_hashtag_public_post_model()
+        HashtagPublicPost.index_posts_with_ids(posts_ids=[post.pk])
+
         return post
 
     def close_post_with_id(self, post_id):
@@ -2142,6 +2256,9 @@ class User(AbstractUser):
         post.is_closed = True
         post.save()
 
+        HashtagPublicPost = get_hashtag_public_post_model()
+        HashtagPublicPost.index_posts_with_ids(posts_ids=[post.pk])
+
         return post
 
     def get_hashtag_with_name(self, hashtag_name):
@@ -2159,8 +2276,9 @@ class User(AbstractUser):
         if max_id:
             hashtag_posts_query.add(Q(id__lt=max_id), Q.AND)
 
+        # Posts are indexed once per hashtag, no need for distinct
         Post = get_post_model()
-        hashtag_posts = Post.objects.filter(hashtag_posts_query).distinct()
+        hashtag_posts = Post.objects.filter(hashtag_posts_query)
 
         return hashtag_posts
 
@@ -2387,10 +2505,55 @@ class User(AbstractUser):
         """
 
         if not circles_ids and not lists_ids:
+            if is_materialized_timeline_enabled():
+                timeline_posts = self._get_materialized_timeline_posts(max_id=max_id, min_id=min_id, count=count)
+                if timeline_posts is not None:
+                    return timeline_posts
+
             return self._get_timeline_posts_with_no_filters(max_id=max_id)
 
         return self._get_timeline_posts_with_filters(max_id=max_id, circles_ids=circles_ids, lists_ids=lists_ids)
 
+    def _get_materialized_timeline_posts(self, max_id=None, min_id=None, count=None):
+        """
+        Hydrates the posts of the materialized timeline in one query, applying the viewer exclusions at read time.
+        Returns None and schedules a rebuild if the timeline is cold.
+        """
+        # Over fetch ids so excluded posts don't leave the page short
+        timeline_posts_ids = get_timeline_posts_ids_for_user_with_id(user_id=self.pk, max_id=max_id, min_id=min_id,
+                                                                     count=count * 2 if count else None)
+
+        if timeline_posts_ids is None:
+            rebuild_timeline_for_user_with_id.delay(user_id=self.pk)
+            return None
+
+        Post = get_post_model()
+
+        posts_select_related = ('creator', 'creator__profile', 'community', 'image')
+
+        posts_prefetch_related = ('circles', 'creator__profile__badges')
+
+        posts_only = ('text', 'id', 'uuid', 'created', 'image__width', 'image__height', 'image__image',
+                      'creator__username', 'creator__id', 'creator__profile__name', 'creator__profile__avatar',
+                      'creator__profile__badges__id', 'creator__profile__badges__keyword',
+                      'creator__profile__id', 'community__id', 'community__name', 'community__avatar',
+                      'community__color',
+                      'community__title')
+
+        timeline_posts_query = Q(id__in=timeline_posts_ids)
+        timeline_posts_query.add(make_only_published_posts_query(), Q.AND)
+        timeline_posts_query.add(make_exclude_soft_deleted_posts_query(), Q.AND)
+        timeline_posts_query.add(make_exclude_closed_posts_in_community_for_user_with_id_query(user_id=self.pk),
+                                 Q.AND)
+        timeline_posts_query.add(make_exclude_reported_posts_by_user_with_id_query(user_id=self.pk), Q.AND)
+        timeline_posts_query.add(make_exclude_reported_and_approved_posts_query(), Q.AND)
+        timeline_posts_query.add(make_exclude_blocked_posts_for_user_with_id_query(user_id=self.pk), Q.AND)
+        timeline_posts_query.add(make_exclude_community_posts_banned_from_for_user_with_id_query(user_id=self.pk),
+                                 Q.AND)
+
+        return Post.objects.select_related(*posts_select_related).prefetch_related(
+            *posts_prefetch_related).only(*posts_only).filter(timeline_posts_query)
+
     def _get_timeline_posts_with_filters(self, max_id=None, min_id=None, circles_ids=None, lists_ids=None):
         Post = get_post_model()
 
@@ -2434,7 +2597,7 @@ class User(AbstractUser):
 
         timeline_posts_query.add(Q(is_deleted=False, status=Post.STATUS_PUBLISHED), Q.AND)
 
-        timeline_posts_query.add(~Q(moderated_object__reports__reporter_id=self.pk), Q.AND)
+        timeline_posts_query.add(make_exclude_reported_posts_by_user_with_id_query(user_id=self.pk), Q.AND)
 
         return Post.objects.filter(timeline_posts_query).distinct()
 
@@ -2457,8 +2620,7 @@ class User(AbstractUser):
                       'community__color',
                       'community__title')
 
-        ModeratedObject = get_moderated_object_model()
-        reported_posts_exclusion_query = ~Q(moderated_object__reports__reporter_id=self.pk)
+        reported_posts_exclusion_query = make_exclude_reported_posts_by_user_with_id_query(user_id=self.pk)
 
         own_posts_query = Q(creator=self.pk, community__isnull=True, is_deleted=False, status=Post.STATUS_PUBLISHED)
 
@@ -2473,13 +2635,12 @@ class User(AbstractUser):
         community_posts_query = Q(community__memberships__user__id=self.pk, is_closed=False, is_deleted=False,
                                   status=Post.STATUS_PUBLISHED)
 
-        community_posts_query.add(~Q(Q(creator__blocked_by_users__blocker_id=self.pk) | Q(
-            creator__user_blocks__blocked_user_id=self.pk)), Q.AND)
+        community_posts_query.add(make_exclude_blocked_posts_for_user_with_id_query(user_id=self.pk), Q.AND)
 
         if max_id:
             community_posts_query.add(Q(id__lt=max_id), Q.AND)
 
-        community_posts_query.add(~Q(moderated_object__status=ModeratedObject.STATUS_APPROVED), Q.AND)
+        community_posts_query.add(make_exclude_reported_and_approved_posts_query(), Q.AND)
 
         community_posts_query.add(reported_posts_exclusion_query, Q.AND)
 
@@ -2630,6 +2791,7 @@ class User(AbstractUser):
 
         Follow = get_follow_model()
         follow = Follow.create_follow(user_id=self.pk, followed_user_id=user_id, lists_ids=lists_ids)
+        invalidate_timeline_for_user_with_id(user_id=self.pk)
         self._create_follow_notification(followed_user_id=user_id)
         self._send_follow_push_notification(followed_user_id=user_id)
 
@@ -2643,6 +2805,7 @@ class User(AbstractUser):
         follow = self.follows.get(followed_user_id=user_id)
         self._delete_follow_notification(followed_user_id=user_id)
         follow.delete()
+        invalidate_timeline_for_user_with_id(user_id=self.pk)
 
     def update_follow_for_user(self, user, lists_ids=None):
         return self.update_follow_for_user_with_id(user.pk, lists_ids=lists_ids)
@@ -2740,6 +2903,10 @@ class User(AbstractUser):
         connection.circles.add(*circles_ids)
         connection.save()
 
+        # The circles we see each other's posts through changed
+        invalidate_timeline_for_user_with_id(user_id=self.pk)
+        invalidate_timeline_for_user_with_id(user_id=user_id)
+
         return connection
 
     def disconnect_from_user(self, user):
@@ -2757,6 +2924,9 @@ class User(AbstractUser):
         connection = self.connections.get(target_connection__user_id=user_id)
         connection.delete()
 
+        invalidate_timeline_for_user_with_id(user_id=self.pk)
+        invalidate_timeline_for_user_with_id(user_id=user_id)
+
         return connection
 
     def get_connection_for_user_with_id(self, user_id):
@@ -2784,7 +2954,9 @@ class User(AbstractUser):
         if types:
             notifications_query.add(Q(notification_type__in=types), Q.AND)
 
-        self.notifications.filter(notifications_query).update(read=True)
+        read_notifications_count = self.notifications.filter(notifications_query).update(read=True)
+
+        decrement_unread_notifications_count_for_user_with_id(user_id=self.pk, amount=read_notifications_count)
 
     def get_unread_notifications(self, max_id=None, types=None):
         notifications_query = Q(read=False)
@@ -2799,17 +2971,24 @@ class User(AbstractUser):
     def read_notification_with_id(self, notification_id):
         check_can_read_notification_with_id(user=self, notification_id=notification_id)
         notification = self.notifications.get(id=notification_id)
+        was_read = notification.read
         notification.read = True
         notification.save()
+
+        if not was_read:
+            decrement_unread_notifications_count_for_user_with_id(user_id=self.pk)
+
         return notification
 
     def delete_notification_with_id(self, notification_id):
         check_can_delete_notification_with_id(user=self, notification_id=notification_id)
         notification = self.notifications.get(id=notification_id)
+        # The unread notifications counter is decremented on post_delete
         notification.delete()
 
     def delete_notifications(self):
         self.notifications.all().delete()
+        set_unread_notifications_count_for_user_with_id(user_id=self.pk, count=0)
 
     def create_device(self, uuid, name=None):
         check_device_with_uuid_does_not_exist(user=self, device_uuid=uuid)
@@ -3281,6 +3460,7 @@ class User(AbstractUser):
                                                                                                 user_b_id=user_id)
 
     def _reset_auth_token(self):
+        # The cached token is invalidated by the invalidate_cached_auth_token receiver
         self.auth_token.delete()
         bootstrap_user_auth_token(user=self)
 
@@ -3332,13 +3512,12 @@ class User(AbstractUser):
                                   circles__connections__target_connection__circles__isnull=False), Q.OR)
 
         posts_query.add(posts_circles_query, Q.AND)
-        posts_query.add(~Q(Q(creator__blocked_by_users__blocker_id=self.pk) | Q(
-            creator__user_blocks__blocked_user_id=self.pk)), Q.AND)
+        posts_query.add(make_exclude_blocked_posts_for_user_with_id_query(user_id=self.pk), Q.AND)
 
         if max_id:
             posts_query.add(Q(id__lt=max_id), Q.AND)
 
-        posts_query.add(~Q(moderated_object__reports__reporter_id=self.pk), Q.AND)
+        posts_query.add(make_exclude_reported_posts_by_user_with_id_query(user_id=self.pk), Q.AND)
 
         return posts_query
 
@@ -3530,14 +3709,14 @@ class User(AbstractUser):
         community_posts_query = Q(community_id=community.pk, is_deleted=False, status=Post.STATUS_PUBLISHED)
 
         # Don't retrieve items that have been reported and approved
-        ModeratedObject = get_moderated_object_model()
-        community_posts_query.add(~Q(moderated_object__status=ModeratedObject.STATUS_APPROVED), Q.AND)
+        community_posts_query.add(make_exclude_reported_and_approved_posts_query(), Q.AND)
 
         # Dont retrieve items we have reported
-        community_posts_query.add(~Q(moderated_object__reports__reporter_id=self.pk), Q.AND)
+        community_posts_query.add(make_exclude_reported_posts_by_user_with_id_query(user_id=self.pk), Q.AND)
 
         # Only retrieve posts if we're not banned
-        community_posts_query.add(~Q(community__banned_users__id=self.pk), Q.AND)
+        community_posts_query.add(make_exclude_community_posts_banned_from_for_user_with_id_query(user_id=self.pk),
+                                  Q.AND)
 
         # Ensure public/private visibility is respected
         community_posts_visibility_query = Q(community__memberships__user__id=self.pk)
@@ -3551,16 +3730,10 @@ class User(AbstractUser):
             community_posts_query.add(Q(is_closed=False) | Q(creator_id=self.pk), Q.AND)
 
             # Don't retrieve posts of blocked users, except if they're staff members
-            blocked_users_query = ~Q(Q(creator__blocked_by_users__blocker_id=self.pk) | Q(
-                creator__user_blocks__blocked_user_id=self.pk))
-
-            blocked_users_query_staff_members = Q(creator__communities_memberships__community_id=community)
-            blocked_users_query_staff_members.add(Q(creator__communities_memberships__is_administrator=True) | Q(
-                creator__communities_memberships__is_moderator=True), Q.AND)
-
-            blocked_users_query.add(~blocked_users_query_staff_members, Q.AND)
-
-            community_posts_query.add(blocked_users_query, Q.AND)
+            community_posts_query.add(
+                make_exclude_blocked_community_posts_for_user_and_community_with_ids(user_id=self.pk,
+                                                                                     community_id=community.pk),
+                Q.AND)
         else:
             if not include_closed_posts_for_staff:
                 community_posts_query.add(Q(is_closed=False), Q.AND)
@@ -3577,6 +3750,25 @@ def create_auth_token(sender, instance=None, created=False, **kwargs):
         bootstrap_user_auth_token(instance)
 
 
+@receiver(post_delete, sender=Token, dispatch_uid='invalidate_cached_auth_token')
+def invalidate_cached_auth_token(sender, instance=None, **kwargs):
+    """
+    Invalidate the cached token on reset and on account deletion
+    """
+    invalidate_auth_token(key=instance.key)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL, dispatch_uid='invalidate_cached_auth_tokens_on_deactivation')
+def invalidate_cached_auth_tokens_on_deactivation(sender, instance=None, created=False, **kwargs):
+    """
+    Only the tokens of active users are cached, the ones of a deactivated user must stop authenticating right away
+    """
+    if created or instance.is_active:
+        return
+
+    invalidate_auth_tokens_for_user_with_id(user_id=instance.pk)
+
+
 @receiver(post_save, sender=settings.AUTH_USER_MODEL, dispatch_uid='bootstrap_user_circles')
 def bootstrap_circles(sender, instance=None, created=False, **kwargs):
     """"
@@ -3593,12 +3785,12 @@ class UserProfile(models.Model):
     location = models.CharField(_('location'), max_length=settings.PROFILE_LOCATION_MAX_LENGTH, blank=False, null=True)
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='profile')
     is_of_legal_age = models.BooleanField(default=False)
-    avatar = ProcessedImageField(verbose_name=_('avatar'), blank=False, null=True, format='JPEG',
-                                 options={'quality': 90}, processors=[ResizeToFill(500, 500)],
-                                 upload_to=upload_to_user_avatar_directory)
-    cover = ProcessedImageField(verbose_name=_('cover'), blank=False, null=True, format='JPEG', options={'quality': 90},
-                                upload_to=upload_to_user_cover_directory,
-                                processors=[ResizeToFit(width=1024, upscale=False)])
+    avatar = DerivativeImageField(verbose_name=_('avatar'), blank=False, null=True,
+                                  widths=(64, 128, 256, 500), aspect_ratio=1,
+                                  upload_to=upload_to_user_avatar_directory)
+    cover = DerivativeImageField(verbose_name=_('cover'), blank=False, null=True,
+                                 upload_to=upload_to_user_cover_directory,
+                                 widths=(320, 640, 1024))
     bio = models.TextField(_('bio'), max_length=settings.PROFILE_BIO_MAX_LENGTH, blank=False, null=True)
     url = models.URLField(_('url'), blank=False, null=True)
     followers_count_visible = models.BooleanField(_('followers count visible'), blank=False, null=False, default=False)
@@ -3793,3 +3985,132 @@ class UserNotificationsSubscription(models.Model):
         return cls.objects.filter(user__username=target_username,
                                   subscriber__username=username,
                                   new_post_notifications=True).exists()
+
+
+class UserCounts(models.Model):
+    """
+    Denormalized counters of a user, kept up to date by the signals below.
+    Rows are created lazily from the real counts the first time they are read.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='counts', primary_key=True)
+    followers_count = models.IntegerField(default=0)
+    following_count = models.IntegerField(default=0)
+    posts_count = models.IntegerField(default=0)
+
+    @classmethod
+    def get_counts_for_user_with_id(cls, user_id):
+        try:
+            return cls.objects.get(user_id=user_id)
+        except cls.DoesNotExist:
+            cls.reconcile_counts_for_users_with_ids(users_ids=[user_id])
+            return cls.objects.get(user_id=user_id)
+
+    @classmethod
+    def update_count_for_user_with_id(cls, user_id, count_name, amount):
+        """
+        Missing rows are skipped, they will be built from the real counts on their first read
+        """
+        cls.objects.filter(user_id=user_id).update(**{count_name: F(count_name) + amount})
+
+    @classmethod
+    def reconcile_counts_for_users_with_ids(cls, users_ids):
+        """
+        Repairs the counters of the given users from the real counts.
+        Returns the amount of counters that were missing or had drifted.
+        """
+        Follow = get_follow_model()
+        Post = get_post_model()
+
+        users_ids = list(users_ids)
+
+        followers_counts = dict(Follow.objects.filter(followed_user_id__in=users_ids).values(
+            'followed_user_id').annotate(count=Count('id')).order_by().values_list('followed_user_id', 'count'))
+        following_counts = dict(Follow.objects.filter(user_id__in=users_ids).values(
+            'user_id').annotate(count=Count('id')).order_by().values_list('user_id', 'count'))
+        posts_counts = dict(Post.objects.filter(creator_id__in=users_ids).values(
+            'creator_id').annotate(count=Count('id')).order_by().values_list('creator_id', 'count'))
+
+        existing_counts = cls.objects.in_bulk(users_ids)
+
+        counts_to_create = []
+        counts_to_update = []
+
+        for user_id in users_ids:
+            followers_count = followers_counts.get(user_id, 0)
+            following_count = following_counts.get(user_id, 0)
+            posts_count = posts_counts.get(user_id, 0)
+
+            user_counts = existing_counts.get(user_id)
+
+            if user_counts is None:
+                counts_to_create.append(cls(user_id=user_id, followers_count=followers_count,
+                                            following_count=following_count, posts_count=posts_count))
+            elif (user_counts.followers_count, user_counts.following_count, user_counts.posts_count) != (
+                    followers_count, following_count, posts_count):
+                user_counts.followers_count = followers_count
+                user_counts.following_count = following_count
+                user_counts.posts_count = posts_count
+                counts_to_update.append(user_counts)
+
+        cls.objects.bulk_create(counts_to_create, ignore_conflicts=True)
+        cls.objects.bulk_update(counts_to_update, ['followers_count', 'following_count', 'posts_count'])
+
+        return len(counts_to_create) + len(counts_to_update)
+
+
+@receiver(post_save, sender='openbook_follows.Follow', dispatch_uid='increment_follow_counts')
+def increment_follow_counts(sender, instance=None, created=False, **kwargs):
+    if created:
+        UserCounts.update_count_for_user_with_id(user_id=instance.user_id, count_name='following_count', amount=1)
+        UserCounts.update_count_for_user_with_id(user_id=instance.followed_user_id, count_name='followers_count',
+                                                 amount=1)
+
+
+@receiver(post_delete, sender='openbook_follows.Follow', dispatch_uid='decrement_follow_counts')
+def decrement_follow_counts(sender, instance=None, **kwargs):
+    UserCounts.update_count_for_user_with_id(user_id=instance.user_id, count_name='following_count', amount=-1)
+    UserCounts.update_count_for_user_with_id(user_id=instance.followed_user_id, count_name='followers_count',
+                                             amount=-1)
+
+
+@receiver(post_save, sender='openbook_posts.Post', dispatch_uid='increment_user_posts_count')
+def increment_user_posts_count(sender, instance=None, created=False, **kwargs):
+    if created:
+        UserCounts.update_count_for_user_with_id(user_id=instance.creator_id, count_name='posts_count', amount=1)
+
+
+@receiver(post_delete, sender='openbook_posts.Post', dispatch_uid='decrement_user_posts_count')
+def decrement_user_posts_count(sender, instance=None, **kwargs):
+    UserCounts.update_count_for_user_with_id(user_id=instance.creator_id, count_name='posts_count', amount=-1)
+
+
+@receiver(post_save, sender=UserBlock, dispatch_uid='invalidate_blocked_users_exclusions_on_block')
+def invalidate_blocked_users_exclusions_on_block(sender, instance=None, created=False, **kwargs):
+    if created:
+        invalidate_blocked_users_ids_for_users_with_ids(users_ids=[instance.blocker_id, instance.blocked_user_id])
+
+
+@receiver(post_delete, sender=UserBlock, dispatch_uid='invalidate_blocked_users_exclusions_on_unblock')
+def invalidate_blocked_users_exclusions_on_unblock(sender, instance=None, **kwargs):
+    invalidate_blocked_users_ids_for_users_with_ids(users_ids=[instance.blocker_id, instance.blocked_user_id])
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL, dispatch_uid='index_user_for_search')
+def index_user_for_search(sender, instance=None, update_fields=None, **kwargs):
+    if update_fields and not {'username', 'is_deleted'}.intersection(update_fields):
+        return
+
+    index_users_with_ids(users_ids=[instance.pk])
+
+
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL, dispatch_uid='delete_user_from_search_index')
+def delete_user_from_search_index(sender, instance=None, **kwargs):
+    delete_users_with_ids_from_index(users_ids=[instance.pk])
+
+
+@receiver(post_save, sender=UserProfile, dispatch_uid='index_user_profile_for_search')
+def index_user_profile_for_search(sender, instance=None, update_fields=None, **kwargs):
+    if update_fields and 'name' not in update_fields:
+        return
+
+    index_users_with_ids(users_ids=[instance.user_id])
@@ -569,6 +569,28 @@ class VerifyResetPasswordAPITests(OpenbookAPITestCase):
         self.assertNotEqual(original_auth_token_key, user.auth_token.key)
         self.assertFalse(Token.objects.filter(key=original_auth_token_key).exists())
 
+    def test_updating_password_with_valid_token_invalidates_cached_auth_token(self):
+        """
+        updating the password with a valid token should stop authenticating with the previously used auth token
+        """
+        user = make_user()
+        headers = make_authentication_headers_for_user(user)
+        authenticated_user_url = reverse('authenticated-user')
+
+        response = self.client.get(authenticated_user_url, **headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        request_data = {
+            'new_password': 'testing12345',
+            'token': user.request_password_reset(),
+        }
+
+        response = self.client.post(self._get_url(), request_data, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.get(authenticated_user_url, **headers)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
     def _get_url(self):
         return reverse('verify-reset-password')
 
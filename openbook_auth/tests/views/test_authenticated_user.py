@@ -479,6 +479,25 @@ class AuthenticatedUserAPITests(OpenbookAPITestCase):
 
         self.assertEqual('https://' + unfully_qualified_url, user.profile.url)
 
+    def test_deactivated_user_cannot_retrieve_itself(self):
+        """
+        should not authenticate a user with a cached token once it is deactivated
+        """
+        user = make_user()
+        headers = make_authentication_headers_for_user(user)
+
+        url = self._get_url()
+        response = self.client.get(url, **headers)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        user.is_active = False
+        user.save()
+
+        response = self.client.get(url, **headers)
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
     def _get_url(self):
         return reverse('authenticated-user')
 
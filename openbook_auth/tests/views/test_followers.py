@@ -71,6 +71,44 @@ class FollowersAPITests(OpenbookAPITestCase):
 
         self.assertEqual(0, len(response_followers))
 
+    def test_retrieves_followers_relationship_state(self):
+        """
+        should serialize the relationship of the authenticated user with every follower
+        """
+        user = make_user()
+        headers = make_authentication_headers_for_user(user)
+
+        follower = make_user()
+        follower.follow_user_with_id(user.pk)
+
+        followed_follower = make_user()
+        followed_follower.follow_user_with_id(user.pk)
+        user.follow_user_with_id(followed_follower.pk)
+
+        connected_follower = make_user()
+        connected_follower.follow_user_with_id(user.pk)
+        connected_follower.connect_with_user_with_id(user.pk)
+        user.confirm_connection_with_user_with_id(connected_follower.pk)
+
+        url = self._get_url()
+        response = self.client.get(url, **headers)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response_followers = {response_follower['id']: response_follower for response_follower in
+                              json.loads(response.content)}
+
+        self.assertEqual(len(response_followers), 3)
+
+        for follower_id, is_following, is_connected in (
+                (follower.pk, False, False),
+                (followed_follower.pk, True, False),
+                (connected_follower.pk, True, True)):
+            response_follower = response_followers[follower_id]
+            self.assertEqual(response_follower['is_following'], is_following)
+            self.assertEqual(response_follower['is_connected'], is_connected)
+            self.assertTrue(response_follower['is_followed'])
+
     def _get_url(self):
         return reverse('followers')
 
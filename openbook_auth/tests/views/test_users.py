@@ -1,3 +1,5 @@
+from django.core.management import call_command
+from django.test import override_settings
 from django.urls import reverse
 from faker import Faker
 from rest_framework import status
@@ -6,6 +8,7 @@ from openbook_common.tests.models import OpenbookAPITestCase
 import logging
 import json
 from openbook_common.tests.helpers import make_user, make_authentication_headers_for_user, make_fake_post_text
+from openbook_auth.models import UserCounts
 from openbook_common.utils.model_loaders import get_user_notifications_subscription_model
 
 fake = Faker()
@@ -132,6 +135,67 @@ class SearchUsersAPITests(OpenbookAPITestCase):
 
         self.assertEqual(0, len(parsed_reponse))
 
+    def test_ranks_exact_and_prefix_username_matches_first(self):
+        user_with_name = make_user()
+        user_with_name.profile.name = 'Bigjoel'
+        user_with_name.profile.save()
+
+        user_with_username_containing = make_user()
+        user_with_username_containing.username = 'thejoelshow'
+        user_with_username_containing.save()
+
+        user_with_username_prefix = make_user()
+        user_with_username_prefix.username = 'joelle'
+        user_with_username_prefix.save()
+
+        user_with_username = make_user()
+        user_with_username.username = 'joel'
+        user_with_username.save()
+
+        user = make_user()
+        headers = make_authentication_headers_for_user(user)
+
+        url = self._get_url()
+        response = self.client.get(url, {
+            'query': 'Joel'
+        }, **headers)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        parsed_response = json.loads(response.content)
+
+        response_usernames = [user['username'] for user in parsed_response]
+
+        self.assertEqual(response_usernames[:2], [user_with_username.username, user_with_username_prefix.username])
+        self.assertIn(user_with_username_containing.username, response_usernames[2:])
+        self.assertIn(user_with_name.username, response_usernames[2:])
+
+    @override_settings(OS_SEARCH_BACKEND_NAME=None)
+    def test_can_query_users_without_search_backend(self):
+        user_with_username = make_user()
+        user_with_username.username = 'thejoelshow'
+        user_with_username.save()
+
+        user_with_name = make_user()
+        user_with_name.profile.name = 'Bigjoel'
+        user_with_name.profile.save()
+
+        user = make_user()
+        headers = make_authentication_headers_for_user(user)
+
+        url = self._get_url()
+        response = self.client.get(url, {
+            'query': 'joel'
+        }, **headers)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        parsed_response = json.loads(response.content)
+
+        response_usernames = {user['username'] for user in parsed_response}
+
+        self.assertEqual(response_usernames, {user_with_username.username, user_with_name.username})
+
     def _get_url(self):
         return reverse('search-users')
 
@@ -208,6 +272,53 @@ class GetUserAPITests(OpenbookAPITestCase):
 
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
 
+    def test_retrieves_user_counts(self):
+        """
+        should retrieve the followers, following and posts counts kept by the counters
+        """
+        user = make_user()
+        headers = make_authentication_headers_for_user(user)
+
+        for i in range(0, 3):
+            follower = make_user()
+            follower.follow_user_with_id(user.pk)
+
+        follower.unfollow_user_with_id(user.pk)
+
+        for i in range(0, 2):
+            user.follow_user_with_id(make_user().pk)
+
+        user.create_public_post(text=make_fake_post_text())
+
+        url = self._get_url(user)
+
+        response = self.client.get(url, **headers)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        parsed_response = json.loads(response.content)
+
+        self.assertEqual(parsed_response['followers_count'], 2)
+        self.assertEqual(parsed_response['following_count'], 2)
+        self.assertEqual(parsed_response['posts_count'], 1)
+
+    def test_reconcile_counts_repairs_drifted_user_counts(self):
+        """
+        should repair drifted user counters when reconciling counts
+        """
+        user = make_user()
+        follower = make_user()
+        follower.follow_user_with_id(user.pk)
+
+        self.assertEqual(user.get_followers_count(), 1)
+
+        UserCounts.objects.filter(user_id=user.pk).update(followers_count=10)
+
+        call_command('reconcile_counts')
+
+        self.assertEqual(user.get_followers_count(), 1)
+        self.assertEqual(follower.get_following_count(), 1)
+
     def _get_url(self, user):
         return reverse('get-user', kwargs={
             'user_username': user.username
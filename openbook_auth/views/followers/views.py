@@ -3,6 +3,7 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from openbook_auth.batch_loaders import make_users_relationship_state_context
 from openbook_auth.views.followers.serializers import GetFollowersSerializer, FollowersUserSerializer, \
     SearchFollowersSerializer
 
@@ -21,10 +22,11 @@ class Followers(APIView):
         max_id = data.get('max_id')
 
         user = request.user
-        users = user.get_followers(max_id=max_id).order_by(
-            '-id')[:count]
+        users = list(user.get_followers(max_id=max_id).order_by(
+            '-id')[:count])
 
-        users_serializer = FollowersUserSerializer(users, many=True, context={'request': request})
+        users_serializer = FollowersUserSerializer(users, many=True,
+                                                   context=make_users_relationship_state_context(request, users))
 
         return Response(users_serializer.data, status=status.HTTP_200_OK)
 
@@ -43,8 +45,9 @@ class SearchFollowers(APIView):
         query = data.get('query')
 
         user = request.user
-        users = user.search_followers_with_query(query=query)[:count]
+        users = list(user.search_followers_with_query(query=query)[:count])
 
-        users_serializer = FollowersUserSerializer(users, many=True, context={'request': request, })
+        users_serializer = FollowersUserSerializer(users, many=True,
+                                                   context=make_users_relationship_state_context(request, users))
 
         return Response(users_serializer.data, status=status.HTTP_200_OK)
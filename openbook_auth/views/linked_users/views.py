@@ -3,6 +3,7 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from openbook_auth.batch_loaders import make_users_relationship_state_context
 from openbook_auth.views.linked_users.serializers import GetLinkedUsersSerializer, \
     SearchLinkedUsersSerializer, LinkedUsersUserSerializer
 
@@ -22,12 +23,13 @@ class LinkedUsers(APIView):
         with_community = data.get('with_community')
 
         user = request.user
-        users = user.get_linked_users(max_id=max_id).order_by(
-            '-id')[:count]
+        users = list(user.get_linked_users(max_id=max_id).order_by(
+            '-id')[:count])
 
-        users_serializer = LinkedUsersUserSerializer(users, many=True, context={'request': request,
-                                                                                'communities_names': [
-                                                                                    with_community]})
+        users_serializer = LinkedUsersUserSerializer(users, many=True,
+                                                     context=make_users_relationship_state_context(
+                                                         request, users,
+                                                         context={'communities_names': [with_community]}))
 
         return Response(users_serializer.data, status=status.HTTP_200_OK)
 
@@ -47,10 +49,11 @@ class SearchLinkedUsers(APIView):
         with_community = data.get('with_community')
 
         user = request.user
-        users = user.search_linked_users_with_query(query=query)[:count]
+        users = list(user.search_linked_users_with_query(query=query)[:count])
 
-        users_serializer = LinkedUsersUserSerializer(users, many=True, context={'request': request,
-                                                                                'communities_names': [
-                                                                                    with_community]})
+        users_serializer = LinkedUsersUserSerializer(users, many=True,
+                                                     context=make_users_relationship_state_context(
+                                                         request, users,
+                                                         context={'communities_names': [with_community]}))
 
         return Response(users_serializer.data, status=status.HTTP_200_OK)
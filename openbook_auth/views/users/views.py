@@ -4,6 +4,7 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from openbook_auth.batch_loaders import make_users_relationship_state_context
 from openbook_auth.views.authenticated_user.serializers import GetAuthenticatedUserSerializer, \
     LegacyGetAuthenticatedUserSerializer
 from openbook_auth.views.users.serializers import SearchUsersSerializer, SearchUsersUserSerializer, GetUserSerializer, \
@@ -30,9 +31,10 @@ class SearchUsers(APIView):
 
         user = request.user
 
-        users = user.search_users_with_query(query=query)
+        users = list(user.search_users_with_query(query=query)[:count])
 
-        users_serializer = SearchUsersUserSerializer(users[:count], many=True, context={'request': request})
+        users_serializer = SearchUsersUserSerializer(users, many=True,
+                                                     context=make_users_relationship_state_context(request, users))
 
         return Response(users_serializer.data, status=status.HTTP_200_OK)
 
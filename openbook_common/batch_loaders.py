@@ -0,0 +1,35 @@
+from openbook_common.fields import get_derivatives_urls_of_images
+
+IMAGE_DERIVATIVES_CONTEXT_KEY = 'image_derivatives'
+
+
+class ImageDerivativesBatchLoader:
+    """
+    Request scoped loader of the derivatives of the images of a page.
+    They are looked up for the whole page at once the first time a field asks for them.
+    """
+
+    def __init__(self, get_images):
+        # Called on first use, so the images are taken from the objects being serialized
+        self._get_images = get_images
+        self._derivatives_urls_by_image_key = None
+
+    def get_derivatives_urls_for_image(self, image):
+        """
+        Returns None if the image is not one of the page
+        """
+        if self._derivatives_urls_by_image_key is None:
+            images = [image for image in self._get_images() if image]
+            derivatives_urls_of_images = get_derivatives_urls_of_images(images=images)
+            self._derivatives_urls_by_image_key = {_make_image_key(image): derivatives_urls for
+                                                   image, derivatives_urls in zip(images, derivatives_urls_of_images)}
+
+        return self._derivatives_urls_by_image_key.get(_make_image_key(image))
+
+
+def get_image_derivatives_batch_loader(context):
+    return context.get(IMAGE_DERIVATIVES_CONTEXT_KEY)
+
+
+def _make_image_key(image):
+    return image.field, image.name
@@ -1,25 +1,111 @@
-class DBRouter(object):
+import random
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.utils import Error as DatabaseError
+from django_redis import get_redis_connection
+
+_routing = threading.local()
+
+# Process wide, replica alias -> timestamp until which it's considered down
+_replicas_down_until = {}
+
+
+def start_routing(pinned_reason=None):
+    """
+    Starts routing the reads of the current request. Reads go to a replica unless pinned to the writer.
+    Outside of a request (jobs, commands) every read goes to the writer.
+    """
+    _routing.active = True
+    _routing.pinned_reason = pinned_reason
+    _routing.wrote = False
+    _routing.replica = None
+    _routing.reads = Counter()
+
+
+def stop_routing():
+    _routing.active = False
+
+
+def pin_to_writer(reason):
+    """
+    Sends the remaining reads of the current request to the writer
+    """
+    if not _routing_is_active():
+        return
+
+    if _routing.pinned_reason is None:
+        _routing.pinned_reason = reason
+
+
+def get_routing_pinned_reason():
+    if not _routing_is_active():
+        return None
+    return _routing.pinned_reason
+
+
+def routing_did_write():
+    return _routing_is_active() and _routing.wrote
+
+
+def get_routing_reads():
+    """
+    Returns a Counter of the reads of the current request, per database alias
+    """
+    if not _routing_is_active():
+        return Counter()
+    return _routing.reads
+
+
+def mark_replica_down(alias):
+    _replicas_down_until[alias] = time.monotonic() + settings.DATABASE_REPLICA_DOWNTIME
+
+
+def is_replica_up(alias):
+    down_until = _replicas_down_until.get(alias)
+
+    if down_until is None:
+        return True
+
+    if down_until > time.monotonic():
+        return False
+
+    del _replicas_down_until[alias]
+    return True
+
+
+class ReplicaRouter(object):
+    """
+    Routes the reads of a request to one of the DATABASE_REPLICAS, picked by weight among the replicas which are up.
+    Requests pinned to the writer, or that wrote already, read from the writer so they see their own writes.
+    """
+
     def db_for_read(self, model, **hints):
-        """
-        All reads are routed to Reader
-        """
-        return 'Reader'
+        if not _routing_is_active():
+            return DEFAULT_DB_ALIAS
+
+        if _routing.pinned_reason is not None or _routing.wrote:
+            alias = DEFAULT_DB_ALIAS
+        else:
+            alias = self._get_replica_for_request()
+
+        _routing.reads[alias] += 1
+
+        return alias
 
     def db_for_write(self, model, **hints):
-        """
-        All writes are routed to Writer
-        """
-        return 'Writer'
+        if _routing_is_active():
+            # Read your own writes for the rest of the request
+            _routing.wrote = True
+
+        return DEFAULT_DB_ALIAS
 
     def allow_relation(self, obj1, obj2, **hints):
         """
-        Returning
-        None
-        means
-        that
-        no
-        specific
-        routing
+        All the databases hold the same data
         """
         return True
 
@@ -27,4 +113,105 @@ class DBRouter(object):
         """
         Returning None means that no specific routing
         """
+        return None
+
+    def _get_replica_for_request(self):
+        # Stick to one replica per request, so reads within it are consistent with each other
+        if _routing.replica is None:
+            _routing.replica = self._choose_replica()
+        return _routing.replica
+
+    def _choose_replica(self):
+        replicas = [(alias, weight) for alias, weight in settings.DATABASE_REPLICAS.items() if weight > 0]
+
+        while replicas:
+            aliases, weights = zip(*replicas)
+            alias = random.choices(aliases, weights=weights)[0]
+
+            if is_replica_up(alias) and self._can_connect_to_replica(alias):
+                return alias
+
+            replicas = [(other_alias, weight) for other_alias, weight in replicas if other_alias != alias]
+
+        return DEFAULT_DB_ALIAS
+
+    def _can_connect_to_replica(self, alias):
+        try:
+            connections[alias].ensure_connection()
+        except DatabaseError:
+            mark_replica_down(alias)
+            return False
+
         return True
+
+
+def make_writer_pin_key(client_key):
+    return 'ob-api-db-writer-pin-%s' % client_key
+
+
+def set_writer_pin_for_client(client_key):
+    redis = _get_db_routing_redis_connection()
+    redis.set(make_writer_pin_key(client_key), 1, ex=settings.DATABASE_WRITER_PIN_SECONDS)
+
+
+def client_has_writer_pin(client_key):
+    redis = _get_db_routing_redis_connection()
+    return redis.exists(make_writer_pin_key(client_key)) > 0
+
+
+def make_db_routing_metrics_key():
+    return 'ob-api-db-routing-metrics'
+
+
+def record_db_routing_metrics_for_request():
+    """
+    Adds the routing of the current request to the metrics, with one round trip
+    """
+    if not _routing_is_active():
+        return
+
+    pinned_reason = _routing.pinned_reason
+
+    if pinned_reason is None and _routing.wrote:
+        pinned_reason = 'write'
+
+    metrics_key = make_db_routing_metrics_key()
+
+    redis = _get_db_routing_redis_connection()
+    pipeline = redis.pipeline(transaction=False)
+
+    if pinned_reason is None:
+        pipeline.hincrby(metrics_key, 'requests_replica', 1)
+    else:
+        pipeline.hincrby(metrics_key, 'requests_pinned', 1)
+        pipeline.hincrby(metrics_key, 'requests_pinned_by_%s' % pinned_reason, 1)
+
+    for alias, reads_count in _routing.reads.items():
+        if alias == DEFAULT_DB_ALIAS:
+            pipeline.hincrby(metrics_key, 'reads_writer', reads_count)
+            if pinned_reason is None:
+                # Wanted a replica but none was up
+                pipeline.hincrby(metrics_key, 'reads_replica_fallback', reads_count)
+        else:
+            pipeline.hincrby(metrics_key, 'reads_replica_%s' % alias, reads_count)
+
+    pipeline.execute()
+
+
+def get_db_routing_metrics():
+    redis = _get_db_routing_redis_connection()
+    metrics = redis.hgetall(make_db_routing_metrics_key())
+    return {name.decode('utf-8'): int(value) for name, value in metrics.items()}
+
+
+def reset_db_routing_metrics():
+    redis = _get_db_routing_redis_connection()
+    redis.delete(make_db_routing_metrics_key())
+
+
+def _get_db_routing_redis_connection():
+    return get_redis_connection('default')
+
+
+def _routing_is_active():
+    return getattr(_routing, 'active', False)
@@ -0,0 +1,77 @@
+import os
+
+from django.db import models
+from django.db.models.fields.files import ImageFieldFile
+
+from openbook_common.utils.image_derivatives import ImageDerivative, get_image_derivatives_urls, \
+    delete_image_derivatives, normalise_image, IMAGE_DERIVATIVES_FORMATS
+
+
+class DerivativeImageFieldFile(ImageFieldFile):
+    def save(self, name, content, save=True):
+        # The stored image is served until its derivatives are generated, it never keeps the upload as is
+        content = normalise_image(file=content, width=max(self.field.widths), aspect_ratio=self.field.aspect_ratio)
+        name = '%s.jpg' % os.path.splitext(name)[0]
+        super(DerivativeImageFieldFile, self).save(name, content, save=save)
+
+    def get_derivative(self, width, format):
+        return ImageDerivative(storage=self.storage, source_name=self.name, width=width, format=format,
+                               aspect_ratio=self.field.aspect_ratio)
+
+    def get_derivatives(self):
+        return [self.get_derivative(width=width, format=format) for format in IMAGE_DERIVATIVES_FORMATS for width in
+                self.field.widths]
+
+    def get_derivatives_urls(self):
+        """
+        Returns the derivatives generated so far as dicts with their width, height, format and url
+        """
+        self._require_file()
+
+        return get_derivatives_urls_of_images(images=[self])[0]
+
+    def delete_derivatives(self):
+        if self.name:
+            delete_image_derivatives(derivatives=self.get_derivatives())
+
+
+class DerivativeImageField(models.ImageField):
+    """
+    Stores the image as a JPEG no larger than the largest of the given widths and without its metadata, which is
+    its url. Its variants of the given widths are generated when first requested. With an aspect_ratio, the
+    image and its variants are cropped to it.
+    """
+    attr_class = DerivativeImageFieldFile
+
+    def __init__(self, verbose_name=None, name=None, widths=(1024,), aspect_ratio=None, **kwargs):
+        self.widths = tuple(sorted(set(widths)))
+        self.aspect_ratio = aspect_ratio
+        super(DerivativeImageField, self).__init__(verbose_name, name, **kwargs)
+
+
+def get_derivatives_urls_of_images(images):
+    """
+    Same as DerivativeImageFieldFile.get_derivatives_urls for each of the given images, looked up all at once
+    """
+    derivatives_of_images = [image.get_derivatives() for image in images]
+    urls = iter(get_image_derivatives_urls(
+        derivatives=[derivative for derivatives in derivatives_of_images for derivative in derivatives]))
+
+    derivatives_urls_of_images = []
+
+    for derivatives in derivatives_of_images:
+        derivatives_urls = []
+
+        for derivative in derivatives:
+            url = next(urls)
+            if url:
+                derivatives_urls.append({
+                    'width': derivative.width,
+                    'height': derivative.height,
+                    'format': derivative.format,
+                    'url': url,
+                })
+
+        derivatives_urls_of_images.append(derivatives_urls)
+
+    return derivatives_urls_of_images
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+import logging
+
+from openbook_common.db_router import get_db_routing_metrics, reset_db_routing_metrics
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Shows how many requests and reads were routed to the writer and to each replica'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Reset the metrics after showing them')
+
+    def handle(self, *args, **options):
+        metrics = get_db_routing_metrics()
+
+        requests_count = metrics.get('requests_pinned', 0) + metrics.get('requests_replica', 0)
+
+        for name in sorted(metrics.keys()):
+            logger.info('%s: %d' % (name, metrics[name]))
+
+        if requests_count:
+            logger.info('Requests pinned to the writer: %.2f%%' % (
+                    metrics.get('requests_pinned', 0) / requests_count * 100))
+
+        if options.get('reset'):
+            reset_db_routing_metrics()
+            logger.info('Metrics reset')
@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand
+import logging
+
+from openbook_auth.models import UserCounts
+from openbook_common.utils.model_loaders import get_user_model, get_post_model, get_post_comment_model, \
+    get_community_model
+from openbook_communities.models import CommunityCounts
+from openbook_posts.models import PostCounts, PostCommentCounts
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Repairs missing or drifted denormalized counters of users, posts, post comments and communities'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help='How many counters to repair per query')
+
+    def handle(self, *args, **options):
+        chunk_size = options.get('chunk_size')
+
+        User = get_user_model()
+        Post = get_post_model()
+        PostComment = get_post_comment_model()
+        Community = get_community_model()
+
+        self._reconcile(name='users', queryset=User.objects.all(), chunk_size=chunk_size,
+                        reconcile=lambda ids: UserCounts.reconcile_counts_for_users_with_ids(users_ids=ids))
+        self._reconcile(name='posts', queryset=Post.objects.all(), chunk_size=chunk_size,
+                        reconcile=lambda ids: PostCounts.reconcile_counts_for_posts_with_ids(posts_ids=ids))
+        self._reconcile(name='post comments', queryset=PostComment.objects.all(), chunk_size=chunk_size,
+                        reconcile=lambda ids: PostCommentCounts.reconcile_counts_for_post_comments_with_ids(
+                            post_comments_ids=ids))
+        self._reconcile(name='communities', queryset=Community.objects.all(), chunk_size=chunk_size,
+                        reconcile=lambda ids: CommunityCounts.reconcile_counts_for_communities_with_ids(
+                            communities_ids=ids))
+
+    def _reconcile(self, name, queryset, chunk_size, reconcile):
+        logger.info('Reconciling counts of %s' % name)
+
+        last_id = 0
+        checked = 0
+        repaired = 0
+
+        while True:
+            ids = list(queryset.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:chunk_size])
+
+            if not ids:
+                break
+
+            repaired += reconcile(ids)
+            checked += len(ids)
+            last_id = ids[-1]
+
+        logger.info('Checked %d %s, repaired %d counts' % (checked, name, repaired))
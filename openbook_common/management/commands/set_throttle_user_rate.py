@@ -0,0 +1,40 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+import logging
+
+from openbook_common.throttles import set_throttle_rate_for_user_with_id, clear_throttle_rate_for_user_with_id, \
+    get_throttle_rates_for_user_with_id
+from openbook_common.utils.model_loaders import get_user_model
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Replaces the rate of a throttle scope for a user, e.g. to block a spammer or let a bot write faster'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', type=str, help='The username of the user to set the rate for')
+        parser.add_argument('--scope', type=str, help='The throttle scope, one of the THROTTLE_RATES keys')
+        parser.add_argument('--rate', type=str, help='The rate, e.g. 100/hour, 0/hour blocks the user')
+        parser.add_argument('--clear', action='store_true', help='Go back to the rate of the scope')
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+
+        username = options.get('username')
+        scope = options.get('scope')
+        rate = options.get('rate')
+
+        user = User.objects.only('id').get(username=username)
+
+        if scope is not None:
+            if scope not in settings.THROTTLE_RATES:
+                raise CommandError('Unknown throttle scope: %s' % scope)
+
+            if options.get('clear'):
+                clear_throttle_rate_for_user_with_id(user_id=user.pk, scope=scope)
+            elif rate is not None:
+                set_throttle_rate_for_user_with_id(user_id=user.pk, scope=scope, rate=rate)
+
+        for user_scope, (capacity, period) in sorted(get_throttle_rates_for_user_with_id(user_id=user.pk).items()):
+            logger.info('%s: %d requests every %d seconds' % (user_scope, capacity, period))
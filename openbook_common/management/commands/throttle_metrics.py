@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+import logging
+
+from openbook_common.throttles import get_throttle_metrics, reset_throttle_metrics
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Shows how many requests each throttle scope allowed and rejected, and the latency the checks added'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Reset the metrics after showing them')
+
+    def handle(self, *args, **options):
+        metrics = get_throttle_metrics()
+
+        for scope in sorted(metrics.keys()):
+            scope_metrics = metrics[scope]
+
+            allowed_count = scope_metrics.get('allowed', 0)
+            rejected_count = scope_metrics.get('rejected', 0)
+            timed_checks_count = scope_metrics.get('timed_checks', 0)
+
+            logger.info('%s scope. Allowed: %d. Rejected: %d' % (scope, allowed_count, rejected_count))
+
+            if allowed_count or rejected_count:
+                logger.info('%s scope. Rejected: %.2f%%' % (
+                    scope, rejected_count / (allowed_count + rejected_count) * 100))
+
+            if timed_checks_count:
+                logger.info('%s scope. Average check latency: %.3f ms' % (
+                    scope, scope_metrics.get('checks_microseconds', 0) / timed_checks_count / 1000))
+
+        if options.get('reset'):
+            reset_throttle_metrics()
+            logger.info('Metrics reset')
@@ -1,8 +1,14 @@
+import hashlib
+
 import pytz
 
+from django.conf import settings
 from django.utils import timezone
 from django.utils.deprecation import MiddlewareMixin
 
+from openbook_common.db_router import start_routing, stop_routing, routing_did_write, set_writer_pin_for_client, \
+    client_has_writer_pin, record_db_routing_metrics_for_request
+
 
 class TimezoneMiddleware(MiddlewareMixin):
     """
@@ -15,3 +21,60 @@ class TimezoneMiddleware(MiddlewareMixin):
             timezone.activate(pytz.timezone(tzname))
         else:
             timezone.deactivate()
+
+
+class ReadYourWritesMiddleware(MiddlewareMixin):
+    """
+    Sends the reads of a request to the database replicas, unless the client wrote in the last
+    DATABASE_WRITER_PIN_SECONDS, in which case they go to the writer so the client sees its own writes.
+
+    Clients are pinned after a successful write with a cookie and, as API clients often don't keep cookies,
+    a Redis marker keyed by their authorization header. Clients can also ask for the writer with a header.
+    """
+    SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+    def process_request(self, request):
+        start_routing(pinned_reason=self._get_pinned_reason(request))
+
+    def process_response(self, request, response):
+        if request.method not in self.SAFE_METHODS and routing_did_write() and response.status_code < 400:
+            response.set_cookie(settings.DATABASE_WRITER_PIN_COOKIE_NAME, 'true',
+                                max_age=settings.DATABASE_WRITER_PIN_SECONDS)
+            client_key = self._get_client_key(request)
+            if client_key:
+                set_writer_pin_for_client(client_key)
+
+        if settings.DATABASE_ROUTING_METRICS_ENABLED:
+            record_db_routing_metrics_for_request()
+
+        stop_routing()
+
+        return response
+
+    def _get_pinned_reason(self, request):
+        if request.method not in self.SAFE_METHODS:
+            return 'write_method'
+
+        if any(request.path_info.startswith(path) for path in settings.DATABASE_WRITER_PINNED_PATHS):
+            return 'path'
+
+        if request.META.get(settings.DATABASE_WRITER_PIN_HEADER) == 'true':
+            return 'header'
+
+        if request.COOKIES.get(settings.DATABASE_WRITER_PIN_COOKIE_NAME) == 'true':
+            return 'cookie'
+
+        client_key = self._get_client_key(request)
+
+        if client_key and client_has_writer_pin(client_key):
+            return 'marker'
+
+        return None
+
+    def _get_client_key(self, request):
+        authorization = request.META.get('HTTP_AUTHORIZATION')
+
+        if not authorization:
+            return None
+
+        return hashlib.sha256(authorization.encode('utf-8')).hexdigest()
@@ -75,6 +75,25 @@ class Emoji(models.Model):
 
         return [{'emoji': emoji, 'count': emoji.post_reactions__count} for emoji in emojis]
 
+    @classmethod
+    def make_emoji_counts(cls, counts_by_emoji_id, emojis_by_id=None):
+        """
+        Turns emoji id -> amount of reactions into the emoji counts of the API, the most used first
+        """
+        counts_by_emoji_id = {emoji_id: count for emoji_id, count in counts_by_emoji_id.items() if count > 0}
+
+        if not counts_by_emoji_id:
+            return []
+
+        if emojis_by_id is None:
+            emojis_by_id = cls.objects.cache().in_bulk(list(counts_by_emoji_id.keys()))
+
+        emoji_counts = [{'emoji': emojis_by_id[emoji_id], 'count': count} for emoji_id, count in
+                        counts_by_emoji_id.items() if emoji_id in emojis_by_id]
+        emoji_counts.sort(key=lambda emoji_count: emoji_count['count'], reverse=True)
+
+        return emoji_counts
+
     def __str__(self):
         return 'Emoji: ' + self.keyword
 
@@ -0,0 +1,35 @@
+from rest_framework.fields import Field
+
+from openbook_common.batch_loaders import get_image_derivatives_batch_loader
+
+
+class ImageDerivativesField(Field):
+    """
+    The derivatives of a DerivativeImageField generated so far, for clients to pick the width and format they need.
+    The ones missing are generated meanwhile.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super(ImageDerivativesField, self).__init__(**kwargs)
+
+    def to_representation(self, image):
+        if not image:
+            return []
+
+        request = self.context.get('request')
+
+        derivatives = None
+        image_derivatives_batch_loader = get_image_derivatives_batch_loader(context=self.context)
+
+        if image_derivatives_batch_loader:
+            derivatives = image_derivatives_batch_loader.get_derivatives_urls_for_image(image)
+
+        if derivatives is None:
+            derivatives = image.get_derivatives_urls()
+
+        if request:
+            derivatives = [dict(derivative, url=request.build_absolute_uri(derivative['url'])) for derivative in
+                           derivatives]
+
+        return derivatives
@@ -1,7 +1,9 @@
 from rest_framework.fields import Field
 
+from openbook_common.batch_loaders import get_image_derivatives_batch_loader, IMAGE_DERIVATIVES_CONTEXT_KEY
 from openbook_common.utils.model_loaders import get_post_model
 from openbook_communities.models import CommunityMembership
+from openbook_posts.batch_loaders import get_posts_viewer_state_for_post
 from openbook_posts.models import PostReaction, PostCommentReaction
 
 
@@ -19,11 +21,18 @@ class ReactionField(Field):
         serialized_reaction = None
 
         if not request_user.is_anonymous:
-            try:
-                reaction = request_user.get_reaction_for_post_with_id(post.pk)
-                serialized_reaction = self.reaction_serializer(reaction, context={'request': request}).data
-            except PostReaction.DoesNotExist:
-                pass
+            posts_viewer_state = get_posts_viewer_state_for_post(context=self.context, post=post)
+
+            if posts_viewer_state:
+                reaction = posts_viewer_state.get_reaction_for_post_with_id(post.pk)
+                if reaction:
+                    serialized_reaction = self.reaction_serializer(reaction, context={'request': request}).data
+            else:
+                try:
+                    reaction = request_user.get_reaction_for_post_with_id(post.pk)
+                    serialized_reaction = self.reaction_serializer(reaction, context={'request': request}).data
+                except PostReaction.DoesNotExist:
+                    pass
 
         return serialized_reaction
 
@@ -41,9 +50,14 @@ class CommentsCountField(Field):
         comments_count = None
 
         if request_user.is_anonymous:
-            comments_count = post.count_comments()
+            comments_count = post.get_comments_count()
         else:
-            comments_count = request_user.get_comments_count_for_post(post=post)
+            posts_viewer_state = get_posts_viewer_state_for_post(context=self.context, post=post)
+
+            if posts_viewer_state:
+                comments_count = posts_viewer_state.get_comments_count_for_post_with_id(post.pk)
+            else:
+                comments_count = request_user.get_comments_count_for_post(post=post)
 
         return comments_count
 
@@ -65,7 +79,12 @@ class PostReactionsEmojiCountField(Field):
                 Post = get_post_model()
                 reaction_emoji_count = Post.get_emoji_counts_for_post_with_id(post.pk)
         else:
-            reaction_emoji_count = request_user.get_emoji_counts_for_post_with_id(post.pk)
+            posts_viewer_state = get_posts_viewer_state_for_post(context=self.context, post=post)
+
+            if posts_viewer_state:
+                reaction_emoji_count = posts_viewer_state.get_emoji_counts_for_post_with_id(post.pk)
+            else:
+                reaction_emoji_count = request_user.get_emoji_counts_for_post_with_id(post.pk)
 
         post_reactions_serializer = self.emoji_count_serializer(reaction_emoji_count, many=True,
                                                                 context={"request": request, 'post': post})
@@ -105,11 +124,22 @@ class PostCreatorField(Field):
         post_creator = post.creator
         post_community = post.community
 
-        post_creator_serializer = self.post_creator_serializer(post_creator, context={"request": request}).data
+        post_creator_serializer = self.post_creator_serializer(post_creator, context={
+            "request": request,
+            IMAGE_DERIVATIVES_CONTEXT_KEY: get_image_derivatives_batch_loader(context=self.context)}).data
 
         if post_community:
-            try:
-                post_creator_membership = post_community.memberships.get(user_id=post_creator.pk)
+            posts_viewer_state = get_posts_viewer_state_for_post(context=self.context, post=post)
+
+            if posts_viewer_state:
+                post_creator_membership = posts_viewer_state.get_creator_membership_for_post_with_id(post.pk)
+            else:
+                try:
+                    post_creator_membership = post_community.memberships.get(user_id=post_creator.pk)
+                except CommunityMembership.DoesNotExist:
+                    post_creator_membership = None
+
+            if post_creator_membership:
                 post_creator_serializer['communities_memberships'] = [
                     self.community_membership_serializer(
                         post_creator_membership,
@@ -117,8 +147,6 @@ class PostCreatorField(Field):
                         context={
                             "request": request}).data
                 ]
-            except CommunityMembership.DoesNotExist:
-                pass
 
         return post_creator_serializer
 
@@ -136,7 +164,12 @@ class PostIsMutedField(Field):
         is_muted = False
 
         if not request_user.is_anonymous:
-            is_muted = request_user.has_muted_post_with_id(post_id=post.pk)
+            posts_viewer_state = get_posts_viewer_state_for_post(context=self.context, post=post)
+
+            if posts_viewer_state:
+                is_muted = posts_viewer_state.has_muted_post_with_id(post_id=post.pk)
+            else:
+                is_muted = request_user.has_muted_post_with_id(post_id=post.pk)
 
         return is_muted
 
@@ -42,7 +42,10 @@ class RepliesCountField(Field):
         request_user = request.user
 
         if request_user.is_anonymous:
-            replies_count = post_comment.count_replies()
+            replies_count = post_comment.get_replies_count()
+        elif post_comment.get_replies_count() == 0:
+            # Nothing to filter for the user
+            replies_count = 0
         else:
             replies_count = request_user.get_replies_count_for_post_comment(post_comment=post_comment)
 
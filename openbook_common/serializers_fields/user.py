@@ -1,5 +1,6 @@
 from rest_framework.fields import Field
 
+from openbook_auth.batch_loaders import get_users_relationship_state_for_user
 from openbook_communities.models import CommunityInvite
 from openbook_common.utils.model_loaders import get_user_model
 
@@ -16,6 +17,9 @@ class IsFollowingField(Field):
         if not request.user.is_anonymous:
             if request.user.pk == value.pk:
                 return False
+            users_relationship_state = get_users_relationship_state_for_user(self.context, value)
+            if users_relationship_state:
+                return users_relationship_state.is_following_user_with_id(value.pk)
             return request.user.is_following_user_with_id(value.pk)
 
         return False
@@ -50,6 +54,9 @@ class IsFollowedField(Field):
         if not request.user.is_anonymous:
             if request.user.pk == user.pk:
                 return False
+            users_relationship_state = get_users_relationship_state_for_user(self.context, user)
+            if users_relationship_state:
+                return users_relationship_state.is_followed_by_user_with_id(user.pk)
             return user.is_following_user_with_id(request.user.pk)
 
         return False
@@ -67,6 +74,9 @@ class IsUserReportedField(Field):
         if not request.user.is_anonymous:
             if request.user.pk == value.pk:
                 return False
+            users_relationship_state = get_users_relationship_state_for_user(self.context, value)
+            if users_relationship_state:
+                return users_relationship_state.has_reported_user_with_id(value.pk)
             reported = request.user.has_reported_user_with_id(value.pk)
             return reported
 
@@ -99,6 +109,9 @@ class IsConnectedField(Field):
         if not request.user.is_anonymous:
             if request.user.pk == value.pk:
                 return False
+            users_relationship_state = get_users_relationship_state_for_user(self.context, value)
+            if users_relationship_state:
+                return users_relationship_state.is_connected_with_user_with_id(value.pk)
             return request.user.is_connected_with_user_with_id(value.pk)
 
         return False
@@ -116,6 +129,9 @@ class IsBlockedField(Field):
         if not request.user.is_anonymous:
             if request.user.pk == value.pk:
                 return False
+            users_relationship_state = get_users_relationship_state_for_user(self.context, value)
+            if users_relationship_state:
+                return users_relationship_state.has_blocked_user_with_id(value.pk)
             return request.user.has_blocked_user_with_id(value.pk)
 
         return False
@@ -133,6 +149,9 @@ class IsFullyConnectedField(Field):
         if not request.user.is_anonymous:
             if request.user.pk == value.pk:
                 return False
+            users_relationship_state = get_users_relationship_state_for_user(self.context, value)
+            if users_relationship_state:
+                return users_relationship_state.is_fully_connected_with_user_with_id(value.pk)
             return request.user.is_fully_connected_with_user_with_id(value.pk)
 
         return False
@@ -150,6 +169,9 @@ class IsPendingConnectionConfirmation(Field):
         if not request.user.is_anonymous:
             if request.user.pk == value.pk:
                 return False
+            users_relationship_state = get_users_relationship_state_for_user(self.context, value)
+            if users_relationship_state:
+                return users_relationship_state.is_pending_confirm_connection_for_user_with_id(value.pk)
             return request.user.is_pending_confirm_connection_for_user_with_id(value.pk)
 
         return False
@@ -168,7 +190,7 @@ class FollowersCountField(Field):
         if not user.profile.followers_count_visible and user.pk != request_user.pk:
             return None
 
-        return user.count_followers()
+        return user.get_followers_count()
 
 
 class IsGlobalModeratorField(Field):
@@ -188,7 +210,7 @@ class FollowingCountField(Field):
         super(FollowingCountField, self).__init__(**kwargs)
 
     def to_representation(self, value):
-        return value.count_following()
+        return value.get_following_count()
 
 
 class UserPostsCountField(Field):
@@ -202,7 +224,7 @@ class UserPostsCountField(Field):
 
         if not request.user.is_anonymous:
             if request.user.pk == value.pk:
-                return value.count_posts()
+                return value.get_posts_count()
             return value.count_posts_for_user_with_id(request.user.pk)
 
         User = get_user_model()
@@ -220,7 +242,7 @@ class UnreadNotificationsCountField(Field):
         request_user = request.user
 
         if not request_user.is_anonymous:
-            return request_user.count_unread_notifications()
+            return request_user.get_unread_notifications_count()
 
         return None
 
@@ -238,8 +260,11 @@ class ConnectedCirclesField(Field):
 
         circles = []
 
-        if not request_user.is_anonymous:
-            if not request_user.pk == user.pk and request_user.is_connected_with_user_with_id(user.pk):
+        if not request_user.is_anonymous and not request_user.pk == user.pk:
+            users_relationship_state = get_users_relationship_state_for_user(self.context, user)
+            if users_relationship_state:
+                circles = users_relationship_state.get_circles_for_connection_with_user_with_id(user.pk)
+            elif request_user.is_connected_with_user_with_id(user.pk):
                 circles = request_user.get_circles_for_connection_with_user_with_id(user.pk).all()
 
         return self.circle_serializer(circles, context={"request": request}, many=True).data
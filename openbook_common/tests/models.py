@@ -1,12 +1,50 @@
 from unittest.mock import patch
 
+from django_redis import get_redis_connection
 from rest_framework.test import APITestCase
 
+from openbook_auth.authentication import clear_local_auth_cache
+from openbook_search.helpers import clear_search_indexes
+
+# Redis state derived from database rows, which are rolled back after each test
+REDIS_STATE_KEYS_PATTERNS = [
+    'ob-api-timeline-*',
+    'ob-api-unread-notifications-count-*',
+    'ob-api-top-posts-curation-watermark',
+    'ob-api-trending-posts-scores-*',
+    'ob-api-exclusions-*',
+    'ob-api-db-writer-pin-*',
+    'ob-api-db-routing-metrics',
+    'ob-api-auth-token-*',
+    'ob-api-suspension-expiration-*',
+    'ob-api-push-notifications-*',
+    'ob-api-post-subscribers-fan-out-*',
+    'ob-api-throttle-*',
+    'ob-api-soft-deletion-*',
+    'ob-api-post-media-processing-*',
+    'ob-api-image-derivative-*',
+]
+
 
 class OpenbookAPITestCase(APITestCase):
     def setUp(self):
         self.patcher = patch('openbook_notifications.helpers._send_notification_to_user')
         self.mock_foo = self.patcher.start()
+        self.users_patcher = patch('openbook_notifications.helpers._send_notification_to_users_with_ids')
+        self.users_patcher.start()
+        self._clear_redis_state()
+        clear_local_auth_cache()
+        # The search index lives outside of the test database and its ids are reused
+        clear_search_indexes()
 
     def tearDown(self):
         self.patcher.stop()
+        self.users_patcher.stop()
+
+    def _clear_redis_state(self):
+        redis = get_redis_connection('default')
+
+        for keys_pattern in REDIS_STATE_KEYS_PATTERNS:
+            keys = list(redis.scan_iter(match=keys_pattern))
+            if keys:
+                redis.delete(*keys)
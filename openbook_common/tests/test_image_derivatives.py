@@ -0,0 +1,112 @@
+from PIL import Image
+from django.core.files import File
+from django.core.files.storage import default_storage
+
+from openbook_common.tests.helpers import get_test_images
+from openbook_common.tests.models import OpenbookAPITestCase
+from openbook_common.utils.image_derivatives import ImageDerivative, get_image_derivative_url, \
+    delete_image_derivatives, normalise_image, IMAGE_DERIVATIVE_FORMAT_WEBP, IMAGE_DERIVATIVE_FORMAT_JPEG
+
+
+class ImageDerivativesTests(OpenbookAPITestCase):
+    """
+    Image derivatives
+    """
+
+    def test_generates_derivative_when_first_requested(self):
+        """
+        should generate and store a derivative of the requested width and format when first requested
+        """
+        for test_image in get_test_images():
+            derivative = self._make_derivative_of_test_image(test_image=test_image, width=320,
+                                                             format=IMAGE_DERIVATIVE_FORMAT_WEBP)
+
+            self.assertFalse(default_storage.exists(derivative.name))
+
+            url = get_image_derivative_url(derivative=derivative)
+
+            self.assertEqual(url, derivative.url)
+            self.assertIn(derivative.source_name, derivative.name)
+
+            with default_storage.open(derivative.name, 'rb') as derivative_file:
+                derivative_image = Image.open(derivative_file)
+                self.assertEqual(derivative_image.format, 'WEBP')
+                self.assertEqual(derivative_image.width, min(320, test_image['width']))
+
+            self._delete_derivative_and_source(derivative=derivative)
+
+    def test_crops_derivative_to_aspect_ratio(self):
+        """
+        should crop a derivative with an aspect ratio to it
+        """
+        test_image = get_test_images()[1]
+
+        derivative = self._make_derivative_of_test_image(test_image=test_image, width=128,
+                                                         format=IMAGE_DERIVATIVE_FORMAT_JPEG, aspect_ratio=1)
+
+        get_image_derivative_url(derivative=derivative)
+
+        with default_storage.open(derivative.name, 'rb') as derivative_file:
+            derivative_image = Image.open(derivative_file)
+            self.assertEqual(derivative_image.format, 'JPEG')
+            self.assertEqual(derivative_image.size, (128, 128))
+
+        self._delete_derivative_and_source(derivative=derivative)
+
+    def test_deletes_derivatives(self):
+        """
+        should delete a generated derivative and forget it was generated
+        """
+        test_image = get_test_images()[0]
+
+        derivative = self._make_derivative_of_test_image(test_image=test_image, width=64,
+                                                         format=IMAGE_DERIVATIVE_FORMAT_JPEG)
+
+        get_image_derivative_url(derivative=derivative)
+
+        delete_image_derivatives(derivatives=[derivative])
+
+        self.assertFalse(default_storage.exists(derivative.name))
+
+        # Generated again
+        self.assertEqual(get_image_derivative_url(derivative=derivative), derivative.url)
+        self.assertTrue(default_storage.exists(derivative.name))
+
+        self._delete_derivative_and_source(derivative=derivative)
+
+    def test_normalises_uploaded_image(self):
+        """
+        should re-encode an uploaded image as a JPEG no wider than the given width and without its metadata
+        """
+        for test_image in get_test_images():
+            with open(test_image['path'], 'rb') as file:
+                normalised_file = normalise_image(file=File(file), width=1024)
+
+            normalised_image = Image.open(normalised_file)
+
+            self.assertEqual(normalised_image.format, 'JPEG')
+            self.assertEqual(normalised_image.width, min(1024, test_image['width']))
+            self.assertNotIn('exif', normalised_image.info)
+
+    def test_normalises_uploaded_image_to_aspect_ratio(self):
+        """
+        should crop an uploaded image with an aspect ratio to it, like avatars
+        """
+        test_image = get_test_images()[2]
+
+        with open(test_image['path'], 'rb') as file:
+            normalised_file = normalise_image(file=File(file), width=500, aspect_ratio=1)
+
+        self.assertEqual(Image.open(normalised_file).size, (500, 500))
+
+    def _make_derivative_of_test_image(self, test_image, width, format, aspect_ratio=None):
+        with open(test_image['path'], 'rb') as file:
+            source_name = default_storage.save('test-image-derivatives/' + test_image['path'].split('/')[-1],
+                                               File(file))
+
+        return ImageDerivative(storage=default_storage, source_name=source_name, width=width, format=format,
+                               aspect_ratio=aspect_ratio)
+
+    def _delete_derivative_and_source(self, derivative):
+        delete_image_derivatives(derivatives=[derivative])
+        default_storage.delete(derivative.source_name)
@@ -0,0 +1,64 @@
+import os
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+from rest_framework.exceptions import ValidationError
+
+from openbook_common.utils.helpers import sha256sum
+from openbook_common.utils.media_ingestion import ingest_media_file
+from openbook_posts.checkers import check_mimetype_is_supported_media_mimetypes
+
+
+class IngestMediaFileTests(TestCase):
+    """
+    ingest_media_file
+    """
+
+    def test_hashes_and_sniffs_in_memory_image_without_spooling(self):
+        """
+        should hash and sniff an in memory image and give back the upload itself, rewound
+        """
+        file_path = 'openbook_common/tests/files/test_image_small.jpg'
+
+        with open(file_path, 'rb') as file:
+            upload = SimpleUploadedFile(name='image.jpg', content=file.read(), content_type='image/jpeg')
+
+        ingested_file = ingest_media_file(file=upload)
+
+        self.assertEqual(ingested_file.mime, 'image/jpeg')
+        self.assertEqual(ingested_file.hash, sha256sum(filename=file_path))
+        self.assertIsNone(ingested_file.path)
+        self.assertIs(ingested_file.file, upload)
+        self.assertEqual(upload.tell(), 0)
+
+    def test_spools_in_memory_video_to_disk(self):
+        """
+        should write an in memory video to a temporary file, removed on close
+        """
+        file_path = 'openbook_common/tests/files/test_video.mp4'
+
+        with open(file_path, 'rb') as file:
+            content = file.read()
+
+        upload = SimpleUploadedFile(name='video.mp4', content=content, content_type='video/mp4')
+
+        ingested_file = ingest_media_file(file=upload)
+
+        self.assertEqual(ingested_file.mime_type, 'video')
+        self.assertEqual(ingested_file.hash, sha256sum(filename=file_path))
+
+        with open(ingested_file.path, 'rb') as spooled_file:
+            self.assertEqual(spooled_file.read(), content)
+
+        ingested_file.close()
+
+        self.assertFalse(os.path.exists(ingested_file.path))
+
+    def test_checks_mime_before_spooling(self):
+        """
+        should raise the error of check_mime and leave no temporary file behind
+        """
+        upload = SimpleUploadedFile(name='text.txt', content=b'Not a media file' * 10000, content_type='text/plain')
+
+        with self.assertRaises(ValidationError):
+            ingest_media_file(file=upload, check_mime=check_mimetype_is_supported_media_mimetypes)
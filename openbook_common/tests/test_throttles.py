@@ -0,0 +1,75 @@
+from django.conf import settings
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+
+from openbook_common.tests.helpers import make_user
+from openbook_common.tests.models import OpenbookAPITestCase
+from openbook_common.throttles import set_throttle_rate_for_user_with_id, get_throttle_metrics
+
+
+@override_settings(THROTTLE_ENABLED=True, THROTTLE_RATES=dict(settings.THROTTLE_RATES, follow='2/hour',
+                                                                 create_post='1/hour'))
+class WriteRateThrottleTests(OpenbookAPITestCase):
+    """
+    WriteRateThrottle
+    """
+
+    def test_rejects_requests_over_the_rate(self):
+        """
+        should reject the requests over the rate of the scope with 429 and a Retry-After header
+        """
+        user = make_user()
+
+        for i in range(0, 2):
+            response = self._follow_user(user=user, user_to_follow=make_user())
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        response = self._follow_user(user=user, user_to_follow=make_user())
+
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertTrue(0 < int(response['Retry-After']) <= 60 * 60)
+
+        follow_metrics = get_throttle_metrics()['follow']
+        self.assertEqual(follow_metrics['allowed'], 2)
+        self.assertEqual(follow_metrics['rejected'], 1)
+
+    def test_throttles_each_user_separately(self):
+        """
+        should not reject the requests of a user because of the requests of another one
+        """
+        user = make_user()
+
+        for i in range(0, 2):
+            self._follow_user(user=user, user_to_follow=make_user())
+
+        response = self._follow_user(user=make_user(), user_to_follow=make_user())
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_applies_the_rate_set_for_the_user(self):
+        """
+        should apply the rate set for the user instead of the one of the scope
+        """
+        user = make_user()
+        set_throttle_rate_for_user_with_id(user_id=user.pk, scope='follow', rate='0/hour')
+
+        response = self._follow_user(user=user, user_to_follow=make_user())
+
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_does_not_throttle_reads(self):
+        """
+        should not throttle the methods of a view without a scope
+        """
+        user = make_user()
+        headers = {'HTTP_AUTHORIZATION': 'Token %s' % user.auth_token.key}
+
+        for i in range(0, 3):
+            response = self.client.get(reverse('posts'), **headers)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def _follow_user(self, user, user_to_follow):
+        headers = {'HTTP_AUTHORIZATION': 'Token %s' % user.auth_token.key}
+        data = {'username': user_to_follow.username}
+        return self.client.post(reverse('follow-user'), data, **headers, format='multipart')
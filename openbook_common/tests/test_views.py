@@ -1,8 +1,15 @@
+from unittest import mock
+
+from django.db import DEFAULT_DB_ALIAS
+from django.test import override_settings
 from django.urls import reverse
 from django.conf import settings
 from rest_framework import status
+from openbook_common.db_router import ReplicaRouter, start_routing, stop_routing, mark_replica_down, \
+    get_db_routing_metrics, client_has_writer_pin
 from openbook_common.tests.models import OpenbookAPITestCase
 
+import hashlib
 import logging
 import json
 
@@ -191,3 +198,72 @@ class ProxyDomainCheckAPITests(OpenbookAPITestCase):
 
     def _get_url(self):
         return reverse('proxy-domain-check')
+
+
+@override_settings(MIDDLEWARE=settings.MIDDLEWARE + ['openbook_common.middleware.ReadYourWritesMiddleware'],
+                   DATABASE_ROUTERS=['openbook_common.db_router.ReplicaRouter'],
+                   DATABASE_ROUTING_METRICS_ENABLED=True)
+class ReadYourWritesRoutingTests(OpenbookAPITestCase):
+    """
+    ReadYourWritesMiddleware and ReplicaRouter
+    """
+
+    def test_pins_client_to_writer_after_writing(self):
+        """
+        should pin the reads of a client to the writer after it wrote and count them as pinned
+        """
+        user = make_user()
+        headers = make_authentication_headers_for_user(user)
+        url = reverse('posts')
+
+        response = self.client.put(url, {'text': make_fake_post_text()}, **headers, format='multipart')
+
+        self.assertEqual(status.HTTP_201_CREATED, response.status_code)
+        self.assertEqual('true', response.cookies[settings.DATABASE_WRITER_PIN_COOKIE_NAME].value)
+
+        self.client.cookies.clear()
+
+        response = self.client.get(url, **headers)
+
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+
+        metrics = get_db_routing_metrics()
+
+        self.assertEqual(1, metrics['requests_pinned_by_write_method'])
+        self.assertEqual(1, metrics['requests_pinned_by_marker'])
+        self.assertNotIn('requests_replica', metrics)
+
+    def test_does_not_pin_client_that_did_not_write(self):
+        """
+        should not pin the reads of a client that didn't write
+        """
+        user = make_user()
+        headers = make_authentication_headers_for_user(user)
+
+        response = self.client.get(reverse('posts'), **headers)
+
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertFalse(client_has_writer_pin(
+            client_key=hashlib.sha256(headers['HTTP_AUTHORIZATION'].encode('utf-8')).hexdigest()))
+        self.assertEqual(1, get_db_routing_metrics()['requests_replica'])
+
+    @override_settings(DATABASE_REPLICAS={'Reader': 1, 'Reader2': 0})
+    def test_routes_reads_to_replicas_which_are_up(self):
+        """
+        should read from a replica which is up, and from the writer once the request wrote
+        """
+        router = ReplicaRouter()
+
+        with mock.patch.object(ReplicaRouter, '_can_connect_to_replica', return_value=True), \
+                mock.patch.dict('openbook_common.db_router._replicas_down_until', clear=True):
+            self.assertEqual(DEFAULT_DB_ALIAS, router.db_for_read(model=None))
+
+            start_routing()
+            self.assertEqual('Reader', router.db_for_read(model=None))
+            router.db_for_write(model=None)
+            self.assertEqual(DEFAULT_DB_ALIAS, router.db_for_read(model=None))
+
+            mark_replica_down('Reader')
+            start_routing()
+            self.assertEqual(DEFAULT_DB_ALIAS, router.db_for_read(model=None))
+            stop_routing()
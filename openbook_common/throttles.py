@@ -0,0 +1,203 @@
+import time
+
+from django.conf import settings
+from django_redis import get_redis_connection
+from redis import RedisError
+from rest_framework.throttling import BaseThrottle
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Token bucket of KEYS[1], holding up to capacity tokens which refill over period seconds.
+# A rate of the user in the KEYS[2] hash replaces the one of the scope, a capacity of 0 rejects every request.
+# Also adds the check to the metrics of KEYS[3], along with the latency of the previous checks of the process.
+# Returns whether the request is allowed and the seconds to wait for the next token, as a string.
+THROTTLE_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local period = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local scope = ARGV[4]
+
+local user_rate = redis.call('hget', KEYS[2], scope)
+if user_rate then
+    local separator = string.find(user_rate, '/', 1, true)
+    capacity = tonumber(string.sub(user_rate, 1, separator - 1))
+    period = tonumber(string.sub(user_rate, separator + 1))
+end
+
+if tonumber(ARGV[5]) > 0 then
+    redis.call('hincrby', KEYS[3], scope .. ':timed_checks', ARGV[5])
+    redis.call('hincrby', KEYS[3], scope .. ':checks_microseconds', ARGV[6])
+end
+
+if capacity <= 0 then
+    redis.call('hincrby', KEYS[3], scope .. ':rejected', 1)
+    return {0, tostring(period)}
+end
+
+local refill_rate = capacity / period
+local bucket = redis.call('hmget', KEYS[1], 'tokens', 'timestamp')
+local tokens = tonumber(bucket[1]) or capacity
+local timestamp = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - timestamp) * refill_rate)
+
+if tokens < 1 then
+    redis.call('hincrby', KEYS[3], scope .. ':rejected', 1)
+    return {0, tostring((1 - tokens) / refill_rate)}
+end
+
+redis.call('hmset', KEYS[1], 'tokens', tokens - 1, 'timestamp', now)
+redis.call('expire', KEYS[1], math.ceil(period))
+redis.call('hincrby', KEYS[3], scope .. ':allowed', 1)
+return {1, '0'}
+"""
+
+THROTTLE_RATE_PERIODS = {
+    's': 1,
+    'm': 60,
+    'h': 60 * 60,
+    'd': 60 * 60 * 24,
+}
+
+# Scope -> [microseconds, checks] of the checks of this process not yet added to the metrics
+_pending_checks_latencies = {}
+
+
+class WriteRateThrottle(BaseThrottle):
+    """
+    Throttles the methods of a view listed in its throttle_scopes, method -> scope, with the
+    THROTTLE_RATES of the scope or the rate set for the user
+    """
+
+    def __init__(self):
+        self.wait_seconds = None
+
+    def allow_request(self, request, view):
+        if not settings.THROTTLE_ENABLED:
+            return True
+
+        scope = getattr(view, 'throttle_scopes', {}).get(request.method)
+
+        if scope is None:
+            return True
+
+        rate = settings.THROTTLE_RATES.get(scope)
+
+        if rate is None:
+            return True
+
+        user_id = request.user.pk if request.user.is_authenticated else None
+        ident = user_id if user_id is not None else self.get_ident(request)
+
+        allowed, self.wait_seconds = check_throttle(scope=scope, ident=ident, rate=rate, user_id=user_id)
+
+        return allowed
+
+    def wait(self):
+        return self.wait_seconds
+
+
+def make_throttle_bucket_key(scope, ident):
+    return 'ob-api-throttle-bucket-%s-%s' % (scope, ident)
+
+
+def make_throttle_user_rates_key(user_id):
+    return 'ob-api-throttle-user-rates-%s' % user_id
+
+
+def make_throttle_metrics_key():
+    return 'ob-api-throttle-metrics'
+
+
+def parse_throttle_rate(rate):
+    """
+    Returns the capacity and period in seconds of a rate like 30/hour or 5/m
+    """
+    capacity, period = rate.split('/')
+    return int(capacity), THROTTLE_RATE_PERIODS[period[0]]
+
+
+def check_throttle(scope, ident, rate, user_id=None):
+    """
+    Takes a token of the bucket of the ident in the scope, in one round trip.
+    Returns whether the request is allowed and, if not, the seconds until it would be.
+    Requests are allowed when Redis can't be reached.
+    """
+    capacity, period = parse_throttle_rate(rate)
+    pending_microseconds, pending_checks = _pending_checks_latencies.pop(scope, (0, 0))
+
+    redis = _get_throttles_redis_connection()
+    throttle = redis.register_script(THROTTLE_SCRIPT)
+
+    started = time.perf_counter()
+
+    try:
+        allowed, wait_seconds = throttle(
+            keys=[make_throttle_bucket_key(scope=scope, ident=ident),
+                  make_throttle_user_rates_key(user_id=user_id if user_id is not None else 'anonymous'),
+                  make_throttle_metrics_key()],
+            args=[capacity, period, time.time(), scope, pending_checks, pending_microseconds])
+    except RedisError as e:
+        logger.warning('Failed to check the %s throttle: %s' % (scope, e))
+        return True, None
+
+    elapsed_microseconds = int((time.perf_counter() - started) * 1000000)
+    latencies = _pending_checks_latencies.setdefault(scope, [0, 0])
+    latencies[0] += elapsed_microseconds
+    latencies[1] += 1
+
+    if allowed:
+        return True, None
+
+    return False, float(wait_seconds)
+
+
+def set_throttle_rate_for_user_with_id(user_id, scope, rate):
+    """
+    Replaces the rate of the scope for the user, 0/hour blocks the user from the scope
+    """
+    capacity, period = parse_throttle_rate(rate)
+    redis = _get_throttles_redis_connection()
+    redis.hset(make_throttle_user_rates_key(user_id=user_id), scope, '%d/%d' % (capacity, period))
+
+
+def clear_throttle_rate_for_user_with_id(user_id, scope):
+    redis = _get_throttles_redis_connection()
+    redis.hdel(make_throttle_user_rates_key(user_id=user_id), scope)
+
+
+def get_throttle_rates_for_user_with_id(user_id):
+    """
+    Returns the rates set for the user, scope -> (capacity, period in seconds)
+    """
+    redis = _get_throttles_redis_connection()
+    rates = redis.hgetall(make_throttle_user_rates_key(user_id=user_id))
+
+    return {scope.decode('utf-8'): tuple(int(value) for value in rate.decode('utf-8').split('/')) for
+            scope, rate in rates.items()}
+
+
+def get_throttle_metrics():
+    """
+    Returns the metrics of each scope, scope -> metric name -> value
+    """
+    redis = _get_throttles_redis_connection()
+    raw_metrics = redis.hgetall(make_throttle_metrics_key())
+
+    metrics = {}
+
+    for field, value in raw_metrics.items():
+        scope, metric_name = field.decode('utf-8').rsplit(':', 1)
+        metrics.setdefault(scope, {})[metric_name] = int(value)
+
+    return metrics
+
+
+def reset_throttle_metrics():
+    redis = _get_throttles_redis_connection()
+    redis.delete(make_throttle_metrics_key())
+
+
+def _get_throttles_redis_connection():
+    return get_redis_connection('default')
@@ -8,10 +8,9 @@ import tempfile
 import magic
 import spectra
 from django.http import QueryDict
-from imagekit.utils import get_cache
-from imagekit.models import ProcessedImageField
 import hashlib
 
+from openbook_common.fields import DerivativeImageField
 from openbook_common.utils.model_loaders import get_post_model
 from openbook_common.validators import is_valid_hex_color
 
@@ -73,11 +72,8 @@ def delete_file_field(filefield):
 
     else:
 
-        if isinstance(filefield.field, ProcessedImageField):
-            # ImageKit has a bug where files are cached and not deleted right away
-            # https://github.com/matthewwithanm/django-imagekit/issues/229#issuecomment-315690575
-            cache = get_cache()
-            cache.delete(cache.get(file))
+        if isinstance(filefield.field, DerivativeImageField):
+            filefield.delete_derivatives()
 
         filefield.storage.delete(file.name)
 
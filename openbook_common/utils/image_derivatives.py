@@ -0,0 +1,266 @@
+import io
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from PIL import Image, ImageOps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django_redis import get_redis_connection
+
+logger = logging.getLogger(__name__)
+
+IMAGE_DERIVATIVE_FORMAT_JPEG = 'jpeg'
+IMAGE_DERIVATIVE_FORMAT_WEBP = 'webp'
+
+IMAGE_DERIVATIVES_FORMATS = (
+    IMAGE_DERIVATIVE_FORMAT_WEBP,
+    IMAGE_DERIVATIVE_FORMAT_JPEG,
+)
+
+_generation_executor = None
+# The futures of the derivatives being generated by this process, by name
+_generations = {}
+_generations_lock = threading.Lock()
+
+
+class ImageDerivative:
+    """
+    A resized variant of a stored image, in a given width and format. Its name is made from the name of the image,
+    so it is found in the storage without any lookup. With an aspect_ratio the image is cropped to it.
+    """
+
+    def __init__(self, storage, source_name, width, format, aspect_ratio=None):
+        self.storage = storage
+        self.source_name = source_name
+        self.width = width
+        self.format = format
+        self.aspect_ratio = aspect_ratio
+
+    @property
+    def height(self):
+        if not self.aspect_ratio:
+            return None
+
+        return max(1, round(self.width / self.aspect_ratio))
+
+    @property
+    def name(self):
+        size = '%dx%d' % (self.width, self.height) if self.aspect_ratio else '%dw' % self.width
+        return 'derivatives/%s/%s.%s' % (self.source_name, size, self.format)
+
+    @property
+    def url(self):
+        return self.storage.url(self.name)
+
+
+def make_image_derivative_key(derivative):
+    return 'ob-api-image-derivative-%s' % derivative.name
+
+
+def make_image_derivative_generation_key(derivative):
+    return 'ob-api-image-derivative-generation-%s' % derivative.name
+
+
+def get_image_derivative_url(derivative):
+    return get_image_derivatives_urls(derivatives=[derivative])[0]
+
+
+def get_image_derivatives_urls(derivatives):
+    """
+    Returns the urls of the given derivatives, None for the ones not generated yet, in at most two round trips to
+    Redis whatever their number. The missing derivatives are generated in the pool of this process, the urls of the
+    ones generated within IMAGE_DERIVATIVES_WAIT_TIMEOUT seconds are returned too.
+    """
+    if not derivatives:
+        return []
+
+    redis = _get_image_derivatives_redis_connection()
+    generated = redis.mget([make_image_derivative_key(derivative) for derivative in derivatives])
+
+    missing_derivatives = [derivative for derivative, is_generated in zip(derivatives, generated) if
+                           is_generated is None]
+    generations = _request_generation_of_derivatives(derivatives=missing_derivatives, redis=redis)
+
+    if generations:
+        wait(generations.values(), timeout=settings.IMAGE_DERIVATIVES_WAIT_TIMEOUT)
+
+    urls = []
+
+    for derivative, is_generated in zip(derivatives, generated):
+        future = generations.get(derivative.name)
+
+        if is_generated is not None or (future and future.done() and future.result()):
+            urls.append(derivative.url)
+        else:
+            urls.append(None)
+
+    return urls
+
+
+def generate_image_derivative(derivative):
+    """
+    Stores the derivative unless it already is, and marks it as generated for IMAGE_DERIVATIVES_CACHE_TTL
+    """
+    storage = derivative.storage
+
+    if not storage.exists(derivative.name):
+        with storage.open(derivative.source_name, 'rb') as source_file:
+            derivative_content = _make_derivative_content(source_file=source_file, derivative=derivative)
+
+        saved_name = storage.save(derivative.name, ContentFile(derivative_content))
+
+        if saved_name != derivative.name:
+            storage.delete(saved_name)
+            raise ValueError('Image derivative %s was stored as %s' % (derivative.name, saved_name))
+
+    redis = _get_image_derivatives_redis_connection()
+    redis.set(make_image_derivative_key(derivative), 1, ex=settings.IMAGE_DERIVATIVES_CACHE_TTL)
+
+
+def normalise_image(file, width, aspect_ratio=None):
+    """
+    Re-encodes an uploaded image as a JPEG no wider than width, upright and without its EXIF metadata
+    """
+    derivative = ImageDerivative(storage=None, source_name=None, width=width, format=IMAGE_DERIVATIVE_FORMAT_JPEG,
+                                 aspect_ratio=aspect_ratio)
+    file.seek(0)
+
+    return ContentFile(_make_derivative_content(source_file=file, derivative=derivative))
+
+
+def delete_image_derivatives(derivatives):
+    if not derivatives:
+        return
+
+    for derivative in derivatives:
+        derivative.storage.delete(derivative.name)
+
+    redis = _get_image_derivatives_redis_connection()
+    redis.delete(*[make_image_derivative_key(derivative) for derivative in derivatives])
+
+
+def _request_generation_of_derivatives(derivatives, redis):
+    """
+    Returns the futures of the generations by derivative name, leaving out the derivatives another process is
+    generating. The generations are claimed in a single pipeline.
+    """
+    generations = {}
+    started_generations = []
+
+    with _generations_lock:
+        derivatives_to_claim = {}
+
+        for derivative in derivatives:
+            future = _generations.get(derivative.name)
+
+            if future:
+                generations[derivative.name] = future
+            else:
+                derivatives_to_claim[derivative.name] = derivative
+
+        if not derivatives_to_claim:
+            return generations
+
+        derivatives_to_claim = list(derivatives_to_claim.values())
+
+        pipeline = redis.pipeline(transaction=False)
+
+        for derivative in derivatives_to_claim:
+            pipeline.set(make_image_derivative_generation_key(derivative), 1, nx=True,
+                         ex=settings.IMAGE_DERIVATIVES_GENERATION_TTL)
+
+        for derivative, is_claimed in zip(derivatives_to_claim, pipeline.execute()):
+            if not is_claimed:
+                continue
+
+            future = _get_generation_executor().submit(_generate_image_derivative_in_pool, derivative=derivative)
+            _generations[derivative.name] = future
+            generations[derivative.name] = future
+            started_generations.append((derivative, future))
+
+    for derivative, future in started_generations:
+        future.add_done_callback(
+            lambda done_future, derivative=derivative: _forget_generation_of_derivative(derivative=derivative))
+
+    return generations
+
+
+def _generate_image_derivative_in_pool(derivative):
+    try:
+        generate_image_derivative(derivative=derivative)
+    except Exception as e:
+        logger.error('Failed to generate image derivative %s: %s' % (derivative.name, e))
+        return False
+    finally:
+        redis = _get_image_derivatives_redis_connection()
+        redis.delete(make_image_derivative_generation_key(derivative))
+
+    return True
+
+
+def _forget_generation_of_derivative(derivative):
+    with _generations_lock:
+        _generations.pop(derivative.name, None)
+
+
+def _get_generation_executor():
+    # Created on first use, so each forked worker process gets its own threads
+    global _generation_executor
+
+    if _generation_executor is None:
+        _generation_executor = ThreadPoolExecutor(max_workers=settings.IMAGE_DERIVATIVES_MAX_WORKERS,
+                                                  thread_name_prefix='image-derivatives')
+
+    return _generation_executor
+
+
+def _make_derivative_content(source_file, derivative):
+    image = Image.open(source_file)
+
+    target_width = derivative.width
+    target_height = derivative.height or max(1, round(image.height * target_width / image.width))
+
+    # Lets JPEGs be decoded already downscaled, at the smallest scale still larger than the derivative.
+    # Bounded on both sides as the EXIF orientation can swap them.
+    draft_size = max(target_width, target_height)
+    image.draft('RGB', (draft_size, draft_size))
+    image = ImageOps.exif_transpose(image)
+
+    if derivative.aspect_ratio:
+        image = ImageOps.fit(image, (target_width, target_height), method=Image.LANCZOS)
+    elif image.width > target_width:
+        image = image.resize((target_width, max(1, round(image.height * target_width / image.width))),
+                             resample=Image.LANCZOS)
+
+    content = io.BytesIO()
+
+    if derivative.format == IMAGE_DERIVATIVE_FORMAT_WEBP:
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if _has_transparency(image) else 'RGB')
+        image.save(content, format='WEBP', quality=settings.IMAGE_DERIVATIVES_WEBP_QUALITY, method=4)
+    else:
+        image = _flatten_transparency(image)
+        image.save(content, format='JPEG', quality=settings.IMAGE_DERIVATIVES_JPEG_QUALITY, optimize=True,
+                   progressive=True)
+
+    return content.getvalue()
+
+
+def _has_transparency(image):
+    return image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+
+
+def _flatten_transparency(image):
+    if not _has_transparency(image):
+        return image if image.mode in ('RGB', 'L') else image.convert('RGB')
+
+    image = image.convert('RGBA')
+    background = Image.new('RGB', image.size, (255, 255, 255))
+    background.paste(image, mask=image.split()[3])
+
+    return background
+
+
+def _get_image_derivatives_redis_connection():
+    return get_redis_connection('default')
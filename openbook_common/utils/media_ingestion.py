@@ -0,0 +1,127 @@
+import hashlib
+import os
+import tempfile
+
+from django.core.files import File
+
+from openbook_common.utils.helpers import get_magic
+
+INGESTION_CHUNK_SIZE = 128 * 1024
+
+# Enough for libmagic to recognise the supported image and video formats
+MIME_SNIFF_SIZE = 64 * 1024
+
+magic = get_magic()
+
+
+class IngestedMediaFile:
+    """
+    An uploaded media file read once. file is positioned at its start and ready to be given to the storage
+    backend and the processors, path is a path to its contents on disk if it was needed.
+    """
+
+    def __init__(self, file, mime, hash, path=None, spooled_file=None):
+        self.file = file
+        self.mime = mime
+        self.hash = hash
+        self.path = path
+        self._spooled_file = spooled_file
+
+    @property
+    def mime_type(self):
+        return self.mime.split('/')[0]
+
+    @property
+    def mime_subtype(self):
+        return self.mime.split('/')[1]
+
+    def close(self):
+        # Only the temporary file is ours, the upload is closed by whoever opened it
+        if self._spooled_file:
+            self._spooled_file.close()
+            os.remove(self._spooled_file.name)
+            self._spooled_file = None
+
+
+def ingest_media_file(file, check_mime=None, spool=True):
+    """
+    Hashes the file and sniffs its mime type from its first bytes in one read, in chunks of INGESTION_CHUNK_SIZE.
+    Unless spool is False, in memory uploads of videos and gifs, which ffmpeg reads from disk, are written to a
+    temporary file along the way. The mime type is given to check_mime before reading the rest of the file.
+    """
+    path = _get_path_of_file(file=file)
+
+    hasher = hashlib.sha256()
+    head = bytearray()
+    mime = None
+    spooled_file = None
+
+    try:
+        for chunk in file.chunks(chunk_size=INGESTION_CHUNK_SIZE):
+            hasher.update(chunk)
+
+            if mime is not None:
+                if spooled_file:
+                    spooled_file.write(chunk)
+                continue
+
+            head += chunk
+
+            if len(head) >= MIME_SNIFF_SIZE:
+                mime, spooled_file = _sniff_head(file=file, head=head, path=path, check_mime=check_mime,
+                                                  spool=spool)
+                head = None
+
+        if mime is None:
+            # Smaller than MIME_SNIFF_SIZE
+            mime, spooled_file = _sniff_head(file=file, head=head, path=path, check_mime=check_mime,
+                                             spool=spool)
+    except Exception:
+        if spooled_file:
+            spooled_file.close()
+            os.remove(spooled_file.name)
+        raise
+
+    if spooled_file:
+        spooled_file.flush()
+        spooled_file.seek(0)
+        ingested_file = File(spooled_file, name=os.path.basename(file.name))
+        path = spooled_file.name
+    else:
+        file.seek(0)
+        ingested_file = file
+
+    return IngestedMediaFile(file=ingested_file, mime=mime, hash=hasher.hexdigest(), path=path,
+                             spooled_file=spooled_file)
+
+
+def _sniff_head(file, head, path, check_mime, spool):
+    mime = magic.from_buffer(bytes(head))
+
+    if check_mime:
+        check_mime(mime)
+
+    spooled_file = None
+
+    if spool and path is None and _is_processed_from_disk(mime=mime):
+        extension = os.path.splitext(file.name)[1]
+        spooled_file = tempfile.NamedTemporaryFile(suffix=extension, delete=False)
+        spooled_file.write(head)
+
+    return mime, spooled_file
+
+
+def _is_processed_from_disk(mime):
+    return mime.startswith('video/') or mime == 'image/gif'
+
+
+def _get_path_of_file(file):
+    if hasattr(file, 'temporary_file_path'):
+        return file.temporary_file_path()
+
+    # Files opened from disk
+    name = getattr(file.file, 'name', None) if hasattr(file, 'file') else None
+    if isinstance(name, str) and os.path.isfile(name):
+        return name
+
+    return None
@@ -89,6 +89,18 @@ def get_post_comment_reaction_model():
     return apps.get_model('openbook_posts.PostCommentReaction')
 
 
+def get_post_counts_model():
+    return apps.get_model('openbook_posts.PostCounts')
+
+
+def get_post_reaction_emoji_count_model():
+    return apps.get_model('openbook_posts.PostReactionEmojiCount')
+
+
+def get_post_comment_reaction_emoji_count_model():
+    return apps.get_model('openbook_posts.PostCommentReactionEmojiCount')
+
+
 def get_emoji_model():
     return apps.get_model('openbook_common.Emoji')
 
@@ -113,6 +125,14 @@ def get_hashtag_model():
     return apps.get_model('openbook_hashtags.Hashtag')
 
 
+def get_hashtag_public_post_model():
+    return apps.get_model('openbook_hashtags.HashtagPublicPost')
+
+
+def get_hashtag_counts_model():
+    return apps.get_model('openbook_hashtags.HashtagCounts')
+
+
 def get_category_model():
     return apps.get_model('openbook_categories.Category')
 
@@ -0,0 +1,21 @@
+# Generated by Django 2.2.5 on 2020-01-08 10:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('openbook_communities', '0033_auto_20191209_1337'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CommunityCounts',
+            fields=[
+                ('community', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='counts', serialize=False, to='openbook_communities.Community')),
+                ('members_count', models.IntegerField(default=0)),
+            ],
+        ),
+    ]
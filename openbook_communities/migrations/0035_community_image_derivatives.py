@@ -0,0 +1,23 @@
+from django.db import migrations
+import openbook_common.fields
+import openbook_communities.helpers
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('openbook_communities', '0034_communitycounts'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='community',
+            name='avatar',
+            field=openbook_common.fields.DerivativeImageField(null=True, upload_to=openbook_communities.helpers.upload_to_community_avatar_directory, verbose_name='avatar'),
+        ),
+        migrations.AlterField(
+            model_name='community',
+            name='cover',
+            field=openbook_common.fields.DerivativeImageField(null=True, upload_to=openbook_communities.helpers.upload_to_community_cover_directory, verbose_name='cover'),
+        ),
+    ]
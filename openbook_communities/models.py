@@ -4,23 +4,28 @@ from django.db import models
 
 # Create your models here.
 from django.utils import timezone
-from django.db.models import Q
+from django.db.models import Q, F
 from django.db.models import Count
-from pilkit.processors import ResizeToFill, ResizeToFit
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
 
 from openbook.settings import COLOR_ATTR_MAX_LENGTH
+from openbook_auth.exclusions import invalidate_banned_communities_ids_for_users_with_ids
 from openbook_auth.models import User
 from django.utils.translation import ugettext_lazy as _
 
 from openbook_common.utils.model_loaders import get_community_invite_model, \
     get_community_log_model, get_category_model, get_user_model, get_moderated_object_model, \
-    get_community_notifications_subscription_model
+    get_community_notifications_subscription_model, get_hashtag_public_post_model
+from openbook_common.fields import DerivativeImageField
 from openbook_common.validators import hex_color_validator
 from openbook_communities.helpers import upload_to_community_avatar_directory, upload_to_community_cover_directory
 from openbook_communities.validators import community_name_characters_validator
 from openbook_moderation.models import ModeratedObject, ModerationCategory
 from openbook_posts.models import Post
-from imagekit.models import ProcessedImageField
+from openbook_posts.soft_deletion import start_soft_deletion, SOFT_DELETION_TARGET_COMMUNITY
+from openbook_search.helpers import search_communities_ids, order_by_search_rank, \
+    index_communities_with_ids, delete_communities_with_ids_from_index
 
 
 class Community(models.Model):
@@ -34,13 +39,12 @@ class Community(models.Model):
                                    null=True, )
     rules = models.TextField(_('rules'), max_length=settings.COMMUNITY_RULES_MAX_LENGTH, blank=False,
                              null=True)
-    avatar = ProcessedImageField(verbose_name=_('avatar'), blank=False, null=True, format='JPEG',
-                                 options={'quality': 90}, processors=[ResizeToFill(500, 500)],
-                                 upload_to=upload_to_community_avatar_directory)
-    cover = ProcessedImageField(verbose_name=_('cover'), blank=False, null=True, format='JPEG',
-                                options={'quality': 90},
-                                upload_to=upload_to_community_cover_directory,
-                                processors=[ResizeToFit(width=1024, upscale=False)])
+    avatar = DerivativeImageField(verbose_name=_('avatar'), blank=False, null=True,
+                                  widths=(64, 128, 256, 500), aspect_ratio=1,
+                                  upload_to=upload_to_community_avatar_directory)
+    cover = DerivativeImageField(verbose_name=_('cover'), blank=False, null=True,
+                                 upload_to=upload_to_community_cover_directory,
+                                 widths=(320, 640, 1024))
     created = models.DateTimeField(editable=False)
     starrers = models.ManyToManyField(User, related_name='favorite_communities')
     banned_users = models.ManyToManyField(User, related_name='banned_of_communities')
@@ -119,8 +123,9 @@ class Community(models.Model):
 
     @classmethod
     def search_communities_with_query(cls, query):
-        query = cls._make_search_communities_query(query=query)
-        return cls.objects.filter(query)
+        communities_ids = search_communities_ids(query=query)
+        query = cls._make_search_communities_query(query=query, communities_ids=communities_ids)
+        return order_by_search_rank(cls.objects.filter(query), ranked_ids=communities_ids)
 
     @classmethod
     def get_new_user_suggested_communities(cls):
@@ -128,9 +133,12 @@ class Community(models.Model):
         return cls.objects.filter(id__in=community_ids, type=cls.COMMUNITY_TYPE_PUBLIC)
 
     @classmethod
-    def _make_search_communities_query(cls, query):
-        communities_query = Q(name__icontains=query)
-        communities_query.add(Q(title__icontains=query), Q.OR)
+    def _make_search_communities_query(cls, query, communities_ids=None):
+        if communities_ids is not None:
+            communities_query = Q(id__in=communities_ids)
+        else:
+            communities_query = Q(name__icontains=query)
+            communities_query.add(Q(title__icontains=query), Q.OR)
         communities_query.add(Q(is_deleted=False), Q.AND)
         return communities_query
 
@@ -207,6 +215,7 @@ class Community(models.Model):
 
     @classmethod
     def search_community_with_name_members(cls, community_name, query, exclude_keywords=None):
+        # Searched in the database, the best matches of the search index could leave out the members
         db_query = Q(communities_memberships__community__name=community_name)
 
         community_members_query = Q(communities_memberships__user__username__icontains=query)
@@ -296,7 +305,7 @@ class Community(models.Model):
 
     @property
     def members_count(self):
-        return self.memberships.all().count()
+        return CommunityCounts.get_counts_for_community_with_id(community_id=self.pk).members_count
 
     def get_staff_members(self):
         User = get_user_model()
@@ -318,6 +327,8 @@ class Community(models.Model):
         if title:
             self.title = title
 
+        type_changed = type and type != self.type
+
         if type:
             self.type = type
 
@@ -344,6 +355,11 @@ class Community(models.Model):
 
         self.save()
 
+        if type_changed:
+            # Only the posts of public communities are publicly visible
+            HashtagPublicPost = get_hashtag_public_post_model()
+            HashtagPublicPost.index_posts_of_community_with_id(community_id=self.pk)
+
     def add_moderator(self, user):
         user_membership = self.memberships.get(user=user)
         user_membership.is_moderator = True
@@ -483,15 +499,13 @@ class Community(models.Model):
 
     def soft_delete(self):
         self.is_deleted = True
-        for post in self.posts.all().iterator():
-            post.soft_delete()
         self.save()
+        start_soft_deletion(target_type=SOFT_DELETION_TARGET_COMMUNITY, target_id=self.pk, is_deleted=True)
 
     def unsoft_delete(self):
         self.is_deleted = False
-        for post in self.posts:
-            post.unsoft_delete()
         self.save()
+        start_soft_deletion(target_type=SOFT_DELETION_TARGET_COMMUNITY, target_id=self.pk, is_deleted=False)
 
     def count_pending_moderated_objects(self):
         ModeratedObject = get_moderated_object_model()
@@ -645,3 +659,101 @@ class CommunityNotificationsSubscription(models.Model):
         return cls.objects.filter(community__name=community_name,
                                   subscriber__username=username,
                                   new_post_notifications=True).exists()
+
+
+class CommunityCounts(models.Model):
+    """
+    Denormalized counters of a community, kept up to date by the signals below.
+    Rows are created lazily from the real counts the first time they are read.
+    """
+    community = models.OneToOneField(Community, on_delete=models.CASCADE, related_name='counts', primary_key=True)
+    members_count = models.IntegerField(default=0)
+
+    @classmethod
+    def get_counts_for_community_with_id(cls, community_id):
+        try:
+            return cls.objects.get(community_id=community_id)
+        except cls.DoesNotExist:
+            cls.reconcile_counts_for_communities_with_ids(communities_ids=[community_id])
+            return cls.objects.get(community_id=community_id)
+
+    @classmethod
+    def update_count_for_community_with_id(cls, community_id, count_name, amount):
+        """
+        Missing rows are skipped, they will be built from the real counts on their first read
+        """
+        cls.objects.filter(community_id=community_id).update(**{count_name: F(count_name) + amount})
+
+    @classmethod
+    def reconcile_counts_for_communities_with_ids(cls, communities_ids):
+        """
+        Repairs the counters of the given communities from the real counts.
+        Returns the amount of counters that were missing or had drifted.
+        """
+        communities_ids = list(communities_ids)
+
+        members_counts = dict(CommunityMembership.objects.filter(community_id__in=communities_ids).values(
+            'community_id').annotate(count=Count('id')).order_by().values_list('community_id', 'count'))
+
+        existing_counts = cls.objects.in_bulk(communities_ids)
+
+        counts_to_create = []
+        counts_to_update = []
+
+        for community_id in communities_ids:
+            members_count = members_counts.get(community_id, 0)
+            community_counts = existing_counts.get(community_id)
+
+            if community_counts is None:
+                counts_to_create.append(cls(community_id=community_id, members_count=members_count))
+            elif community_counts.members_count != members_count:
+                community_counts.members_count = members_count
+                counts_to_update.append(community_counts)
+
+        cls.objects.bulk_create(counts_to_create, ignore_conflicts=True)
+        cls.objects.bulk_update(counts_to_update, ['members_count'])
+
+        return len(counts_to_create) + len(counts_to_update)
+
+
+@receiver(post_save, sender=CommunityMembership, dispatch_uid='increment_community_members_count')
+def increment_community_members_count(sender, instance=None, created=False, **kwargs):
+    if created:
+        CommunityCounts.update_count_for_community_with_id(community_id=instance.community_id,
+                                                           count_name='members_count', amount=1)
+
+
+@receiver(post_delete, sender=CommunityMembership, dispatch_uid='decrement_community_members_count')
+def decrement_community_members_count(sender, instance=None, **kwargs):
+    CommunityCounts.update_count_for_community_with_id(community_id=instance.community_id,
+                                                       count_name='members_count', amount=-1)
+
+
+@receiver(post_save, sender=Community, dispatch_uid='index_community_for_search')
+def index_community_for_search(sender, instance=None, update_fields=None, **kwargs):
+    if update_fields and not {'name', 'title', 'is_deleted'}.intersection(update_fields):
+        return
+
+    index_communities_with_ids(communities_ids=[instance.pk])
+
+
+@receiver(post_delete, sender=Community, dispatch_uid='delete_community_from_search_index')
+def delete_community_from_search_index(sender, instance=None, **kwargs):
+    delete_communities_with_ids_from_index(communities_ids=[instance.pk])
+
+
+@receiver(m2m_changed, sender=Community.banned_users.through, dispatch_uid='invalidate_banned_communities_exclusions')
+def invalidate_banned_communities_exclusions(sender, instance=None, action=None, reverse=False, pk_set=None,
+                                             **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+
+    if reverse:
+        # Changed from the user side
+        users_ids = [instance.pk]
+    elif action == 'pre_clear':
+        users_ids = list(instance.banned_users.values_list('id', flat=True))
+    else:
+        users_ids = pk_set
+
+    invalidate_banned_communities_ids_for_users_with_ids(users_ids=users_ids)
@@ -5,6 +5,7 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from openbook_auth.batch_loaders import make_users_relationship_state_context
 from openbook_moderation.permissions import IsNotSuspended
 from openbook_common.utils.helpers import normalise_request_data, normalize_list_value_in_request_data
 from openbook_communities.views.community.members.serializers import JoinCommunitySerializer, \
@@ -31,12 +32,13 @@ class CommunityMembers(APIView):
 
         user = request.user
 
-        members = user.get_community_with_name_members(community_name=community_name, max_id=max_id,
-                                                       exclude_keywords=exclude).order_by(
-            '-id')[:count]
+        members = list(user.get_community_with_name_members(community_name=community_name, max_id=max_id,
+                                                            exclude_keywords=exclude).order_by(
+            '-id')[:count])
 
         response_serializer = GetCommunityMembersMemberSerializer(members, many=True,
-                                                                  context={"request": request})
+                                                                  context=make_users_relationship_state_context(
+                                                                      request, members))
 
         return Response(response_serializer.data, status=status.HTTP_200_OK)
 
@@ -151,11 +153,11 @@ class SearchCommunityMembers(APIView):
 
         user = request.user
 
-        members = user.search_community_with_name_members(community_name=community_name, query=query,
-                                                          exclude_keywords=exclude)[
-                  :count]
+        members = list(user.search_community_with_name_members(community_name=community_name, query=query,
+                                                               exclude_keywords=exclude)[:count])
 
         response_serializer = GetCommunityMembersMemberSerializer(members, many=True,
-                                                                  context={"request": request})
+                                                                  context=make_users_relationship_state_context(
+                                                                      request, members))
 
         return Response(response_serializer.data, status=status.HTTP_200_OK)
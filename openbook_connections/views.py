@@ -24,6 +24,7 @@ class Connections(APIView):
 
 class ConnectWithUser(APIView):
     permission_classes = (IsAuthenticated, IsNotSuspended)
+    throttle_scopes = {'POST': 'connect'}
 
     def post(self, request):
         request_data = _prepare_request_data_for_validation(request.data)
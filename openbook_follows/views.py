@@ -24,6 +24,7 @@ class Follows(APIView):
 
 class FollowUser(APIView):
     permission_classes = (IsAuthenticated, IsNotSuspended)
+    throttle_scopes = {'POST': 'follow'}
 
     def post(self, request):
         request_data = _prepare_request_data_for_validation(request.data)
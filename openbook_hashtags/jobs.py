@@ -0,0 +1,24 @@
+from django.db.models import Q
+from django_rq import job
+
+from openbook_common.utils.model_loaders import get_post_model, get_hashtag_model
+
+
+@job('low')
+def update_hashtags_images_with_post(post_id):
+    """
+    This job is called after a post is linked to hashtags or published, to copy its first image to the
+    hashtags which don't have an image yet
+    """
+    Post = get_post_model()
+    Hashtag = get_hashtag_model()
+
+    post = Post.objects.filter(pk=post_id).first()
+
+    if not post or not post.is_publicly_visible():
+        return
+
+    hashtags_without_image = Hashtag.objects.filter(Q(image__isnull=True) | Q(image=''), posts__id=post_id)
+
+    for hashtag in hashtags_without_image.iterator():
+        hashtag.attempt_update_media_with_post(post=post)
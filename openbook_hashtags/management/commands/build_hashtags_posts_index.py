@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand
+import logging
+
+from openbook_common.utils.model_loaders import get_post_model, get_hashtag_model
+from openbook_hashtags.models import HashtagPublicPost, HashtagCounts
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Builds the index of the publicly visible posts of each hashtag and repairs the entries and posts ' \
+           'counts that drifted from the posts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help='How many posts or hashtags to check '
+                                                                         'per query')
+
+    def handle(self, *args, **options):
+        chunk_size = options.get('chunk_size')
+
+        Post = get_post_model()
+        Hashtag = get_hashtag_model()
+
+        logger.info('Indexing the posts of the hashtags')
+
+        last_post_id = 0
+        checked_posts = 0
+        repaired_entries = 0
+
+        while True:
+            posts_ids = list(Post.objects.filter(id__gt=last_post_id, hashtags__isnull=False).order_by(
+                'id').values_list('id', flat=True).distinct()[:chunk_size])
+
+            if not posts_ids:
+                break
+
+            repaired_entries += HashtagPublicPost.index_posts_with_ids(posts_ids=posts_ids)
+            checked_posts += len(posts_ids)
+            last_post_id = posts_ids[-1]
+
+        logger.info('Checked %d posts, %d index entries were missing or stale' % (checked_posts, repaired_entries))
+
+        last_hashtag_id = 0
+        checked_hashtags = 0
+        repaired_counts = 0
+
+        while True:
+            hashtags_ids = list(Hashtag.objects.filter(id__gt=last_hashtag_id).order_by('id').values_list(
+                'id', flat=True)[:chunk_size])
+
+            if not hashtags_ids:
+                break
+
+            repaired_counts += HashtagCounts.reconcile_counts_for_hashtags_with_ids(hashtags_ids=hashtags_ids)
+            checked_hashtags += len(hashtags_ids)
+            last_hashtag_id = hashtags_ids[-1]
+
+        logger.info('Checked %d hashtags, %d posts counts were missing or had drifted' % (checked_hashtags,
+                                                                                        repaired_counts))
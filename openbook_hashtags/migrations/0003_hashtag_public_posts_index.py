@@ -0,0 +1,33 @@
+# Generated by Django 2.2.5 on 2020-01-21 10:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('openbook_posts', '0070_reactions_emoji_counts'),
+        ('openbook_hashtags', '0002_hashtag_text_color'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HashtagCounts',
+            fields=[
+                ('hashtag', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='counts', serialize=False, to='openbook_hashtags.Hashtag')),
+                ('posts_count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='HashtagPublicPost',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hashtag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='public_posts_index', to='openbook_hashtags.Hashtag')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='public_hashtags_index', to='openbook_posts.Post')),
+            ],
+            options={
+                'unique_together': {('hashtag', 'post')},
+            },
+        ),
+    ]
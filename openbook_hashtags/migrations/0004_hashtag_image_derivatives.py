@@ -0,0 +1,18 @@
+from django.db import migrations
+import openbook_common.fields
+import openbook_hashtags.helpers
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('openbook_hashtags', '0003_hashtag_public_posts_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='hashtag',
+            name='image',
+            field=openbook_common.fields.DerivativeImageField(blank=True, height_field='height', null=True, upload_to=openbook_hashtags.helpers.upload_to_hashtags_directory, verbose_name='image', width_field='width'),
+        ),
+    ]
@@ -1,16 +1,20 @@
+from collections import Counter
+
 from django.conf import settings
 from django.contrib.contenttypes.fields import GenericRelation
 from django.core.files.base import ContentFile
 from django.core.files.storage import default_storage
 from django.db import models
+from django.db.models import F, Count
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 from django.utils import timezone
 
 # Create your models here.
 from django.utils.translation import ugettext_lazy as _
-from imagekit.models import ProcessedImageField
-from pilkit.processors import ResizeToFit
 
 from openbook.storage_backends import S3PrivateMediaStorage
+from openbook_common.fields import DerivativeImageField
 from openbook_common.models import Emoji
 from openbook_common.utils.helpers import delete_file_field, get_random_pastel_color
 from openbook_common.validators import hex_color_validator
@@ -18,7 +22,8 @@ from openbook_communities.models import Community
 from openbook_hashtags.helpers import upload_to_hashtags_directory
 from openbook_hashtags.validators import hashtag_name_validator
 from openbook_posts.models import Post, PostComment
-from openbook_posts.queries import make_only_public_posts_query
+from openbook_posts.queries import make_only_publicly_visible_posts_query
+from openbook_search.helpers import index_hashtags_with_ids, delete_hashtags_with_ids_from_index
 
 hashtag_image_storage = S3PrivateMediaStorage() if settings.IS_PRODUCTION else default_storage
 
@@ -39,13 +44,12 @@ class Hashtag(models.Model):
     post_comments = models.ManyToManyField(PostComment, related_name='hashtags')
     width = models.PositiveIntegerField(editable=False, null=True, blank=False)
     height = models.PositiveIntegerField(editable=False, null=True, blank=False)
-    image = ProcessedImageField(verbose_name=_('image'),
-                                storage=hashtag_image_storage,
-                                upload_to=upload_to_hashtags_directory,
-                                width_field='width',
-                                height_field='height',
-                                blank=True, null=True, format='JPEG', options={'quality': 60},
-                                processors=[ResizeToFit(width=1024, upscale=False)])
+    image = DerivativeImageField(verbose_name=_('image'),
+                                 storage=hashtag_image_storage,
+                                 upload_to=upload_to_hashtags_directory,
+                                 width_field='width',
+                                 height_field='height',
+                                 blank=True, null=True, widths=(320, 640, 1024))
     emoji = models.ForeignKey(Emoji, on_delete=models.SET_NULL, related_name='hashtags', null=True, blank=True)
 
     @classmethod
@@ -70,6 +74,27 @@ class Hashtag(models.Model):
 
         return hashtag
 
+    @classmethod
+    def get_or_create_hashtags_ids_with_names(cls, names):
+        """
+        Returns name -> id of the hashtags with the given lowercase names, creating the missing ones with one INSERT
+        """
+        hashtags_ids = dict(cls.objects.filter(name__in=names).values_list('name', 'id'))
+
+        missing_names = [name for name in names if name not in hashtags_ids]
+
+        if missing_names:
+            created = timezone.now()
+            # Concurrent saves can create the same hashtags, they are read back below
+            cls.objects.bulk_create([cls(name=name, color=get_random_pastel_color(), created=created) for
+                                     name in missing_names], ignore_conflicts=True)
+            created_hashtags_ids = dict(cls.objects.filter(name__in=missing_names).values_list('name', 'id'))
+            # Bulk created rows don't send post_save
+            index_hashtags_with_ids(hashtags_ids=list(created_hashtags_ids.values()))
+            hashtags_ids.update(created_hashtags_ids)
+
+        return hashtags_ids
+
     @classmethod
     def hashtag_with_name_exists(cls, hashtag_name):
         return cls.objects.filter(name=hashtag_name).exists()
@@ -99,8 +124,7 @@ class Hashtag(models.Model):
                 self.save()
 
     def count_posts(self):
-        public_posts_query = make_only_public_posts_query()
-        return self.posts.filter(public_posts_query).count()
+        return HashtagCounts.get_counts_for_hashtag_with_id(hashtag_id=self.pk).posts_count
 
     def delete_media(self):
         if self.has_image():
@@ -113,3 +137,150 @@ class Hashtag(models.Model):
                 return True
 
         return False
+
+
+class HashtagPublicPost(models.Model):
+    """
+    Index of the publicly visible posts of a hashtag, kept up to date with index_posts_with_ids when posts are
+    published, edited, closed, moderated or soft deleted. Hashtag feeds page through it by post id.
+    """
+    hashtag = models.ForeignKey(Hashtag, on_delete=models.CASCADE, related_name='public_posts_index')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='public_hashtags_index')
+
+    class Meta:
+        unique_together = ('hashtag', 'post',)
+
+    @classmethod
+    def index_posts_with_ids(cls, posts_ids):
+        """
+        Adds the given posts to the index of each of their hashtags when publicly visible, removes them otherwise
+        and updates the posts counts of the hashtags by the difference.
+        Returns the amount of added and removed entries.
+        """
+        posts_ids = list(posts_ids)
+
+        if not posts_ids:
+            return 0
+
+        publicly_visible_posts_ids = set(Post.objects.filter(make_only_publicly_visible_posts_query(),
+                                                             id__in=posts_ids).values_list('id', flat=True))
+
+        expected_entries = set(Hashtag.posts.through.objects.filter(
+            post_id__in=publicly_visible_posts_ids).values_list('hashtag_id', 'post_id'))
+
+        existing_entries = {(hashtag_id, post_id): entry_id for entry_id, hashtag_id, post_id in
+                            cls.objects.filter(post_id__in=posts_ids).values_list('id', 'hashtag_id', 'post_id')}
+
+        entries_to_add = [entry for entry in expected_entries if entry not in existing_entries]
+        entries_to_remove = [entry for entry in existing_entries.keys() if entry not in expected_entries]
+
+        if entries_to_add:
+            cls.objects.bulk_create([cls(hashtag_id=hashtag_id, post_id=post_id) for hashtag_id, post_id in
+                                     entries_to_add], ignore_conflicts=True)
+
+        if entries_to_remove:
+            # Raw deletes skip post_delete, the counts are updated below
+            entries_to_remove_queryset = cls.objects.filter(
+                id__in=[existing_entries[entry] for entry in entries_to_remove])
+            entries_to_remove_queryset._raw_delete(entries_to_remove_queryset.db)
+
+        posts_counts_differences = Counter(hashtag_id for hashtag_id, post_id in entries_to_add)
+        posts_counts_differences.subtract(hashtag_id for hashtag_id, post_id in entries_to_remove)
+
+        for hashtag_id, difference in posts_counts_differences.items():
+            if difference:
+                HashtagCounts.update_count_for_hashtag_with_id(hashtag_id=hashtag_id, count_name='posts_count',
+                                                               amount=difference)
+
+        return len(entries_to_add) + len(entries_to_remove)
+
+    @classmethod
+    def index_posts_of_community_with_id(cls, community_id, chunk_size=1000):
+        """
+        Indexes the posts with hashtags of the community, chunk after chunk.
+        Called when the community type changes, as it decides whether its posts are publicly visible.
+        """
+        last_post_id = 0
+
+        while True:
+            posts_ids = list(Post.objects.filter(community_id=community_id, id__gt=last_post_id,
+                                                 hashtags__isnull=False).order_by('id').values_list(
+                'id', flat=True).distinct()[:chunk_size])
+
+            if not posts_ids:
+                break
+
+            cls.index_posts_with_ids(posts_ids=posts_ids)
+            last_post_id = posts_ids[-1]
+
+
+class HashtagCounts(models.Model):
+    """
+    Denormalized counters of a hashtag, kept up to date by HashtagPublicPost and the signal below.
+    Rows are created lazily from the public posts index the first time they are read.
+    """
+    hashtag = models.OneToOneField(Hashtag, on_delete=models.CASCADE, related_name='counts', primary_key=True)
+    posts_count = models.IntegerField(default=0)
+
+    @classmethod
+    def get_counts_for_hashtag_with_id(cls, hashtag_id):
+        try:
+            return cls.objects.get(hashtag_id=hashtag_id)
+        except cls.DoesNotExist:
+            cls.reconcile_counts_for_hashtags_with_ids(hashtags_ids=[hashtag_id])
+            return cls.objects.get(hashtag_id=hashtag_id)
+
+    @classmethod
+    def update_count_for_hashtag_with_id(cls, hashtag_id, count_name, amount):
+        """
+        Missing rows are skipped, they will be built from the index on their first read
+        """
+        cls.objects.filter(hashtag_id=hashtag_id).update(**{count_name: F(count_name) + amount})
+
+    @classmethod
+    def reconcile_counts_for_hashtags_with_ids(cls, hashtags_ids):
+        """
+        Repairs the counters of the given hashtags from the public posts index.
+        Returns the amount of counters that were missing or had drifted.
+        """
+        hashtags_ids = list(hashtags_ids)
+
+        posts_counts = dict(HashtagPublicPost.objects.filter(hashtag_id__in=hashtags_ids).values(
+            'hashtag_id').annotate(count=Count('id')).order_by().values_list('hashtag_id', 'count'))
+
+        existing_counts = cls.objects.in_bulk(hashtags_ids)
+
+        counts_to_create = []
+        counts_to_update = []
+
+        for hashtag_id in hashtags_ids:
+            posts_count = posts_counts.get(hashtag_id, 0)
+            hashtag_counts = existing_counts.get(hashtag_id)
+
+            if hashtag_counts is None:
+                counts_to_create.append(cls(hashtag_id=hashtag_id, posts_count=posts_count))
+            elif hashtag_counts.posts_count != posts_count:
+                hashtag_counts.posts_count = posts_count
+                counts_to_update.append(hashtag_counts)
+
+        cls.objects.bulk_create(counts_to_create, ignore_conflicts=True)
+        cls.objects.bulk_update(counts_to_update, ['posts_count'])
+
+        return len(counts_to_create) + len(counts_to_update)
+
+
+@receiver(post_delete, sender=HashtagPublicPost, dispatch_uid='decrement_hashtag_posts_count')
+def decrement_hashtag_posts_count(sender, instance=None, **kwargs):
+    # Deleting a post deletes its index entries
+    HashtagCounts.update_count_for_hashtag_with_id(hashtag_id=instance.hashtag_id, count_name='posts_count',
+                                                   amount=-1)
+
+
+@receiver(post_save, sender=Hashtag, dispatch_uid='index_hashtag_for_search')
+def index_hashtag_for_search(sender, instance=None, **kwargs):
+    index_hashtags_with_ids(hashtags_ids=[instance.pk])
+
+
+@receiver(post_delete, sender=Hashtag, dispatch_uid='delete_hashtag_from_search_index')
+def delete_hashtag_from_search_index(sender, instance=None, **kwargs):
+    delete_hashtags_with_ids_from_index(hashtags_ids=[instance.pk])
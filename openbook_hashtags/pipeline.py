@@ -0,0 +1,50 @@
+from django.conf import settings
+from django.db import transaction
+
+from openbook_common.utils.helpers import extract_hashtags_from_string
+from openbook_common.utils.model_loaders import get_hashtag_model
+from openbook_hashtags.jobs import update_hashtags_images_with_post
+
+
+def link_hashtags_of_text(hashtags_manager, text):
+    """
+    Links the hashtags of the text to the post or post comment of the hashtags manager and unlinks the rest.
+    Reads the current links, upserts the missing hashtags, and inserts and deletes the links in one query each.
+    Returns the ids of the newly linked hashtags.
+    """
+    hashtags_names = set(hashtag_name.lower() for hashtag_name in extract_hashtags_from_string(string=text)) \
+        if text else set()
+
+    linked_hashtags_ids = dict(hashtags_manager.values_list('name', 'id'))
+
+    unlinked_hashtags_ids = [hashtag_id for hashtag_name, hashtag_id in linked_hashtags_ids.items() if
+                             hashtag_name not in hashtags_names]
+
+    if unlinked_hashtags_ids:
+        hashtags_manager.remove(*unlinked_hashtags_ids)
+
+    missing_hashtags_names = [hashtag_name for hashtag_name in hashtags_names if
+                              hashtag_name not in linked_hashtags_ids]
+
+    if not missing_hashtags_names:
+        return []
+
+    Hashtag = get_hashtag_model()
+    hashtags_ids = list(Hashtag.get_or_create_hashtags_ids_with_names(names=missing_hashtags_names).values())
+    hashtags_manager.add(*hashtags_ids)
+
+    return hashtags_ids
+
+
+def is_hashtags_images_update_async():
+    return settings.HASHTAGS_IMAGES_UPDATE_ASYNC
+
+
+def update_hashtags_images_with_post_with_id(post_id):
+    """
+    Uses the first image of the post as the image of its hashtags without one, in a job when async
+    """
+    if is_hashtags_images_update_async():
+        transaction.on_commit(lambda: update_hashtags_images_with_post.delay(post_id=post_id))
+    else:
+        update_hashtags_images_with_post(post_id=post_id)
@@ -3,8 +3,12 @@ from django.db.models import Q
 from openbook_common.utils.model_loaders import get_moderated_object_model
 
 
-def make_search_hashtag_query_for_user_with_id(search_query, user_id):
-    query = Q(name__icontains=search_query)
+def make_search_hashtag_query_for_user_with_id(search_query, user_id, hashtags_ids=None):
+    # The ids of the hashtags matching the search in the search backend, if there is one
+    if hashtags_ids is not None:
+        query = Q(id__in=hashtags_ids)
+    else:
+        query = Q(name__icontains=search_query)
     query.add(make_exclude_reported_and_approved_hashtags_query(), Q.AND)
     query.add(make_exclude_reported_hashtags_by_user_with_id_query(user_id=user_id), Q.AND)
     return query
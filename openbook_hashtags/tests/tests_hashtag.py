@@ -140,6 +140,34 @@ class HashtagAPITests(OpenbookAPITestCase):
         posts_count = parsed_response['posts_count']
         self.assertEqual(posts_count, amount_of_posts)
 
+    def test_posts_count_does_not_count_soft_deleted_posts(self):
+        """
+        should not count the soft deleted posts of the hashtag and return 200
+        """
+        user = make_user()
+        headers = make_authentication_headers_for_user(user)
+
+        hashtag = make_hashtag()
+        hashtag_name = hashtag.name
+
+        post_creator = make_user()
+        post_creator.create_public_post(text='#%s' % hashtag_name)
+        post = post_creator.create_public_post(text='#%s' % hashtag_name)
+
+        self.assertEqual(hashtag.count_posts(), 2)
+
+        post.soft_delete()
+
+        url = self._get_url(hashtag_name=hashtag_name)
+
+        response = self.client.get(url, **headers)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        parsed_response = json.loads(response.content)
+
+        self.assertEqual(parsed_response['posts_count'], 1)
+
     def _get_url(self, hashtag_name):
         return reverse('hashtag', kwargs={
             'hashtag_name': hashtag_name
@@ -209,6 +237,30 @@ class HashtagPostsAPITests(OpenbookAPITestCase):
         retrieved_posts = parsed_response[0]
         self.assertEqual(retrieved_posts['text'], fake_post_text)
 
+    def test_does_not_retrieve_post_without_hashtag_anymore(self):
+        """
+        should not retrieve a post whose hashtag was edited out and return 200
+        """
+        user = make_user()
+        headers = make_authentication_headers_for_user(user)
+
+        post_creator = make_user()
+
+        hashtag = make_hashtag()
+
+        post = post_creator.create_public_post(text=make_fake_post_text() + ' #%s' % hashtag.name)
+        post_creator.update_post(post=post, text=make_fake_post_text())
+
+        url = self._get_url(hashtag_name=hashtag.name)
+
+        response = self.client.get(url, **headers)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        parsed_response = json.loads(response.content)
+
+        self.assertEqual(len(parsed_response), 0)
+
     def test_does_not_retrieve_private_community_not_part_of_post_with_hashtag(self):
         """
         should not retrieve a private community not part of post with a givne hashtag and return 200
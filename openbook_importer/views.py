@@ -19,6 +19,7 @@ from openbook_importer.socialmedia_archive_parser.fb_parser import zip_parser
 class ImportItem(APIView):
 
     permission_classes = (IsAuthenticated, IsNotSuspended)
+    throttle_scopes = {'POST': 'import'}
 
     def post(self, request):
         serializer = ZipfileSerializer(data=request.FILES)
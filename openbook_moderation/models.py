@@ -2,14 +2,20 @@ from django.conf import settings
 from django.contrib.contenttypes.fields import GenericForeignKey, GenericRelation
 from django.contrib.contenttypes.models import ContentType
 from django.db import models
+from django.db.models import Count
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 from django.utils.translation import ugettext_lazy as _
 
 # Create your models here.
 from django.utils import timezone
 
+from openbook_auth.authentication import invalidate_suspension_for_user_with_id, \
+    invalidate_suspension_for_users_with_ids
+from openbook_auth.exclusions import invalidate_reported_posts_ids_for_user_with_id, invalidate_approved_posts_ids
 from openbook_auth.models import User
 from openbook_common.utils.model_loaders import get_post_model, get_post_comment_model, get_community_model, \
-    get_user_model, get_moderation_penalty_model, get_hashtag_model
+    get_user_model, get_moderation_penalty_model, get_hashtag_model, get_hashtag_public_post_model
 
 
 class ModerationCategory(models.Model):
@@ -190,26 +196,30 @@ class ModeratedObject(models.Model):
 
         content_object = self.content_object
         moderation_severity = self.category.severity
-        penalty_targets = None
+        penalty_targets_ids = None
 
         if self.is_approved():
             if isinstance(content_object, User):
-                penalty_targets = [content_object]
+                penalty_targets_ids = [content_object.pk]
             elif isinstance(content_object, Post):
-                penalty_targets = [content_object.creator]
+                penalty_targets_ids = [content_object.creator_id]
             elif isinstance(content_object, PostComment):
-                penalty_targets = [content_object.commenter]
+                penalty_targets_ids = [content_object.commenter_id]
             elif isinstance(content_object, Community):
-                penalty_targets = content_object.get_staff_members()
+                penalty_targets_ids = list(content_object.get_staff_members().values_list('id', flat=True))
             elif isinstance(content_object, ModeratedObject):
-                penalty_targets = content_object.get_reporters()
+                penalty_targets_ids = list(content_object.get_reporters().values_list('id', flat=True))
             elif isinstance(content_object, Hashtag):
-                penalty_targets = []
+                penalty_targets_ids = []
 
-            for penalty_target in penalty_targets:
+            penalties_counts = ModerationPenalty.count_moderation_penalties_for_users_with_ids(
+                users_ids=penalty_targets_ids, moderation_severity=moderation_severity)
+
+            moderation_expirations = {}
+
+            for penalty_target_id in penalty_targets_ids:
                 duration_of_penalty = None
-                penalties_count = penalty_target.count_moderation_penalties_for_moderation_severity(
-                    moderation_severity=moderation_severity) + 1
+                penalties_count = penalties_counts.get(penalty_target_id, 0) + 1
 
                 if moderation_severity == ModerationCategory.SEVERITY_CRITICAL:
                     duration_of_penalty = timezone.timedelta(weeks=5000)
@@ -220,11 +230,10 @@ class ModeratedObject(models.Model):
                 elif moderation_severity == ModerationCategory.SEVERITY_LOW:
                     duration_of_penalty = timezone.timedelta(minutes=penalties_count ** 2)
 
-                moderation_expiration = timezone.now() + duration_of_penalty
+                moderation_expirations[penalty_target_id] = timezone.now() + duration_of_penalty
 
-                ModerationPenalty.create_suspension_moderation_penalty(moderated_object=self,
-                                                                       user_id=penalty_target.pk,
-                                                                       expiration=moderation_expiration)
+            ModerationPenalty.bulk_create_suspension_moderation_penalties(
+                moderated_object=self, expirations_by_user_id=moderation_expirations)
 
             if (isinstance(content_object, Post) or isinstance(content_object, PostComment) or isinstance(
                     content_object,
@@ -360,6 +369,27 @@ class ModerationPenalty(models.Model):
         return cls.objects.create(moderated_object=moderated_object, user_id=user_id, type=cls.TYPE_SUSPENSION,
                                   expiration=expiration)
 
+    @classmethod
+    def bulk_create_suspension_moderation_penalties(cls, moderated_object, expirations_by_user_id):
+        """
+        Creates a suspension for each user id -> expiration with one INSERT.
+        bulk_create skips post_save, the suspensions are invalidated here.
+        """
+        cls.objects.bulk_create([
+            cls(moderated_object=moderated_object, user_id=user_id, type=cls.TYPE_SUSPENSION, expiration=expiration)
+            for user_id, expiration in expirations_by_user_id.items()
+        ])
+
+        invalidate_suspension_for_users_with_ids(users_ids=list(expirations_by_user_id.keys()))
+
+    @classmethod
+    def count_moderation_penalties_for_users_with_ids(cls, users_ids, moderation_severity):
+        """
+        Returns user id -> amount of penalties of the moderation severity, users without penalties are missing
+        """
+        return dict(cls.objects.filter(user_id__in=users_ids, moderated_object__category__severity=moderation_severity)
+                    .values('user_id').annotate(count=Count('id')).order_by().values_list('user_id', 'count'))
+
 
 class ModeratedObjectLog(models.Model):
     actor = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+', null=True)
@@ -463,3 +493,43 @@ class ModeratedObjectVerifiedChangedLog(models.Model):
         ModeratedObjectLog.create_moderated_object_log(log_type=ModeratedObjectLog.LOG_TYPE_VERIFIED_CHANGED,
                                                        content_object=moderated_object_description_changed_log,
                                                        moderated_object_id=moderated_object_id, actor_id=actor_id)
+
+
+@receiver(post_save, sender=ModeratedObject, dispatch_uid='invalidate_approved_posts_exclusions_on_save')
+def invalidate_approved_posts_exclusions_on_save(sender, instance=None, **kwargs):
+    # Approving, rejecting, verifying and unverifying all save the moderated object
+    if instance.object_type == ModeratedObject.OBJECT_TYPE_POST:
+        invalidate_approved_posts_ids()
+
+        # Reported and approved posts are left out of the hashtags public posts index
+        HashtagPublicPost = get_hashtag_public_post_model()
+        HashtagPublicPost.index_posts_with_ids(posts_ids=[instance.object_id])
+
+
+@receiver(post_delete, sender=ModeratedObject, dispatch_uid='invalidate_approved_posts_exclusions_on_delete')
+def invalidate_approved_posts_exclusions_on_delete(sender, instance=None, **kwargs):
+    if instance.object_type == ModeratedObject.OBJECT_TYPE_POST:
+        invalidate_approved_posts_ids()
+
+
+@receiver(post_save, sender=ModerationReport, dispatch_uid='invalidate_reported_posts_exclusions_on_report')
+def invalidate_reported_posts_exclusions_on_report(sender, instance=None, created=False, **kwargs):
+    if created:
+        invalidate_reported_posts_ids_for_user_with_id(user_id=instance.reporter_id)
+
+
+@receiver(post_delete, sender=ModerationReport, dispatch_uid='invalidate_reported_posts_exclusions_on_report_delete')
+def invalidate_reported_posts_exclusions_on_report_delete(sender, instance=None, **kwargs):
+    invalidate_reported_posts_ids_for_user_with_id(user_id=instance.reporter_id)
+
+
+@receiver(post_save, sender=ModerationPenalty, dispatch_uid='invalidate_suspension_on_penalty')
+def invalidate_suspension_on_penalty(sender, instance=None, **kwargs):
+    # Covers create_suspension_moderation_penalty when verifying
+    invalidate_suspension_for_user_with_id(user_id=instance.user_id)
+
+
+@receiver(post_delete, sender=ModerationPenalty, dispatch_uid='invalidate_suspension_on_penalty_delete')
+def invalidate_suspension_on_penalty_delete(sender, instance=None, **kwargs):
+    # Covers the penalties deleted when unverifying
+    invalidate_suspension_for_user_with_id(user_id=instance.user_id)
@@ -3,6 +3,8 @@ from rest_framework.exceptions import PermissionDenied
 from rest_framework.permissions import BasePermission
 from django.utils.translation import ugettext_lazy as _
 
+from openbook_auth.authentication import is_user_with_id_suspended
+
 
 class IsNotSuspended(BasePermission):
     """
@@ -16,7 +18,8 @@ class IsNotSuspended(BasePermission):
 
 def check_user_is_not_suspended(user):
     if not user.is_anonymous:
-        is_suspended = user.is_suspended()
+        # By id, so the cached authenticated user doesn't need to be loaded
+        is_suspended = is_user_with_id_suspended(user_id=user.pk)
         if is_suspended:
             longest_suspension = user.get_longest_moderation_suspension()
 
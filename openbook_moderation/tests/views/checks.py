@@ -45,6 +45,42 @@ class IsNotSuspendedCheckAPITests(OpenbookAPITestCase):
 
         self.assertEqual(status.HTTP_403_FORBIDDEN, response.status_code)
 
+    def test_suspension_penalties_prevent_access_after_a_successful_check(self):
+        """
+        suspension penalties should prevent access to the API right away, even if the user was just let through
+        :return:
+        """
+        global_moderator = make_global_moderator()
+
+        user = make_user()
+
+        url = self._get_url()
+        headers = make_authentication_headers_for_user(user)
+        response = self.client.get(url, **headers)
+
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+
+        reporter_user = make_user()
+        report_category = make_moderation_category(severity=ModerationCategory.SEVERITY_MEDIUM)
+
+        reporter_user.report_user_with_username(username=user.username, category_id=report_category.pk)
+
+        moderated_object = ModeratedObject.get_or_create_moderated_object_for_user(user=user,
+                                                                                   category_id=report_category.pk)
+
+        global_moderator.approve_moderated_object(moderated_object=moderated_object)
+        global_moderator.verify_moderated_object(moderated_object=moderated_object)
+
+        response = self.client.get(url, **headers)
+
+        self.assertEqual(status.HTTP_403_FORBIDDEN, response.status_code)
+
+        global_moderator.unverify_moderated_object(moderated_object=moderated_object)
+
+        response = self.client.get(url, **headers)
+
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+
     def test_expired_suspension_penalty_does_not_prevent_access(self):
         """
         expired suspension penalty should not prevent access to the API
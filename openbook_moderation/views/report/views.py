@@ -12,6 +12,7 @@ from django.utils.translation import ugettext_lazy as _
 
 class ReportPost(APIView):
     permission_classes = (IsAuthenticated, IsNotSuspended)
+    throttle_scopes = {'POST': 'report'}
 
     def post(self, request, post_uuid):
         request_data = request.data.copy()
@@ -36,6 +37,7 @@ class ReportPost(APIView):
 
 class ReportPostComment(APIView):
     permission_classes = (IsAuthenticated,)
+    throttle_scopes = {'POST': 'report'}
 
     def post(self, request, post_uuid, post_comment_id):
         request_data = request.data.copy()
@@ -64,6 +66,7 @@ class ReportPostComment(APIView):
 
 class ReportUser(APIView):
     permission_classes = (IsAuthenticated, IsNotSuspended)
+    throttle_scopes = {'POST': 'report'}
 
     def post(self, request, user_username):
         request_data = request.data.copy()
@@ -89,6 +92,7 @@ class ReportUser(APIView):
 
 class ReportHashtag(APIView):
     permission_classes = (IsAuthenticated, IsNotSuspended)
+    throttle_scopes = {'POST': 'report'}
 
     def post(self, request, hashtag_name):
         request_data = request.data.copy()
@@ -114,6 +118,7 @@ class ReportHashtag(APIView):
 
 class ReportCommunity(APIView):
     permission_classes = (IsAuthenticated, IsNotSuspended)
+    throttle_scopes = {'POST': 'report'}
 
     def post(self, request, community_name):
         request_data = request.data.copy()
@@ -0,0 +1,89 @@
+from collections import Counter
+
+from django.conf import settings
+from django_redis import get_redis_connection
+
+# Only touches counters that exist, a missing counter is rebuilt from the database on its next read.
+# Counters never go below 0 and keep their expiry.
+UPDATE_EXISTING_COUNTER_SCRIPT = """
+if redis.call('exists', KEYS[1]) == 0 then
+    return nil
+end
+local count = redis.call('incrby', KEYS[1], ARGV[1])
+if count < 0 then
+    redis.call('incrby', KEYS[1], -count)
+    return 0
+end
+return count
+"""
+
+
+def make_unread_notifications_count_key_for_user_with_id(user_id):
+    return 'ob-api-unread-notifications-count-%d' % user_id
+
+
+def get_unread_notifications_count_for_user_with_id(user_id):
+    """
+    Returns None if the counter is missing
+    """
+    redis = _get_counters_redis_connection()
+    count = redis.get(make_unread_notifications_count_key_for_user_with_id(user_id))
+
+    if count is None:
+        return None
+
+    return int(count)
+
+
+def set_unread_notifications_count_for_user_with_id(user_id, count):
+    redis = _get_counters_redis_connection()
+    redis.set(make_unread_notifications_count_key_for_user_with_id(user_id), count,
+              ex=settings.UNREAD_NOTIFICATIONS_COUNT_TTL)
+
+
+def increment_unread_notifications_count_for_user_with_id(user_id, amount=1):
+    if not amount:
+        return
+
+    redis = _get_counters_redis_connection()
+    update_existing_counter = redis.register_script(UPDATE_EXISTING_COUNTER_SCRIPT)
+    update_existing_counter(keys=[make_unread_notifications_count_key_for_user_with_id(user_id)], args=[amount])
+
+
+def increment_unread_notifications_count_for_users_with_ids(users_ids):
+    """
+    Increments the counters of many users in one round trip
+    """
+    _update_unread_notifications_counts_for_users_with_ids(amounts_by_user_id=Counter(users_ids))
+
+
+def decrement_unread_notifications_count_for_users_with_ids(users_ids):
+    """
+    Decrements the counters of many users in one round trip, once per appearance of the user id
+    """
+    _update_unread_notifications_counts_for_users_with_ids(
+        amounts_by_user_id={user_id: -amount for user_id, amount in Counter(users_ids).items()})
+
+
+def decrement_unread_notifications_count_for_user_with_id(user_id, amount=1):
+    increment_unread_notifications_count_for_user_with_id(user_id=user_id, amount=-amount)
+
+
+def _update_unread_notifications_counts_for_users_with_ids(amounts_by_user_id):
+    if not amounts_by_user_id:
+        return
+
+    redis = _get_counters_redis_connection()
+    update_existing_counter = redis.register_script(UPDATE_EXISTING_COUNTER_SCRIPT)
+
+    pipeline = redis.pipeline(transaction=False)
+
+    for user_id, amount in amounts_by_user_id.items():
+        update_existing_counter(keys=[make_unread_notifications_count_key_for_user_with_id(user_id)], args=[amount],
+                                client=pipeline)
+
+    pipeline.execute()
+
+
+def _get_counters_redis_connection():
+    return get_redis_connection('default')
@@ -4,6 +4,7 @@ from django.conf import settings
 from django_rq import job
 
 from openbook_common.utils.model_loaders import get_user_model
+from openbook_notifications.push_dispatcher import flush_push_notifications
 
 onesignal_client = onesignal_sdk.Client(
     app_id=settings.ONE_SIGNAL_APP_ID,
@@ -11,6 +12,12 @@ onesignal_client = onesignal_sdk.Client(
 )
 
 
+@job('default')
+def flush_push_notifications_queue(queue_name):
+    flush_push_notifications(queue_name=queue_name)
+
+
+# Push notifications go through the push dispatcher, kept for the jobs queued before it
 @job('default')
 def send_notification_to_user_with_id(user_id, notification):
     User = get_user_model()
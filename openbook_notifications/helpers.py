@@ -4,7 +4,8 @@ from django.utils.translation import ugettext_lazy as _
 import onesignal as onesignal_sdk
 
 from openbook_common.utils.model_loaders import get_notification_model
-from openbook_notifications.django_rq_jobs import send_notification_to_user_with_id
+from openbook_notifications.push_dispatcher import queue_push_notification, queue_push_notifications, \
+    PUSH_NOTIFICATIONS_QUEUE_LOW, PUSH_NOTIFICATIONS_QUEUE_DEFAULT, PUSH_NOTIFICATIONS_QUEUE_HIGH
 from openbook_translation import translation_strategy
 
 import logging
@@ -15,6 +16,12 @@ NOTIFICATION_GROUP_LOW_PRIORITY = 'low'
 NOTIFICATION_GROUP_MEDIUM_PRIORITY = 'medium'
 NOTIFICATION_GROUP_HIGH_PRIORITY = 'high'
 
+PUSH_NOTIFICATIONS_QUEUE_FOR_NOTIFICATION_GROUP = {
+    NOTIFICATION_GROUP_LOW_PRIORITY: PUSH_NOTIFICATIONS_QUEUE_LOW,
+    NOTIFICATION_GROUP_MEDIUM_PRIORITY: PUSH_NOTIFICATIONS_QUEUE_DEFAULT,
+    NOTIFICATION_GROUP_HIGH_PRIORITY: PUSH_NOTIFICATIONS_QUEUE_HIGH,
+}
+
 
 def send_post_reaction_push_notification(post_reaction):
     post_creator = post_reaction.post.creator
@@ -144,66 +151,24 @@ def send_post_comment_reaction_push_notification(post_comment_reaction):
     _send_notification_to_user(notification=one_signal_notification, user=post_comment_commenter)
 
 
-def send_post_comment_user_mention_push_notification(post_comment_user_mention):
-    mentioned_user = post_comment_user_mention.user
-
-    if not mentioned_user.has_post_comment_mention_notifications_enabled():
-        return
-
-    notification_group = NOTIFICATION_GROUP_MEDIUM_PRIORITY
-
-    mentioner = post_comment_user_mention.post_comment.commenter
-
-    target_user_language_code = get_notification_language_code_for_target_user(mentioned_user)
-    with translation.override(target_user_language_code):
-        one_signal_notification = onesignal_sdk.Notification(post_body={
-            "contents": {
-                "en": _(
-                    '%(mentioner_name)s · @%(mentioner_username)s mentioned you in a comment.') % {
-                          'mentioner_name': mentioner.profile.name,
-                          'mentioner_username': mentioner.username,
-                      }}
-        })
-
-    Notification = get_notification_model()
-    notification_data = {
-        'type': Notification.POST_COMMENT_USER_MENTION,
-    }
-    one_signal_notification.set_parameter('data', notification_data)
-    one_signal_notification.set_parameter('!thread_id', notification_group)
-    one_signal_notification.set_parameter('android_group', notification_group)
-    _send_notification_to_user(notification=one_signal_notification, user=mentioned_user)
+def send_post_comment_user_mention_push_notifications(mentioner, target_users_languages_codes):
+    """
+    target_users_languages_codes: mentioned user id -> code of the language of the user, None if not set
+    """
+    _send_user_mention_push_notifications(
+        mentioner=mentioner, target_users_languages_codes=target_users_languages_codes,
+        notification_type=get_notification_model().POST_COMMENT_USER_MENTION,
+        message=_('%(mentioner_name)s · @%(mentioner_username)s mentioned you in a comment.'))
 
 
-def send_post_user_mention_push_notification(post_user_mention):
-    mentioned_user = post_user_mention.user
-
-    if not mentioned_user.has_post_mention_notifications_enabled():
-        return
-
-    notification_group = NOTIFICATION_GROUP_MEDIUM_PRIORITY
-
-    mentioner = post_user_mention.post.creator
-
-    target_user_language_code = get_notification_language_code_for_target_user(mentioned_user)
-    with translation.override(target_user_language_code):
-        one_signal_notification = onesignal_sdk.Notification(post_body={
-            "contents": {
-                "en": _(
-                    '%(mentioner_name)s · @%(mentioner_username)s mentioned you in a post.') % {
-                          'mentioner_name': mentioner.profile.name,
-                          'mentioner_username': mentioner.username,
-                      }}
-        })
-
-    Notification = get_notification_model()
-    notification_data = {
-        'type': Notification.POST_USER_MENTION,
-    }
-    one_signal_notification.set_parameter('data', notification_data)
-    one_signal_notification.set_parameter('!thread_id', notification_group)
-    one_signal_notification.set_parameter('android_group', notification_group)
-    _send_notification_to_user(notification=one_signal_notification, user=mentioned_user)
+def send_post_user_mention_push_notifications(mentioner, target_users_languages_codes):
+    """
+    target_users_languages_codes: mentioned user id -> code of the language of the user, None if not set
+    """
+    _send_user_mention_push_notifications(
+        mentioner=mentioner, target_users_languages_codes=target_users_languages_codes,
+        notification_type=get_notification_model().POST_USER_MENTION,
+        message=_('%(mentioner_name)s · @%(mentioner_username)s mentioned you in a post.'))
 
 
 def send_community_invite_push_notification(community_invite):
@@ -237,55 +202,56 @@ def send_community_invite_push_notification(community_invite):
         _send_notification_to_user(notification=one_signal_notification, user=invited_user)
 
 
-def send_community_new_post_push_notification(community_notifications_subscription):
-    community_name = community_notifications_subscription.community.name
-    target_user = community_notifications_subscription.subscriber
+def send_community_new_post_push_notifications(community_name, target_users_languages_codes):
+    """
+    target_users_languages_codes: target user id -> code of the language of the user, None if not set
+    """
+    Notification = get_notification_model()
 
-    if target_user.has_community_new_post_notifications_enabled():
-        target_user_language_code = get_notification_language_code_for_target_user(target_user)
-        with translation.override(target_user_language_code):
+    notification_group = NOTIFICATION_GROUP_HIGH_PRIORITY
+
+    for language_code, target_users_ids in _group_target_users_ids_by_language_code(
+            target_users_languages_codes=target_users_languages_codes).items():
+        with translation.override(language_code):
             one_signal_notification = onesignal_sdk.Notification(
                 post_body={"contents": {"en": _('A new post was posted in c/%(community_name)s.') % {
                     'community_name': community_name,
                 }}})
 
-        Notification = get_notification_model()
-
         notification_data = {
             'type': Notification.COMMUNITY_NEW_POST,
         }
 
-        notification_group = NOTIFICATION_GROUP_HIGH_PRIORITY
-
         one_signal_notification.set_parameter('data', notification_data)
         one_signal_notification.set_parameter('!thread_id', notification_group)
         one_signal_notification.set_parameter('android_group', notification_group)
 
-        _send_notification_to_user(notification=one_signal_notification, user=target_user)
+        _send_notification_to_users_with_ids(notification=one_signal_notification, users_ids=target_users_ids,
+                                             language_code=language_code)
 
 
-def send_user_new_post_push_notification(user_notifications_subscription, post):
-    post_creator_name = user_notifications_subscription.user.profile.name
-    post_creator_username = user_notifications_subscription.user.username
-    target_user = user_notifications_subscription.subscriber
+def send_user_new_post_push_notifications(post_creator, target_users_languages_codes):
+    """
+    target_users_languages_codes: target user id -> code of the language of the user, None if not set
+    """
+    Notification = get_notification_model()
 
-    if target_user.has_user_new_post_notifications_enabled():
-        target_user_language_code = get_notification_language_code_for_target_user(target_user)
-        with translation.override(target_user_language_code):
+    for language_code, target_users_ids in _group_target_users_ids_by_language_code(
+            target_users_languages_codes=target_users_languages_codes).items():
+        with translation.override(language_code):
             one_signal_notification = onesignal_sdk.Notification(
                 post_body={"contents": {"en": _('%(post_creator_name)s · @%(post_creator_username)s posted something.') % {
-                    'post_creator_username': post_creator_username,
-                    'post_creator_name': post_creator_name,
+                    'post_creator_username': post_creator.username,
+                    'post_creator_name': post_creator.profile.name,
                 }}})
 
-        Notification = get_notification_model()
-
         notification_data = {
             'type': Notification.USER_NEW_POST,
         }
         one_signal_notification.set_parameter('data', notification_data)
 
-        _send_notification_to_user(notification=one_signal_notification, user=target_user)
+        _send_notification_to_users_with_ids(notification=one_signal_notification, users_ids=target_users_ids,
+                                             language_code=language_code)
 
 
 def get_notification_language_code_for_target_user(target_user):
@@ -295,5 +261,61 @@ def get_notification_language_code_for_target_user(target_user):
     return translation_strategy.get_default_translation_language_code()
 
 
+def _group_target_users_ids_by_language_code(target_users_languages_codes):
+    default_language_code = translation_strategy.get_default_translation_language_code()
+
+    # Language code -> whether notifications can be translated to it
+    checked_languages_codes = {}
+
+    target_users_ids_by_language_code = {}
+
+    for target_user_id, language_code in target_users_languages_codes.items():
+        if language_code and language_code not in checked_languages_codes:
+            checked_languages_codes[language_code] = translation.check_for_language(language_code)
+
+        if not language_code or not checked_languages_codes[language_code]:
+            language_code = default_language_code
+
+        target_users_ids_by_language_code.setdefault(language_code, []).append(target_user_id)
+
+    return target_users_ids_by_language_code
+
+
+def _send_user_mention_push_notifications(mentioner, target_users_languages_codes, notification_type, message):
+    notification_group = NOTIFICATION_GROUP_MEDIUM_PRIORITY
+
+    for language_code, target_users_ids in _group_target_users_ids_by_language_code(
+            target_users_languages_codes=target_users_languages_codes).items():
+        with translation.override(language_code):
+            one_signal_notification = onesignal_sdk.Notification(post_body={
+                "contents": {"en": message % {
+                    'mentioner_name': mentioner.profile.name,
+                    'mentioner_username': mentioner.username,
+                }}
+            })
+
+        notification_data = {
+            'type': notification_type,
+        }
+        one_signal_notification.set_parameter('data', notification_data)
+        one_signal_notification.set_parameter('!thread_id', notification_group)
+        one_signal_notification.set_parameter('android_group', notification_group)
+
+        _send_notification_to_users_with_ids(notification=one_signal_notification, users_ids=target_users_ids,
+                                             language_code=language_code)
+
+
+def _send_notification_to_users_with_ids(users_ids, notification, language_code):
+    queue_push_notifications(users_ids=users_ids, notification=notification, language_code=language_code,
+                             queue_name=_get_push_notifications_queue_name(notification=notification))
+
+
 def _send_notification_to_user(user, notification):
-    send_notification_to_user_with_id.delay(user_id=user.pk, notification=notification)
+    queue_push_notification(user_id=user.pk, notification=notification,
+                            language_code=get_notification_language_code_for_target_user(user),
+                            queue_name=_get_push_notifications_queue_name(notification=notification))
+
+
+def _get_push_notifications_queue_name(notification):
+    notification_group = notification.post_body.get('android_group')
+    return PUSH_NOTIFICATIONS_QUEUE_FOR_NOTIFICATION_GROUP.get(notification_group, PUSH_NOTIFICATIONS_QUEUE_DEFAULT)
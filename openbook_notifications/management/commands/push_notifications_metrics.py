@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+import logging
+
+from openbook_notifications.push_dispatcher import get_push_notifications_metrics, \
+    reset_push_notifications_metrics
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Shows how many push notifications, requests and devices each push notifications queue went through'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Reset the metrics after showing them')
+
+    def handle(self, *args, **options):
+        metrics = get_push_notifications_metrics()
+
+        for queue_name in sorted(metrics.keys()):
+            queue_metrics = metrics[queue_name]
+
+            notifications_count = queue_metrics.get('notifications', 0)
+            requests_count = queue_metrics.get('requests', 0)
+            sending_seconds = queue_metrics.get('sending_milliseconds', 0) / 1000
+
+            logger.info('%s queue. Batches: %d. Notifications: %d. Requests: %d. Failed requests: %d. Devices: %d' % (
+                queue_name, queue_metrics.get('batches', 0), notifications_count, requests_count,
+                queue_metrics.get('failed_requests', 0), queue_metrics.get('devices', 0)))
+
+            if requests_count:
+                logger.info('%s queue. Notifications per request: %.2f' % (
+                    queue_name, notifications_count / requests_count))
+
+            if sending_seconds:
+                logger.info('%s queue. Throughput: %.2f notifications/s, %.2f requests/s' % (
+                    queue_name, notifications_count / sending_seconds, requests_count / sending_seconds))
+
+        if options.get('reset'):
+            reset_push_notifications_metrics()
+            logger.info('Metrics reset')
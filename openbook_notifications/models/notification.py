@@ -1,9 +1,14 @@
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
-from django.db import models
+from django.db import models, transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 from django.utils import timezone
 
 from openbook_auth.models import User
+from openbook_notifications.counters import increment_unread_notifications_count_for_user_with_id, \
+    decrement_unread_notifications_count_for_user_with_id, increment_unread_notifications_count_for_users_with_ids, \
+    decrement_unread_notifications_count_for_users_with_ids
 
 
 class Notification(models.Model):
@@ -50,6 +55,49 @@ class Notification(models.Model):
     def create_notification(cls, owner_id, type, content_object):
         return cls.objects.create(notification_type=type, content_object=content_object, owner_id=owner_id)
 
+    @classmethod
+    def bulk_create_notifications(cls, type, content_model, objects_ids_and_owners_ids):
+        """
+        Creates a notification for each (content object id, owner id) pair.
+        bulk_create skips post_save, the unread notifications counters are incremented here once committed.
+        """
+        content_type = ContentType.objects.get_for_model(content_model)
+        created = timezone.now()
+
+        cls.objects.bulk_create([
+            cls(notification_type=type, content_type=content_type, object_id=object_id, owner_id=owner_id,
+                created=created) for object_id, owner_id in objects_ids_and_owners_ids
+        ])
+
+        owners_ids = [owner_id for object_id, owner_id in objects_ids_and_owners_ids]
+
+        transaction.on_commit(lambda: increment_unread_notifications_count_for_users_with_ids(users_ids=owners_ids))
+
+    @classmethod
+    def bulk_delete_notifications_for_content_objects(cls, content_objects):
+        """
+        Deletes the given queryset of content objects and their notifications, with one DELETE each.
+        Raw deletes skip post_delete, the unread notifications counters are decremented here.
+        Returns the amount of deleted notifications.
+        """
+        content_type = ContentType.objects.get_for_model(content_objects.model)
+        content_objects_ids = list(content_objects.values_list('id', flat=True))
+
+        if not content_objects_ids:
+            return 0
+
+        notifications = cls.objects.filter(content_type=content_type, object_id__in=content_objects_ids)
+        notifications_owners_ids_and_reads = list(notifications.values_list('owner_id', 'read'))
+
+        notifications._raw_delete(notifications.db)
+        content_objects = content_objects.model.objects.filter(id__in=content_objects_ids)
+        content_objects._raw_delete(content_objects.db)
+
+        decrement_unread_notifications_count_for_users_with_ids(
+            users_ids=[owner_id for owner_id, read in notifications_owners_ids_and_reads if not read])
+
+        return len(notifications_owners_ids_and_reads)
+
     @classmethod
     def get_notification_types_values(cls):
         return [a for (a, b) in Notification.NOTIFICATION_TYPES]
@@ -60,3 +108,15 @@ class Notification(models.Model):
             self.created = timezone.now()
 
         return super(Notification, self).save(*args, **kwargs)
+
+
+@receiver(post_save, sender=Notification, dispatch_uid='increment_unread_notifications_count')
+def increment_unread_notifications_count(sender, instance=None, created=False, **kwargs):
+    if created and not instance.read:
+        increment_unread_notifications_count_for_user_with_id(user_id=instance.owner_id)
+
+
+@receiver(post_delete, sender=Notification, dispatch_uid='decrement_unread_notifications_count')
+def decrement_unread_notifications_count(sender, instance=None, **kwargs):
+    if not instance.read:
+        decrement_unread_notifications_count_for_user_with_id(user_id=instance.owner_id)
@@ -17,6 +17,23 @@ class PostUserMentionNotification(models.Model):
                                          owner_id=owner_id)
         return post_user_mention_notification
 
+    @classmethod
+    def bulk_create_post_user_mention_notifications(cls, owners_ids_by_post_user_mention_id):
+        """
+        Creates a notification for each of the given mentions, owned by the mentioned user
+        """
+        mentions_ids = list(owners_ids_by_post_user_mention_id.keys())
+
+        cls.objects.bulk_create([cls(post_user_mention_id=mention_id) for mention_id in mentions_ids])
+
+        # Not every database returns the ids of bulk created rows
+        objects_ids_and_owners_ids = [
+            (notification_id, owners_ids_by_post_user_mention_id[mention_id]) for notification_id, mention_id in
+            cls.objects.filter(post_user_mention_id__in=mentions_ids).values_list('id', 'post_user_mention_id')]
+
+        Notification.bulk_create_notifications(type=Notification.POST_USER_MENTION, content_model=cls,
+                                               objects_ids_and_owners_ids=objects_ids_and_owners_ids)
+
     @classmethod
     def delete_post_user_mention_notification(cls, post_user_mention_id, owner_id):
         cls.objects.filter(post_user_mention_id=post_user_mention_id,
@@ -1,5 +1,5 @@
 from django.contrib.contenttypes.fields import GenericRelation
-from django.db import models
+from django.db import models, transaction
 from openbook_auth.models import UserNotificationsSubscription
 from openbook_notifications.models.notification import Notification
 from openbook_posts.models import Post
@@ -20,6 +20,41 @@ class UserNewPostNotification(models.Model):
                                          owner_id=owner_id)
         return user_new_post_notification
 
+    @classmethod
+    def bulk_create_user_new_post_notifications(cls, post_id, owners_ids_by_subscription_id):
+        """
+        Creates the notifications of the post for the given subscriptions, skipping the ones which already have one.
+        Returns the ids of the subscriptions which got a notification.
+        """
+        existing_subscriptions_ids = set(cls.objects.filter(
+            post_id=post_id,
+            user_notifications_subscription_id__in=owners_ids_by_subscription_id.keys()).values_list(
+            'user_notifications_subscription_id', flat=True))
+
+        subscriptions_ids = [subscription_id for subscription_id in owners_ids_by_subscription_id.keys() if
+                             subscription_id not in existing_subscriptions_ids]
+
+        if not subscriptions_ids:
+            return []
+
+        # A crash between both inserts would leave subscriptions which look notified without a notification
+        with transaction.atomic():
+            cls.objects.bulk_create([cls(post_id=post_id, user_notifications_subscription_id=subscription_id) for
+                                     subscription_id in subscriptions_ids])
+
+            # Not every database returns the ids of bulk created rows
+            objects_ids_and_owners_ids = [
+                (user_new_post_notification_id, owners_ids_by_subscription_id[subscription_id]) for
+                user_new_post_notification_id, subscription_id in
+                cls.objects.filter(post_id=post_id,
+                                   user_notifications_subscription_id__in=subscriptions_ids).values_list(
+                    'id', 'user_notifications_subscription_id')]
+
+            Notification.bulk_create_notifications(type=Notification.USER_NEW_POST, content_model=cls,
+                                                   objects_ids_and_owners_ids=objects_ids_and_owners_ids)
+
+        return subscriptions_ids
+
     @classmethod
     def delete_user_new_post_notification(cls, user_notifications_subscription_id, post_id, owner_id):
         cls.objects.filter(user_notifications_subscription_id=user_notifications_subscription_id,
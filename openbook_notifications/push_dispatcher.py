@@ -0,0 +1,298 @@
+import json
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from hashlib import sha256
+
+import django_rq
+import requests
+from django.conf import settings
+from django_redis import get_redis_connection
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from openbook_common.utils.model_loaders import get_user_model
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+PUSH_NOTIFICATIONS_QUEUE_LOW = 'low'
+PUSH_NOTIFICATIONS_QUEUE_DEFAULT = 'default'
+PUSH_NOTIFICATIONS_QUEUE_HIGH = 'high'
+
+PUSH_NOTIFICATIONS_QUEUES = (
+    PUSH_NOTIFICATIONS_QUEUE_LOW,
+    PUSH_NOTIFICATIONS_QUEUE_DEFAULT,
+    PUSH_NOTIFICATIONS_QUEUE_HIGH,
+)
+
+# Process wide, (retries, backoff factor, pool size) -> session
+_sessions = {}
+
+
+def make_push_notifications_queue_key(queue_name):
+    return 'ob-api-push-notifications-queue-%s' % queue_name
+
+
+def make_push_notifications_flush_scheduled_key(queue_name):
+    return 'ob-api-push-notifications-flush-scheduled-%s' % queue_name
+
+
+def make_push_notifications_metrics_key():
+    return 'ob-api-push-notifications-metrics'
+
+
+def queue_push_notification(user_id, notification, language_code, queue_name=PUSH_NOTIFICATIONS_QUEUE_DEFAULT):
+    """
+    Queues a OneSignal notification for the devices of the user. The queue is flushed after
+    PUSH_NOTIFICATIONS_BATCH_WINDOW seconds, sending the same notification to many devices at once.
+    """
+    queue_push_notifications(users_ids=[user_id], notification=notification, language_code=language_code,
+                             queue_name=queue_name)
+
+
+def queue_push_notifications(users_ids, notification, language_code, queue_name=PUSH_NOTIFICATIONS_QUEUE_DEFAULT):
+    """
+    Queues a OneSignal notification for the devices of each of the users, in one round trip
+    """
+    if not users_ids:
+        return
+
+    queued_notifications = [json.dumps({
+        'user_id': user_id,
+        'language_code': language_code,
+        'payload': notification.post_body,
+    }, default=str) for user_id in users_ids]
+
+    redis = _get_push_notifications_redis_connection()
+    pipeline = redis.pipeline(transaction=False)
+    pipeline.rpush(make_push_notifications_queue_key(queue_name), *queued_notifications)
+    # The flag expires in case the scheduled flush is lost, the next notification schedules another one
+    pipeline.set(make_push_notifications_flush_scheduled_key(queue_name), 1, nx=True,
+                 ex=settings.PUSH_NOTIFICATIONS_BATCH_WINDOW + 60)
+    _, flush_needs_scheduling = pipeline.execute()
+
+    if flush_needs_scheduling:
+        _schedule_flush(queue_name=queue_name)
+
+
+def flush_push_notifications(queue_name):
+    """
+    Sends the queued notifications of the queue, grouped by payload and language.
+    Returns the amount of notifications sent.
+    """
+    redis = _get_push_notifications_redis_connection()
+    queue_key = make_push_notifications_queue_key(queue_name)
+
+    # Notifications queued from now on schedule another flush
+    redis.delete(make_push_notifications_flush_scheduled_key(queue_name))
+
+    sent_notifications_count = 0
+
+    while True:
+        pipeline = redis.pipeline()
+        pipeline.lrange(queue_key, 0, settings.PUSH_NOTIFICATIONS_MAX_BATCH_SIZE - 1)
+        pipeline.ltrim(queue_key, settings.PUSH_NOTIFICATIONS_MAX_BATCH_SIZE, -1)
+        queued_notifications, _ = pipeline.execute()
+
+        if not queued_notifications:
+            break
+
+        sent_notifications_count += _send_queued_notifications(queue_name=queue_name,
+                                                               queued_notifications=queued_notifications)
+
+    return sent_notifications_count
+
+
+def get_push_notifications_metrics():
+    """
+    Returns the metrics of each queue, queue name -> metric name -> value
+    """
+    redis = _get_push_notifications_redis_connection()
+    raw_metrics = redis.hgetall(make_push_notifications_metrics_key())
+
+    metrics = {}
+
+    for field, value in raw_metrics.items():
+        queue_name, metric_name = field.decode('utf-8').split(':', 1)
+        metrics.setdefault(queue_name, {})[metric_name] = float(value)
+
+    return metrics
+
+
+def reset_push_notifications_metrics():
+    redis = _get_push_notifications_redis_connection()
+    redis.delete(make_push_notifications_metrics_key())
+
+
+def _requeue_push_notifications(queue_name, queued_notifications):
+    """
+    Puts the notifications back at the head of the queue, in their order. The next notification queued schedules
+    their flush.
+    """
+    if not queued_notifications:
+        return
+
+    redis = _get_push_notifications_redis_connection()
+    redis.lpush(make_push_notifications_queue_key(queue_name), *reversed(queued_notifications))
+
+
+def _send_queued_notifications(queue_name, queued_notifications):
+    """
+    Failed requests are only logged, anything else puts the notifications whose sending has not started back
+    in the queue for the next flush. The ones already sent are not requeued, their devices would get them twice.
+    """
+    # (language code, payload) -> users ids, in the order they were queued
+    users_ids_by_notification = OrderedDict()
+    notifications_keys = []
+
+    for queued_notification in queued_notifications:
+        queued_notification = json.loads(queued_notification)
+        notification_key = (queued_notification['language_code'],
+                            json.dumps(queued_notification['payload'], sort_keys=True))
+        users_ids_by_notification.setdefault(notification_key, set()).add(queued_notification['user_id'])
+        notifications_keys.append(notification_key)
+
+    unsent_notifications_keys = set(users_ids_by_notification.keys())
+
+    requests_count = 0
+    failed_requests_count = 0
+    devices_count = 0
+
+    try:
+        all_users_ids = set().union(*users_ids_by_notification.values())
+        devices_filters_by_user_id = _get_devices_filters_for_users_with_ids(users_ids=all_users_ids)
+        start = time.monotonic()
+
+        for notification_key, users_ids in users_ids_by_notification.items():
+            language_code, payload = notification_key
+            unsent_notifications_keys.remove(notification_key)
+
+            devices_filters = [device_filters for user_id in sorted(users_ids)
+                               for device_filters in devices_filters_by_user_id.get(user_id, [])]
+
+            for chunk_start in range(0, len(devices_filters), settings.PUSH_NOTIFICATIONS_MAX_DEVICES_PER_REQUEST):
+                chunk_devices_filters = devices_filters[
+                                        chunk_start:chunk_start + settings.PUSH_NOTIFICATIONS_MAX_DEVICES_PER_REQUEST]
+
+                requests_count += 1
+                devices_count += len(chunk_devices_filters)
+
+                if not _send_notification_to_devices(payload=json.loads(payload),
+                                                     devices_filters=chunk_devices_filters):
+                    failed_requests_count += 1
+    except Exception:
+        _requeue_push_notifications(queue_name=queue_name, queued_notifications=[
+            queued_notification for queued_notification, notification_key in
+            zip(queued_notifications, notifications_keys) if notification_key in unsent_notifications_keys])
+        raise
+
+    elapsed_milliseconds = (time.monotonic() - start) * 1000
+
+    _record_push_notifications_metrics(queue_name=queue_name, notifications_count=len(queued_notifications),
+                                       requests_count=requests_count, failed_requests_count=failed_requests_count,
+                                       devices_count=devices_count, elapsed_milliseconds=elapsed_milliseconds)
+
+    return len(queued_notifications)
+
+
+def _get_devices_filters_for_users_with_ids(users_ids):
+    """
+    Returns user id -> the OneSignal filters matching each of the devices of the user
+    """
+    User = get_user_model()
+
+    devices = User.objects.filter(pk__in=users_ids, devices__isnull=False).values_list('id', 'uuid', 'devices__uuid')
+
+    devices_filters_by_user_id = {}
+
+    for user_id, user_uuid, device_uuid in devices:
+        user_tag = sha256((str(user_uuid) + str(user_id)).encode('utf-8')).hexdigest()
+        devices_filters_by_user_id.setdefault(user_id, []).append([
+            {"field": "tag", "key": "user_id", "relation": "=", "value": user_tag},
+            {"field": "tag", "key": "device_uuid", "relation": "=", "value": device_uuid},
+        ])
+
+    return devices_filters_by_user_id
+
+
+def _send_notification_to_devices(payload, devices_filters):
+    filters = []
+
+    for device_filters in devices_filters:
+        if filters:
+            filters.append({"operator": "OR"})
+        filters.extend(device_filters)
+
+    body = dict(payload)
+    body['app_id'] = settings.ONE_SIGNAL_APP_ID
+    body['filters'] = filters
+    body['ios_badgeType'] = 'Increase'
+    body['ios_badgeCount'] = '1'
+
+    try:
+        response = _get_session().post(settings.ONE_SIGNAL_API_URL, json=body,
+                                       headers={'Authorization': 'Basic %s' % settings.ONE_SIGNAL_API_KEY},
+                                       timeout=settings.PUSH_NOTIFICATIONS_REQUEST_TIMEOUT)
+        response.raise_for_status()
+    except requests.RequestException as e:
+        logger.error('Failed to send a push notification to %d devices: %s' % (len(devices_filters), e))
+        return False
+
+    return True
+
+
+def _get_session():
+    """
+    Returns a session that keeps the connections to OneSignal open and retries throttled and failed requests
+    """
+    session_key = (settings.PUSH_NOTIFICATIONS_REQUEST_RETRIES, settings.PUSH_NOTIFICATIONS_RETRY_BACKOFF_FACTOR,
+                   settings.PUSH_NOTIFICATIONS_POOL_SIZE)
+
+    session = _sessions.get(session_key)
+
+    if session is None:
+        retry = Retry(total=settings.PUSH_NOTIFICATIONS_REQUEST_RETRIES,
+                      # A request that timed out could have been delivered, don't send it twice
+                      read=0,
+                      status_forcelist=(429, 500, 502, 503, 504),
+                      method_whitelist=frozenset(['POST']),
+                      backoff_factor=settings.PUSH_NOTIFICATIONS_RETRY_BACKOFF_FACTOR,
+                      raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings.PUSH_NOTIFICATIONS_POOL_SIZE,
+                              max_retries=retry)
+        session = requests.Session()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        _sessions[session_key] = session
+
+    return session
+
+
+def _record_push_notifications_metrics(queue_name, notifications_count, requests_count, failed_requests_count,
+                                       devices_count, elapsed_milliseconds):
+    metrics_key = make_push_notifications_metrics_key()
+
+    redis = _get_push_notifications_redis_connection()
+    pipeline = redis.pipeline(transaction=False)
+    pipeline.hincrby(metrics_key, '%s:batches' % queue_name, 1)
+    pipeline.hincrby(metrics_key, '%s:notifications' % queue_name, notifications_count)
+    pipeline.hincrby(metrics_key, '%s:requests' % queue_name, requests_count)
+    pipeline.hincrby(metrics_key, '%s:failed_requests' % queue_name, failed_requests_count)
+    pipeline.hincrby(metrics_key, '%s:devices' % queue_name, devices_count)
+    pipeline.hincrbyfloat(metrics_key, '%s:sending_milliseconds' % queue_name, elapsed_milliseconds)
+    pipeline.execute()
+
+
+def _schedule_flush(queue_name):
+    from openbook_notifications.django_rq_jobs import flush_push_notifications_queue
+
+    scheduler = django_rq.get_scheduler(queue_name)
+    # Positional, the scheduler takes the queue_name keyword argument for itself
+    scheduler.enqueue_in(timedelta(seconds=settings.PUSH_NOTIFICATIONS_BATCH_WINDOW), flush_push_notifications_queue,
+                         queue_name)
+
+
+def _get_push_notifications_redis_connection():
+    return get_redis_connection('default')
@@ -0,0 +1,214 @@
+import json
+import threading
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from unittest import mock
+
+import onesignal as onesignal_sdk
+from django.test import override_settings
+
+from openbook_common.tests.helpers import make_user, make_device
+from openbook_common.tests.models import OpenbookAPITestCase
+from openbook_notifications import push_dispatcher
+from openbook_notifications.push_dispatcher import queue_push_notification, flush_push_notifications, \
+    get_push_notifications_metrics
+
+
+class PushDispatcherTests(OpenbookAPITestCase):
+    """
+    Push notifications dispatcher, against a stub of the OneSignal API
+    """
+
+    def setUp(self):
+        super(PushDispatcherTests, self).setUp()
+        self.stub_responses_statuses = []
+        self.stub_requests_bodies = []
+        self.stub_server = HTTPServer(('127.0.0.1', 0), self._make_stub_request_handler())
+        threading.Thread(target=self.stub_server.serve_forever, daemon=True).start()
+
+        self.settings_override = override_settings(
+            ONE_SIGNAL_API_URL='http://127.0.0.1:%d/api/v1/notifications' % self.stub_server.server_port,
+            PUSH_NOTIFICATIONS_RETRY_BACKOFF_FACTOR=0)
+        self.settings_override.enable()
+
+        self.schedule_flush_patcher = mock.patch('openbook_notifications.push_dispatcher._schedule_flush')
+        self.schedule_flush_mock = self.schedule_flush_patcher.start()
+
+    def tearDown(self):
+        self.schedule_flush_patcher.stop()
+        self.settings_override.disable()
+        self.stub_server.shutdown()
+        self.stub_server.server_close()
+        super(PushDispatcherTests, self).tearDown()
+
+    def test_sends_the_same_notification_to_many_users_in_one_request(self):
+        """
+        should send a notification queued for several users in one request targeting all of their devices
+        """
+        users_devices_uuids = []
+
+        for i in range(0, 3):
+            user = make_user()
+            for j in range(0, 2):
+                users_devices_uuids.append(make_device(owner=user).uuid)
+            queue_push_notification(user_id=user.pk, notification=self._make_notification(text='Hello'),
+                                    language_code='en')
+
+        flush_push_notifications(queue_name='default')
+
+        self.assertEqual(len(self.stub_requests_bodies), 1)
+
+        request_body = self.stub_requests_bodies[0]
+        self.assertEqual(request_body['contents'], {'en': 'Hello'})
+
+        devices_uuids = [request_filter['value'] for request_filter in request_body['filters'] if
+                         request_filter.get('key') == 'device_uuid']
+        self.assertEqual(sorted(devices_uuids), sorted(users_devices_uuids))
+
+    def test_sends_different_notifications_in_different_requests(self):
+        """
+        should send notifications with a different payload or language in separate requests
+        """
+        user = make_user()
+        make_device(owner=user)
+
+        queue_push_notification(user_id=user.pk, notification=self._make_notification(text='Hello'),
+                                language_code='en')
+        queue_push_notification(user_id=user.pk, notification=self._make_notification(text='Bye'),
+                                language_code='en')
+        queue_push_notification(user_id=user.pk, notification=self._make_notification(text='Bye'),
+                                language_code='es')
+
+        flush_push_notifications(queue_name='default')
+
+        self.assertEqual(len(self.stub_requests_bodies), 3)
+
+    def test_schedules_one_flush_per_window(self):
+        """
+        should schedule a single flush for the notifications queued before it runs
+        """
+        user = make_user()
+        make_device(owner=user)
+
+        for i in range(0, 3):
+            queue_push_notification(user_id=user.pk, notification=self._make_notification(text='Hello'),
+                                    language_code='en', queue_name='high')
+
+        self.assertEqual(self.schedule_flush_mock.call_count, 1)
+
+        flush_push_notifications(queue_name='high')
+
+        queue_push_notification(user_id=user.pk, notification=self._make_notification(text='Hello'),
+                                language_code='en', queue_name='high')
+
+        self.assertEqual(self.schedule_flush_mock.call_count, 2)
+
+    def test_requeues_notifications_when_flush_fails(self):
+        """
+        should put the notifications back in the queue when their flush fails and send them with the next flush
+        """
+        user = make_user()
+        make_device(owner=user)
+
+        queue_push_notification(user_id=user.pk, notification=self._make_notification(text='Hello'),
+                                language_code='en')
+
+        with mock.patch('openbook_notifications.push_dispatcher._get_devices_filters_for_users_with_ids',
+                        side_effect=ValueError('Database unavailable')):
+            with self.assertRaises(ValueError):
+                flush_push_notifications(queue_name='default')
+
+        self.assertEqual(len(self.stub_requests_bodies), 0)
+
+        flush_push_notifications(queue_name='default')
+
+        self.assertEqual(len(self.stub_requests_bodies), 1)
+
+    def test_requeues_only_the_notifications_not_sent_when_flush_fails(self):
+        """
+        should not put back the notifications sent before a flush failed, their devices would get them twice
+        """
+        user = make_user()
+        make_device(owner=user)
+
+        queue_push_notification(user_id=user.pk, notification=self._make_notification(text='Hello'),
+                                language_code='en')
+        queue_push_notification(user_id=user.pk, notification=self._make_notification(text='Bye'),
+                                language_code='en')
+
+        send_notification_to_devices = push_dispatcher._send_notification_to_devices
+
+        def send_once_then_fail(payload, devices_filters):
+            if self.stub_requests_bodies:
+                raise ValueError('Worker stopped')
+            return send_notification_to_devices(payload=payload, devices_filters=devices_filters)
+
+        with mock.patch('openbook_notifications.push_dispatcher._send_notification_to_devices',
+                        side_effect=send_once_then_fail):
+            with self.assertRaises(ValueError):
+                flush_push_notifications(queue_name='default')
+
+        self.assertEqual(len(self.stub_requests_bodies), 1)
+
+        flush_push_notifications(queue_name='default')
+
+        self.assertEqual(len(self.stub_requests_bodies), 2)
+        self.assertEqual(self.stub_requests_bodies[1]['contents'], {'en': 'Bye'})
+
+    def test_retries_throttled_requests(self):
+        """
+        should retry a request throttled by OneSignal
+        """
+        user = make_user()
+        make_device(owner=user)
+
+        self.stub_responses_statuses = [429, 200]
+
+        queue_push_notification(user_id=user.pk, notification=self._make_notification(text='Hello'),
+                                language_code='en', queue_name='low')
+
+        flush_push_notifications(queue_name='low')
+
+        self.assertEqual(len(self.stub_requests_bodies), 2)
+
+        low_queue_metrics = get_push_notifications_metrics()['low']
+        self.assertEqual(low_queue_metrics['notifications'], 1)
+        self.assertEqual(low_queue_metrics['requests'], 1)
+        self.assertEqual(low_queue_metrics['failed_requests'], 0)
+
+    def test_skips_users_without_devices(self):
+        """
+        should not send requests for users without devices
+        """
+        user = make_user()
+
+        queue_push_notification(user_id=user.pk, notification=self._make_notification(text='Hello'),
+                                language_code='en')
+
+        flush_push_notifications(queue_name='default')
+
+        self.assertEqual(len(self.stub_requests_bodies), 0)
+
+    def _make_notification(self, text):
+        notification = onesignal_sdk.Notification(post_body={"contents": {"en": text}})
+        notification.set_parameter('data', {'type': 'PR'})
+        return notification
+
+    def _make_stub_request_handler(self):
+        test = self
+
+        class StubRequestHandler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                content_length = int(self.headers['Content-Length'])
+                test.stub_requests_bodies.append(json.loads(self.rfile.read(content_length).decode('utf-8')))
+
+                status = test.stub_responses_statuses.pop(0) if test.stub_responses_statuses else 200
+
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                self.wfile.write(b'{"id": "stub", "recipients": 1}')
+
+            def log_message(self, format, *args):
+                pass
+
+        return StubRequestHandler
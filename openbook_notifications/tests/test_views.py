@@ -438,5 +438,30 @@ class UnreadNotificationsCountAPITests(OpenbookAPITestCase):
 
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
+    def test_unread_notifications_count_is_kept_up_to_date(self):
+        """
+        should keep the unread notifications count up to date once it has been retrieved
+        """
+        user = make_user()
+
+        url = self._get_url()
+        headers = make_authentication_headers_for_user(user)
+
+        response = self.client.get(url, {}, **headers)
+        self.assertEqual(json.loads(response.content)['count'], 0)
+
+        notifications = [make_notification(owner=user) for i in range(0, 4)]
+
+        user.read_notification_with_id(notification_id=notifications[0].pk)
+        user.delete_notification_with_id(notification_id=notifications[1].pk)
+
+        response = self.client.get(url, {}, **headers)
+        self.assertEqual(json.loads(response.content)['count'], 2)
+
+        user.read_notifications()
+
+        response = self.client.get(url, {}, **headers)
+        self.assertEqual(json.loads(response.content)['count'], 0)
+
     def _get_url(self):
             return reverse('unread-notifications-count')
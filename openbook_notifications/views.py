@@ -87,9 +87,12 @@ class UnreadNotificationsCount(APIView):
         max_id = data.get('max_id')
         types = data.get('types')
 
-        notifications = user.get_unread_notifications(max_id=max_id, types=types)
+        if not max_id and not types:
+            count = user.get_unread_notifications_count()
+        else:
+            count = user.get_unread_notifications(max_id=max_id, types=types).count()
 
-        return Response({'count': notifications.count()}, status=status.HTTP_200_OK)
+        return Response({'count': count}, status=status.HTTP_200_OK)
 
 
 class NotificationItem(APIView):
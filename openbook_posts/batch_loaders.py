@@ -0,0 +1,263 @@
+from django.db.models import Q, Count
+
+from openbook_common.batch_loaders import ImageDerivativesBatchLoader, IMAGE_DERIVATIVES_CONTEXT_KEY
+from openbook_common.utils.model_loaders import get_post_reaction_model, get_post_mute_model, \
+    get_post_comment_model, get_community_membership_model, get_user_block_model, get_emoji_model, \
+    get_moderated_object_model, get_post_reaction_emoji_count_model
+
+POSTS_VIEWER_STATE_CONTEXT_KEY = 'posts_viewer_state'
+
+
+class PostsViewerStateBatchLoader:
+    """
+    Request scoped loader of the state of a page of posts relative to the viewer.
+    Each state is fetched for the whole page with a few grouped queries the first time a field asks for it.
+
+    The posts are expected to already be visible to the viewer, no visibility checks are done.
+    """
+
+    def __init__(self, viewer, posts):
+        self.viewer = viewer
+        self.posts_by_id = {post.pk: post for post in posts}
+        self._reactions_by_post_id = None
+        self._muted_posts_ids = None
+        self._comments_counts_by_post_id = None
+        self._emoji_counts_by_post_id = None
+        self._creator_memberships_by_post_id = None
+        self._blocked_users_ids = None
+        self._viewer_staff_communities_ids = None
+
+    def has_post_with_id(self, post_id):
+        return post_id in self.posts_by_id
+
+    def get_reaction_for_post_with_id(self, post_id):
+        if self._reactions_by_post_id is None:
+            PostReaction = get_post_reaction_model()
+            reactions = PostReaction.objects.select_related('emoji').filter(reactor_id=self.viewer.pk,
+                                                                            post_id__in=self._get_posts_ids())
+            self._reactions_by_post_id = {reaction.post_id: reaction for reaction in reactions}
+
+        return self._reactions_by_post_id.get(post_id)
+
+    def has_muted_post_with_id(self, post_id):
+        if self._muted_posts_ids is None:
+            PostMute = get_post_mute_model()
+            self._muted_posts_ids = set(PostMute.objects.filter(muter_id=self.viewer.pk,
+                                                                post_id__in=self._get_posts_ids()).values_list(
+                'post_id', flat=True))
+
+        return post_id in self._muted_posts_ids
+
+    def get_creator_membership_for_post_with_id(self, post_id):
+        if self._creator_memberships_by_post_id is None:
+            self._creator_memberships_by_post_id = self._load_creator_memberships()
+
+        return self._creator_memberships_by_post_id.get(post_id)
+
+    def get_comments_count_for_post_with_id(self, post_id):
+        """
+        Same results as Post.count_comments_with_user for the viewer
+        """
+        if self._comments_counts_by_post_id is None:
+            self._comments_counts_by_post_id = self._load_comments_counts()
+
+        return self._comments_counts_by_post_id.get(post_id, 0)
+
+    def get_emoji_counts_for_post_with_id(self, post_id):
+        """
+        Same results as User.get_emoji_counts_for_post for the viewer
+        """
+        if self._emoji_counts_by_post_id is None:
+            self._emoji_counts_by_post_id = self._load_emoji_counts()
+
+        return self._emoji_counts_by_post_id.get(post_id, [])
+
+    def _get_posts_ids(self):
+        return list(self.posts_by_id.keys())
+
+    def _get_communities_ids(self):
+        return {post.community_id for post in self.posts_by_id.values() if post.community_id}
+
+    def _get_blocked_users_ids(self):
+        """
+        Users the viewer blocked or that blocked the viewer
+        """
+        if self._blocked_users_ids is None:
+            UserBlock = get_user_block_model()
+            blocks = UserBlock.objects.filter(Q(blocker_id=self.viewer.pk) | Q(blocked_user_id=self.viewer.pk)). \
+                values_list('blocker_id', 'blocked_user_id')
+            self._blocked_users_ids = {blocker_id if blocker_id != self.viewer.pk else blocked_user_id for
+                                       blocker_id, blocked_user_id in blocks}
+
+        return self._blocked_users_ids
+
+    def _get_viewer_staff_communities_ids(self):
+        if self._viewer_staff_communities_ids is None:
+            communities_ids = self._get_communities_ids()
+            if not communities_ids:
+                self._viewer_staff_communities_ids = set()
+            else:
+                CommunityMembership = get_community_membership_model()
+                self._viewer_staff_communities_ids = set(CommunityMembership.objects.filter(
+                    Q(is_administrator=True) | Q(is_moderator=True),
+                    user_id=self.viewer.pk,
+                    community_id__in=communities_ids).values_list('community_id', flat=True))
+
+        return self._viewer_staff_communities_ids
+
+    def _get_staff_memberships_of_users_with_ids(self, users_ids):
+        """
+        Returns a set of (community_id, user_id) for the given users that are staff of the posts communities
+        """
+        communities_ids = self._get_communities_ids()
+        if not communities_ids or not users_ids:
+            return set()
+
+        CommunityMembership = get_community_membership_model()
+        return set(CommunityMembership.objects.filter(
+            Q(is_administrator=True) | Q(is_moderator=True),
+            user_id__in=users_ids,
+            community_id__in=communities_ids).values_list('community_id', 'user_id'))
+
+    def _is_hidden_for_viewer(self, post, user_id, blocked_users_ids, blocked_staff_memberships):
+        """
+        Whether content of the given user in the given post is hidden for the viewer because of a block
+        """
+        if user_id not in blocked_users_ids:
+            return False
+
+        if not post.community_id:
+            return True
+
+        if post.community_id in self._get_viewer_staff_communities_ids():
+            return False
+
+        return (post.community_id, user_id) not in blocked_staff_memberships
+
+    def _load_creator_memberships(self):
+        communities_posts = [post for post in self.posts_by_id.values() if post.community_id]
+
+        if not communities_posts:
+            return {}
+
+        CommunityMembership = get_community_membership_model()
+        memberships = CommunityMembership.objects.filter(
+            community_id__in={post.community_id for post in communities_posts},
+            user_id__in={post.creator_id for post in communities_posts})
+
+        memberships_by_key = {(membership.community_id, membership.user_id): membership for membership in
+                              memberships}
+
+        return {post.pk: memberships_by_key.get((post.community_id, post.creator_id)) for post in
+                communities_posts}
+
+    def _load_comments_counts(self):
+        PostComment = get_post_comment_model()
+        ModeratedObject = get_moderated_object_model()
+
+        comments_counts = PostComment.objects. \
+            filter(post_id__in=self._get_posts_ids(), is_deleted=False). \
+            exclude(moderated_object__reports__reporter_id=self.viewer.pk). \
+            values('post_id', 'commenter_id'). \
+            annotate(comments_count=Count('id'),
+                     approved_comments_count=Count('id', filter=Q(
+                         moderated_object__status=ModeratedObject.STATUS_APPROVED))). \
+            order_by()
+
+        comments_counts = list(comments_counts)
+
+        blocked_users_ids = self._get_blocked_users_ids()
+        blocked_staff_memberships = self._get_staff_memberships_of_users_with_ids(
+            {comments_count['commenter_id'] for comments_count in comments_counts} & blocked_users_ids)
+
+        comments_counts_by_post_id = {}
+
+        for comments_count in comments_counts:
+            post = self.posts_by_id[comments_count['post_id']]
+
+            if self._is_hidden_for_viewer(post=post, user_id=comments_count['commenter_id'],
+                                          blocked_users_ids=blocked_users_ids,
+                                          blocked_staff_memberships=blocked_staff_memberships):
+                continue
+
+            count = comments_count['comments_count']
+
+            if post.community_id:
+                # Approved reports are only excluded from community posts
+                count -= comments_count['approved_comments_count']
+
+            comments_counts_by_post_id[post.pk] = comments_counts_by_post_id.get(post.pk, 0) + count
+
+        return comments_counts_by_post_id
+
+    def _load_emoji_counts(self):
+        PostReaction = get_post_reaction_model()
+        PostReactionEmojiCount = get_post_reaction_emoji_count_model()
+        Emoji = get_emoji_model()
+
+        posts_ids = self._get_posts_ids()
+        blocked_users_ids = self._get_blocked_users_ids()
+
+        counts_by_post_id = PostReactionEmojiCount.get_counts_for_posts_with_ids(posts_ids=posts_ids)
+
+        if blocked_users_ids and counts_by_post_id:
+            blocked_reactions = list(PostReaction.objects.filter(post_id__in=list(counts_by_post_id.keys()),
+                                                                 reactor_id__in=blocked_users_ids).values_list(
+                'post_id', 'emoji_id', 'reactor_id'))
+
+            # Blocked users reactions are still shown in communities where they or the viewer are staff
+            blocked_staff_memberships = self._get_staff_memberships_of_users_with_ids(
+                {reactor_id for post_id, emoji_id, reactor_id in blocked_reactions})
+
+            for post_id, emoji_id, reactor_id in blocked_reactions:
+                if self._is_hidden_for_viewer(post=self.posts_by_id[post_id], user_id=reactor_id,
+                                              blocked_users_ids=blocked_users_ids,
+                                              blocked_staff_memberships=blocked_staff_memberships):
+                    counts_by_emoji_id = counts_by_post_id[post_id]
+                    counts_by_emoji_id[emoji_id] = counts_by_emoji_id.get(emoji_id, 0) - 1
+
+        emojis_by_id = Emoji.objects.cache().in_bulk(
+            list({emoji_id for counts_by_emoji_id in counts_by_post_id.values() for emoji_id in counts_by_emoji_id}))
+
+        return {post_id: Emoji.make_emoji_counts(counts_by_emoji_id=counts_by_emoji_id, emojis_by_id=emojis_by_id) for
+                post_id, counts_by_emoji_id in counts_by_post_id.items()}
+
+def make_posts_viewer_state_context(request, posts):
+    """
+    Makes the serializer context for a page of posts, priming the viewer state batch loader when authenticated
+    """
+    context = {
+        'request': request,
+        IMAGE_DERIVATIVES_CONTEXT_KEY: ImageDerivativesBatchLoader(get_images=lambda: _get_images_of_posts(posts)),
+    }
+
+    if not request.user.is_anonymous:
+        context[POSTS_VIEWER_STATE_CONTEXT_KEY] = PostsViewerStateBatchLoader(viewer=request.user, posts=posts)
+
+    return context
+
+
+def _get_images_of_posts(posts):
+    images = []
+
+    for post in posts:
+        images.append(post.media_thumbnail)
+        images.append(post.creator.profile.avatar)
+
+    return images
+
+
+def get_posts_viewer_state_for_post(context, post):
+    """
+    Returns the primed viewer state loader from the serializer context if it covers the post
+    """
+    posts_viewer_state = context.get(POSTS_VIEWER_STATE_CONTEXT_KEY)
+
+    if posts_viewer_state is None or not posts_viewer_state.has_post_with_id(post.pk):
+        return None
+
+    request = context.get('request')
+    if request is None or request.user.pk != posts_viewer_state.viewer.pk:
+        return None
+
+    return posts_viewer_state
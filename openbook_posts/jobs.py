@@ -1,17 +1,38 @@
+import time
+
+from django.db import transaction
 from django.utils import timezone
+from django_redis import get_redis_connection
 from django_rq import job
 from video_encoding import tasks
-from datetime import timedelta
+from datetime import timedelta, datetime
 from django.db.models import Q, Count
 from django.conf import settings
 from cursor_pagination import CursorPaginator
 
 from openbook_common.utils.model_loaders import get_post_model, get_post_media_model, get_community_model, \
-    get_top_post_model, get_post_comment_model, get_moderated_object_model, get_trending_post_model
+    get_top_post_model, get_post_comment_model, get_moderated_object_model, get_trending_post_model, get_user_model, \
+    get_post_reaction_model
+from openbook_posts.media_processing import beat_media_processing_of_post_with_id, \
+    clear_media_processing_of_post_with_id, get_posts_ids_with_interrupted_media_processing, \
+    count_media_processing_attempt_of_post_with_id, get_media_processing_attempts_of_post_with_id
+from openbook_posts.timelines import add_post_with_id_to_timelines_of_users_with_ids, \
+    get_timeline_recipients_ids_for_post, set_timeline_posts_ids_for_user_with_id
+from openbook_posts.soft_deletion import soft_delete_next_chunk_of_target, get_soft_deletion_progress
+from openbook_posts.subscribers import notify_next_subscribers_chunk_of_post_with_id, \
+    get_subscribers_fan_out_progress_for_post_with_id
+from openbook_posts.trending import get_trending_posts_scores
 import logging
 
 logger = logging.getLogger(__name__)
 
+TOP_POSTS_CURATION_WATERMARK_KEY = 'ob-api-top-posts-curation-watermark'
+TOP_POSTS_CURATION_WATERMARK_OVERLAP = timedelta(minutes=1)
+
+TRENDING_POSTS_COUNT = 30
+# How many of the highest scored posts are checked for eligibility per trending post
+TRENDING_POSTS_CANDIDATES_FACTOR = 5
+
 
 @job('low')
 def flush_draft_posts():
@@ -35,88 +56,235 @@ def flush_draft_posts():
 @job('high')
 def process_post_media(post_id):
     """
-    This job is called to process post media and mark it as published
+    This job is called to process post media and mark it as published.
+    The formats encoded before an interruption are kept, queueing it again resumes the processing.
     """
     Post = get_post_model()
     PostMedia = get_post_media_model()
     post = Post.objects.get(pk=post_id)
-    logger.info('Processing media of post with id: %d' % post_id)
 
-    post_media_videos = post.media.filter(type=PostMedia.MEDIA_TYPE_VIDEO)
-
-    for post_media_video in post_media_videos.iterator():
-        post_video = post_media_video.content_object
-        tasks.convert_video(post_video.file)
+    if post.status != Post.STATUS_PROCESSING:
+        logger.info('Media of post with id: %d was already processed' % post_id)
+        return
+
+    attempts = count_media_processing_attempt_of_post_with_id(post_id=post_id)
+    logger.info('Processing media of post with id: %d, attempt %d' % (post_id, attempts))
+    beat_media_processing_of_post_with_id(post_id=post_id)
+
+    try:
+        post_media_videos = post.media.filter(type=PostMedia.MEDIA_TYPE_VIDEO)
+
+        for post_media_video in post_media_videos.iterator():
+            post_video = post_media_video.content_object
+            # Converts gifs, probes the video and extracts its thumbnail, all left out of the upload request
+            post_video.process()
+            beat_media_processing_of_post_with_id(post_id=post_id)
+            tasks.convert_video(post_video.file, on_progress=lambda video_format: beat_media_processing_of_post_with_id(
+                post_id=post_id))
+
+        first_media = post.get_first_media()
+
+        if first_media.type == PostMedia.MEDIA_TYPE_VIDEO:
+            first_post_video = first_media.content_object
+            post.media_width = first_post_video.width
+            post.media_height = first_post_video.height
+            post.media_thumbnail = first_post_video.thumbnail.file
+    except Exception as e:
+        logger.error('Failed to process media of post with id: %d: %s' % (post_id, e))
+        _fail_media_processing_of_post(post=post)
+        raise
 
     # This updates the status and created attributes
     post._publish()
+    clear_media_processing_of_post_with_id(post_id=post_id)
     logger.info('Processed media of post with id: %d' % post_id)
 
 
+def _fail_media_processing_of_post(post):
+    """
+    Moves the post back to a draft, for its creator to publish it again, and stops it being taken as interrupted
+    """
+    Post = get_post_model()
+    post.status = Post.STATUS_DRAFT
+    post.save(update_fields=['status', 'modified'])
+    clear_media_processing_of_post_with_id(post_id=post.pk)
+
+
 @job('low')
-def curate_top_posts():
+def resume_interrupted_post_media_processing():
+    """
+    This job should be scheduled to queue again the processing of the media of the posts whose processing job
+    was interrupted by a worker restart. The posts interrupted POST_MEDIA_PROCESSING_MAX_ATTEMPTS times are moved
+    back to drafts instead, their media is likely what kills the worker.
+    """
+    Post = get_post_model()
+
+    processing_posts_ids = Post.objects.filter(status=Post.STATUS_PROCESSING).values_list('id', flat=True)
+    interrupted_posts_ids = get_posts_ids_with_interrupted_media_processing(posts_ids=processing_posts_ids)
+
+    resumed_posts = 0
+    failed_posts = 0
+
+    for post_id in interrupted_posts_ids:
+        attempts = get_media_processing_attempts_of_post_with_id(post_id=post_id)
+
+        if attempts >= settings.POST_MEDIA_PROCESSING_MAX_ATTEMPTS:
+            logger.error('Gave up processing media of post with id: %d' % post_id)
+            _fail_media_processing_of_post(post=Post.objects.get(pk=post_id))
+            failed_posts = failed_posts + 1
+        else:
+            beat_media_processing_of_post_with_id(post_id=post_id)
+            process_post_media.delay(post_id=post_id)
+            resumed_posts = resumed_posts + 1
+
+    return 'Resumed the media processing of %d posts, gave up on %d posts' % (resumed_posts, failed_posts)
+
+
+@job('default')
+def fan_out_post_to_subscribers(post_id):
+    """
+    This job is called after a post is published to notify the subscribers of its creator or community.
+    It notifies one chunk of subscribers and queues itself again for the next one, resuming from the progress.
+    """
+    finished = notify_next_subscribers_chunk_of_post_with_id(post_id=post_id)
+
+    # A post without subscribers or deleted before the job ran has no counts
+    progress = get_subscribers_fan_out_progress_for_post_with_id(post_id=post_id) or {}
+    logger.info('Notified %d subscribers of post with id: %d' % (
+        progress.get('notified_subscribers_count', 0), post_id))
+
+    if not finished:
+        fan_out_post_to_subscribers.delay(post_id=post_id)
+
+
+@job('default')
+def soft_delete_target(target_type, target_id, is_deleted):
+    """
+    This job is called to soft delete or restore the posts and post comments of a big post, community or user.
+    It marks one chunk and queues itself again for the next one, resuming from the progress.
+    """
+    finished = soft_delete_next_chunk_of_target(target_type=target_type, target_id=target_id, is_deleted=is_deleted)
+
+    progress = get_soft_deletion_progress(target_type=target_type, target_id=target_id)
+
+    if progress:
+        logger.info('%s %d posts and %d post comments of %s with id: %d' % (
+            'Soft deleted' if is_deleted else 'Restored', progress.get('posts_count', 0),
+            progress.get('post_comments_count', 0), target_type, target_id))
+
+    if not finished:
+        soft_delete_target.delay(target_type=target_type, target_id=target_id, is_deleted=is_deleted)
+
+
+@job('default')
+def fan_out_post_to_timelines(post_id):
+    """
+    This job is called after a post is published to push it into the materialized timelines of its audience
+    """
+    Post = get_post_model()
+    post = Post.objects.only('id', 'creator_id', 'community_id').get(pk=post_id)
+
+    recipients_ids = get_timeline_recipients_ids_for_post(post=post)
+    add_post_with_id_to_timelines_of_users_with_ids(post_id=post.pk, users_ids=recipients_ids)
+
+    return 'Fanned out post with id: %d' % post_id
+
+
+@job('default')
+def rebuild_timeline_for_user_with_id(user_id):
+    """
+    This job is called to (re)build the materialized timeline of a user whose timeline is cold
+    """
+    User = get_user_model()
+    user = User.objects.get(pk=user_id)
+
+    timeline_posts = user._get_timeline_posts_with_no_filters().order_by('-id')[:settings.TIMELINE_MAX_POSTS]
+    timeline_posts_ids = [timeline_post.pk for timeline_post in timeline_posts]
+
+    set_timeline_posts_ids_for_user_with_id(user_id=user.pk, posts_ids=timeline_posts_ids)
+
+    return 'Rebuilt timeline of user with id: %d with %d posts' % (user_id, len(timeline_posts_ids))
+
+
+@job('low')
+def curate_top_posts(full=False):
     """
     Curates the top posts.
+    Only the posts commented or reacted to since the last run are considered, unless full is True or the last run
+    is unknown.
     This job should be scheduled to be run every n hours.
     """
-    Post = get_post_model()
-    Community = get_community_model()
     PostComment = get_post_comment_model()
-    ModeratedObject = get_moderated_object_model()
-    TopPost = get_top_post_model()
+    PostReaction = get_post_reaction_model()
     logger.info('Processing top posts at %s...' % timezone.now())
 
-    top_posts_community_query = Q(top_post__isnull=True)
-    top_posts_community_query.add(Q(community__isnull=False, community__type=Community.COMMUNITY_TYPE_PUBLIC), Q.AND)
-    top_posts_community_query.add(Q(is_closed=False, is_deleted=False, status=Post.STATUS_PUBLISHED), Q.AND)
-    top_posts_community_query.add(~Q(moderated_object__status=ModeratedObject.STATUS_APPROVED), Q.AND)
+    run_started = timezone.now()
+    run_started_time = time.time()
 
-    top_posts_criteria_query = Q(total_comments_count__gte=settings.MIN_UNIQUE_TOP_POST_COMMENTS_COUNT) | \
-                               Q(reactions_count__gte=settings.MIN_UNIQUE_TOP_POST_REACTIONS_COUNT)
+    watermark = None if full else get_top_posts_curation_watermark()
 
-    posts_select_related = 'community'
-    posts_prefetch_related = ('comments__commenter', 'reactions__reactor')
-    posts_only = ('id', 'status', 'is_deleted', 'is_closed', 'community__type')
+    if watermark is None:
+        candidate_posts_ids = None
+        total_scanned_rows = 0
+    else:
+        # Overlap with the previous run so that rows committed late by long transactions are not missed
+        changes_since = watermark - TOP_POSTS_CURATION_WATERMARK_OVERLAP
 
-    posts = Post.objects. \
-        select_related(posts_select_related). \
-        prefetch_related(*posts_prefetch_related). \
-        only(*posts_only). \
-        filter(top_posts_community_query). \
-        annotate(total_comments_count=Count('comments__commenter_id'),
-                 reactions_count=Count('reactions__reactor_id')). \
-        filter(top_posts_criteria_query)
+        new_comments = PostComment.objects.filter(created__gt=changes_since)
+        new_reactions = PostReaction.objects.filter(created__gt=changes_since)
+
+        # Deduplicated by the database, a busy window only loads one row per post
+        candidate_posts_ids = set(new_comments.values_list('post_id', flat=True).order_by().distinct())
+        candidate_posts_ids.update(new_reactions.values_list('post_id', flat=True).order_by().distinct())
+
+        total_scanned_rows = new_comments.count() + new_reactions.count()
+
+    top_posts_community_query = _make_top_posts_candidates_query()
 
-    top_posts_objects = []
     total_checked_posts = 0
     total_curated_posts = 0
 
-    for post in _chunked_queryset_iterator(posts, 1000):
-        total_checked_posts = total_checked_posts + 1
-        if not post.reactions_count >= settings.MIN_UNIQUE_TOP_POST_REACTIONS_COUNT:
-            unique_comments_count = PostComment.objects.filter(post=post). \
-                values('commenter_id'). \
-                annotate(user_comments_count=Count('commenter_id')).count()
+    for posts_ids in _chunked_top_posts_candidates_ids(query=top_posts_community_query,
+                                                       candidate_posts_ids=candidate_posts_ids, size=1000):
+        total_checked_posts += len(posts_ids)
+        total_scanned_rows += len(posts_ids)
 
-            if unique_comments_count >= settings.MIN_UNIQUE_TOP_POST_COMMENTS_COUNT:
-                top_post = _add_post_to_top_post(post=post)
-                if top_post is not None:
-                    top_posts_objects.append(top_post)
-        else:
-            top_post = _add_post_to_top_post(post=post)
-            if top_post is not None:
-                top_posts_objects.append(top_post)
+        commenters_counts = PostComment.objects.filter(post_id__in=posts_ids). \
+            values('post_id'). \
+            annotate(commenters_count=Count('commenter_id', distinct=True), comments_count=Count('id')). \
+            order_by()
 
-        if len(top_posts_objects) > 1000:
-            TopPost.objects.bulk_create(top_posts_objects)
-            total_curated_posts += len(top_posts_objects)
-            top_posts_objects = []
+        reactors_counts = PostReaction.objects.filter(post_id__in=posts_ids). \
+            values('post_id'). \
+            annotate(reactors_count=Count('reactor_id', distinct=True), reactions_count=Count('id')). \
+            order_by()
 
-    if len(top_posts_objects) > 0:
-        total_curated_posts += len(top_posts_objects)
-        TopPost.objects.bulk_create(top_posts_objects)
+        commenters_count_by_post_id = {}
+        for commenters_count in commenters_counts:
+            commenters_count_by_post_id[commenters_count['post_id']] = commenters_count['commenters_count']
+            total_scanned_rows += commenters_count['comments_count']
 
-    return 'Checked: %d. Curated: %d' % (total_checked_posts, total_curated_posts)
+        reactors_count_by_post_id = {}
+        for reactors_count in reactors_counts:
+            reactors_count_by_post_id[reactors_count['post_id']] = reactors_count['reactors_count']
+            total_scanned_rows += reactors_count['reactions_count']
+
+        top_posts_ids = [post_id for post_id in posts_ids if
+                         reactors_count_by_post_id.get(post_id, 0) >= settings.MIN_UNIQUE_TOP_POST_REACTIONS_COUNT or
+                         commenters_count_by_post_id.get(post_id, 0) >= settings.MIN_UNIQUE_TOP_POST_COMMENTS_COUNT]
+
+        total_curated_posts += _bulk_create_top_posts_for_posts_with_ids(posts_ids=top_posts_ids)
+
+    set_top_posts_curation_watermark(run_started)
+
+    elapsed_seconds = time.time() - run_started_time
+    rows_per_second = total_scanned_rows / elapsed_seconds if elapsed_seconds > 0 else total_scanned_rows
+
+    result = 'Checked: %d. Curated: %d. Scanned: %d rows in %.2fs (%d rows/s)' % (
+        total_checked_posts, total_curated_posts, total_scanned_rows, elapsed_seconds, rows_per_second)
+    logger.info(result)
+
+    return result
 
 
 @job('low')
@@ -191,27 +359,101 @@ def clean_top_posts():
     TopPost.objects.filter(id__in=delete_ids).delete()
 
 
-def _add_post_to_top_post(post):
+def _make_top_posts_candidates_query():
+    """
+    Published public community posts that are not top posts yet
+    """
+    Post = get_post_model()
+    Community = get_community_model()
+    ModeratedObject = get_moderated_object_model()
+
+    top_posts_community_query = Q(top_post__isnull=True)
+    top_posts_community_query.add(Q(community__isnull=False, community__type=Community.COMMUNITY_TYPE_PUBLIC), Q.AND)
+    top_posts_community_query.add(Q(is_closed=False, is_deleted=False, status=Post.STATUS_PUBLISHED), Q.AND)
+    top_posts_community_query.add(~Q(moderated_object__status=ModeratedObject.STATUS_APPROVED), Q.AND)
+
+    return top_posts_community_query
+
+
+def _chunked_top_posts_candidates_ids(query, candidate_posts_ids, size):
+    """
+    Yields chunks of ids of the posts matching the query, restricted to candidate_posts_ids if given
+    """
+    Post = get_post_model()
+
+    if candidate_posts_ids is not None:
+        candidate_posts_ids = sorted(candidate_posts_ids)
+        for chunk_start in range(0, len(candidate_posts_ids), size):
+            chunk_candidate_posts_ids = candidate_posts_ids[chunk_start:chunk_start + size]
+            posts_ids = list(Post.objects.filter(query, id__in=chunk_candidate_posts_ids).values_list('id', flat=True))
+            if posts_ids:
+                yield posts_ids
+        return
+
+    last_post_id = 0
+
+    while True:
+        posts_ids = list(Post.objects.filter(query, id__gt=last_post_id).order_by('id').values_list('id', flat=True)[
+                         :size])
+        if not posts_ids:
+            return
+        yield posts_ids
+        last_post_id = posts_ids[-1]
+
+
+def _bulk_create_top_posts_for_posts_with_ids(posts_ids):
+    """
+    Inserts the missing top posts in one statement, posts that are already top posts are skipped by the database
+    """
+    if not posts_ids:
+        return 0
+
     TopPost = get_top_post_model()
-    if not TopPost.objects.filter(post=post).exists():
-        return TopPost(post=post, created=timezone.now())
-    return None
+    created = timezone.now()
+
+    TopPost.objects.bulk_create([TopPost(post_id=post_id, created=created) for post_id in posts_ids],
+                                ignore_conflicts=True)
+
+    return len(posts_ids)
+
+
+def get_top_posts_curation_watermark():
+    redis = _get_jobs_redis_connection()
+    watermark = redis.get(TOP_POSTS_CURATION_WATERMARK_KEY)
+
+    if watermark is None:
+        return None
+
+    return datetime.fromtimestamp(float(watermark), tz=timezone.utc)
+
+
+def set_top_posts_curation_watermark(watermark):
+    redis = _get_jobs_redis_connection()
+    redis.set(TOP_POSTS_CURATION_WATERMARK_KEY, watermark.timestamp())
+
+
+def _get_jobs_redis_connection():
+    return get_redis_connection('default')
 
 
 @job('low')
 def curate_trending_posts():
     """
     Curates the trending posts.
+    Snapshots the eligible posts with the highest time decayed activity scores into the trending posts.
     This job should be scheduled to be run every n hours.
     """
     Post = get_post_model()
     Community = get_community_model()
     ModeratedObject = get_moderated_object_model()
+    PostReaction = get_post_reaction_model()
     TrendingPost = get_trending_post_model()
     logger.info('Processing trending posts at %s...' % timezone.now())
 
-    trending_posts_query = Q(created__gte=timezone.now() - timedelta(
-        hours=12))
+    posts_scores = get_trending_posts_scores(count=TRENDING_POSTS_COUNT * TRENDING_POSTS_CANDIDATES_FACTOR)
+    candidate_posts_ids = [post_id for post_id, score in posts_scores]
+
+    trending_posts_query = Q(id__in=candidate_posts_ids, created__gte=timezone.now() - timedelta(hours=12))
 
     trending_posts_community_query = Q(community__isnull=False, community__type=Community.COMMUNITY_TYPE_PUBLIC,
                                        status=Post.STATUS_PUBLISHED,
@@ -220,33 +462,33 @@ def curate_trending_posts():
 
     trending_posts_query.add(trending_posts_community_query, Q.AND)
 
-    posts_select_related = 'community'
-    posts_prefetch_related = 'reactions__reactor'
-    posts_only = ('id', 'status', 'is_deleted', 'is_closed', 'community__type')
+    eligible_posts_ids = Post.objects.filter(trending_posts_query).values_list('id', flat=True)
 
-    trending_posts_criteria_query = Q(reactions_count__gte=settings.MIN_UNIQUE_TRENDING_POST_REACTIONS_COUNT)
+    reactions_counts = dict(PostReaction.objects.filter(post_id__in=eligible_posts_ids).values('post_id').annotate(
+        reactions_count=Count('reactor_id')).order_by().values_list('post_id', 'reactions_count'))
 
-    posts = Post.objects. \
-        select_related(posts_select_related). \
-        prefetch_related(posts_prefetch_related). \
-        only(*posts_only). \
-        filter(trending_posts_query). \
-        annotate(reactions_count=Count('reactions__reactor_id')).\
-        filter(trending_posts_criteria_query).\
-        order_by('-reactions_count', '-created')[:30]
+    trending_posts_ids = [post_id for post_id in candidate_posts_ids if
+                          reactions_counts.get(post_id, 0) >= settings.MIN_UNIQUE_TRENDING_POST_REACTIONS_COUNT][
+                         :TRENDING_POSTS_COUNT]
 
-    trending_posts_objects = []
+    # Most trending last, so it gets the highest id and is displayed first
+    trending_posts_ids.reverse()
 
-    for post in posts.iterator():
-        if TrendingPost.objects.filter(post=post).exists():
-            TrendingPost.objects.filter(post=post).delete()
+    latest_trending_posts_ids = list(
+        TrendingPost.objects.order_by('-id').values_list('post_id', flat=True)[:len(trending_posts_ids)])
+    latest_trending_posts_ids.reverse()
 
-        trending_post = TrendingPost(post=post, created=timezone.now())
-        trending_posts_objects.insert(0, trending_post)
+    if trending_posts_ids == latest_trending_posts_ids:
+        return 'Curated: 0 posts, trending posts did not change'
+
+    created = timezone.now()
 
-    TrendingPost.objects.bulk_create(trending_posts_objects)
+    with transaction.atomic():
+        TrendingPost.objects.filter(post_id__in=trending_posts_ids).delete()
+        TrendingPost.objects.bulk_create(
+            [TrendingPost(post_id=post_id, created=created) for post_id in trending_posts_ids])
 
-    return 'Curated: %d posts' % posts.count()
+    return 'Curated: %d posts' % len(trending_posts_ids)
 
 
 @job('low')
@@ -322,14 +564,8 @@ def clean_trending_posts():
     trending_posts_community_query.add(Q(post__status=Post.STATUS_PROCESSING), Q.OR)
     trending_posts_community_query.add(Q(post__moderated_object__status=ModeratedObject.STATUS_APPROVED), Q.OR)
 
-    posts_select_related = 'post__community'
-    posts_only = ('post__id', 'post__status', 'post__is_deleted', 'post__is_closed', 'post__community__type')
-
-    removable_trending_posts = TrendingPost.objects.select_related(posts_select_related). \
-        only(*posts_only). \
-        filter(trending_posts_community_query)
-
-    direct_removable_delete_ids = [trending_post.pk for trending_post in removable_trending_posts]
+    direct_removable_delete_ids = list(TrendingPost.objects.filter(trending_posts_community_query).values_list(
+        'id', flat=True))
 
     # delete posts
     TrendingPost.objects.filter(id__in=direct_removable_delete_ids).delete()
@@ -337,13 +573,10 @@ def clean_trending_posts():
     # Now we filter trending posts that do not meet criteria anymore
     trending_posts_criteria_query = Q(reactions_count__lt=settings.MIN_UNIQUE_TRENDING_POST_REACTIONS_COUNT)
 
-    less_than_min_reactions_trending_posts = TrendingPost.objects.\
-        prefetch_related('post__reactions__reactor'). \
-        only('id'). \
-        annotate(reactions_count=Count('post__reactions__reactor_id')). \
-        filter(trending_posts_criteria_query)
-
-    delete_ids = [trending_post.pk for trending_post in less_than_min_reactions_trending_posts]
+    delete_ids = list(TrendingPost.objects. \
+                      annotate(reactions_count=Count('post__reactions__reactor_id')). \
+                      filter(trending_posts_criteria_query). \
+                      values_list('id', flat=True))
     TrendingPost.objects.filter(id__in=delete_ids).delete()
 
 
@@ -0,0 +1,119 @@
+import io
+import multiprocessing
+import os
+import resource
+import time
+
+from django.core.files.uploadedfile import InMemoryUploadedFile
+from django.core.management.base import BaseCommand
+import logging
+
+from openbook_common.utils.helpers import get_magic, sha256sum, write_in_memory_file_to_disk
+from openbook_common.utils.media_ingestion import ingest_media_file, MIME_SNIFF_SIZE
+
+logger = logging.getLogger(__name__)
+
+magic = get_magic()
+
+# The headers of the synthetic uploads are taken from these so they sniff as the real formats
+MEDIA_HEADERS_FILES = {
+    'image': ('openbook_common/tests/files/test_image_small.jpg', 'image/jpeg', '.jpg'),
+    'video': ('openbook_common/tests/files/test_video.mp4', 'video/mp4', '.mp4'),
+}
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks the wall time and peak RSS of ingesting in memory uploads of several sizes, against the ' \
+           'previous pipeline which read each upload several times. Each run happens in a forked process.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1, 10, 50, 100],
+                            help='The sizes of the uploads in MB')
+        parser.add_argument('--type', choices=MEDIA_HEADERS_FILES.keys(), default='video',
+                            help='The type of media of the uploads')
+        parser.add_argument('--runs', type=int, default=3, help='The amount of times each upload is ingested')
+
+    def handle(self, *args, **options):
+        media_type = options['type']
+        header_file_path, content_type, extension = MEDIA_HEADERS_FILES[media_type]
+
+        with open(header_file_path, 'rb') as header_file:
+            header = header_file.read(MIME_SNIFF_SIZE)
+
+        # Forked so the peak RSS of a run doesn't carry over to the next ones
+        context = multiprocessing.get_context('fork')
+
+        for size in options['sizes']:
+            for pipeline_name, pipeline in (('multiple reads', _ingest_with_multiple_reads),
+                                            ('single pass', _ingest_in_single_pass)):
+                timings = []
+                peak_rss_increases = []
+
+                for run in range(0, options['runs']):
+                    queue = context.Queue()
+                    process = context.Process(target=_measure_ingestion, kwargs={
+                        'pipeline': pipeline, 'size': size * 1024 * 1024, 'header': header,
+                        'content_type': content_type, 'extension': extension, 'queue': queue})
+                    process.start()
+                    wall_time, peak_rss_increase = queue.get()
+                    process.join()
+
+                    timings.append(wall_time)
+                    peak_rss_increases.append(peak_rss_increase)
+
+                logger.info('%s for a %dMB %s. Best: %.2fms. Average: %.2fms. Peak RSS increase: %.1fMB' % (
+                    pipeline_name, size, media_type, min(timings) * 1000, sum(timings) / len(timings) * 1000,
+                    max(peak_rss_increases) / 1024))
+
+
+def _measure_ingestion(pipeline, size, header, content_type, extension, queue):
+    upload = _make_upload(size=size, header=header, content_type=content_type, extension=extension)
+
+    rss_before = _get_current_rss()
+    start = time.monotonic()
+    pipeline(upload)
+    wall_time = time.monotonic() - start
+
+    # Both in KB
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    queue.put((wall_time, peak_rss - rss_before))
+
+
+def _ingest_with_multiple_reads(upload):
+    """
+    What Post.add_media and PostVideo.create_post_media_video used to do before processing the upload
+    """
+    file_mime = magic.from_buffer(upload.read())
+    upload.seek(0)
+    sha256sum(file=upload.file)
+
+    if file_mime.startswith('video/') or file_mime == 'image/gif':
+        in_disk_file = write_in_memory_file_to_disk(upload)
+        os.remove(in_disk_file.name)
+
+
+def _ingest_in_single_pass(upload):
+    ingested_file = ingest_media_file(file=upload)
+    ingested_file.close()
+
+
+def _make_upload(size, header, content_type, extension):
+    content = io.BytesIO()
+    content.write(header[:size])
+
+    # Written in chunks, so making the upload doesn't raise the peak RSS over its size
+    while content.tell() < size:
+        content.write(os.urandom(min(1024 * 1024, size - content.tell())))
+
+    content.seek(0)
+
+    return InMemoryUploadedFile(file=content, field_name='file', name='upload%s' % extension,
+                                content_type=content_type, size=size, charset=None)
+
+
+def _get_current_rss():
+    with open('/proc/self/statm') as statm:
+        resident_pages = int(statm.read().split()[1])
+
+    return resident_pages * os.sysconf('SC_PAGE_SIZE') // 1024
@@ -0,0 +1,125 @@
+import secrets
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+import logging
+
+from openbook_common.utils.model_loaders import get_user_model, get_post_model, get_circle_model, \
+    get_moderated_object_model, get_connection_model
+from openbook_posts.queries import make_circles_posts_query_for_user, make_community_posts_query_for_user
+from openbook_posts.query_collections import get_posts_for_user_collection
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks retrieving the profile posts of a user against the previous DISTINCT based query. ' \
+           'Runs in a transaction that is rolled back, nothing is left behind.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=100000, help='The amount of posts of the profile')
+        parser.add_argument('--count', type=int, default=10, help='The amount of posts per page')
+        parser.add_argument('--runs', type=int, default=5, help='The amount of times each query is timed')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='The amount of posts created at once')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            target_user, source_user = self._make_profile(posts_count=options['posts'],
+                                                          chunk_size=options['chunk_size'])
+
+            Post = get_post_model()
+            middle_post_id = Post.objects.filter(creator_id=target_user.pk).order_by('-id').values_list(
+                'id', flat=True)[options['posts'] // 2]
+
+            for page_name, max_id in (('first page', None), ('middle page', middle_post_id)):
+                for query_name, get_posts in (('distinct', _get_distinct_posts_for_user_collection),
+                                              ('keyset', get_posts_for_user_collection)):
+                    posts = get_posts(target_user=target_user, source_user=source_user, max_id=max_id,
+                                      include_community_posts=True).order_by('-id')[:options['count']]
+
+                    logger.info('Plan of the %s query for the %s:\n%s' % (query_name, page_name, posts.explain()))
+
+                    timings = []
+                    for run in range(0, options['runs']):
+                        start = time.monotonic()
+                        list(posts.all())
+                        timings.append(time.monotonic() - start)
+
+                    logger.info('%s query for the %s. Best: %.2fms. Average: %.2fms' % (
+                        query_name, page_name, min(timings) * 1000, sum(timings) / len(timings) * 1000))
+
+            transaction.set_rollback(True)
+
+    def _make_profile(self, posts_count, chunk_size):
+        User = get_user_model()
+        Post = get_post_model()
+        Circle = get_circle_model()
+
+        target_user = User.create_user(username='benchmark%s' % secrets.token_hex(8), password=secrets.token_hex(16),
+                                       name='Benchmark', is_of_legal_age=True, are_guidelines_accepted=True)
+        source_user = User.create_user(username='benchmark%s' % secrets.token_hex(8), password=secrets.token_hex(16),
+                                       name='Benchmark', is_of_legal_age=True, are_guidelines_accepted=True)
+
+        # Connect them directly, going through the connection requests would send notifications
+        Connection = get_connection_model()
+        connection = Connection.create_connection(user_id=target_user.pk, target_user_id=source_user.pk,
+                                                  circles_ids=[target_user.connections_circle_id])
+        connection.target_connection.circles.add(source_user.connections_circle_id)
+
+        PostCircle = Post.circles.through
+        world_circle_id = Circle.get_world_circle_id()
+        created = timezone.now()
+
+        logger.info('Creating %d posts' % posts_count)
+
+        for chunk_start in range(0, posts_count, chunk_size):
+            chunk_posts_count = min(chunk_size, posts_count - chunk_start)
+            Post.objects.bulk_create([
+                Post(creator_id=target_user.pk, text='Benchmark post', created=created, status=Post.STATUS_PUBLISHED)
+                for i in range(0, chunk_posts_count)])
+
+        posts_ids = Post.objects.filter(creator_id=target_user.pk).values_list('id', flat=True).order_by('id')
+
+        # Half of the posts are public, the other half only for connections
+        posts_circles = [
+            PostCircle(post_id=post_id,
+                       circle_id=world_circle_id if index % 2 else target_user.connections_circle_id)
+            for index, post_id in enumerate(posts_ids)]
+
+        PostCircle.objects.bulk_create(posts_circles, batch_size=chunk_size)
+
+        return target_user, source_user
+
+
+def _get_distinct_posts_for_user_collection(target_user, source_user, max_id=None, include_community_posts=False):
+    """
+    The query get_posts_for_user_collection used to run, kept as the baseline
+    """
+    Post = get_post_model()
+    ModeratedObject = get_moderated_object_model()
+
+    query = Q(creator__username=target_user.username, is_closed=False, is_deleted=False,
+              status=Post.STATUS_PUBLISHED)
+
+    posts_query = make_circles_posts_query_for_user(user=source_user)
+
+    if include_community_posts:
+        posts_query.add(make_community_posts_query_for_user(user=source_user), Q.OR)
+
+    query.add(posts_query, Q.AND)
+
+    if max_id:
+        query.add(Q(id__lt=max_id), Q.AND)
+
+    posts_visibility_exclude_query = Q(
+        Q(moderated_object__reports__reporter_id=source_user.pk) |
+        Q(moderated_object__status=ModeratedObject.STATUS_APPROVED) |
+        Q(creator__blocked_by_users__blocker_id=source_user.pk) | Q(
+            creator__user_blocks__blocked_user_id=source_user.pk) |
+        Q(community__banned_users__id=source_user.pk)
+    )
+
+    return Post.objects.filter(query).exclude(posts_visibility_exclude_query).distinct()
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+import logging
+
+from openbook_common.utils.model_loaders import get_user_model
+from openbook_posts.jobs import rebuild_timeline_for_user_with_id
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the materialized timeline of a user'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', type=str, help='The username of the user to rebuild the timeline for')
+        parser.add_argument('--async', action='store_true', help='Enqueue the rebuild instead of running it in place')
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+
+        username = options.get('username')
+        run_async = options.get('async', False)
+
+        user = User.objects.only('id').get(username=username)
+
+        if run_async:
+            rebuild_timeline_for_user_with_id.delay(user_id=user.pk)
+            logger.info('Enqueued timeline rebuild for user with id: %d' % user.pk)
+        else:
+            result = rebuild_timeline_for_user_with_id(user_id=user.pk)
+            logger.info(result)
@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand
+import logging
+
+from openbook_common.utils.model_loaders import get_post_model, get_post_comment_model
+from openbook_posts.models import PostCounts, PostCommentCounts, PostReactionEmojiCount, \
+    PostCommentReactionEmojiCount
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Builds the reactions emoji counts of the posts and post comments which don\'t have them yet and ' \
+           'repairs the ones that drifted from the reactions. With --check, only reports the drifted counts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Only report the counts that drifted, without building or repairing anything')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='How many posts to check per query')
+
+    def handle(self, *args, **options):
+        chunk_size = options.get('chunk_size')
+        check = options.get('check')
+
+        Post = get_post_model()
+        PostComment = get_post_comment_model()
+
+        if check:
+            # Counts that were never built aren't expected to match yet
+            self._reconcile(name='posts', queryset=Post.objects.filter(counts__reactions_emoji_counts_built=True),
+                            chunk_size=chunk_size,
+                            reconcile=lambda ids: PostReactionEmojiCount.reconcile_counts_for_posts_with_ids(
+                                posts_ids=ids, repair=False))
+            check_post_comments = PostCommentReactionEmojiCount.reconcile_counts_for_post_comments_with_ids
+            self._reconcile(name='post comments',
+                            queryset=PostComment.objects.filter(counts__reactions_emoji_counts_built=True),
+                            chunk_size=chunk_size,
+                            reconcile=lambda ids: check_post_comments(post_comments_ids=ids, repair=False))
+        else:
+            self._reconcile(name='posts', queryset=Post.objects.all(), chunk_size=chunk_size,
+                            reconcile=lambda ids: PostCounts.reconcile_counts_for_posts_with_ids(posts_ids=ids))
+            self._reconcile(name='post comments', queryset=PostComment.objects.all(), chunk_size=chunk_size,
+                            reconcile=lambda ids: PostCommentCounts.reconcile_counts_for_post_comments_with_ids(
+                                post_comments_ids=ids))
+
+    def _reconcile(self, name, queryset, chunk_size, reconcile):
+        logger.info('Reconciling reactions emoji counts of %s' % name)
+
+        last_id = 0
+        checked = 0
+        drifted = 0
+
+        while True:
+            ids = list(queryset.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:chunk_size])
+
+            if not ids:
+                break
+
+            drifted += reconcile(ids)
+            checked += len(ids)
+            last_id = ids[-1]
+
+        logger.info('Checked %d %s, %d counts were missing or had drifted' % (checked, name, drifted))
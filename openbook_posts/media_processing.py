@@ -0,0 +1,75 @@
+from django.conf import settings
+from django_redis import get_redis_connection
+
+
+def make_media_processing_heartbeat_key_for_post_with_id(post_id):
+    return 'ob-api-post-media-processing-%d' % post_id
+
+
+def make_media_processing_attempts_key_for_post_with_id(post_id):
+    return 'ob-api-post-media-processing-attempts-%d' % post_id
+
+
+def beat_media_processing_of_post_with_id(post_id):
+    """
+    Marks the processing of the media of the post as queued or running for POST_MEDIA_PROCESSING_HEARTBEAT_TTL
+    """
+    redis = _get_media_processing_redis_connection()
+    redis.set(make_media_processing_heartbeat_key_for_post_with_id(post_id), 1,
+              ex=settings.POST_MEDIA_PROCESSING_HEARTBEAT_TTL)
+
+
+def clear_media_processing_heartbeat_of_post_with_id(post_id):
+    redis = _get_media_processing_redis_connection()
+    redis.delete(make_media_processing_heartbeat_key_for_post_with_id(post_id))
+
+
+def count_media_processing_attempt_of_post_with_id(post_id):
+    """
+    Counts a run of the processing job of the media of the post, returns the number of runs so far
+    """
+    redis = _get_media_processing_redis_connection()
+    key = make_media_processing_attempts_key_for_post_with_id(post_id)
+
+    pipeline = redis.pipeline()
+    pipeline.incr(key)
+    pipeline.expire(key, settings.POST_MEDIA_PROCESSING_ATTEMPTS_TTL)
+    attempts, _ = pipeline.execute()
+
+    return attempts
+
+
+def get_media_processing_attempts_of_post_with_id(post_id):
+    redis = _get_media_processing_redis_connection()
+    attempts = redis.get(make_media_processing_attempts_key_for_post_with_id(post_id))
+
+    return int(attempts) if attempts else 0
+
+
+def clear_media_processing_of_post_with_id(post_id):
+    """
+    Clears the heartbeat and the attempts of the processing of the media of the post, once it is over
+    """
+    redis = _get_media_processing_redis_connection()
+    redis.delete(make_media_processing_heartbeat_key_for_post_with_id(post_id),
+                 make_media_processing_attempts_key_for_post_with_id(post_id))
+
+
+def get_posts_ids_with_interrupted_media_processing(posts_ids):
+    """
+    Returns the ids of the given processing posts whose processing job stopped beating, because its worker
+    was restarted or killed
+    """
+    posts_ids = list(posts_ids)
+
+    if not posts_ids:
+        return []
+
+    redis = _get_media_processing_redis_connection()
+    heartbeats = redis.mget([make_media_processing_heartbeat_key_for_post_with_id(post_id) for post_id in posts_ids])
+
+    return [post_id for post_id, heartbeat in zip(posts_ids, heartbeats) if heartbeat is None]
+
+
+def _get_media_processing_redis_connection():
+    return get_redis_connection('default')
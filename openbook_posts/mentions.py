@@ -0,0 +1,182 @@
+from django.db.models import Q
+
+from openbook_common.utils.helpers import extract_usernames_from_string
+from openbook_common.utils.model_loaders import get_post_model, get_user_model, get_post_user_mention_model, \
+    get_post_comment_user_mention_model, get_community_membership_model, get_moderated_object_model, \
+    get_community_model, get_circle_model
+from openbook_posts.queries import make_exclude_reported_and_approved_posts_query
+
+
+def process_mentions_of_post(post):
+    """
+    Replaces the mentions of the post with the ones of its text. The mentioned users are resolved and checked
+    for visibility in one query for the whole text and mentioned in bulk.
+    """
+    usernames = extract_usernames_from_string(string=post.text) if post.text else []
+
+    if not usernames:
+        post.user_mentions.all().delete()
+        return
+
+    # Mentions of usernames which are no longer in the text
+    post.user_mentions.exclude(_make_usernames_query(usernames=usernames, prefix='user__')).delete()
+
+    users_query = _make_users_who_can_see_post_query(post=post)
+
+    if users_query is None:
+        return
+
+    User = get_user_model()
+    users_ids = list(User.objects.filter(_make_usernames_query(usernames=usernames)).filter(users_query).exclude(
+        pk=post.creator_id).exclude(post_mentions__post_id=post.pk).values_list('id', flat=True).distinct())
+
+    if users_ids:
+        PostUserMention = get_post_user_mention_model()
+        PostUserMention.bulk_create_post_user_mentions(post=post, users_ids=users_ids)
+
+
+def process_mentions_of_post_comment(post_comment):
+    """
+    Replaces the mentions of the post comment with the ones of its text. Users who will already be notified of
+    the post comment, as the creator of the parent comment or as previous commenters, are not mentioned.
+    """
+    usernames = extract_usernames_from_string(string=post_comment.text)
+
+    if not usernames:
+        post_comment.user_mentions.all().delete()
+        return
+
+    # Mentions of usernames which are no longer in the text
+    post_comment.user_mentions.exclude(_make_usernames_query(usernames=usernames, prefix='user__')).delete()
+
+    users_query = _make_users_who_can_see_post_comment_query(post_comment=post_comment)
+
+    if users_query is None:
+        return
+
+    User = get_user_model()
+    users = User.objects.filter(_make_usernames_query(usernames=usernames)).filter(users_query).exclude(
+        pk=post_comment.commenter_id).exclude(post_comment_mentions__post_comment_id=post_comment.pk)
+
+    if post_comment.parent_comment_id:
+        # The creator of the parent comment and its previous repliers are already alerted of the reply
+        users = users.exclude(pk=post_comment.parent_comment.commenter_id).exclude(
+            posts_comments__parent_comment_id=post_comment.parent_comment_id)
+    else:
+        # The previous commenters of the post are already alerted of the comment
+        users = users.exclude(posts_comments__post_id=post_comment.post_id)
+
+    users_ids = list(users.values_list('id', flat=True).distinct())
+
+    if users_ids:
+        PostCommentUserMention = get_post_comment_user_mention_model()
+        PostCommentUserMention.bulk_create_post_comment_user_mentions(post_comment=post_comment, users_ids=users_ids)
+
+
+def _make_usernames_query(usernames, prefix=''):
+    usernames_query = Q()
+
+    for username in set(username.lower() for username in usernames):
+        usernames_query.add(Q(**{prefix + 'username__iexact': username}), Q.OR)
+
+    return usernames_query
+
+
+def _make_users_who_can_see_post_query(post):
+    """
+    Returns the query of the users who can see the post, as User.can_see_post does for a single one, or None if
+    nobody but its creator can. The creator is left to the caller.
+    """
+    Post = get_post_model()
+
+    if post.is_deleted or post.status != Post.STATUS_PUBLISHED:
+        return None
+
+    # Dont retrieve users who reported the post
+    users_query = ~Q(moderation_reports__moderated_object__posts__id=post.pk)
+
+    if not post.community_id:
+        Circle = get_circle_model()
+
+        if not post.circles.filter(id=Circle.get_world_circle_id()).exists():
+            # Only retrieve users connected to the creator through one of the circles of the post
+            users_query.add(Q(targeted_connections__circles__posts__id=post.pk,
+                              targeted_connections__target_connection__circles__isnull=False), Q.AND)
+
+        users_query.add(_make_exclude_blocked_with_user_with_id_query(user_id=post.creator_id), Q.AND)
+
+        return users_query
+
+    if not Post.objects.filter(make_exclude_reported_and_approved_posts_query(), pk=post.pk).exists():
+        return None
+
+    community = post.community
+
+    # Dont retrieve users banned from the community
+    users_query.add(~Q(banned_of_communities__id=community.pk), Q.AND)
+
+    Community = get_community_model()
+
+    if community.type != Community.COMMUNITY_TYPE_PUBLIC:
+        users_query.add(Q(communities_memberships__community_id=community.pk), Q.AND)
+
+    staff_ids = _get_staff_ids_of_community_with_id(community_id=community.pk)
+
+    if post.is_closed:
+        # Only staff members see closed posts
+        users_query.add(Q(pk__in=staff_ids), Q.AND)
+    elif post.creator_id not in staff_ids:
+        # Don't retrieve users blocked with the creator, except if they're staff members
+        users_query.add(Q(pk__in=staff_ids) | _make_exclude_blocked_with_user_with_id_query(user_id=post.creator_id),
+                        Q.AND)
+
+    return users_query
+
+
+def _make_users_who_can_see_post_comment_query(post_comment):
+    """
+    Returns the query of the users who can see the post comment, as User.can_see_post_comment does for a single
+    one, or None if nobody but the creator of its post can.
+    """
+    if post_comment.is_deleted:
+        return None
+
+    post = post_comment.post
+
+    users_query = _make_users_who_can_see_post_query(post=post)
+
+    if users_query is None:
+        return None
+
+    # Dont retrieve users who reported the post comment
+    users_query.add(~Q(moderation_reports__moderated_object__post_comments__id=post_comment.pk), Q.AND)
+
+    if not post.community_id:
+        users_query.add(_make_exclude_blocked_with_user_with_id_query(user_id=post_comment.commenter_id), Q.AND)
+        return users_query
+
+    staff_ids = _get_staff_ids_of_community_with_id(community_id=post.community_id)
+
+    ModeratedObject = get_moderated_object_model()
+    is_approved = post_comment.moderated_object.filter(status=ModeratedObject.STATUS_APPROVED).exists()
+
+    if is_approved:
+        # Only staff members see reported and approved post comments
+        users_query.add(Q(pk__in=staff_ids), Q.AND)
+    elif post_comment.commenter_id not in staff_ids:
+        # Don't retrieve users blocked with the commenter, except if they're staff members
+        users_query.add(
+            Q(pk__in=staff_ids) | _make_exclude_blocked_with_user_with_id_query(user_id=post_comment.commenter_id),
+            Q.AND)
+
+    return users_query
+
+
+def _make_exclude_blocked_with_user_with_id_query(user_id):
+    return ~Q(user_blocks__blocked_user_id=user_id) & ~Q(blocked_by_users__blocker_id=user_id)
+
+
+def _get_staff_ids_of_community_with_id(community_id):
+    CommunityMembership = get_community_membership_model()
+    return set(CommunityMembership.objects.filter(Q(is_administrator=True) | Q(is_moderator=True),
+                                                  community_id=community_id).values_list('user_id', flat=True))
@@ -0,0 +1,28 @@
+# Generated by Django 2.2.5 on 2020-01-08 10:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('openbook_posts', '0067_merge_20191202_1731'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostCounts',
+            fields=[
+                ('post', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='counts', serialize=False, to='openbook_posts.Post')),
+                ('comments_count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PostCommentCounts',
+            fields=[
+                ('post_comment', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='counts', serialize=False, to='openbook_posts.PostComment')),
+                ('replies_count', models.IntegerField(default=0)),
+            ],
+        ),
+    ]
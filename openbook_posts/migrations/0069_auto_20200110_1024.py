@@ -0,0 +1,18 @@
+# Generated by Django 2.2.5 on 2020-01-10 09:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('openbook_posts', '0068_postcounts_postcommentcounts'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='postreaction',
+            name='created',
+            field=models.DateTimeField(db_index=True, editable=False),
+        ),
+    ]
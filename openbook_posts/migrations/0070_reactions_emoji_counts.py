@@ -0,0 +1,49 @@
+# Generated by Django 2.2.5 on 2020-01-14 11:02
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('openbook_common', '0021_auto_20190917_1806'),
+        ('openbook_posts', '0069_auto_20200110_1024'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='postcounts',
+            name='reactions_emoji_counts_built',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='postcommentcounts',
+            name='reactions_emoji_counts_built',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='PostReactionEmojiCount',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.IntegerField(default=0)),
+                ('emoji', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='openbook_common.Emoji')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reactions_emoji_counts', to='openbook_posts.Post')),
+            ],
+            options={
+                'unique_together': {('post', 'emoji')},
+            },
+        ),
+        migrations.CreateModel(
+            name='PostCommentReactionEmojiCount',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.IntegerField(default=0)),
+                ('emoji', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='openbook_common.Emoji')),
+                ('post_comment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reactions_emoji_counts', to='openbook_posts.PostComment')),
+            ],
+            options={
+                'unique_together': {('post_comment', 'emoji')},
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+from django.db import migrations
+import openbook_common.fields
+import openbook_posts.helpers
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('openbook_posts', '0071_postvideo_unprocessed_thumbnail'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='post',
+            name='media_thumbnail',
+            field=openbook_common.fields.DerivativeImageField(null=True, upload_to=openbook_posts.helpers.upload_to_post_directory, verbose_name='thumbnail'),
+        ),
+        migrations.AlterField(
+            model_name='postimage',
+            name='image',
+            field=openbook_common.fields.DerivativeImageField(height_field='height', null=True, upload_to=openbook_posts.helpers.upload_to_post_image_directory, verbose_name='image', width_field='width'),
+        ),
+        migrations.AlterField(
+            model_name='postimage',
+            name='thumbnail',
+            field=openbook_common.fields.DerivativeImageField(null=True, upload_to=openbook_posts.helpers.upload_to_post_image_directory, verbose_name='thumbnail'),
+        ),
+        migrations.AlterField(
+            model_name='postvideo',
+            name='thumbnail',
+            field=openbook_common.fields.DerivativeImageField(height_field='thumbnail_height', null=True, upload_to=openbook_posts.helpers.upload_to_post_image_directory, verbose_name='thumbnail', width_field='thumbnail_width'),
+        ),
+    ]
@@ -8,17 +8,17 @@ from django.contrib.contenttypes.fields import GenericRelation, GenericForeignKe
 from django.contrib.contenttypes.models import ContentType
 from django.core.files import File
 from django.core.files.storage import default_storage
-from django.core.files.uploadedfile import InMemoryUploadedFile, TemporaryUploadedFile, SimpleUploadedFile
-from django.db import models
-from django.db.models import Q
+from django.db import models, transaction
+from django.db.models import Q, F, DEFERRED
 from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
 from django.db.models import Count
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 import ffmpy
 
 # Create your views here.
 from ordered_model.models import OrderedModel
-from pilkit.processors import ResizeToFit
 from rest_framework.exceptions import ValidationError
 
 from django.conf import settings
@@ -27,31 +27,42 @@ from openbook_posts.validators import post_text_validators, post_comment_text_va
 from video_encoding.backends import get_backend
 from video_encoding.fields import VideoField
 from video_encoding.models import Format
+from video_encoding.utils import get_fieldfile_local_path
 
 from openbook.storage_backends import S3PrivateMediaStorage
 from openbook_auth.models import User
 
+from openbook_common.fields import DerivativeImageField
 from openbook_common.models import Emoji, Language
-from openbook_common.utils.helpers import delete_file_field, sha256sum, extract_usernames_from_string, get_magic, \
-    write_in_memory_file_to_disk, extract_hashtags_from_string
+from openbook_common.utils.helpers import delete_file_field, sha256sum, get_magic
+from openbook_common.utils.media_ingestion import ingest_media_file
 from openbook_common.utils.model_loaders import get_emoji_model, \
     get_circle_model, get_community_model, get_post_comment_notification_model, \
     get_post_comment_reply_notification_model, get_post_reaction_notification_model, get_moderated_object_model, \
     get_post_user_mention_notification_model, get_post_comment_user_mention_notification_model, get_user_model, \
-    get_post_user_mention_model, get_post_comment_user_mention_model, get_community_notifications_subscription_model, \
-    get_community_new_post_notification_model, get_user_new_post_notification_model, \
-    get_hashtag_model, get_user_notifications_subscription_model, get_trending_post_model
-from imagekit.models import ProcessedImageField
+    get_community_notifications_subscription_model, \
+    get_user_notifications_subscription_model, get_trending_post_model, \
+    get_community_membership_model, get_user_block_model, get_connection_model, get_hashtag_public_post_model
 
 from openbook_moderation.models import ModeratedObject
-from openbook_notifications.helpers import send_post_comment_user_mention_push_notification, \
-    send_post_user_mention_push_notification, send_community_new_post_push_notification, \
-    send_user_new_post_push_notification
+from openbook_notifications.helpers import send_post_comment_user_mention_push_notifications, \
+    send_post_user_mention_push_notifications
+from openbook_hashtags.pipeline import link_hashtags_of_text, update_hashtags_images_with_post_with_id
 from openbook_posts.checkers import check_can_be_updated, check_can_add_media, check_can_be_published, \
     check_mimetype_is_supported_media_mimetypes
 from openbook_posts.helpers import upload_to_post_image_directory, upload_to_post_video_directory, \
     upload_to_post_directory
-from openbook_posts.jobs import process_post_media
+from openbook_posts.jobs import process_post_media, fan_out_post_to_timelines, fan_out_post_to_subscribers
+from openbook_posts.media_processing import beat_media_processing_of_post_with_id
+from openbook_posts.mentions import process_mentions_of_post, process_mentions_of_post_comment
+from openbook_posts.queries import make_exclude_community_posts_banned_from_for_user_with_id_query, \
+    make_exclude_blocked_posts_for_user_with_id_query, make_exclude_reported_posts_by_user_with_id_query, \
+    make_exclude_reported_and_approved_posts_query
+from openbook_posts.soft_deletion import start_soft_deletion, SOFT_DELETION_TARGET_POST
+from openbook_posts.subscribers import is_subscribers_fan_out_async, notify_subscribers_of_post_with_id
+from openbook_posts.timelines import is_materialized_timeline_enabled
+from openbook_posts.trending import record_post_published_with_id, record_post_reaction_for_post_with_id, \
+    record_post_comment_for_post_with_id
 
 magic = get_magic()
 from openbook_common.helpers import get_language_for_text
@@ -87,10 +98,9 @@ class Post(models.Model):
     status = models.CharField(blank=False, null=False, choices=STATUSES, default=STATUS_DRAFT, max_length=2)
     media_height = models.PositiveSmallIntegerField(_('media height'), null=True)
     media_width = models.PositiveSmallIntegerField(_('media width'), null=True)
-    media_thumbnail = ProcessedImageField(verbose_name=_('thumbnail'), storage=post_image_storage,
-                                          upload_to=upload_to_post_directory,
-                                          blank=False, null=True, format='JPEG', options={'quality': 30},
-                                          processors=[ResizeToFit(width=512, upscale=False)])
+    media_thumbnail = DerivativeImageField(verbose_name=_('thumbnail'), storage=post_image_storage,
+                                           upload_to=upload_to_post_directory,
+                                           blank=False, null=True, widths=(256, 512))
 
     class Meta:
         index_together = [
@@ -152,7 +162,14 @@ class Post(models.Model):
     @classmethod
     def get_emoji_counts_for_post_with_id(cls, post_id, emoji_id=None, reactor_id=None):
         Emoji = get_emoji_model()
-        return Emoji.get_emoji_counts_for_post_with_id(post_id=post_id, emoji_id=emoji_id, reactor_id=reactor_id)
+
+        if reactor_id:
+            return Emoji.get_emoji_counts_for_post_with_id(post_id=post_id, emoji_id=emoji_id, reactor_id=reactor_id)
+
+        counts_by_emoji_id = PostReactionEmojiCount.get_counts_for_posts_with_ids(posts_ids=[post_id],
+                                                                                  emoji_id=emoji_id).get(post_id, {})
+
+        return Emoji.make_emoji_counts(counts_by_emoji_id=counts_by_emoji_id)
 
     @classmethod
     def get_trending_posts_for_user_with_id(cls, user_id, max_id=None, min_id=None):
@@ -211,14 +228,14 @@ class Post(models.Model):
         For backwards compatibility reasons
         """
         trending_posts_query = cls._get_trending_posts_old_query()
-        trending_posts_query.add(~Q(community__banned_users__id=user_id), Q.AND)
+        trending_posts_query.add(make_exclude_community_posts_banned_from_for_user_with_id_query(user_id=user_id),
+                                 Q.AND)
 
-        trending_posts_query.add(~Q(Q(creator__blocked_by_users__blocker_id=user_id) | Q(
-            creator__user_blocks__blocked_user_id=user_id)), Q.AND)
+        trending_posts_query.add(make_exclude_blocked_posts_for_user_with_id_query(user_id=user_id), Q.AND)
 
-        trending_posts_query.add(~Q(moderated_object__reports__reporter_id=user_id), Q.AND)
+        trending_posts_query.add(make_exclude_reported_posts_by_user_with_id_query(user_id=user_id), Q.AND)
 
-        trending_posts_query.add(~Q(moderated_object__status=ModeratedObject.STATUS_APPROVED), Q.AND)
+        trending_posts_query.add(make_exclude_reported_and_approved_posts_query(), Q.AND)
 
         return cls._get_trending_posts_old_with_query(query=trending_posts_query)
 
@@ -280,70 +297,75 @@ class Post(models.Model):
 
     @classmethod
     def get_community_notification_target_subscriptions(cls, post):
-        CommunityNotificationsSubscription = get_community_notifications_subscription_model()
-
-        community_subscriptions_query = Q(community=post.community, new_post_notifications=True)
-
-        exclude_blocked_users_query = Q(Q(subscriber__blocked_by_users__blocker_id=post.creator.pk) | Q(
-            subscriber__user_blocks__blocked_user_id=post.creator.pk))
-        community_members_query = Q(subscriber__communities_memberships__community_id=post.community.pk)
-        exclude_self_query = ~Q(subscriber=post.creator)
+        """
+        Subscriptions to the community of the post, excluding its creator and the users blocked by or blocking
+        the creator or banned from the community, unless they are staff of the community.
 
-        # Exclude banned users
-        exclude_blocked_users_query.add(Q(subscriber__banned_of_communities__id=post.community.pk), Q.OR)
+        Every condition is a semi join, each subscription matches once and can be paginated by id.
+        """
+        CommunityNotificationsSubscription = get_community_notifications_subscription_model()
+        CommunityMembership = get_community_membership_model()
+        Community = get_community_model()
+        UserBlock = get_user_block_model()
 
-        # Subscriptions after excluding blocked users
-        target_subscriptions_excluding_blocked = CommunityNotificationsSubscription.objects. \
-            filter(community_subscriptions_query &
-                   community_members_query &
-                   exclude_self_query
-                   ). \
-            exclude(exclude_blocked_users_query)
+        community_members_ids = CommunityMembership.objects.filter(community_id=post.community_id).values('user_id')
 
-        staff_members_query = Q(subscriber__communities_memberships__community_id=post.community.pk,
-                                subscriber__communities_memberships__is_administrator=True) | \
-                              Q(subscriber__communities_memberships__community_id=post.community.pk,
-                                subscriber__communities_memberships__is_moderator=True)
+        community_staff_ids = CommunityMembership.objects.filter(
+            Q(is_administrator=True) | Q(is_moderator=True),
+            community_id=post.community_id).values('user_id')
 
-        # Subscriptions from staff of community
-        target_subscriptions_with_staff = CommunityNotificationsSubscription.objects. \
-            filter(community_subscriptions_query &
-                   community_members_query &
-                   staff_members_query &
-                   exclude_self_query
-                   )
+        excluded_subscribers_query = Q(
+            subscriber_id__in=UserBlock.objects.filter(blocker_id=post.creator_id).values('blocked_user_id')) | Q(
+            subscriber_id__in=UserBlock.objects.filter(blocked_user_id=post.creator_id).values('blocker_id')) | Q(
+            subscriber_id__in=Community.banned_users.through.objects.filter(community_id=post.community_id).values(
+                'user_id'))
 
-        results = target_subscriptions_excluding_blocked.union(target_subscriptions_with_staff)
+        # Staff members are notified even if blocked or banned
+        excluded_subscribers_query.add(~Q(subscriber_id__in=community_staff_ids), Q.AND)
 
-        return results
+        return CommunityNotificationsSubscription.objects.filter(
+            community_id=post.community_id,
+            new_post_notifications=True,
+            subscriber_id__in=community_members_ids,
+        ).exclude(subscriber_id=post.creator_id).exclude(excluded_subscribers_query)
 
     @classmethod
     def get_user_notification_target_subscriptions(cls, post):
-        UserNotificationsSubscription = get_user_notifications_subscription_model()
+        """
+        Subscriptions to the creator of the post which can see it, excluding the users blocked by or blocking
+        the creator.
 
-        user_subscriptions_query = Q(user=post.creator, new_post_notifications=True)
+        Every condition is a semi join, each subscription matches once and can be paginated by id.
+        """
+        UserNotificationsSubscription = get_user_notifications_subscription_model()
+        UserBlock = get_user_block_model()
+        Connection = get_connection_model()
 
-        exclude_blocked_users_query = Q(Q(subscriber__blocked_by_users__blocker_id=post.creator.pk) | Q(
-            subscriber__user_blocks__blocked_user_id=post.creator.pk))
-        exclude_self_query = ~Q(subscriber=post.creator)
+        user_subscriptions_query = Q(user_id=post.creator_id, new_post_notifications=True)
 
         if post.is_encircled_post():
             circle_ids = [circle.pk for circle in post.circles.all()]
-            post_circles_query = Q(subscriber__connections__target_connection__circles__in=circle_ids)
-            user_subscriptions_query.add(post_circles_query, Q.AND)
+            # Connected into one of the circles of the post
+            user_subscriptions_query.add(Q(subscriber_id__in=Connection.objects.filter(
+                target_connection__circles__id__in=circle_ids).values('user_id')), Q.AND)
 
-        user_subscriptions_query.add(exclude_self_query, Q.AND)
+        exclude_blocked_users_query = Q(
+            subscriber_id__in=UserBlock.objects.filter(blocker_id=post.creator_id).values('blocked_user_id')) | Q(
+            subscriber_id__in=UserBlock.objects.filter(blocked_user_id=post.creator_id).values('blocker_id'))
 
-        # Subscriptions after excluding blocked users
-        target_subscriptions = UserNotificationsSubscription.objects. \
-            filter(user_subscriptions_query). \
+        return UserNotificationsSubscription.objects.filter(user_subscriptions_query). \
+            exclude(subscriber_id=post.creator_id). \
             exclude(exclude_blocked_users_query)
 
-        return target_subscriptions
-
     def count_comments(self):
         return PostComment.count_comments_for_post_with_id(self.pk)
 
+    def get_comments_count(self):
+        """
+        Same result as count_comments, read from the denormalized counters
+        """
+        return PostCounts.get_counts_for_post_with_id(post_id=self.pk).comments_count
+
     def count_comments_with_user(self, user):
         # Count comments excluding users blocked by authenticated user
         count_query = ~Q(Q(commenter__blocked_by_users__blocker_id=user.pk) | Q(
@@ -437,64 +459,35 @@ class Post(models.Model):
     def add_media(self, file, order=None):
         check_can_add_media(post=self)
 
-        is_in_memory_file = isinstance(file, InMemoryUploadedFile) or isinstance(file, SimpleUploadedFile)
-
-        if is_in_memory_file:
-            file_mime = magic.from_buffer(file.read())
-        elif isinstance(file, TemporaryUploadedFile):
-            file_mime = magic.from_file(file.temporary_file_path())
-        else:
-            file_mime = magic.from_file(file.name)
-
-        check_mimetype_is_supported_media_mimetypes(file_mime)
-        # Mime check moved pointer
-        file.seek(0)
-
-        file_mime_types = file_mime.split('/')
-
-        file_mime_type = file_mime_types[0]
-        file_mime_subtype = file_mime_types[1]
-
-        temp_files_to_close = []
+        # Reads the upload once, hashing it. Videos and gifs are processed from the storage by process_post_media
+        ingested_file = ingest_media_file(file=file, check_mime=check_mimetype_is_supported_media_mimetypes,
+                                          spool=False)
 
-        if file_mime_subtype == 'gif':
-            if is_in_memory_file:
-                file = write_in_memory_file_to_disk(file)
+        try:
+            self._add_ingested_media(ingested_file=ingested_file, order=order)
+        finally:
+            ingested_file.close()
 
-            temp_dir = tempfile.gettempdir()
-            converted_gif_file_name = os.path.join(temp_dir, str(uuid.uuid4()) + '.mp4')
-
-            ff = ffmpy.FFmpeg(
-                inputs={file.temporary_file_path() if hasattr(file, 'temporary_file_path') else file.name: None},
-                outputs={converted_gif_file_name: None})
-            ff.run()
-            converted_gif_file = open(converted_gif_file_name, 'rb')
-            temp_files_to_close.append(converted_gif_file)
-            file = File(file=converted_gif_file)
-            file_mime_type = 'video'
+    def _add_ingested_media(self, ingested_file, order):
+        file = ingested_file.file
+        file_hash = ingested_file.hash
 
         has_other_media = self.media.exists()
 
-        if file_mime_type == 'image':
-            post_image = self._add_media_image(image=file, order=order)
+        if ingested_file.mime_subtype == 'gif' or ingested_file.mime_type == 'video':
+            # The dimensions and thumbnail of the post are set once the video is processed
+            self._add_media_video(video=file, order=order, hash=file_hash)
+        elif ingested_file.mime_type == 'image':
+            post_image = self._add_media_image(image=file, order=order, hash=file_hash)
             if not has_other_media:
                 self.media_width = post_image.width
                 self.media_height = post_image.height
                 self.media_thumbnail = file
-        elif file_mime_type == 'video':
-            post_video = self._add_media_video(video=file, order=order)
-            if not has_other_media:
-                self.media_width = post_video.width
-                self.media_height = post_video.height
-                self.media_thumbnail = post_video.thumbnail.file
         else:
             raise ValidationError(
                 _('Unsupported media file type')
             )
 
-        for file_to_close in temp_files_to_close:
-            file_to_close.close()
-
         self.save()
 
     def get_first_media(self):
@@ -503,11 +496,11 @@ class Post(models.Model):
     def get_first_media_image(self):
         return self.media.filter(type=PostMedia.MEDIA_TYPE_IMAGE).first()
 
-    def _add_media_image(self, image, order):
-        return PostImage.create_post_media_image(image=image, post_id=self.pk, order=order)
+    def _add_media_image(self, image, order, hash=None):
+        return PostImage.create_post_media_image(image=image, post_id=self.pk, order=order, hash=hash)
 
-    def _add_media_video(self, video, order):
-        return PostVideo.create_post_media_video(file=video, post_id=self.pk, order=order)
+    def _add_media_video(self, video, order, hash=None):
+        return PostVideo.create_post_media_video(file=video, post_id=self.pk, order=order, hash=hash)
 
     def count_media(self):
         return self.media.count()
@@ -519,6 +512,8 @@ class Post(models.Model):
             # After finishing, this will call _publish()
             self.status = Post.STATUS_PROCESSING
             self.save()
+            # Keeps the queued job from being taken as interrupted
+            beat_media_processing_of_post_with_id(post_id=self.pk)
             process_post_media.delay(post_id=self.pk)
         else:
             self._publish()
@@ -526,8 +521,21 @@ class Post(models.Model):
     def _publish(self):
         self.status = Post.STATUS_PUBLISHED
         self.created = timezone.now()
-        self._process_post_subscribers()
         self.save()
+        self._process_post_subscribers()
+
+        if is_materialized_timeline_enabled():
+            post_id = self.pk
+            transaction.on_commit(lambda: fan_out_post_to_timelines.delay(post_id=post_id))
+
+        if self.community_id:
+            record_post_published_with_id(post_id=self.pk)
+
+        # The media of the post can be added after its hashtags were linked
+        if self.hashtags.exists():
+            HashtagPublicPost = get_hashtag_public_post_model()
+            HashtagPublicPost.index_posts_with_ids(posts_ids=[self.pk])
+            update_hashtags_images_with_post_with_id(post_id=self.pk)
 
     def is_draft(self):
         return self.status == Post.STATUS_DRAFT
@@ -538,6 +546,13 @@ class Post(models.Model):
     def has_media(self):
         return self.media.exists()
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        post = super(Post, cls).from_db(db, field_names, values)
+        # Saves which don't change the loaded text skip processing its hashtags
+        post._hashtags_text = dict(zip(field_names, values)).get('text', DEFERRED)
+        return post
+
     def save(self, *args, **kwargs):
         ''' On create, update timestamps '''
         if not self.id and not self.created:
@@ -545,10 +560,14 @@ class Post(models.Model):
 
         self.modified = timezone.now()
 
+        hashtags_text_changed = self._state.adding or getattr(self, '_hashtags_text', DEFERRED) != self.text
+
         post = super(Post, self).save(*args, **kwargs)
 
         self._process_post_mentions()
-        self._process_post_hashtags()
+
+        if hashtags_text_changed:
+            self._process_post_hashtags()
 
         return post
 
@@ -558,20 +577,25 @@ class Post(models.Model):
 
     def delete_media(self):
         if self.has_image():
-            delete_file_field(self.image.image)
+            self.image.delete_media()
+
+        for post_media in self.media.all():
+            post_media.content_object.delete_media()
+
+        # A copy of the first media, with derivatives of its own
+        delete_file_field(self.media_thumbnail)
+        self.media_thumbnail = None
+        Post.objects.filter(pk=self.pk).update(media_thumbnail=None)
 
     def soft_delete(self):
-        self.delete_notifications()
-        for comment in self.comments.all().iterator():
-            comment.soft_delete()
         self.is_deleted = True
         self.save()
+        start_soft_deletion(target_type=SOFT_DELETION_TARGET_POST, target_id=self.pk, is_deleted=True)
 
     def unsoft_delete(self):
         self.is_deleted = False
-        for comment in self.comments.all().iterator():
-            comment.unsoft_delete()
         self.save()
+        start_soft_deletion(target_type=SOFT_DELETION_TARGET_POST, target_id=self.pk, is_deleted=False)
 
     def delete_notifications(self):
         # Remove all post comment notifications
@@ -626,78 +650,27 @@ class Post(models.Model):
         return result
 
     def _process_post_mentions(self):
-        if not self.text:
-            self.user_mentions.all().delete()
-        else:
-            usernames = extract_usernames_from_string(string=self.text)
-            if not usernames:
-                self.user_mentions.all().delete()
-            else:
-                existing_mention_usernames = []
-                for existing_mention in self.user_mentions.only('id', 'user__username').all().iterator():
-                    existing_mention_username = existing_mention.user.username.lower()
-                    if existing_mention_username not in usernames:
-                        existing_mention.delete()
-                    else:
-                        existing_mention_usernames.append(existing_mention_username)
-
-                PostUserMention = get_post_user_mention_model()
-                User = get_user_model()
-
-                for username in usernames:
-                    username = username.lower()
-                    if username not in existing_mention_usernames:
-                        try:
-                            user = User.objects.only('id', 'username').get(username__iexact=username)
-                            user_is_post_creator = user.pk == self.creator_id
-                            if user.can_see_post(post=self) and not user_is_post_creator:
-                                PostUserMention.create_post_user_mention(user=user, post=self)
-                                existing_mention_usernames.append(username)
-                        except User.DoesNotExist:
-                            pass
+        process_mentions_of_post(post=self)
 
     def _process_post_hashtags(self):
-        if not self.text:
-            self.hashtags.all().delete()
-        else:
-            hashtags = extract_hashtags_from_string(string=self.text)
-            if not hashtags:
-                self.hashtags.all().delete()
-            else:
-                existing_hashtags = []
-                for existing_hashtag in self.hashtags.only('id', 'name').all().iterator():
-                    if existing_hashtag.name not in hashtags:
-                        self.hashtags.remove(existing_hashtag)
-                    else:
-                        existing_hashtags.append(existing_hashtag.name)
-
-                Hashtag = get_hashtag_model()
-
-                for hashtag in hashtags:
-                    hashtag = hashtag.lower()
-                    hashtag_obj = Hashtag.get_or_create_hashtag(name=hashtag, post=self)
-                    if hashtag not in existing_hashtags:
-                        self.hashtags.add(hashtag_obj)
+        linked_hashtags_ids = link_hashtags_of_text(hashtags_manager=self.hashtags, text=self.text)
+        self._hashtags_text = self.text
+
+        # Drafts are indexed once published
+        if self.status == Post.STATUS_PUBLISHED:
+            HashtagPublicPost = get_hashtag_public_post_model()
+            HashtagPublicPost.index_posts_with_ids(posts_ids=[self.pk])
+
+        if linked_hashtags_ids:
+            update_hashtags_images_with_post_with_id(post_id=self.pk)
 
     def _process_post_subscribers(self):
-        if self.community:
-            CommunityNewPostNotification = get_community_new_post_notification_model()
-            community_subscriptions = Post.get_community_notification_target_subscriptions(post=self)
-
-            for subscription in community_subscriptions:
-                CommunityNewPostNotification.create_community_new_post_notification(
-                    post_id=self.pk,
-                    owner_id=subscription.subscriber.pk, community_notifications_subscription_id=subscription.pk)
-                send_community_new_post_push_notification(community_notifications_subscription=subscription)
-        else:
-            UserNewPostNotification = get_user_new_post_notification_model()
-            user_subscriptions = Post.get_user_notification_target_subscriptions(post=self)
+        post_id = self.pk
 
-            for subscription in user_subscriptions:
-                UserNewPostNotification.create_user_new_post_notification(
-                    post_id=self.pk, owner_id=subscription.subscriber.pk,
-                    user_notifications_subscription_id=subscription.pk)
-                send_user_new_post_push_notification(user_notifications_subscription=subscription, post=self)
+        if is_subscribers_fan_out_async():
+            transaction.on_commit(lambda: fan_out_post_to_subscribers.delay(post_id=post_id))
+        else:
+            notify_subscribers_of_post_with_id(post_id=post_id)
 
 
 class TopPost(models.Model):
@@ -770,19 +743,17 @@ class PostMedia(OrderedModel):
 
 class PostImage(models.Model):
     post = models.OneToOneField(Post, on_delete=models.CASCADE, related_name='image', null=True)
-    image = ProcessedImageField(verbose_name=_('image'), storage=post_image_storage,
-                                upload_to=upload_to_post_image_directory,
-                                width_field='width',
-                                height_field='height',
-                                blank=False, null=True, format='JPEG', options={'quality': 80},
-                                processors=[ResizeToFit(width=1024, upscale=False)])
+    image = DerivativeImageField(verbose_name=_('image'), storage=post_image_storage,
+                                 upload_to=upload_to_post_image_directory,
+                                 width_field='width',
+                                 height_field='height',
+                                 blank=False, null=True, widths=(320, 640, 1024))
     width = models.PositiveIntegerField(editable=False, null=False, blank=False)
     height = models.PositiveIntegerField(editable=False, null=False, blank=False)
     hash = models.CharField(_('hash'), max_length=64, blank=False, null=True)
-    thumbnail = ProcessedImageField(verbose_name=_('thumbnail'), storage=post_image_storage,
-                                    upload_to=upload_to_post_image_directory,
-                                    blank=False, null=True, format='JPEG', options={'quality': 30},
-                                    processors=[ResizeToFit(width=1024, upscale=False)])
+    thumbnail = DerivativeImageField(verbose_name=_('thumbnail'), storage=post_image_storage,
+                                     upload_to=upload_to_post_image_directory,
+                                     blank=False, null=True, widths=(256, 512))
 
     media = GenericRelation(PostMedia)
 
@@ -792,14 +763,21 @@ class PostImage(models.Model):
         return cls.objects.create(image=image, post_id=post_id, hash=hash)
 
     @classmethod
-    def create_post_media_image(cls, image, post_id, order):
-        hash = sha256sum(file=image.file)
+    def create_post_media_image(cls, image, post_id, order, hash=None):
+        if hash is None:
+            hash = sha256sum(file=image.file)
         post_image = cls.objects.create(image=image, post_id=post_id, hash=hash, thumbnail=image)
         PostMedia.create_post_media(type=PostMedia.MEDIA_TYPE_IMAGE,
                                     content_object=post_image,
                                     post_id=post_id, order=order)
         return post_image
 
+    def delete_media(self):
+        delete_file_field(self.image)
+        delete_file_field(self.thumbnail)
+        # Cleared without assigning None to image, its width and height are not nullable. Its hash is kept.
+        PostImage.objects.filter(pk=self.pk).update(image=None, thumbnail=None)
+
 
 class PostVideo(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='videos', null=True)
@@ -812,41 +790,102 @@ class PostVideo(models.Model):
     height = models.PositiveIntegerField(editable=False, null=True)
     duration = models.FloatField(editable=False, null=True)
 
+    # Probed by process(), off the request
     file = VideoField(width_field='width', height_field='height',
-                      duration_field='duration', storage=post_image_storage,
+                      duration_field='duration', storage=post_image_storage, probe=False,
                       upload_to=upload_to_post_video_directory, blank=False, null=True)
 
     format_set = GenericRelation(Format)
 
-    thumbnail = ProcessedImageField(verbose_name=_('thumbnail'), storage=post_image_storage,
-                                    upload_to=upload_to_post_image_directory,
-                                    width_field='thumbnail_width',
-                                    height_field='thumbnail_height',
-                                    blank=False, null=True, format='JPEG', options={'quality': 30},
-                                    processors=[ResizeToFit(width=1024, upscale=False)])
+    thumbnail = DerivativeImageField(verbose_name=_('thumbnail'), storage=post_image_storage,
+                                     upload_to=upload_to_post_image_directory,
+                                     width_field='thumbnail_width',
+                                     height_field='thumbnail_height',
+                                     blank=False, null=True, widths=(256, 512))
 
-    thumbnail_width = models.PositiveIntegerField(editable=False, null=False, blank=False)
-    thumbnail_height = models.PositiveIntegerField(editable=False, null=False, blank=False)
+    thumbnail_width = models.PositiveIntegerField(editable=False, null=True)
+    thumbnail_height = models.PositiveIntegerField(editable=False, null=True)
 
     @classmethod
-    def create_post_media_video(cls, file, post_id, order):
-        hash = sha256sum(file=file.file)
-        video_backend = get_backend()
-
-        if isinstance(file, InMemoryUploadedFile):
-            # If its in memory, doing read shouldn't be an issue as the file should be small.
-            in_disk_file = write_in_memory_file_to_disk(file)
-            thumbnail_path = video_backend.get_thumbnail(video_path=in_disk_file.name, at_time=0.0)
-        else:
-            thumbnail_path = video_backend.get_thumbnail(video_path=file.file.name, at_time=0.0)
+    def create_post_media_video(cls, file, post_id, order, hash=None):
+        """
+        Stores the file as uploaded, it is converted, probed and thumbnailed by process()
+        """
+        if hash is None:
+            hash = sha256sum(file=file.file)
 
-        with open(thumbnail_path, 'rb+') as thumbnail_file:
-            post_video = cls.objects.create(file=file, post_id=post_id, hash=hash, thumbnail=File(thumbnail_file), )
+        post_video = cls.objects.create(file=file, post_id=post_id, hash=hash)
         PostMedia.create_post_media(type=PostMedia.MEDIA_TYPE_VIDEO,
                                     content_object=post_video,
                                     post_id=post_id, order=order)
         return post_video
 
+    def delete_media(self):
+        delete_file_field(self.thumbnail)
+        self.thumbnail = None
+        self.save()
+
+    def is_processed(self):
+        return self.duration is not None and bool(self.thumbnail)
+
+    def process(self):
+        """
+        Converts a gif to mp4, probes the dimensions and duration of the video and extracts its thumbnail.
+        Videos processed before an interruption are skipped.
+        """
+        if self.is_processed():
+            return
+
+        local_path, local_temp_file = get_fieldfile_local_path(fieldfile=self.file)
+        converted_gif_file_name = None
+        thumbnail_path = None
+
+        try:
+            if magic.from_file(local_path) == 'image/gif':
+                converted_gif_file_name = os.path.join(tempfile.gettempdir(), str(uuid.uuid4()) + '.mp4')
+
+                ff = ffmpy.FFmpeg(
+                    inputs={local_path: None},
+                    outputs={converted_gif_file_name: None})
+                ff.run()
+
+                self._replace_file(path=converted_gif_file_name)
+                local_path = converted_gif_file_name
+
+            video_backend = get_backend()
+
+            media_info = video_backend.get_media_info(video_path=local_path)
+            self.width = media_info['width']
+            self.height = media_info['height']
+            self.duration = media_info['duration']
+
+            thumbnail_path = video_backend.get_thumbnail(video_path=local_path, at_time=0.0)
+
+            with open(thumbnail_path, 'rb') as thumbnail_file:
+                self.thumbnail.save(os.path.basename(thumbnail_path), File(thumbnail_file), save=False)
+
+            self.save()
+        finally:
+            if local_temp_file:
+                local_temp_file.close()
+                os.remove(local_temp_file.name)
+            if converted_gif_file_name and os.path.exists(converted_gif_file_name):
+                os.remove(converted_gif_file_name)
+            if thumbnail_path:
+                os.remove(thumbnail_path)
+
+    def _replace_file(self, path):
+        previous_file_name = self.file.name
+
+        with open(path, 'rb') as file:
+            self.file.save(os.path.basename(path), File(file), save=False)
+
+        # The hash is the one of the converted video
+        self.hash = sha256sum(filename=path)
+        self.save()
+
+        self.file.storage.delete(previous_file_name)
+
 
 class PostComment(models.Model):
     moderated_object = GenericRelation(ModeratedObject, related_query_name='post_comments')
@@ -869,6 +908,9 @@ class PostComment(models.Model):
         post_comment.language = get_language_for_text(text)
         post_comment.save()
 
+        if post.community_id:
+            record_post_comment_for_post_with_id(post_id=post.pk)
+
         return post_comment
 
     @classmethod
@@ -879,12 +921,24 @@ class PostComment(models.Model):
 
     @classmethod
     def get_emoji_counts_for_post_comment_with_id(cls, post_comment_id, emoji_id=None, reactor_id=None):
-        return Emoji.get_emoji_counts_for_post_comment_with_id(post_comment_id=post_comment_id, emoji_id=emoji_id,
-                                                               reactor_id=reactor_id)
+        if reactor_id:
+            return Emoji.get_emoji_counts_for_post_comment_with_id(post_comment_id=post_comment_id,
+                                                                   emoji_id=emoji_id, reactor_id=reactor_id)
+
+        counts_by_emoji_id = PostCommentReactionEmojiCount.get_counts_for_post_comments_with_ids(
+            post_comments_ids=[post_comment_id], emoji_id=emoji_id).get(post_comment_id, {})
+
+        return Emoji.make_emoji_counts(counts_by_emoji_id=counts_by_emoji_id)
 
     def count_replies(self):
         return self.replies.count()
 
+    def get_replies_count(self):
+        """
+        Same result as count_replies, read from the denormalized counters
+        """
+        return PostCommentCounts.get_counts_for_post_comment_with_id(post_comment_id=self.pk).replies_count
+
     def count_replies_with_user(self, user):
         # Count replies excluding users blocked by authenticated user
         count_query = ~Q(Q(commenter__blocked_by_users__blocker_id=user.pk) | Q(
@@ -922,6 +976,13 @@ class PostComment(models.Model):
     def react(self, reactor, emoji_id):
         return PostCommentReaction.create_reaction(reactor=reactor, emoji_id=emoji_id, post_comment=self)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        post_comment = super(PostComment, cls).from_db(db, field_names, values)
+        # Saves which don't change the loaded text skip processing its hashtags
+        post_comment._hashtags_text = dict(zip(field_names, values)).get('text', DEFERRED)
+        return post_comment
+
     def save(self, *args, **kwargs):
         ''' On save, update timestamps '''
         if not self.id:
@@ -931,84 +992,23 @@ class PostComment(models.Model):
 
         self.full_clean(exclude=['language'])
 
+        hashtags_text_changed = self._state.adding or getattr(self, '_hashtags_text', DEFERRED) != self.text
+
         post_comment = super(PostComment, self).save(*args, **kwargs)
 
         self._process_post_comment_mentions()
-        self._process_post_comment_hashtags()
+
+        if hashtags_text_changed:
+            self._process_post_comment_hashtags()
 
         return post_comment
 
     def _process_post_comment_mentions(self):
-        usernames = extract_usernames_from_string(string=self.text)
-
-        if not usernames:
-            self.user_mentions.all().delete()
-        else:
-            existing_mention_usernames = []
-            for existing_mention in self.user_mentions.only('id', 'user__username').all().iterator():
-                existing_mention_username = existing_mention.user.username.lower()
-                if existing_mention_username not in usernames:
-                    existing_mention.delete()
-                else:
-                    existing_mention_usernames.append(existing_mention_username)
-
-            PostCommentUserMention = get_post_comment_user_mention_model()
-            User = get_user_model()
-
-            for username in usernames:
-                username = username.lower()
-                if username not in existing_mention_usernames:
-                    try:
-                        user = User.objects.only('id', 'username').get(username__iexact=username)
-                        user_can_see_post_comment = user.can_see_post_comment(post_comment=self)
-                        user_is_commenter = user.pk == self.commenter_id
-
-                        if not user_can_see_post_comment or user_is_commenter:
-                            continue
-
-                        if self.parent_comment:
-                            user_is_parent_comment_creator = self.parent_comment.commenter_id == user.pk
-                            user_has_replied_before = self.parent_comment.replies.filter(commenter_id=user.pk).exists()
-
-                            if user_has_replied_before or user_is_parent_comment_creator:
-                                # Its a reply to a comment, if the user previously replied to the comment
-                                # or if he's the creator of the parent comment he will already be alerted of the reply,
-                                # no need for mention
-                                continue
-                        else:
-                            user_has_commented_before = self.post.comments.filter(commenter_id=user.pk).exists()
-                            if user_has_commented_before:
-                                # Its a comment to a post, if the user previously commented on the post
-                                # he will already be alerted of the comment, no need for mention
-                                continue
-
-                        PostCommentUserMention.create_post_comment_user_mention(user=user, post_comment=self)
-                        existing_mention_usernames.append(username)
-                    except User.DoesNotExist:
-                        pass
+        process_mentions_of_post_comment(post_comment=self)
 
     def _process_post_comment_hashtags(self):
-        if not self.text:
-            self.hashtags.all().delete()
-        else:
-            hashtags = extract_hashtags_from_string(string=self.text)
-            if not hashtags:
-                self.hashtags.all().delete()
-            else:
-                existing_hashtags = []
-                for existing_hashtag in self.hashtags.only('id', 'name').all().iterator():
-                    if existing_hashtag.name not in hashtags:
-                        self.hashtags.remove(existing_hashtag)
-                    else:
-                        existing_hashtags.append(existing_hashtag.name)
-
-                Hashtag = get_hashtag_model()
-
-                for hashtag in hashtags:
-                    hashtag = hashtag.lower()
-                    if hashtag not in existing_hashtags:
-                        hashtag_obj = Hashtag.get_or_create_hashtag(name=hashtag)
-                        self.hashtags.add(hashtag_obj)
+        link_hashtags_of_text(hashtags_manager=self.hashtags, text=self.text)
+        self._hashtags_text = self.text
 
     def update_comment(self, text):
         self.text = text
@@ -1017,14 +1017,22 @@ class PostComment(models.Model):
         self.save()
 
     def soft_delete(self):
+        was_deleted = self.is_deleted
         self.is_deleted = True
         self.delete_notifications()
         self.save()
 
+        if not was_deleted and not self.parent_comment_id:
+            PostCounts.update_count_for_post_with_id(post_id=self.post_id, count_name='comments_count', amount=-1)
+
     def unsoft_delete(self):
+        was_deleted = self.is_deleted
         self.is_deleted = False
         self.save()
 
+        if was_deleted and not self.parent_comment_id:
+            PostCounts.update_count_for_post_with_id(post_id=self.post_id, count_name='comments_count', amount=1)
+
     def delete_notifications(self):
         # Delete all post comment reply notifications
         PostCommentReplyNotification = get_post_comment_reply_notification_model()
@@ -1044,7 +1052,7 @@ class PostComment(models.Model):
 
 class PostReaction(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='reactions')
-    created = models.DateTimeField(editable=False)
+    created = models.DateTimeField(editable=False, db_index=True)
     reactor = models.ForeignKey(User, on_delete=models.CASCADE, related_name='post_reactions')
     emoji = models.ForeignKey(Emoji, on_delete=models.CASCADE, related_name='post_reactions')
 
@@ -1053,7 +1061,12 @@ class PostReaction(models.Model):
 
     @classmethod
     def create_reaction(cls, reactor, emoji_id, post):
-        return PostReaction.objects.create(reactor=reactor, emoji_id=emoji_id, post=post)
+        post_reaction = PostReaction.objects.create(reactor=reactor, emoji_id=emoji_id, post=post)
+
+        if post.community_id:
+            record_post_reaction_for_post_with_id(post_id=post.pk)
+
+        return post_reaction
 
     @classmethod
     def count_reactions_for_post_with_id(cls, post_id, reactor_id=None):
@@ -1065,10 +1078,26 @@ class PostReaction(models.Model):
         return cls.objects.filter(count_query).count()
 
     def save(self, *args, **kwargs):
-        ''' On save, update timestamps '''
+        ''' On save, update timestamps and emoji counts '''
+        previous_emoji_id = None
+
         if not self.id:
             self.created = timezone.now()
-        return super(PostReaction, self).save(*args, **kwargs)
+        else:
+            previous_emoji_id = PostReaction.objects.filter(pk=self.pk).values_list('emoji_id', flat=True).first()
+
+        # The reaction is only seen by a build of the counts once its count is updated too
+        with transaction.atomic():
+            post_reaction = super(PostReaction, self).save(*args, **kwargs)
+
+            if previous_emoji_id != self.emoji_id:
+                if previous_emoji_id is not None:
+                    PostReactionEmojiCount.update_count_for_post_with_id(post_id=self.post_id,
+                                                                         emoji_id=previous_emoji_id, amount=-1)
+                PostReactionEmojiCount.update_count_for_post_with_id(post_id=self.post_id, emoji_id=self.emoji_id,
+                                                                     amount=1)
+
+        return post_reaction
 
 
 class PostCommentReaction(models.Model):
@@ -1094,10 +1123,27 @@ class PostCommentReaction(models.Model):
         return cls.objects.filter(count_query).count()
 
     def save(self, *args, **kwargs):
-        ''' On save, update timestamps '''
+        ''' On save, update timestamps and emoji counts '''
+        previous_emoji_id = None
+
         if not self.id:
             self.created = timezone.now()
-        return super(PostCommentReaction, self).save(*args, **kwargs)
+        else:
+            previous_emoji_id = PostCommentReaction.objects.filter(pk=self.pk).values_list('emoji_id',
+                                                                                           flat=True).first()
+
+        # The reaction is only seen by a build of the counts once its count is updated too
+        with transaction.atomic():
+            post_comment_reaction = super(PostCommentReaction, self).save(*args, **kwargs)
+
+            if previous_emoji_id != self.emoji_id:
+                if previous_emoji_id is not None:
+                    PostCommentReactionEmojiCount.update_count_for_post_comment_with_id(
+                        post_comment_id=self.post_comment_id, emoji_id=previous_emoji_id, amount=-1)
+                PostCommentReactionEmojiCount.update_count_for_post_comment_with_id(
+                    post_comment_id=self.post_comment_id, emoji_id=self.emoji_id, amount=1)
+
+        return post_comment_reaction
 
 
 class PostMute(models.Model):
@@ -1132,13 +1178,27 @@ class PostUserMention(models.Model):
         unique_together = ('user', 'post',)
 
     @classmethod
-    def create_post_user_mention(cls, user, post):
-        post_user_mention = cls.objects.create(user=user, post=post)
+    def bulk_create_post_user_mentions(cls, post, users_ids):
+        """
+        Mentions the users in the post, creating their notifications and queueing their push notifications in bulk
+        """
+        cls.objects.bulk_create([cls(user_id=user_id, post_id=post.pk) for user_id in users_ids])
+
+        # Not every database returns the ids of bulk created rows
+        owners_ids_by_post_user_mention_id = dict(
+            cls.objects.filter(post_id=post.pk, user_id__in=users_ids).values_list('id', 'user_id'))
+
         PostUserMentionNotification = get_post_user_mention_notification_model()
-        PostUserMentionNotification.create_post_user_mention_notification(post_user_mention_id=post_user_mention.pk,
-                                                                          owner_id=user.pk)
-        send_post_user_mention_push_notification(post_user_mention=post_user_mention)
-        return post_user_mention
+        PostUserMentionNotification.bulk_create_post_user_mention_notifications(
+            owners_ids_by_post_user_mention_id=owners_ids_by_post_user_mention_id)
+
+        target_users_languages_codes = dict(User.objects.filter(
+            id__in=users_ids, notifications_settings__post_user_mention_notifications=True).values_list(
+            'id', 'language__code'))
+
+        if target_users_languages_codes:
+            send_post_user_mention_push_notifications(mentioner=post.creator,
+                                                      target_users_languages_codes=target_users_languages_codes)
 
 
 class PostCommentUserMention(models.Model):
@@ -1149,11 +1209,375 @@ class PostCommentUserMention(models.Model):
         unique_together = ('user', 'post_comment',)
 
     @classmethod
-    def create_post_comment_user_mention(cls, user, post_comment):
-        post_comment_user_mention = cls.objects.create(user=user, post_comment=post_comment)
+    def bulk_create_post_comment_user_mentions(cls, post_comment, users_ids):
+        """
+        Mentions the users in the post comment, creating their notifications and queueing their push notifications
+        in bulk
+        """
+        cls.objects.bulk_create([cls(user_id=user_id, post_comment_id=post_comment.pk) for user_id in users_ids])
+
+        # Not every database returns the ids of bulk created rows
+        owners_ids_by_post_comment_user_mention_id = dict(
+            cls.objects.filter(post_comment_id=post_comment.pk, user_id__in=users_ids).values_list('id', 'user_id'))
+
         PostCommentUserMentionNotification = get_post_comment_user_mention_notification_model()
-        PostCommentUserMentionNotification.create_post_comment_user_mention_notification(
-            post_comment_user_mention_id=post_comment_user_mention.pk,
-            owner_id=user.pk)
-        send_post_comment_user_mention_push_notification(post_comment_user_mention=post_comment_user_mention)
-        return post_comment_user_mention
+        PostCommentUserMentionNotification.bulk_create_post_comment_user_mention_notifications(
+            owners_ids_by_post_comment_user_mention_id=owners_ids_by_post_comment_user_mention_id)
+
+        target_users_languages_codes = dict(User.objects.filter(
+            id__in=users_ids, notifications_settings__post_comment_user_mention_notifications=True).values_list(
+            'id', 'language__code'))
+
+        if target_users_languages_codes:
+            send_post_comment_user_mention_push_notifications(
+                mentioner=post_comment.commenter, target_users_languages_codes=target_users_languages_codes)
+
+
+class PostCounts(models.Model):
+    """
+    Denormalized counters of a post, kept up to date by PostComment and the signals below.
+    Rows are created lazily from the real counts the first time they are read.
+    """
+    post = models.OneToOneField(Post, on_delete=models.CASCADE, related_name='counts', primary_key=True)
+    comments_count = models.IntegerField(default=0)
+    # Whether the PostReactionEmojiCount rows of the post were built and are being kept up to date
+    reactions_emoji_counts_built = models.BooleanField(default=False)
+
+    @classmethod
+    def get_counts_for_post_with_id(cls, post_id):
+        try:
+            return cls.objects.get(post_id=post_id)
+        except cls.DoesNotExist:
+            cls.reconcile_counts_for_posts_with_ids(posts_ids=[post_id])
+            return cls.objects.get(post_id=post_id)
+
+    @classmethod
+    def update_count_for_post_with_id(cls, post_id, count_name, amount):
+        """
+        Missing rows are skipped, they will be built from the real counts on their first read
+        """
+        cls.objects.filter(post_id=post_id).update(**{count_name: F(count_name) + amount})
+
+    @classmethod
+    def reconcile_counts_for_posts_with_ids(cls, posts_ids):
+        """
+        Repairs the counters of the given posts from the real counts.
+        Returns the amount of counters that were missing or had drifted.
+        """
+        posts_ids = list(posts_ids)
+
+        comments_counts = dict(PostComment.objects.filter(post_id__in=posts_ids, parent_comment__isnull=True,
+                                                          is_deleted=False).values('post_id').annotate(
+            count=Count('id')).order_by().values_list('post_id', 'count'))
+
+        existing_counts = cls.objects.in_bulk(posts_ids)
+
+        counts_to_create = []
+        counts_to_update = []
+
+        for post_id in posts_ids:
+            comments_count = comments_counts.get(post_id, 0)
+            post_counts = existing_counts.get(post_id)
+
+            if post_counts is None:
+                counts_to_create.append(cls(post_id=post_id, comments_count=comments_count))
+            elif post_counts.comments_count != comments_count:
+                post_counts.comments_count = comments_count
+                counts_to_update.append(post_counts)
+
+        cls.objects.bulk_create(counts_to_create, ignore_conflicts=True)
+        cls.objects.bulk_update(counts_to_update, ['comments_count'])
+
+        with transaction.atomic():
+            # Reactions saved meanwhile wait for the lock in PostReactionEmojiCount.update_count_for_post_with_id
+            # and are counted on top of the built counts, which can't see them yet
+            list(cls.objects.select_for_update().filter(post_id__in=posts_ids).order_by('post_id').values_list(
+                'post_id', flat=True))
+            cls.objects.filter(post_id__in=posts_ids, reactions_emoji_counts_built=False).update(
+                reactions_emoji_counts_built=True)
+            repaired_emoji_counts = PostReactionEmojiCount.reconcile_counts_for_posts_with_ids(posts_ids=posts_ids)
+
+        return len(counts_to_create) + len(counts_to_update) + repaired_emoji_counts
+
+
+class PostCommentCounts(models.Model):
+    """
+    Denormalized counters of a post comment, kept up to date by the signals below.
+    Rows are created lazily from the real counts the first time they are read.
+    """
+    post_comment = models.OneToOneField(PostComment, on_delete=models.CASCADE, related_name='counts',
+                                        primary_key=True)
+    replies_count = models.IntegerField(default=0)
+    # Whether the PostCommentReactionEmojiCount rows of the post comment were built and are being kept up to date
+    reactions_emoji_counts_built = models.BooleanField(default=False)
+
+    @classmethod
+    def get_counts_for_post_comment_with_id(cls, post_comment_id):
+        try:
+            return cls.objects.get(post_comment_id=post_comment_id)
+        except cls.DoesNotExist:
+            cls.reconcile_counts_for_post_comments_with_ids(post_comments_ids=[post_comment_id])
+            return cls.objects.get(post_comment_id=post_comment_id)
+
+    @classmethod
+    def update_count_for_post_comment_with_id(cls, post_comment_id, count_name, amount):
+        """
+        Missing rows are skipped, they will be built from the real counts on their first read
+        """
+        cls.objects.filter(post_comment_id=post_comment_id).update(**{count_name: F(count_name) + amount})
+
+    @classmethod
+    def reconcile_counts_for_post_comments_with_ids(cls, post_comments_ids):
+        """
+        Repairs the counters of the given post comments from the real counts.
+        Returns the amount of counters that were missing or had drifted.
+        """
+        post_comments_ids = list(post_comments_ids)
+
+        replies_counts = dict(PostComment.objects.filter(parent_comment_id__in=post_comments_ids).values(
+            'parent_comment_id').annotate(count=Count('id')).order_by().values_list('parent_comment_id', 'count'))
+
+        existing_counts = cls.objects.in_bulk(post_comments_ids)
+
+        counts_to_create = []
+        counts_to_update = []
+
+        for post_comment_id in post_comments_ids:
+            replies_count = replies_counts.get(post_comment_id, 0)
+            post_comment_counts = existing_counts.get(post_comment_id)
+
+            if post_comment_counts is None:
+                counts_to_create.append(cls(post_comment_id=post_comment_id, replies_count=replies_count))
+            elif post_comment_counts.replies_count != replies_count:
+                post_comment_counts.replies_count = replies_count
+                counts_to_update.append(post_comment_counts)
+
+        cls.objects.bulk_create(counts_to_create, ignore_conflicts=True)
+        cls.objects.bulk_update(counts_to_update, ['replies_count'])
+
+        with transaction.atomic():
+            # Same as PostCounts.reconcile_counts_for_posts_with_ids
+            list(cls.objects.select_for_update().filter(post_comment_id__in=post_comments_ids).order_by(
+                'post_comment_id').values_list('post_comment_id', flat=True))
+            cls.objects.filter(post_comment_id__in=post_comments_ids, reactions_emoji_counts_built=False).update(
+                reactions_emoji_counts_built=True)
+            repaired_emoji_counts = PostCommentReactionEmojiCount.reconcile_counts_for_post_comments_with_ids(
+                post_comments_ids=post_comments_ids)
+
+        return len(counts_to_create) + len(counts_to_update) + repaired_emoji_counts
+
+
+class PostReactionEmojiCount(models.Model):
+    """
+    Denormalized amount of reactions to a post with an emoji, kept up to date by PostReaction and the signals below.
+    The counts of a post are built from its reactions the first time they are read, see PostCounts.
+    """
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='reactions_emoji_counts')
+    emoji = models.ForeignKey(Emoji, on_delete=models.CASCADE, related_name='+')
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('post', 'emoji',)
+
+    @classmethod
+    def get_counts_for_posts_with_ids(cls, posts_ids, emoji_id=None):
+        """
+        Returns post id -> emoji id -> amount of reactions, building the counts of the posts which don't have them
+        """
+        posts_ids = list(posts_ids)
+
+        built_posts_ids = set(PostCounts.objects.filter(post_id__in=posts_ids,
+                                                        reactions_emoji_counts_built=True).values_list('post_id',
+                                                                                                       flat=True))
+        unbuilt_posts_ids = [post_id for post_id in posts_ids if post_id not in built_posts_ids]
+
+        if unbuilt_posts_ids:
+            PostCounts.reconcile_counts_for_posts_with_ids(posts_ids=unbuilt_posts_ids)
+
+        counts_query = Q(post_id__in=posts_ids, count__gt=0)
+
+        if emoji_id:
+            counts_query.add(Q(emoji_id=emoji_id), Q.AND)
+
+        counts = {}
+
+        for post_id, emoji_id, count in cls.objects.filter(counts_query).values_list('post_id', 'emoji_id', 'count'):
+            counts.setdefault(post_id, {})[emoji_id] = count
+
+        return counts
+
+    @classmethod
+    def update_count_for_post_with_id(cls, post_id, emoji_id, amount):
+        """
+        Posts without built counts are skipped, they will be built from the reactions on their first read.
+        Expected to run in the transaction saving or deleting the reaction, the lock on the counts of the post waits
+        for a build in progress.
+        """
+        with transaction.atomic():
+            counts_built = PostCounts.objects.select_for_update().filter(post_id=post_id).values_list(
+                'reactions_emoji_counts_built', flat=True).first()
+
+            if not counts_built:
+                return
+
+            if amount > 0:
+                cls.objects.bulk_create([cls(post_id=post_id, emoji_id=emoji_id)], ignore_conflicts=True)
+
+            cls.objects.filter(post_id=post_id, emoji_id=emoji_id).update(count=F('count') + amount)
+
+    @classmethod
+    def reconcile_counts_for_posts_with_ids(cls, posts_ids, repair=True):
+        """
+        Compares the counts of the given posts with their reactions, repairing them unless repair is False.
+        Returns the amount of counts that were missing or had drifted.
+        """
+        reactions_counts = {(post_id, emoji_id): count for post_id, emoji_id, count in
+                            PostReaction.objects.filter(post_id__in=posts_ids).values('post_id', 'emoji_id').annotate(
+                                count=Count('id')).order_by().values_list('post_id', 'emoji_id', 'count')}
+
+        return _reconcile_emoji_counts(model=cls, object_field_name='post_id', reactions_counts=reactions_counts,
+                                       emoji_counts=cls.objects.filter(post_id__in=posts_ids), repair=repair)
+
+
+class PostCommentReactionEmojiCount(models.Model):
+    """
+    Denormalized amount of reactions to a post comment with an emoji, kept up to date by PostCommentReaction and
+    the signals below. The counts of a post comment are built from its reactions the first time they are read,
+    see PostCommentCounts.
+    """
+    post_comment = models.ForeignKey(PostComment, on_delete=models.CASCADE, related_name='reactions_emoji_counts')
+    emoji = models.ForeignKey(Emoji, on_delete=models.CASCADE, related_name='+')
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('post_comment', 'emoji',)
+
+    @classmethod
+    def get_counts_for_post_comments_with_ids(cls, post_comments_ids, emoji_id=None):
+        """
+        Returns post comment id -> emoji id -> amount of reactions, building the counts of the post comments
+        which don't have them
+        """
+        post_comments_ids = list(post_comments_ids)
+
+        built_post_comments_ids = set(PostCommentCounts.objects.filter(
+            post_comment_id__in=post_comments_ids, reactions_emoji_counts_built=True).values_list('post_comment_id',
+                                                                                                 flat=True))
+        unbuilt_post_comments_ids = [post_comment_id for post_comment_id in post_comments_ids if
+                                     post_comment_id not in built_post_comments_ids]
+
+        if unbuilt_post_comments_ids:
+            PostCommentCounts.reconcile_counts_for_post_comments_with_ids(post_comments_ids=unbuilt_post_comments_ids)
+
+        counts_query = Q(post_comment_id__in=post_comments_ids, count__gt=0)
+
+        if emoji_id:
+            counts_query.add(Q(emoji_id=emoji_id), Q.AND)
+
+        counts = {}
+
+        for post_comment_id, emoji_id, count in cls.objects.filter(counts_query).values_list('post_comment_id',
+                                                                                             'emoji_id', 'count'):
+            counts.setdefault(post_comment_id, {})[emoji_id] = count
+
+        return counts
+
+    @classmethod
+    def update_count_for_post_comment_with_id(cls, post_comment_id, emoji_id, amount):
+        """
+        Post comments without built counts are skipped, they will be built from the reactions on their first read.
+        Same locking as PostReactionEmojiCount.update_count_for_post_with_id.
+        """
+        with transaction.atomic():
+            counts_built = PostCommentCounts.objects.select_for_update().filter(
+                post_comment_id=post_comment_id).values_list('reactions_emoji_counts_built', flat=True).first()
+
+            if not counts_built:
+                return
+
+            if amount > 0:
+                cls.objects.bulk_create([cls(post_comment_id=post_comment_id, emoji_id=emoji_id)],
+                                        ignore_conflicts=True)
+
+            cls.objects.filter(post_comment_id=post_comment_id, emoji_id=emoji_id).update(
+                count=F('count') + amount)
+
+    @classmethod
+    def reconcile_counts_for_post_comments_with_ids(cls, post_comments_ids, repair=True):
+        """
+        Compares the counts of the given post comments with their reactions, repairing them unless repair is False.
+        Returns the amount of counts that were missing or had drifted.
+        """
+        reactions_counts = {(post_comment_id, emoji_id): count for post_comment_id, emoji_id, count in
+                            PostCommentReaction.objects.filter(post_comment_id__in=post_comments_ids).values(
+                                'post_comment_id', 'emoji_id').annotate(count=Count('id')).order_by().values_list(
+                                'post_comment_id', 'emoji_id', 'count')}
+
+        return _reconcile_emoji_counts(model=cls, object_field_name='post_comment_id',
+                                       reactions_counts=reactions_counts,
+                                       emoji_counts=cls.objects.filter(post_comment_id__in=post_comments_ids),
+                                       repair=repair)
+
+
+def _reconcile_emoji_counts(model, object_field_name, reactions_counts, emoji_counts, repair):
+    """
+    reactions_counts: (object id, emoji id) -> real amount of reactions
+    """
+    existing_counts = {(getattr(emoji_count, object_field_name), emoji_count.emoji_id): emoji_count for emoji_count in
+                       emoji_counts}
+
+    counts_to_create = []
+    counts_to_update = []
+
+    for (object_id, emoji_id), count in reactions_counts.items():
+        emoji_count = existing_counts.get((object_id, emoji_id))
+
+        if emoji_count is None:
+            counts_to_create.append(model(**{object_field_name: object_id, 'emoji_id': emoji_id, 'count': count}))
+        elif emoji_count.count != count:
+            emoji_count.count = count
+            counts_to_update.append(emoji_count)
+
+    for key, emoji_count in existing_counts.items():
+        if key not in reactions_counts and emoji_count.count != 0:
+            emoji_count.count = 0
+            counts_to_update.append(emoji_count)
+
+    if repair:
+        model.objects.bulk_create(counts_to_create, ignore_conflicts=True)
+        model.objects.bulk_update(counts_to_update, ['count'])
+
+    return len(counts_to_create) + len(counts_to_update)
+
+
+@receiver(post_save, sender=PostComment, dispatch_uid='increment_post_comment_counts')
+def increment_post_comment_counts(sender, instance=None, created=False, **kwargs):
+    if not created:
+        return
+
+    if instance.parent_comment_id:
+        PostCommentCounts.update_count_for_post_comment_with_id(post_comment_id=instance.parent_comment_id,
+                                                                count_name='replies_count', amount=1)
+    elif not instance.is_deleted:
+        PostCounts.update_count_for_post_with_id(post_id=instance.post_id, count_name='comments_count', amount=1)
+
+
+@receiver(post_delete, sender=PostComment, dispatch_uid='decrement_post_comment_counts')
+def decrement_post_comment_counts(sender, instance=None, **kwargs):
+    if instance.parent_comment_id:
+        PostCommentCounts.update_count_for_post_comment_with_id(post_comment_id=instance.parent_comment_id,
+                                                                count_name='replies_count', amount=-1)
+    elif not instance.is_deleted:
+        PostCounts.update_count_for_post_with_id(post_id=instance.post_id, count_name='comments_count', amount=-1)
+
+
+@receiver(post_delete, sender=PostReaction, dispatch_uid='decrement_post_reaction_emoji_count')
+def decrement_post_reaction_emoji_count(sender, instance=None, **kwargs):
+    PostReactionEmojiCount.update_count_for_post_with_id(post_id=instance.post_id, emoji_id=instance.emoji_id,
+                                                         amount=-1)
+
+
+@receiver(post_delete, sender=PostCommentReaction, dispatch_uid='decrement_post_comment_reaction_emoji_count')
+def decrement_post_comment_reaction_emoji_count(sender, instance=None, **kwargs):
+    PostCommentReactionEmojiCount.update_count_for_post_comment_with_id(post_comment_id=instance.post_comment_id,
+                                                                        emoji_id=instance.emoji_id, amount=-1)
@@ -1,5 +1,7 @@
 from django.db.models import Q
 
+from openbook_auth.exclusions import get_blocked_users_ids_for_user_with_id, get_reported_posts_ids_for_user_with_id, \
+    get_banned_communities_ids_for_user_with_id, get_approved_posts_ids
 from openbook_common.utils.model_loaders import get_post_model, get_moderated_object_model, get_community_model, \
     get_circle_model
 
@@ -36,16 +38,32 @@ def make_exclude_soft_deleted_posts_query():
 
 
 def make_exclude_reported_and_approved_posts_query():
-    ModeratedObject = get_moderated_object_model()
-    return ~Q(moderated_object__status=ModeratedObject.STATUS_APPROVED)
+    # Relies on soft deleted posts being excluded too, see get_approved_posts_ids
+    approved_posts_ids = get_approved_posts_ids()
+
+    if approved_posts_ids is None:
+        ModeratedObject = get_moderated_object_model()
+        return ~Q(moderated_object__status=ModeratedObject.STATUS_APPROVED)
+
+    return _make_exclude_ids_query(field_name='id', ids=approved_posts_ids)
 
 
 def make_exclude_reported_posts_by_user_with_id_query(user_id):
-    return ~Q(moderated_object__reports__reporter_id=user_id)
+    reported_posts_ids = get_reported_posts_ids_for_user_with_id(user_id=user_id)
+
+    if reported_posts_ids is None:
+        return ~Q(moderated_object__reports__reporter_id=user_id)
+
+    return _make_exclude_ids_query(field_name='id', ids=reported_posts_ids)
 
 
 def make_exclude_community_posts_banned_from_for_user_with_id_query(user_id):
-    return ~Q(community__banned_users__id=user_id)
+    banned_communities_ids = get_banned_communities_ids_for_user_with_id(user_id=user_id)
+
+    if banned_communities_ids is None:
+        return ~Q(community__banned_users__id=user_id)
+
+    return _make_exclude_ids_query(field_name='community_id', ids=banned_communities_ids)
 
 
 def make_exclude_closed_posts_in_community_for_user_with_id_query(user_id):
@@ -58,9 +76,13 @@ def make_exclude_closed_posts_query():
 
 def make_exclude_blocked_community_posts_for_user_and_community_with_ids(user_id, community_id):
     # Don't retrieve posts of blocked users, except if they're staff members
-    blocked_users_query = ~Q(Q(creator__blocked_by_users__blocker_id=user_id) | Q(
-        creator__user_blocks__blocked_user_id=user_id))
+    blocked_users_query = make_exclude_blocked_posts_for_user_with_id_query(user_id=user_id)
+
+    if not blocked_users_query:
+        # No blocked users, nothing to exclude
+        return blocked_users_query
 
+    # Added inside the negated blocked users query, reads as NOT (blocked AND NOT staff member)
     blocked_users_query_staff_members = Q(creator__communities_memberships__community_id=community_id)
     blocked_users_query_staff_members.add(Q(creator__communities_memberships__is_administrator=True) | Q(
         creator__communities_memberships__is_moderator=True), Q.AND)
@@ -83,8 +105,13 @@ def make_exclude_community_posts_query():
 
 
 def make_exclude_blocked_posts_for_user_with_id_query(user_id):
-    return ~Q(Q(creator__blocked_by_users__blocker_id=user_id) | Q(
-        creator__user_blocks__blocked_user_id=user_id))
+    blocked_users_ids = get_blocked_users_ids_for_user_with_id(user_id=user_id)
+
+    if blocked_users_ids is None:
+        return ~Q(Q(creator__blocked_by_users__blocker_id=user_id) | Q(
+            creator__user_blocks__blocked_user_id=user_id))
+
+    return _make_exclude_ids_query(field_name='creator_id', ids=blocked_users_ids)
 
 
 def make_only_public_community_posts_query():
@@ -102,24 +129,31 @@ def make_only_public_posts_query():
     return make_only_public_community_posts_query() | make_only_world_circle_posts_query()
 
 
-def make_get_hashtag_posts_for_user_with_id_query(hashtag, user_id):
-    # Retrieve posts with the given hashtag
-    hashtag_posts_query = make_only_posts_with_hashtag_with_id_query(hashtag_id=hashtag.pk)
-
+def make_only_publicly_visible_posts_query():
     # Only retrieve public posts
-    hashtag_posts_query.add(make_only_public_posts_query(), Q.AND)
+    publicly_visible_posts_query = make_only_public_posts_query()
 
     # Dont retrieve soft deleted posts
-    hashtag_posts_query.add(make_exclude_soft_deleted_posts_query(), Q.AND)
-
-    # Dont retrieve posts from blocked people
-    hashtag_posts_query.add(make_exclude_blocked_posts_for_user_with_id_query(user_id=user_id), Q.AND)
+    publicly_visible_posts_query.add(make_exclude_soft_deleted_posts_query(), Q.AND)
 
     # Only retrieve published posts
-    hashtag_posts_query.add(make_only_published_posts_query(), Q.AND)
+    publicly_visible_posts_query.add(make_only_published_posts_query(), Q.AND)
 
     # Don't retrieve items that have been reported and approved
-    hashtag_posts_query.add(make_exclude_reported_and_approved_posts_query(), Q.AND)
+    publicly_visible_posts_query.add(make_exclude_reported_and_approved_posts_query(), Q.AND)
+
+    # Dont retrieve closed posts
+    publicly_visible_posts_query.add(make_exclude_closed_posts_query(), Q.AND)
+
+    return publicly_visible_posts_query
+
+
+def make_get_hashtag_posts_for_user_with_id_query(hashtag, user_id):
+    # Retrieve posts from the index of the publicly visible posts of the hashtag
+    hashtag_posts_query = Q(public_hashtags_index__hashtag_id=hashtag.pk)
+
+    # Dont retrieve posts from blocked people
+    hashtag_posts_query.add(make_exclude_blocked_posts_for_user_with_id_query(user_id=user_id), Q.AND)
 
     # Dont retrieve items we have reported
     hashtag_posts_query.add(make_exclude_reported_posts_by_user_with_id_query(user_id=user_id), Q.AND)
@@ -127,9 +161,6 @@ def make_get_hashtag_posts_for_user_with_id_query(hashtag, user_id):
     # Dont retrieve posts from communities we're  banned from
     hashtag_posts_query.add(make_exclude_community_posts_banned_from_for_user_with_id_query(user_id=user_id), Q.AND)
 
-    # Dont retrieve closed posts
-    hashtag_posts_query.add(make_exclude_closed_posts_query(), Q.AND)
-
     return hashtag_posts_query
 
 
@@ -142,3 +173,10 @@ def make_circles_posts_query_for_user(user):
 
 def make_community_posts_query_for_user(user):
     return make_only_visible_community_posts_for_user_with_id_query(user_id=user.pk)
+
+
+def _make_exclude_ids_query(field_name, ids):
+    if not ids:
+        return Q()
+
+    return ~Q(**{'%s__in' % field_name: sorted(ids)})
@@ -1,15 +1,23 @@
 from django.db.models import Q
 
-from openbook_common.utils.model_loaders import get_post_model, get_moderated_object_model
-from openbook_posts.queries import \
-    make_community_posts_query_for_user, make_only_posts_with_max_id, \
-    make_only_posts_with_min_id, make_circles_posts_query_for_user
+from openbook_common.utils.model_loaders import get_post_model, get_circle_model, get_community_model, \
+    get_community_membership_model
+from openbook_posts.queries import make_only_posts_with_max_id, make_only_posts_with_min_id, \
+    make_exclude_reported_posts_by_user_with_id_query, make_exclude_reported_and_approved_posts_query, \
+    make_exclude_blocked_posts_for_user_with_id_query, \
+    make_exclude_community_posts_banned_from_for_user_with_id_query
 
 
 def get_posts_for_user_collection(target_user, source_user, posts_only=None, posts_prefetch_related=None,
                                   max_id=None,
                                   min_id=None,
                                   include_community_posts=False):
+    """
+    Returns the posts of target_user visible to source_user, paginated by id with max_id or min_id.
+
+    The circles and communities the source user can see are resolved up front, so the query only has
+    single valued joins and semi joins and doesn't need a DISTINCT.
+    """
     Post = get_post_model()
 
     posts_collection_manager = Post.objects
@@ -20,16 +28,9 @@ def get_posts_for_user_collection(target_user, source_user, posts_only=None, pos
     if posts_only:
         posts_collection_manager = posts_collection_manager.only(*posts_only)
 
-    id_boundary_query = None
-
-    if max_id:
-        id_boundary_query = make_only_posts_with_max_id(max_id=max_id)
-    elif min_id:
-        id_boundary_query = make_only_posts_with_min_id(min_id=min_id)
-
     query = Q(
         # Created by the target user
-        creator__username=target_user.username,
+        creator_id=target_user.pk,
         # Not closed
         is_closed=False,
         # Not deleted
@@ -38,32 +39,63 @@ def get_posts_for_user_collection(target_user, source_user, posts_only=None, pos
         status=Post.STATUS_PUBLISHED,
     )
 
-    posts_query = make_circles_posts_query_for_user(
-        user=source_user
-    )
+    visible_circles_ids = get_visible_circles_ids_of_user_for_user(target_user=target_user, source_user=source_user)
+
+    # A post in several visible circles still matches once
+    posts_query = Q(id__in=Post.circles.through.objects.filter(circle_id__in=visible_circles_ids).values('post_id'))
 
     if include_community_posts:
-        posts_query.add(make_community_posts_query_for_user(
-            user=source_user
-        ), Q.OR)
+        posts_query.add(make_visible_community_posts_for_user_query(user=source_user), Q.OR)
 
     query.add(posts_query, Q.AND)
 
-    if id_boundary_query:
-        query.add(id_boundary_query, Q.AND)
-
-    ModeratedObject = get_moderated_object_model()
-
-    posts_visibility_exclude_query = Q(
-        # Reported posts
-        Q(moderated_object__reports__reporter_id=source_user.pk) |
-        # Approved reported posts
-        Q(moderated_object__status=ModeratedObject.STATUS_APPROVED) |
-        # Posts of users we blocked or that have blocked us
-        Q(creator__blocked_by_users__blocker_id=source_user.pk) | Q(
-            creator__user_blocks__blocked_user_id=source_user.pk) |
-        # Posts of communities banned from
-        Q(community__banned_users__id=source_user.pk)
-    )
+    if max_id:
+        query.add(make_only_posts_with_max_id(max_id=max_id), Q.AND)
+    elif min_id:
+        query.add(make_only_posts_with_min_id(min_id=min_id), Q.AND)
+
+    # Reported posts
+    query.add(make_exclude_reported_posts_by_user_with_id_query(user_id=source_user.pk), Q.AND)
+    # Approved reported posts
+    query.add(make_exclude_reported_and_approved_posts_query(), Q.AND)
+    # Posts of users we blocked or that have blocked us
+    query.add(make_exclude_blocked_posts_for_user_with_id_query(user_id=source_user.pk), Q.AND)
+    # Posts of communities banned from
+    query.add(make_exclude_community_posts_banned_from_for_user_with_id_query(user_id=source_user.pk), Q.AND)
+
+    return posts_collection_manager.filter(query)
+
+
+def get_visible_circles_ids_of_user_for_user(target_user, source_user):
+    """
+    Returns the world circle id plus the ids of the circles of target_user that source_user is connected into.
+    """
+    Circle = get_circle_model()
+
+    visible_circles_ids = set(Circle.objects.filter(
+        creator_id=target_user.pk,
+        connections__target_user_id=source_user.pk,
+        connections__target_connection__circles__isnull=False,
+    ).values_list('id', flat=True))
+
+    visible_circles_ids.add(Circle.get_world_circle_id())
+
+    return sorted(visible_circles_ids)
+
+
+def make_visible_community_posts_for_user_query(user):
+    """
+    Public community posts plus the posts of the communities the user is a member of.
+    """
+    Community = get_community_model()
+    CommunityMembership = get_community_membership_model()
+
+    joined_communities_ids = list(CommunityMembership.objects.filter(user_id=user.pk).values_list('community_id',
+                                                                                                  flat=True))
+
+    community_posts_query = Q(community__type=Community.COMMUNITY_TYPE_PUBLIC)
+
+    if joined_communities_ids:
+        community_posts_query.add(Q(community_id__in=joined_communities_ids), Q.OR)
 
-    return posts_collection_manager.filter(query).exclude(posts_visibility_exclude_query).distinct()
+    return community_posts_query
@@ -0,0 +1,211 @@
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django_redis import get_redis_connection
+
+from openbook_common.utils.model_loaders import get_post_model, get_post_comment_model, get_post_counts_model, \
+    get_notification_model, get_post_comment_notification_model, get_post_comment_reply_notification_model, \
+    get_post_comment_user_mention_notification_model, get_post_comment_reaction_notification_model, \
+    get_post_reaction_notification_model, get_post_user_mention_notification_model, get_hashtag_public_post_model
+
+SOFT_DELETION_TARGET_POST = 'post'
+SOFT_DELETION_TARGET_COMMUNITY = 'community'
+SOFT_DELETION_TARGET_USER = 'user'
+
+
+def make_soft_deletion_progress_key(target_type, target_id):
+    return 'ob-api-soft-deletion-%s-%d' % (target_type, target_id)
+
+
+def get_soft_deletion_progress(target_type, target_id):
+    """
+    Returns None if the soft deletion of the target didn't start or its progress expired
+    """
+    redis = _get_soft_deletion_redis_connection()
+    progress = redis.hgetall(make_soft_deletion_progress_key(target_type=target_type, target_id=target_id))
+
+    if not progress:
+        return None
+
+    return {name.decode('utf-8'): int(value) for name, value in progress.items()}
+
+
+def start_soft_deletion(target_type, target_id, is_deleted):
+    """
+    Soft deletes, or restores when is_deleted is False, the posts and post comments of a post, a community or
+    the posts and communities of a user. The target itself is expected to be already marked.
+    Runs in a job when the target has more than SOFT_DELETION_ASYNC_THRESHOLD post comments or posts.
+    """
+    progress_key = make_soft_deletion_progress_key(target_type=target_type, target_id=target_id)
+
+    # A job of a previous soft deletion of the target stops once it sees a different is_deleted
+    redis = _get_soft_deletion_redis_connection()
+    pipeline = redis.pipeline(transaction=False)
+    pipeline.delete(progress_key)
+    pipeline.hset(progress_key, 'is_deleted', int(is_deleted))
+    pipeline.expire(progress_key, settings.SOFT_DELETION_PROGRESS_TTL)
+    pipeline.execute()
+
+    if _is_soft_deletion_large(target_type=target_type, target_id=target_id):
+        from openbook_posts.jobs import soft_delete_target
+        transaction.on_commit(
+            lambda: soft_delete_target.delay(target_type=target_type, target_id=target_id, is_deleted=is_deleted))
+    else:
+        while not soft_delete_next_chunk_of_target(target_type=target_type, target_id=target_id,
+                                                   is_deleted=is_deleted):
+            pass
+
+
+def soft_delete_next_chunk_of_target(target_type, target_id, is_deleted):
+    """
+    Marks the next SOFT_DELETION_CHUNK_SIZE post comments of the target, and then its posts, with set based
+    updates, starting after the last ones of the progress. Soft deleting also deletes their notifications.
+    Returns whether the soft deletion finished or was superseded by another one of the target.
+    """
+    progress_key = make_soft_deletion_progress_key(target_type=target_type, target_id=target_id)
+    progress = get_soft_deletion_progress(target_type=target_type, target_id=target_id)
+
+    if progress is None or progress['is_deleted'] != int(is_deleted):
+        return True
+
+    chunk_size = settings.SOFT_DELETION_CHUNK_SIZE
+    now = timezone.now()
+
+    redis = _get_soft_deletion_redis_connection()
+    pipeline = redis.pipeline(transaction=False)
+
+    if not progress.get('post_comments_finished'):
+        PostComment = get_post_comment_model()
+
+        post_comments_chunk = list(PostComment.objects.filter(
+            _make_target_posts_query(target_type=target_type, target_id=target_id, prefix='post__'),
+            id__gt=progress.get('last_post_comment_id', 0)).exclude(is_deleted=is_deleted).order_by(
+            'id').values_list('id', 'post_id', 'parent_comment_id')[:chunk_size])
+
+        post_comments_ids = [post_comment_id for post_comment_id, post_id, parent_comment_id in post_comments_chunk]
+
+        if post_comments_ids:
+            with transaction.atomic():
+                if is_deleted:
+                    _delete_notifications_for_post_comments_with_ids(post_comments_ids=post_comments_ids)
+
+                PostComment.objects.filter(id__in=post_comments_ids).update(is_deleted=is_deleted, modified=now)
+
+                _update_comments_counts(post_comments_chunk=post_comments_chunk, is_deleted=is_deleted)
+
+            pipeline.hset(progress_key, 'last_post_comment_id', post_comments_ids[-1])
+            pipeline.hincrby(progress_key, 'post_comments_count', len(post_comments_ids))
+
+        if len(post_comments_ids) < chunk_size:
+            pipeline.hset(progress_key, 'post_comments_finished', 1)
+
+        finished = False
+    else:
+        Post = get_post_model()
+
+        posts_ids = list(Post.objects.filter(
+            _make_target_posts_query(target_type=target_type, target_id=target_id),
+            id__gt=progress.get('last_post_id', 0)).order_by('id').values_list('id', flat=True)[:chunk_size])
+
+        if posts_ids:
+            with transaction.atomic():
+                if is_deleted:
+                    _delete_notifications_for_posts_with_ids(posts_ids=posts_ids)
+
+                Post.objects.filter(id__in=posts_ids).update(is_deleted=is_deleted, modified=now)
+
+                HashtagPublicPost = get_hashtag_public_post_model()
+                HashtagPublicPost.index_posts_with_ids(posts_ids=posts_ids)
+
+            pipeline.hset(progress_key, 'last_post_id', posts_ids[-1])
+            pipeline.hincrby(progress_key, 'posts_count', len(posts_ids))
+
+        finished = len(posts_ids) < chunk_size
+
+        if finished:
+            pipeline.hset(progress_key, 'finished', 1)
+
+    pipeline.hincrby(progress_key, 'chunks_count', 1)
+    pipeline.expire(progress_key, settings.SOFT_DELETION_PROGRESS_TTL)
+    pipeline.execute()
+
+    return finished
+
+
+def _make_target_posts_query(target_type, target_id, prefix=''):
+    if target_type == SOFT_DELETION_TARGET_POST:
+        return Q(**{prefix + 'id': target_id})
+    elif target_type == SOFT_DELETION_TARGET_COMMUNITY:
+        return Q(**{prefix + 'community_id': target_id})
+    elif target_type == SOFT_DELETION_TARGET_USER:
+        return Q(**{prefix + 'creator_id': target_id}) | Q(**{prefix + 'community__creator_id': target_id})
+
+    raise ValueError('Unknown soft deletion target type: %s' % target_type)
+
+
+def _is_soft_deletion_large(target_type, target_id):
+    threshold = settings.SOFT_DELETION_ASYNC_THRESHOLD
+
+    PostComment = get_post_comment_model()
+    post_comments = PostComment.objects.filter(
+        _make_target_posts_query(target_type=target_type, target_id=target_id, prefix='post__'))
+
+    if post_comments[:threshold + 1].count() > threshold:
+        return True
+
+    Post = get_post_model()
+    posts = Post.objects.filter(_make_target_posts_query(target_type=target_type, target_id=target_id))
+
+    return posts[:threshold + 1].count() > threshold
+
+
+def _update_comments_counts(post_comments_chunk, is_deleted):
+    PostCounts = get_post_counts_model()
+
+    comments_counts = Counter(
+        post_id for post_comment_id, post_id, parent_comment_id in post_comments_chunk if not parent_comment_id)
+
+    for post_id, comments_count in comments_counts.items():
+        PostCounts.update_count_for_post_with_id(post_id=post_id, count_name='comments_count',
+                                                 amount=-comments_count if is_deleted else comments_count)
+
+
+def _delete_notifications_for_post_comments_with_ids(post_comments_ids):
+    Notification = get_notification_model()
+
+    PostCommentNotification = get_post_comment_notification_model()
+    Notification.bulk_delete_notifications_for_content_objects(
+        content_objects=PostCommentNotification.objects.filter(post_comment_id__in=post_comments_ids))
+
+    PostCommentReplyNotification = get_post_comment_reply_notification_model()
+    Notification.bulk_delete_notifications_for_content_objects(
+        content_objects=PostCommentReplyNotification.objects.filter(post_comment_id__in=post_comments_ids))
+
+    PostCommentUserMentionNotification = get_post_comment_user_mention_notification_model()
+    Notification.bulk_delete_notifications_for_content_objects(
+        content_objects=PostCommentUserMentionNotification.objects.filter(
+            post_comment_user_mention__post_comment_id__in=post_comments_ids))
+
+    PostCommentReactionNotification = get_post_comment_reaction_notification_model()
+    Notification.bulk_delete_notifications_for_content_objects(
+        content_objects=PostCommentReactionNotification.objects.filter(
+            post_comment_reaction__post_comment_id__in=post_comments_ids))
+
+
+def _delete_notifications_for_posts_with_ids(posts_ids):
+    Notification = get_notification_model()
+
+    PostReactionNotification = get_post_reaction_notification_model()
+    Notification.bulk_delete_notifications_for_content_objects(
+        content_objects=PostReactionNotification.objects.filter(post_reaction__post_id__in=posts_ids))
+
+    PostUserMentionNotification = get_post_user_mention_notification_model()
+    Notification.bulk_delete_notifications_for_content_objects(
+        content_objects=PostUserMentionNotification.objects.filter(post_user_mention__post_id__in=posts_ids))
+
+
+def _get_soft_deletion_redis_connection():
+    return get_redis_connection('default')
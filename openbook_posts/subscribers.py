@@ -0,0 +1,118 @@
+from django.conf import settings
+from django_redis import get_redis_connection
+
+from openbook_common.utils.model_loaders import get_post_model, get_community_new_post_notification_model, \
+    get_user_new_post_notification_model
+from openbook_notifications.helpers import send_community_new_post_push_notifications, \
+    send_user_new_post_push_notifications
+
+
+def is_subscribers_fan_out_async():
+    return settings.POST_SUBSCRIBERS_FAN_OUT_ASYNC
+
+
+def make_subscribers_fan_out_progress_key_for_post_with_id(post_id):
+    return 'ob-api-post-subscribers-fan-out-%d' % post_id
+
+
+def get_subscribers_fan_out_progress_for_post_with_id(post_id):
+    """
+    Returns None if the fan out of the post didn't start or its progress expired
+    """
+    redis = _get_subscribers_redis_connection()
+    progress = redis.hgetall(make_subscribers_fan_out_progress_key_for_post_with_id(post_id))
+
+    if not progress:
+        return None
+
+    return {name.decode('utf-8'): int(value) for name, value in progress.items()}
+
+
+def notify_subscribers_of_post_with_id(post_id):
+    """
+    Notifies every subscriber of the post, one chunk after another
+    """
+    while not notify_next_subscribers_chunk_of_post_with_id(post_id=post_id):
+        pass
+
+
+def notify_next_subscribers_chunk_of_post_with_id(post_id):
+    """
+    Creates the notifications and queues the push notifications of the next SUBSCRIBERS_FAN_OUT_CHUNK_SIZE
+    subscribers of the post, in subscription id order, starting after the last one of the progress.
+    Returns whether every subscriber was notified, which a post deleted meanwhile counts as.
+    """
+    Post = get_post_model()
+
+    try:
+        post = Post.objects.select_related('creator__profile', 'community').get(pk=post_id)
+    except Post.DoesNotExist:
+        return True
+
+    progress_key = make_subscribers_fan_out_progress_key_for_post_with_id(post_id)
+
+    redis = _get_subscribers_redis_connection()
+    last_subscription_id = redis.hget(progress_key, 'last_subscription_id')
+    last_subscription_id = int(last_subscription_id) if last_subscription_id is not None else 0
+
+    if post.community_id:
+        subscriptions = Post.get_community_notification_target_subscriptions(post=post)
+        push_notifications_enabled_field = 'subscriber__notifications_settings__community_new_post_notifications'
+    else:
+        subscriptions = Post.get_user_notification_target_subscriptions(post=post)
+        push_notifications_enabled_field = 'subscriber__notifications_settings__user_new_post_notifications'
+
+    subscriptions_chunk = list(subscriptions.filter(id__gt=last_subscription_id).order_by('id').values_list(
+        'id', 'subscriber_id', 'subscriber__language__code', push_notifications_enabled_field)[
+                               :settings.SUBSCRIBERS_FAN_OUT_CHUNK_SIZE])
+
+    if subscriptions_chunk:
+        owners_ids_by_subscription_id = {subscription_id: subscriber_id for
+                                         subscription_id, subscriber_id, language_code, push_notifications_enabled in
+                                         subscriptions_chunk}
+
+        if post.community_id:
+            CommunityNewPostNotification = get_community_new_post_notification_model()
+            notified_subscriptions_ids = set(
+                CommunityNewPostNotification.bulk_create_community_new_post_notifications(
+                    post_id=post_id, owners_ids_by_subscription_id=owners_ids_by_subscription_id))
+        else:
+            UserNewPostNotification = get_user_new_post_notification_model()
+            notified_subscriptions_ids = set(UserNewPostNotification.bulk_create_user_new_post_notifications(
+                post_id=post_id, owners_ids_by_subscription_id=owners_ids_by_subscription_id))
+
+        # A retried chunk doesn't push again to the subscribers notified the first time
+        target_users_languages_codes = {subscriber_id: language_code for
+                                        subscription_id, subscriber_id, language_code, push_notifications_enabled in
+                                        subscriptions_chunk if
+                                        push_notifications_enabled and subscription_id in notified_subscriptions_ids}
+
+        if target_users_languages_codes:
+            if post.community_id:
+                send_community_new_post_push_notifications(community_name=post.community.name,
+                                                           target_users_languages_codes=target_users_languages_codes)
+            else:
+                send_user_new_post_push_notifications(post_creator=post.creator,
+                                                      target_users_languages_codes=target_users_languages_codes)
+
+        pipeline = redis.pipeline(transaction=False)
+        pipeline.hset(progress_key, 'last_subscription_id', subscriptions_chunk[-1][0])
+        pipeline.hincrby(progress_key, 'notified_subscribers_count', len(notified_subscriptions_ids))
+        pipeline.hincrby(progress_key, 'chunks_count', 1)
+        pipeline.hset(progress_key, 'finished', 0)
+        pipeline.expire(progress_key, settings.SUBSCRIBERS_FAN_OUT_PROGRESS_TTL)
+        pipeline.execute()
+
+    finished = len(subscriptions_chunk) < settings.SUBSCRIBERS_FAN_OUT_CHUNK_SIZE
+
+    if finished:
+        pipeline = redis.pipeline(transaction=False)
+        pipeline.hset(progress_key, 'finished', 1)
+        pipeline.expire(progress_key, settings.SUBSCRIBERS_FAN_OUT_PROGRESS_TTL)
+        pipeline.execute()
+
+    return finished
+
+
+def _get_subscribers_redis_connection():
+    return get_redis_connection('default')
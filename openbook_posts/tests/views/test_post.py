@@ -14,6 +14,7 @@ from django.core.files.images import ImageFile
 from django.core.files import File
 from django.core.cache import cache
 from django.conf import settings
+from django.test import override_settings
 from unittest import mock
 
 import logging
@@ -27,7 +28,8 @@ from openbook_common.utils.model_loaders import get_language_model
 from openbook_communities.models import Community
 from openbook_hashtags.models import Hashtag
 from openbook_notifications.models import PostUserMentionNotification, Notification
-from openbook_posts.models import Post, PostUserMention, PostMedia
+from openbook_posts.models import Post, PostUserMention, PostMedia, PostCounts
+from openbook_posts.soft_deletion import get_soft_deletion_progress, SOFT_DELETION_TARGET_POST
 from openbook_common.models import ProxyBlacklistedDomain
 
 logger = logging.getLogger(__name__)
@@ -651,6 +653,34 @@ class PostItemAPITests(OpenbookAPITestCase):
 
         self.assertFalse(access(file.name, F_OK))
 
+    def test_delete_media_image_post(self):
+        """
+        should be able to delete media image post and the files of its image, thumbnail and media thumbnail
+        """
+        user = make_user()
+
+        image = Image.new('RGB', (100, 100))
+        tmp_file = tempfile.NamedTemporaryFile(suffix='.jpg')
+        image.save(tmp_file)
+        tmp_file.seek(0)
+        image = ImageFile(tmp_file)
+
+        post = user.create_public_post(text=make_fake_post_text(), image=image)
+        post_image = post.get_first_media().content_object
+
+        files_names = {
+            post_image.image.file.name,
+            post_image.thumbnail.file.name,
+            post.media_thumbnail.file.name,
+        }
+
+        self.assertEqual(len(files_names), 3)
+
+        user.delete_post(post=post)
+
+        for file_name in files_names:
+            self.assertFalse(access(file_name, F_OK))
+
     def test_delete_video_post(self):
         """
         should be able to delete video post and file
@@ -1037,6 +1067,47 @@ class PostItemAPITests(OpenbookAPITestCase):
         self.assertEqual(post.hashtags.filter(name=hashtag.name).count(), 1)
         self.assertEqual(post.hashtags.all().count(), 1)
 
+    def test_editing_own_post_with_other_hashtags_relinks_hashtags(self):
+        """
+        when editing a post with other hashtags, should unlink the removed ones and keep the hashtags themselves
+        """
+        user = make_user()
+
+        headers = make_authentication_headers_for_user(user=user)
+
+        removed_hashtag_name = make_hashtag_name()
+        kept_hashtag_name = make_hashtag_name()
+        added_hashtag_name = make_hashtag_name()
+
+        post = user.create_public_post(text='#%s #%s' % (removed_hashtag_name, kept_hashtag_name))
+
+        data = {
+            'text': '#%s #%s' % (kept_hashtag_name, added_hashtag_name)
+        }
+
+        url = self._get_url(post)
+
+        response = self.client.patch(url, data, **headers, format='multipart')
+
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+
+        self.assertEqual(set(post.hashtags.values_list('name', flat=True)), {kept_hashtag_name, added_hashtag_name})
+        self.assertTrue(Hashtag.objects.filter(name=removed_hashtag_name).exists())
+
+    def test_saving_post_without_changing_its_text_skips_its_hashtags(self):
+        """
+        when saving a post without changing its text, should not process its hashtags again
+        """
+        user = make_user()
+
+        post = user.create_public_post(text='#%s' % make_hashtag_name())
+        post = Post.objects.get(pk=post.pk)
+
+        with mock.patch('openbook_posts.models.link_hashtags_of_text') as link_hashtags_of_text_call:
+            post.save()
+
+            link_hashtags_of_text_call.assert_not_called()
+
     def test_edit_text_post_with_more_hashtags_than_allowed_should_not_edit_it(self):
         """
         when editing a post with more than allowed hashtags, should not create it
@@ -1231,6 +1302,38 @@ class PostItemAPITests(OpenbookAPITestCase):
 
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
+    @override_settings(SOFT_DELETION_CHUNK_SIZE=2)
+    def test_soft_deleting_post_soft_deletes_comments_in_chunks(self):
+        """
+        should soft delete the comments of a post and their notifications in chunks and restore them
+        """
+        post_creator = make_user()
+        post = post_creator.create_public_post(text=make_fake_post_text())
+
+        for i in range(0, 5):
+            make_user().comment_post(post=post, text=make_fake_post_comment_text())
+
+        self.assertEqual(Notification.objects.filter(owner=post_creator,
+                                                     notification_type=Notification.POST_COMMENT).count(), 5)
+
+        post.soft_delete()
+
+        self.assertFalse(post.comments.filter(is_deleted=False).exists())
+        self.assertFalse(Notification.objects.filter(owner=post_creator,
+                                                     notification_type=Notification.POST_COMMENT).exists())
+        self.assertEqual(post_creator.get_unread_notifications_count(), 0)
+
+        progress = get_soft_deletion_progress(target_type=SOFT_DELETION_TARGET_POST, target_id=post.pk)
+        self.assertEqual(progress['post_comments_count'], 5)
+        self.assertEqual(progress['posts_count'], 1)
+        self.assertEqual(progress['chunks_count'], 4)
+        self.assertEqual(progress['finished'], 1)
+
+        post.unsoft_delete()
+
+        self.assertFalse(post.comments.filter(is_deleted=True).exists())
+        self.assertEqual(PostCounts.get_counts_for_post_with_id(post_id=post.pk).comments_count, 5)
+
     def test_cant_retrieve_reported_community_post(self):
         """
         should not be able to retrieve reported community post
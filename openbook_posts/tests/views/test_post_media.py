@@ -5,6 +5,7 @@ import tempfile
 from PIL import Image
 from django.conf import settings
 from django.core.files import File
+from django.test import override_settings
 from django.urls import reverse
 from django_rq import get_worker
 from faker import Faker
@@ -184,7 +185,7 @@ class PostMediaAPITests(OpenbookAPITestCase):
 
     def test_add_first_media_video_creates_media_thumbnail_and_dimensions(self):
         """
-        should create a post media_thumbnail and dimensions when adding the first media video
+        should create a post media_thumbnail and dimensions when processing the first media video
         """
         user = make_user()
         headers = make_authentication_headers_for_user(user=user)
@@ -205,6 +206,19 @@ class PostMediaAPITests(OpenbookAPITestCase):
 
                 post.refresh_from_db()
 
+                # The video is processed off the request
+                self.assertIsNone(post.media_width)
+                self.assertIsNone(post.get_first_media().content_object.duration)
+
+                post.publish()
+
+                # Run the process handled by a worker
+                get_worker('high', worker_class=SimpleWorker).work(burst=True)
+
+                post.refresh_from_db()
+
+                self.assertEqual(post.status, Post.STATUS_PUBLISHED)
+
                 post_video = post.get_first_media().content_object
 
                 post_video_aspect_ratio = post_video.width / post_video.height
@@ -332,6 +346,43 @@ class PostMediaAPITests(OpenbookAPITestCase):
 
         self._compare_response_media_with_post_media(post_media=post_media, response_media=response_media)
 
+    def test_can_retrieve_own_post_media_image_derivatives(self):
+        """
+        should be able to retrieve the derivatives of an own post media image
+        """
+        user = make_user()
+
+        headers = make_authentication_headers_for_user(user=user)
+
+        test_image = get_test_images()[1]
+
+        with open(test_image['path'], 'rb') as file:
+            file = File(file)
+            post = user.create_public_post(image=file)
+
+        get_worker('high', worker_class=SimpleWorker).work(burst=True)
+
+        url = self._get_url(post=post)
+
+        response = self.client.get(url, **headers, format='multipart')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response_media = json.loads(response.content)
+
+        post_image = post.get_first_media().content_object
+        response_image_derivatives = response_media[0]['content_object']['image_derivatives']
+
+        self.assertEqual(len(response_image_derivatives), len(post_image.image.get_derivatives()))
+
+        for response_image_derivative in response_image_derivatives:
+            self.assertIn(response_image_derivative['format'], ('webp', 'jpeg'))
+            self.assertIn(str(post_image.image), response_image_derivative['url'])
+
+        # The image field is the stored image
+        self.assertIn(str(post_image.image), response_media[0]['content_object']['image'])
+        self.assertNotIn('derivatives/', response_media[0]['content_object']['image'])
+
     def test_can_retrieve_own_post_media_video(self):
         """
         should be able to retrieve an own post media video
@@ -364,6 +415,41 @@ class PostMediaAPITests(OpenbookAPITestCase):
 
         # foreign
 
+    @override_settings(VIDEO_ENCODING_HLS_ENABLED=True)
+    def test_can_retrieve_own_post_media_video_hls_playlist(self):
+        """
+        should encode the video to an HLS ladder and retrieve its master playlist
+        """
+        user = make_user()
+
+        headers = make_authentication_headers_for_user(user=user)
+
+        test_video = get_test_video()
+
+        with open(test_video['path'], 'rb') as file:
+            file = File(file)
+            post = user.create_public_post(video=file)
+
+        get_worker('high', worker_class=SimpleWorker).work(burst=True)
+
+        url = self._get_url(post=post)
+
+        response = self.client.get(url, **headers, format='multipart')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response_media = json.loads(response.content)
+
+        post_video = post.get_media().get().content_object
+        hls_format = post_video.format_set.get(format='hls')
+
+        self.assertEqual(hls_format.progress, 100)
+        self.assertTrue(hls_format.playlist.name.endswith('/master.m3u8'))
+        self.assertIn(hls_format.playlist.url, response_media[0]['content_object']['hls_playlist'])
+
+        with hls_format.playlist.open('r') as master_playlist:
+            self.assertIn('#EXT-X-STREAM-INF', master_playlist.read())
+
     def test_can_retrieve_foreign_user_post_media_image(self):
         """
         should be able to retrieve an foreign_user post media image
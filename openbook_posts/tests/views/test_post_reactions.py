@@ -1,5 +1,7 @@
 # Create your tests here.
 import json
+from unittest import mock
+
 from django.urls import reverse
 from faker import Faker
 from rest_framework import status
@@ -10,7 +12,7 @@ from openbook_common.tests.helpers import make_authentication_headers_for_user,
     make_fake_post_comment_text, make_user, make_circle, make_emoji, make_emoji_group, make_reactions_emoji_group, \
     make_community
 from openbook_notifications.models import PostReactionNotification
-from openbook_posts.models import PostReaction
+from openbook_posts.models import PostReaction, PostReactionEmojiCount
 
 logger = logging.getLogger(__name__)
 fake = Faker()
@@ -654,6 +656,81 @@ class PostReactionsEmojiCountAPITests(OpenbookAPITestCase):
             reaction_count = reaction['count']
             self.assertEqual(count, reaction_count)
 
+    def test_reactions_emoji_count_follows_reactions_changes(self):
+        """
+        should keep the reactions emoji count up to date when reactions are made, changed and deleted
+        """
+        user = make_user()
+        headers = make_authentication_headers_for_user(user)
+        post = user.create_public_post(text=make_fake_post_text())
+        emoji_group = make_reactions_emoji_group()
+        emoji = make_emoji(group=emoji_group)
+        other_emoji = make_emoji(group=emoji_group)
+
+        reactors = [make_user() for i in range(0, 3)]
+
+        for reactor in reactors:
+            reactor.react_to_post_with_id(post_id=post.pk, emoji_id=emoji.pk)
+
+        url = self._get_url(post)
+
+        # Builds the counts
+        response = self.client.get(url, **headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        reactors[0].react_to_post_with_id(post_id=post.pk, emoji_id=other_emoji.pk)
+        post_reaction = reactors[1].get_reaction_for_post_with_id(post_id=post.pk)
+        reactors[1].delete_reaction_with_id_for_post_with_id(post_reaction_id=post_reaction.pk, post_id=post.pk)
+
+        response = self.client.get(url, **headers)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response_emojis_counts = json.loads(response.content)
+
+        counts_by_emoji_id = {response_emoji_count['emoji']['id']: response_emoji_count['count'] for
+                              response_emoji_count in response_emojis_counts}
+
+        self.assertEqual(counts_by_emoji_id, {emoji.pk: 1, other_emoji.pk: 1})
+
+    def test_reactions_emoji_count_counts_reaction_made_while_building(self):
+        """
+        should count a reaction made after the counts were computed from the reactions and before they are used
+        """
+        user = make_user()
+        headers = make_authentication_headers_for_user(user)
+        post = user.create_public_post(text=make_fake_post_text())
+        emoji_group = make_reactions_emoji_group()
+        emoji = make_emoji(group=emoji_group)
+
+        reactor = make_user()
+        reactor.react_to_post_with_id(post_id=post.pk, emoji_id=emoji.pk)
+
+        late_reactor = make_user()
+
+        reconcile_counts_for_posts_with_ids = PostReactionEmojiCount.reconcile_counts_for_posts_with_ids
+
+        def reconcile_counts_then_react(posts_ids, **kwargs):
+            repaired_counts = reconcile_counts_for_posts_with_ids(posts_ids=posts_ids, **kwargs)
+            late_reactor.react_to_post_with_id(post_id=post.pk, emoji_id=emoji.pk)
+            return repaired_counts
+
+        url = self._get_url(post)
+
+        with mock.patch.object(PostReactionEmojiCount, 'reconcile_counts_for_posts_with_ids',
+                               side_effect=reconcile_counts_then_react):
+            response = self.client.get(url, **headers)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.get(url, **headers)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response_emojis_counts = json.loads(response.content)
+
+        self.assertEqual(len(response_emojis_counts), 1)
+        self.assertEqual(response_emojis_counts[0]['count'], 2)
+
     def test_cannot_retrieve_reaction_from_blocked_user(self):
         """
          should not be able to retrieve the reaction from a blocked user
@@ -1,11 +1,13 @@
 # Create your tests here.
 import tempfile
+from datetime import timedelta
 from unittest import mock
 
 from PIL import Image
 from django.conf import settings
 from django.core.files import File
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
 from django.urls import reverse
 from django_rq import get_worker
 from faker import Faker
@@ -34,8 +36,14 @@ from openbook_hashtags.models import Hashtag
 from openbook_lists.models import List
 from openbook_moderation.models import ModeratedObject
 from openbook_notifications.models import PostUserMentionNotification, Notification, UserNewPostNotification
-from openbook_posts.jobs import curate_top_posts, curate_trending_posts
+from openbook_posts.jobs import curate_top_posts, curate_trending_posts, fan_out_post_to_timelines, \
+    resume_interrupted_post_media_processing, fan_out_post_to_subscribers
+from openbook_posts.media_processing import beat_media_processing_of_post_with_id, \
+    clear_media_processing_heartbeat_of_post_with_id, count_media_processing_attempt_of_post_with_id
 from openbook_posts.models import Post, PostUserMention, PostMedia, TopPost, TrendingPost
+from openbook_posts.subscribers import get_subscribers_fan_out_progress_for_post_with_id
+from openbook_posts.timelines import invalidate_timeline_for_user_with_id, timeline_exists_for_user_with_id, \
+    get_timeline_posts_ids_for_user_with_id
 
 logger = logging.getLogger(__name__)
 fake = Faker()
@@ -544,6 +552,40 @@ class PostsAPITests(OpenbookAPITestCase):
 
         self.assertFalse(PostUserMention.objects.filter(post_id=post.pk, user_id=user.pk).exists())
 
+    def test_create_text_post_detects_mentions_of_several_users(self):
+        """
+        should detect the mentions of every mentioned user who can see the post and notify them
+        """
+        user = make_user()
+
+        headers = make_authentication_headers_for_user(user=user)
+
+        mentioned_users = [make_user() for i in range(0, 3)]
+
+        blocking_user = make_user()
+        blocking_user.block_user_with_id(user_id=user.pk)
+
+        post_text = 'Hello ' + ' '.join(
+            '@' + mentioned_user.username.upper() for mentioned_user in mentioned_users + [blocking_user])
+
+        data = {
+            'text': post_text,
+        }
+
+        url = self._get_url()
+        response = self.client.put(url, data, **headers, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        post = Post.objects.get(text=post_text, creator_id=user.pk)
+
+        self.assertEqual(set(PostUserMention.objects.filter(post_id=post.pk).values_list('user_id', flat=True)),
+                         set(mentioned_user.pk for mentioned_user in mentioned_users))
+
+        for mentioned_user in mentioned_users:
+            self.assertTrue(PostUserMentionNotification.objects.filter(
+                post_user_mention__post_id=post.pk,
+                notification__owner_id=mentioned_user.pk,
+                notification__notification_type=Notification.POST_USER_MENTION).exists())
+
     def test_create_post_is_added_to_world_circle(self):
         """
         the created text post should automatically added to world circle
@@ -873,6 +915,9 @@ class PostsAPITests(OpenbookAPITestCase):
 
                 response_post_id = response_post.get('id')
 
+                # Run the process handled by a worker
+                get_worker('high', worker_class=SimpleWorker).work(burst=True)
+
                 media = PostMedia.objects.get(post_id=response_post_id, type=PostMedia.MEDIA_TYPE_VIDEO)
                 self.assertIsNotNone(media.content_object.thumbnail)
                 self.assertIsNotNone(media.content_object.thumbnail_width)
@@ -1393,6 +1438,35 @@ class PostsAPITests(OpenbookAPITestCase):
             self.assertIn(response_post_id, all_posts_ids)
             self.assertTrue(response_post_id > min_id)
 
+    def test_get_all_posts_respects_blocks_made_after_the_first_retrieval(self):
+        """
+        should stop and resume retrieving the community posts of a user once blocked and unblocked
+        """
+        user = make_user()
+        community_creator = make_user()
+        community = make_community(creator=community_creator)
+        user.join_community_with_name(community_name=community.name)
+
+        user_to_block = make_user()
+        user_to_block.join_community_with_name(community_name=community.name)
+        post = user_to_block.create_community_post(text=make_fake_post_text(), community_name=community.name)
+
+        headers = make_authentication_headers_for_user(user)
+        url = self._get_url()
+
+        response = self.client.get(url, **headers)
+        self.assertEqual([post.pk], [response_post['id'] for response_post in json.loads(response.content)])
+
+        user.block_user_with_id(user_id=user_to_block.pk)
+
+        response = self.client.get(url, **headers)
+        self.assertEqual([], json.loads(response.content))
+
+        user.unblock_user_with_id(user_id=user_to_block.pk)
+
+        response = self.client.get(url, **headers)
+        self.assertEqual([post.pk], [response_post['id'] for response_post in json.loads(response.content)])
+
     def test_get_all_public_posts_for_unconnected_user(self):
         """
         should be able to retrieve all the public posts of an unconnected user
@@ -1476,6 +1550,50 @@ class PostsAPITests(OpenbookAPITestCase):
         for post_id in created_posts_ids:
             self.assertIn(post_id, response_posts_ids)
 
+    def test_get_posts_of_connected_user_in_several_circles_once(self):
+        """
+        should retrieve once, newest first, the posts of a connected user shared in several of the circles we're in
+        """
+        user = make_user()
+
+        user_to_connect_with = make_user()
+
+        user.connect_with_user_with_id(user_to_connect_with.pk)
+        user_to_connect_with.confirm_connection_with_user_with_id(user.pk)
+
+        circle = make_circle(creator=user_to_connect_with)
+        other_circle = make_circle(creator=user_to_connect_with)
+
+        user_to_connect_with.update_connection_with_user_with_id(user_id=user.pk,
+                                                                 circles_ids=[circle.pk, other_circle.pk])
+
+        encircled_post = user_to_connect_with.create_encircled_post(text=make_fake_post_text(),
+                                                                    circles_ids=[circle.pk, other_circle.pk])
+        public_post = user_to_connect_with.create_public_post(make_fake_post_text())
+
+        headers = make_authentication_headers_for_user(user)
+
+        url = self._get_url()
+
+        response = self.client.get(url, {
+            'username': user_to_connect_with.username
+        }, **headers)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response_posts_ids = [post['id'] for post in json.loads(response.content)]
+
+        self.assertEqual([public_post.pk, encircled_post.pk], response_posts_ids)
+
+        response = self.client.get(url, {
+            'username': user_to_connect_with.username,
+            'max_id': public_post.pk
+        }, **headers)
+
+        response_posts_ids = [post['id'] for post in json.loads(response.content)]
+
+        self.assertEqual([encircled_post.pk], response_posts_ids)
+
     def test_get_all_public_posts_for_user_unauthenticated(self):
         """
         should be able to retrieve all the public posts of an specific user
@@ -3594,6 +3712,73 @@ class PostsAPITests(OpenbookAPITestCase):
 
         self.assertEqual(0, len(response_posts))
 
+    @mock.patch('openbook_posts.jobs.process_post_media')
+    def test_resumes_interrupted_post_media_processing(self, process_post_media_mock):
+        """
+        should queue again the media processing of the processing posts whose job stopped making progress
+        """
+        user = make_user()
+
+        interrupted_post = user.create_public_post(text=make_fake_post_text())
+        running_post = user.create_public_post(text=make_fake_post_text())
+
+        Post.objects.filter(pk__in=[interrupted_post.pk, running_post.pk]).update(status=Post.STATUS_PROCESSING)
+
+        beat_media_processing_of_post_with_id(post_id=running_post.pk)
+        clear_media_processing_heartbeat_of_post_with_id(post_id=interrupted_post.pk)
+
+        resume_interrupted_post_media_processing()
+
+        process_post_media_mock.delay.assert_called_once_with(post_id=interrupted_post.pk)
+
+    @override_settings(POST_MEDIA_PROCESSING_MAX_ATTEMPTS=2)
+    @mock.patch('openbook_posts.jobs.process_post_media')
+    def test_gives_up_post_media_processing_interrupted_too_many_times(self, process_post_media_mock):
+        """
+        should move back to a draft the processing post whose job was interrupted too many times
+        """
+        user = make_user()
+
+        post = user.create_public_post(text=make_fake_post_text())
+        Post.objects.filter(pk=post.pk).update(status=Post.STATUS_PROCESSING)
+
+        count_media_processing_attempt_of_post_with_id(post_id=post.pk)
+        resume_interrupted_post_media_processing()
+
+        process_post_media_mock.delay.assert_called_once_with(post_id=post.pk)
+
+        count_media_processing_attempt_of_post_with_id(post_id=post.pk)
+        clear_media_processing_heartbeat_of_post_with_id(post_id=post.pk)
+        resume_interrupted_post_media_processing()
+
+        self.assertEqual(process_post_media_mock.delay.call_count, 1)
+
+        post.refresh_from_db()
+        self.assertEqual(post.status, Post.STATUS_DRAFT)
+
+    def test_failed_post_media_processing_moves_post_to_draft(self):
+        """
+        should move the post back to a draft and stop it being taken as interrupted when processing its media fails
+        """
+        user = make_user()
+
+        test_video = get_test_videos()[0]
+
+        with mock.patch('openbook_posts.models.PostVideo.process', side_effect=ValueError('Corrupted video')):
+            with open(test_video['path'], 'rb') as file:
+                file = File(file)
+                post = user.create_public_post(text=make_fake_post_text(), video=file)
+
+            get_worker('high', worker_class=SimpleWorker).work(burst=True)
+
+        post.refresh_from_db()
+        self.assertEqual(post.status, Post.STATUS_DRAFT)
+
+        with mock.patch('openbook_posts.jobs.process_post_media') as process_post_media_mock:
+            resume_interrupted_post_media_processing()
+
+        process_post_media_mock.delay.assert_not_called()
+
     def test_create_post_notifies_subscribers(self):
         """
         should notify subscribers when a post is created
@@ -3616,6 +3801,57 @@ class PostsAPITests(OpenbookAPITestCase):
         self.assertTrue(UserNewPostNotification.objects.filter(
             user_notifications_subscription=user_notifications_subscription).count() == 1)
 
+    @override_settings(SUBSCRIBERS_FAN_OUT_CHUNK_SIZE=2)
+    def test_create_post_notifies_subscribers_in_chunks(self):
+        """
+        should notify every subscriber once when they take several chunks and record the progress
+        """
+        user = make_user()
+
+        subscribers = make_users(amount=5)
+
+        for subscriber in subscribers:
+            subscriber.enable_new_post_notifications_for_user_with_username(user.username)
+
+        headers = make_authentication_headers_for_user(user)
+        data = {'text': make_fake_post_text()}
+
+        url = self._get_url()
+        response = self.client.put(url, data, **headers, format='multipart')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        post = Post.objects.get(creator=user)
+
+        for subscriber in subscribers:
+            self.assertEqual(Notification.objects.filter(owner=subscriber,
+                                                         notification_type=Notification.USER_NEW_POST).count(), 1)
+
+        self.assertEqual(UserNewPostNotification.objects.filter(post=post).count(), len(subscribers))
+
+        progress = get_subscribers_fan_out_progress_for_post_with_id(post_id=post.pk)
+        self.assertEqual(progress['notified_subscribers_count'], len(subscribers))
+        self.assertEqual(progress['chunks_count'], 3)
+        self.assertEqual(progress['finished'], 1)
+
+    def test_fan_out_post_to_subscribers_finishes_without_subscribers_or_post(self):
+        """
+        should finish the fan out of a post without subscribers and of a post deleted before the job ran
+        """
+        user = make_user()
+
+        post = user.create_public_post(text=make_fake_post_text())
+        fan_out_post_to_subscribers(post_id=post.pk)
+
+        progress = get_subscribers_fan_out_progress_for_post_with_id(post_id=post.pk)
+        self.assertEqual(progress['finished'], 1)
+
+        deleted_post = user.create_public_post(text=make_fake_post_text())
+        deleted_post_id = deleted_post.pk
+        deleted_post.delete()
+
+        fan_out_post_to_subscribers(post_id=deleted_post_id)
+
     def test_create_post_does_not_notify_subscribers_if_post_creator_is_blocked(self):
         """
         should NOT notify subscribers if creator is blocked when a post is created
@@ -3701,6 +3937,162 @@ class PostsAPITests(OpenbookAPITestCase):
         self.assertTrue(UserNewPostNotification.objects.filter(
             user_notifications_subscription=subscriber_notifications_subscription).count() == 1)
 
+    def test_get_all_posts_serializes_viewer_state_in_batch(self):
+        """
+        should serialize the reaction, mute, comments count and emoji counts of the viewer for every post
+        """
+        user = make_user()
+        headers = make_authentication_headers_for_user(user)
+
+        emoji_group = make_reactions_emoji_group()
+        emoji = make_emoji(group=emoji_group)
+
+        followed_user = make_user()
+        user.follow_user(followed_user)
+
+        reacted_post = followed_user.create_public_post(text=make_fake_post_text())
+        user.react_to_post_with_id(post_id=reacted_post.pk, emoji_id=emoji.pk)
+        followed_user.comment_post_with_id(post_id=reacted_post.pk, text=make_fake_post_comment_text())
+
+        blocked_user = make_user()
+        blocked_user.comment_post_with_id(post_id=reacted_post.pk, text=make_fake_post_comment_text())
+        user.block_user_with_id(user_id=blocked_user.pk)
+
+        muted_post = followed_user.create_public_post(text=make_fake_post_text())
+        user.mute_post_with_id(post_id=muted_post.pk)
+
+        url = self._get_url()
+        response = self.client.get(url, **headers)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response_posts = {response_post['id']: response_post for response_post in json.loads(response.content)}
+
+        response_reacted_post = response_posts[reacted_post.pk]
+        self.assertEqual(response_reacted_post['reaction']['emoji']['id'], emoji.pk)
+        self.assertEqual(response_reacted_post['comments_count'], 1)
+        self.assertEqual(response_reacted_post['reactions_emoji_counts'][0]['count'], 1)
+        self.assertFalse(response_reacted_post['is_muted'])
+
+        response_muted_post = response_posts[muted_post.pk]
+        self.assertIsNone(response_muted_post['reaction'])
+        self.assertEqual(response_muted_post['comments_count'], 0)
+        self.assertEqual(response_muted_post['reactions_emoji_counts'], [])
+        self.assertTrue(response_muted_post['is_muted'])
+
+    def test_get_all_posts_looks_up_image_derivatives_in_batch(self):
+        """
+        should look up the image derivatives of all the posts at once
+        """
+        user = make_user()
+        headers = make_authentication_headers_for_user(user)
+
+        followed_user = make_user()
+        user.follow_user(followed_user)
+
+        for i in range(0, 3):
+            test_image = get_test_image()
+            with open(test_image['path'], 'rb') as file:
+                file = File(file)
+                followed_user.create_public_post(text=make_fake_post_text(), image=file)
+
+        get_worker('high', worker_class=SimpleWorker).work(burst=True)
+
+        from openbook_common.utils import image_derivatives
+
+        with mock.patch('openbook_common.fields.get_image_derivatives_urls',
+                        wraps=image_derivatives.get_image_derivatives_urls) as mock_get_image_derivatives_urls:
+            url = self._get_url()
+            response = self.client.get(url, **headers)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response_posts = json.loads(response.content)
+
+        self.assertEqual(len(response_posts), 3)
+        self.assertEqual(mock_get_image_derivatives_urls.call_count, 1)
+
+        for response_post in response_posts:
+            self.assertTrue(len(response_post['media_thumbnail_derivatives']) > 0)
+
+    @override_settings(FEATURE_MATERIALIZED_TIMELINE_ENABLED=True)
+    def test_get_all_posts_rebuilds_cold_materialized_timeline(self):
+        """
+        should retrieve the posts of a cold materialized timeline and rebuild it in the background
+        """
+        user = make_user()
+        headers = make_authentication_headers_for_user(user)
+        invalidate_timeline_for_user_with_id(user_id=user.pk)
+
+        followed_user = make_user()
+        user.follow_user(followed_user)
+        post = followed_user.create_public_post(text=make_fake_post_text())
+
+        url = self._get_url()
+        response = self.client.get(url, **headers)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response_posts = json.loads(response.content)
+        self.assertEqual([post.pk], [response_post['id'] for response_post in response_posts])
+
+        get_worker('default', worker_class=SimpleWorker).work(burst=True)
+
+        self.assertTrue(timeline_exists_for_user_with_id(user_id=user.pk))
+        self.assertEqual([post.pk], get_timeline_posts_ids_for_user_with_id(user_id=user.pk))
+
+    @override_settings(FEATURE_MATERIALIZED_TIMELINE_ENABLED=True)
+    def test_get_all_posts_reads_fanned_out_posts_from_materialized_timeline(self):
+        """
+        should retrieve the posts fanned out to a warm materialized timeline
+        """
+        user = make_user()
+        headers = make_authentication_headers_for_user(user)
+        invalidate_timeline_for_user_with_id(user_id=user.pk)
+
+        followed_user = make_user()
+        user.follow_user(followed_user)
+
+        url = self._get_url()
+        self.client.get(url, **headers)
+        get_worker('default', worker_class=SimpleWorker).work(burst=True)
+
+        post = followed_user.create_public_post(text=make_fake_post_text())
+        fan_out_post_to_timelines(post_id=post.pk)
+
+        self.assertEqual([post.pk], get_timeline_posts_ids_for_user_with_id(user_id=user.pk))
+
+        response = self.client.get(url, **headers)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response_posts = json.loads(response.content)
+        self.assertEqual([post.pk], [response_post['id'] for response_post in response_posts])
+
+    @override_settings(FEATURE_MATERIALIZED_TIMELINE_ENABLED=True)
+    def test_get_all_posts_excludes_reported_posts_from_materialized_timeline(self):
+        """
+        should not retrieve reported posts from a warm materialized timeline
+        """
+        user = make_user()
+        headers = make_authentication_headers_for_user(user)
+        invalidate_timeline_for_user_with_id(user_id=user.pk)
+
+        followed_user = make_user()
+        user.follow_user(followed_user)
+
+        url = self._get_url()
+        self.client.get(url, **headers)
+        get_worker('default', worker_class=SimpleWorker).work(burst=True)
+
+        post = followed_user.create_public_post(text=make_fake_post_text())
+        fan_out_post_to_timelines(post_id=post.pk)
+
+        user.report_post(post=post, category_id=make_moderation_category().pk)
+
+        response = self.client.get(url, **headers)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response_posts = json.loads(response.content)
+        self.assertEqual(0, len(response_posts))
+
     def _get_url(self):
         return reverse('posts')
 
@@ -4184,6 +4576,41 @@ class TrendingPostsAPITests(OpenbookAPITestCase):
         response_post = response_posts[0]
         self.assertEqual(response_post['post']['id'], post_two.pk)
 
+    def test_displays_most_active_community_posts_first(self):
+        """
+        should display the community posts with the most activity first and not rewrite unchanged trending posts
+        """
+        user = make_user()
+        community = make_community(creator=user)
+
+        post = user.create_community_post(community_name=community.name, text=make_fake_post_text())
+        post_two = user.create_community_post(community_name=community.name, text=make_fake_post_text())
+
+        emoji_group = make_reactions_emoji_group()
+        emoji = make_emoji(group=emoji_group)
+
+        user.react_to_post_with_id(post_id=post.pk, emoji_id=emoji.pk)
+        user.react_to_post_with_id(post_id=post_two.pk, emoji_id=emoji.pk)
+        user.comment_post(post_two, text=make_fake_post_comment_text())
+
+        curate_trending_posts()
+
+        trending_posts_ids = list(TrendingPost.objects.order_by('id').values_list('id', flat=True))
+
+        curate_trending_posts()
+
+        self.assertEqual(trending_posts_ids, list(TrendingPost.objects.order_by('id').values_list('id', flat=True)))
+
+        headers = make_authentication_headers_for_user(user)
+
+        url = self._get_url()
+
+        response = self.client.get(url, **headers, format='multipart')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response_posts = json.loads(response.content)
+        self.assertEqual([post_two.pk, post.pk], [response_post['post']['id'] for response_post in response_posts])
+
     def _get_url(self):
         return reverse('trending-posts-new')
 
@@ -4808,5 +5235,34 @@ class TopPostsAPITests(OpenbookAPITestCase):
         response_posts = json.loads(response.content)
         self.assertEqual(5, len(response_posts))
 
+    def test_curates_only_posts_changed_since_last_run(self):
+        """
+        should only consider posts commented or reacted to since the last curation unless curating in full
+        """
+        user = make_user()
+        community = make_community(creator=user)
+
+        post = user.create_community_post(community_name=community.name, text=make_fake_post_text())
+        user.comment_post(post, text=make_fake_post_comment_text())
+
+        curate_top_posts()
+        self.assertTrue(TopPost.objects.filter(post_id=post.pk).exists())
+
+        TopPost.objects.filter(post_id=post.pk).delete()
+
+        with mock.patch('openbook_posts.jobs.TOP_POSTS_CURATION_WATERMARK_OVERLAP', timedelta()):
+            curate_top_posts()
+            self.assertFalse(TopPost.objects.filter(post_id=post.pk).exists())
+
+            user.comment_post(post, text=make_fake_post_comment_text())
+
+            curate_top_posts()
+            self.assertTrue(TopPost.objects.filter(post_id=post.pk).exists())
+
+        TopPost.objects.filter(post_id=post.pk).delete()
+
+        curate_top_posts(full=True)
+        self.assertTrue(TopPost.objects.filter(post_id=post.pk).exists())
+
     def _get_url(self):
         return reverse('top-posts')
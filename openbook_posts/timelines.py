@@ -0,0 +1,131 @@
+from django.conf import settings
+from django_redis import get_redis_connection
+
+from openbook_common.utils.model_loaders import get_follow_model, get_connection_model, \
+    get_community_membership_model, get_circle_model
+
+# Every materialized timeline holds this member with score 0 so that a warm but empty timeline
+# can be told apart from a cold (missing) one. Real post ids are always >= 1.
+TIMELINE_SENTINEL_MEMBER = 0
+
+TIMELINE_FAN_OUT_CHUNK_SIZE = 1000
+
+
+def is_materialized_timeline_enabled():
+    return settings.FEATURE_MATERIALIZED_TIMELINE_ENABLED
+
+
+def make_timeline_key_for_user_with_id(user_id):
+    return 'ob-api-timeline-%d' % user_id
+
+
+def timeline_exists_for_user_with_id(user_id):
+    redis = _get_timelines_redis_connection()
+    return redis.exists(make_timeline_key_for_user_with_id(user_id)) > 0
+
+
+def get_timeline_posts_ids_for_user_with_id(user_id, max_id=None, min_id=None, count=None):
+    """
+    Returns the post ids of the materialized timeline, newest first.
+    Returns None if the timeline is cold.
+    """
+    redis = _get_timelines_redis_connection()
+    timeline_key = make_timeline_key_for_user_with_id(user_id)
+
+    max_score = '(%d' % max_id if max_id else '+inf'
+    min_score = '(%d' % (min_id if min_id else TIMELINE_SENTINEL_MEMBER)
+
+    pipeline = redis.pipeline(transaction=False)
+    pipeline.exists(timeline_key)
+    pipeline.zrevrangebyscore(timeline_key, max_score, min_score, start=0,
+                              num=count if count else settings.TIMELINE_MAX_POSTS)
+    timeline_exists, posts_ids = pipeline.execute()
+
+    if not timeline_exists:
+        return None
+
+    return [int(post_id) for post_id in posts_ids]
+
+
+def set_timeline_posts_ids_for_user_with_id(user_id, posts_ids):
+    """
+    Replaces the materialized timeline of the user with the given post ids.
+    """
+    redis = _get_timelines_redis_connection()
+    timeline_key = make_timeline_key_for_user_with_id(user_id)
+
+    timeline_members = {post_id: post_id for post_id in posts_ids[:settings.TIMELINE_MAX_POSTS]}
+    timeline_members[TIMELINE_SENTINEL_MEMBER] = TIMELINE_SENTINEL_MEMBER
+
+    pipeline = redis.pipeline(transaction=True)
+    pipeline.delete(timeline_key)
+    pipeline.zadd(timeline_key, timeline_members)
+    pipeline.expire(timeline_key, settings.TIMELINE_TTL)
+    pipeline.execute()
+
+
+def add_post_with_id_to_timelines_of_users_with_ids(post_id, users_ids):
+    """
+    Pushes the post id into the warm timelines of the given users, capping each timeline.
+    Cold timelines are left untouched, they will be rebuilt on their next read.
+    """
+    redis = _get_timelines_redis_connection()
+    users_ids = list(users_ids)
+
+    for chunk_start in range(0, len(users_ids), TIMELINE_FAN_OUT_CHUNK_SIZE):
+        chunk_users_ids = users_ids[chunk_start:chunk_start + TIMELINE_FAN_OUT_CHUNK_SIZE]
+        timelines_keys = [make_timeline_key_for_user_with_id(user_id) for user_id in chunk_users_ids]
+
+        exists_pipeline = redis.pipeline(transaction=False)
+        for timeline_key in timelines_keys:
+            exists_pipeline.exists(timeline_key)
+        timelines_exist = exists_pipeline.execute()
+
+        pipeline = redis.pipeline(transaction=False)
+        for timeline_key, timeline_exists in zip(timelines_keys, timelines_exist):
+            if not timeline_exists:
+                continue
+            pipeline.zadd(timeline_key, {post_id: post_id})
+            # Rank 0 is always the sentinel, trim everything older than the cap after it
+            pipeline.zremrangebyrank(timeline_key, 1, -(settings.TIMELINE_MAX_POSTS + 1))
+        pipeline.execute()
+
+
+def invalidate_timeline_for_user_with_id(user_id):
+    if not is_materialized_timeline_enabled():
+        return
+    redis = _get_timelines_redis_connection()
+    redis.delete(make_timeline_key_for_user_with_id(user_id))
+
+
+def get_timeline_recipients_ids_for_post(post):
+    """
+    Returns the ids of the users whose unfiltered timeline would show the given post.
+    Mirrors the sources of User._get_timeline_posts_with_no_filters
+    """
+    if post.community_id:
+        CommunityMembership = get_community_membership_model()
+        return CommunityMembership.objects.filter(community_id=post.community_id).values_list('user_id', flat=True)
+
+    Follow = get_follow_model()
+    Circle = get_circle_model()
+
+    followers_ids = set(Follow.objects.filter(followed_user_id=post.creator_id).values_list('user_id', flat=True))
+
+    post_circles_ids = [circle.pk for circle in post.circles.all()]
+
+    if Circle.get_world_circle_id() not in post_circles_ids:
+        Connection = get_connection_model()
+        connected_users_ids = Connection.objects.filter(user_id=post.creator_id,
+                                                        circles__id__in=post_circles_ids,
+                                                        target_connection__circles__isnull=False). \
+            values_list('target_user_id', flat=True)
+        followers_ids.intersection_update(connected_users_ids)
+
+    followers_ids.add(post.creator_id)
+
+    return followers_ids
+
+
+def _get_timelines_redis_connection():
+    return get_redis_connection('default')
@@ -0,0 +1,69 @@
+import time
+
+from django_redis import get_redis_connection
+
+# Activity is bucketed per hour. Buckets older than the window expire on their own, newer buckets weigh more.
+TRENDING_POSTS_BUCKET_SECONDS = 60 * 60
+TRENDING_POSTS_WINDOW_BUCKETS = 12
+TRENDING_POSTS_HALF_LIFE_BUCKETS = 3
+
+TRENDING_POSTS_PUBLISH_WEIGHT = 0.5
+TRENDING_POSTS_REACTION_WEIGHT = 1
+TRENDING_POSTS_COMMENT_WEIGHT = 2
+
+
+def make_trending_posts_bucket_key(bucket):
+    return 'ob-api-trending-posts-scores-%d' % bucket
+
+
+def record_post_published_with_id(post_id):
+    _record_post_activity_with_id(post_id=post_id, weight=TRENDING_POSTS_PUBLISH_WEIGHT)
+
+
+def record_post_reaction_for_post_with_id(post_id):
+    _record_post_activity_with_id(post_id=post_id, weight=TRENDING_POSTS_REACTION_WEIGHT)
+
+
+def record_post_comment_for_post_with_id(post_id):
+    _record_post_activity_with_id(post_id=post_id, weight=TRENDING_POSTS_COMMENT_WEIGHT)
+
+
+def get_trending_posts_scores(count):
+    """
+    Returns up to count (post_id, score) tuples with the highest time decayed scores of the window, highest first
+    """
+    redis = _get_trending_redis_connection()
+    current_bucket = _get_current_bucket()
+
+    buckets_weights = {}
+    for age in range(0, TRENDING_POSTS_WINDOW_BUCKETS):
+        bucket_key = make_trending_posts_bucket_key(current_bucket - age)
+        buckets_weights[bucket_key] = 0.5 ** (age / TRENDING_POSTS_HALF_LIFE_BUCKETS)
+
+    scores_key = 'ob-api-trending-posts-scores-snapshot-%d' % current_bucket
+
+    pipeline = redis.pipeline(transaction=True)
+    pipeline.zunionstore(scores_key, buckets_weights)
+    pipeline.zrevrange(scores_key, 0, count - 1, withscores=True)
+    pipeline.delete(scores_key)
+    results = pipeline.execute()
+
+    return [(int(post_id), score) for post_id, score in results[1]]
+
+
+def _record_post_activity_with_id(post_id, weight):
+    redis = _get_trending_redis_connection()
+    bucket_key = make_trending_posts_bucket_key(_get_current_bucket())
+
+    pipeline = redis.pipeline(transaction=False)
+    pipeline.zincrby(bucket_key, weight, post_id)
+    pipeline.expire(bucket_key, (TRENDING_POSTS_WINDOW_BUCKETS + 1) * TRENDING_POSTS_BUCKET_SECONDS)
+    pipeline.execute()
+
+
+def _get_current_bucket():
+    return int(time.time() // TRENDING_POSTS_BUCKET_SECONDS)
+
+
+def _get_trending_redis_connection():
+    return get_redis_connection('default')
@@ -13,6 +13,7 @@ from openbook_posts.views.post_comment.post_comment_reactions.serializers import
 
 class PostCommentReactions(APIView):
     permission_classes = (IsAuthenticated, IsNotSuspended)
+    throttle_scopes = {'PUT': 'react'}
 
     def get(self, request, post_uuid, post_comment_id):
         request_data = request.query_params.dict()
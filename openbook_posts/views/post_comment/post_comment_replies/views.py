@@ -13,6 +13,7 @@ from openbook_posts.views.post_comment.post_comment_replies.serializers import G
 
 class PostCommentReplies(APIView):
     permission_classes = (IsAuthenticated, IsNotSuspended)
+    throttle_scopes = {'PUT': 'comment'}
 
     SORT_CHOICE_TO_QUERY = {
         'DESC': '-created',
@@ -23,6 +23,7 @@ def get_post_id_for_post_uuid(post_uuid):
 
 class PostComments(APIView):
     permission_classes = (IsAuthenticated, IsNotSuspended)
+    throttle_scopes = {'PUT': 'comment'}
     SORT_CHOICE_TO_QUERY = {
         'DESC': '-created',
         'ASC': 'created'
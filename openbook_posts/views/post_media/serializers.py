@@ -4,6 +4,7 @@ from generic_relations.relations import GenericRelatedField
 from rest_framework import serializers
 from video_encoding.models import Format
 
+from openbook_common.serializers_fields.image import ImageDerivativesField
 from openbook_common.serializers_fields.request import RestrictedImageFileSizeField, RestrictedFileSizeField
 from openbook_posts.models import PostMedia, PostImage, PostVideo
 from openbook_posts.validators import post_uuid_exists, post_reaction_id_exists
@@ -28,11 +29,13 @@ class GetPostMediaSerializer(serializers.Serializer):
 
 class PostImageSerializer(serializers.ModelSerializer):
     image = serializers.ImageField(read_only=True, required=False, allow_empty_file=True)
+    image_derivatives = ImageDerivativesField(source='image')
 
     class Meta:
         model = PostImage
         fields = (
             'image',
+            'image_derivatives',
             'thumbnail',
             'width',
             'height'
@@ -48,6 +51,7 @@ class PostVideoFormatSerializer(serializers.ModelSerializer):
             'progress',
             'format',
             'file',
+            'playlist',
             'width',
             'height',
         )
@@ -55,16 +59,34 @@ class PostVideoFormatSerializer(serializers.ModelSerializer):
 
 class PostVideoSerializer(serializers.ModelSerializer):
     format_set = PostVideoFormatSerializer(many=True)
+    hls_playlist = serializers.SerializerMethodField()
+    thumbnail_derivatives = ImageDerivativesField(source='thumbnail')
+
+    def get_hls_playlist(self, post_video):
+        # Picked from format_set.all() so a prefetch of the formats also covers the playlist
+        hls_formats = [video_format for video_format in post_video.format_set.all() if
+                       video_format.progress == 100 and video_format.playlist]
+        video_format = min(hls_formats, key=lambda hls_format: hls_format.pk, default=None)
+
+        if not video_format:
+            return None
+
+        playlist_url = video_format.playlist.url
+        request = self.context.get('request')
+
+        return request.build_absolute_uri(playlist_url) if request else playlist_url
 
     class Meta:
         model = PostVideo
         fields = (
             'file',
             'format_set',
+            'hls_playlist',
             'width',
             'height',
             'duration',
             'thumbnail',
+            'thumbnail_derivatives',
             'thumbnail_width',
             'thumbnail_height',
         )
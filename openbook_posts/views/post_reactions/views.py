@@ -24,6 +24,7 @@ def get_post_id_for_post_uuid(post_uuid):
 
 class PostReactions(APIView):
     permission_classes = (IsAuthenticated, IsNotSuspended)
+    throttle_scopes = {'PUT': 'react'}
 
     def get(self, request, post_uuid):
         request_data = self._get_request_data(request, post_uuid)
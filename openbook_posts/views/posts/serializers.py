@@ -9,6 +9,7 @@ from openbook_common.models import Emoji, Badge
 from openbook_common.serializers import CommonHashtagSerializer
 from openbook_common.serializers_fields.post import ReactionField, CommentsCountField, PostReactionsEmojiCountField, \
     CirclesField, PostCreatorField, PostIsMutedField, IsEncircledField
+from openbook_common.serializers_fields.image import ImageDerivativesField
 from openbook_common.serializers_fields.request import RestrictedImageFileSizeField, RestrictedFileSizeField
 from openbook_common.models import Language
 from openbook_communities.models import Community, CommunityMembership
@@ -103,11 +104,13 @@ class PostCreatorProfileBadgeSerializer(serializers.ModelSerializer):
 
 class PostCreatorProfileSerializer(serializers.ModelSerializer):
     badges = PostCreatorProfileBadgeSerializer(many=True)
+    avatar_derivatives = ImageDerivativesField(source='avatar')
 
     class Meta:
         model = UserProfile
         fields = (
             'avatar',
+            'avatar_derivatives',
             'cover',
             'badges',
             'name'
@@ -234,6 +237,7 @@ class AuthenticatedUserPostSerializer(serializers.ModelSerializer):
     language = PostLanguageSerializer()
     is_encircled = IsEncircledField()
     hashtags = CommonHashtagSerializer(many=True)
+    media_thumbnail_derivatives = ImageDerivativesField(source='media_thumbnail')
 
     class Meta:
         model = Post
@@ -258,6 +262,7 @@ class AuthenticatedUserPostSerializer(serializers.ModelSerializer):
             'media_height',
             'media_width',
             'media_thumbnail',
+            'media_thumbnail_derivatives',
             'hashtags',
         )
 
@@ -292,6 +297,7 @@ class UnauthenticatedUserPostSerializer(serializers.ModelSerializer):
     reactions_emoji_counts = PostReactionsEmojiCountField(emoji_count_serializer=PostEmojiCountSerializer)
     comments_count = CommentsCountField()
     language = PostLanguageSerializer()
+    media_thumbnail_derivatives = ImageDerivativesField(source='media_thumbnail')
 
     class Meta:
         model = Post
@@ -310,4 +316,5 @@ class UnauthenticatedUserPostSerializer(serializers.ModelSerializer):
             'media_height',
             'media_width',
             'media_thumbnail',
+            'media_thumbnail_derivatives',
         )
@@ -8,6 +8,7 @@ from rest_framework.views import APIView
 
 from openbook_moderation.permissions import IsNotSuspended
 from openbook_common.utils.helpers import normalize_list_value_in_request_data
+from openbook_posts.batch_loaders import make_posts_viewer_state_context
 from openbook_posts.permissions import IsGetOrIsAuthenticated
 from openbook_posts.views.posts.serializers import AuthenticatedUserPostSerializer, \
     GetPostsSerializer, UnauthenticatedUserPostSerializer, CreatePostSerializer, GetTopPostsSerializer, \
@@ -16,6 +17,7 @@ from openbook_posts.views.posts.serializers import AuthenticatedUserPostSerializ
 
 class Posts(APIView):
     permission_classes = (IsGetOrIsAuthenticated, IsNotSuspended)
+    throttle_scopes = {'PUT': 'create_post'}
 
     def put(self, request):
 
@@ -80,9 +82,11 @@ class Posts(APIView):
                 count=count
             )
 
-        posts = posts.order_by('-id')[:count]
+        posts = list(posts.order_by('-id')[:count])
 
-        post_serializer_data = AuthenticatedUserPostSerializer(posts, many=True, context={"request": request}).data
+        post_serializer_data = AuthenticatedUserPostSerializer(posts, many=True,
+                                                               context=make_posts_viewer_state_context(
+                                                                   request=request, posts=posts)).data
 
         return Response(post_serializer_data, status=status.HTTP_200_OK)
 
@@ -115,8 +119,10 @@ class TrendingPosts(APIView):
     def get(self, request):
         user = request.user
 
-        posts = user.get_trending_posts_old()[:30]
-        posts_serializer = AuthenticatedUserPostSerializer(posts, many=True, context={"request": request})
+        posts = list(user.get_trending_posts_old()[:30])
+        posts_serializer = AuthenticatedUserPostSerializer(posts, many=True,
+                                                           context=make_posts_viewer_state_context(request=request,
+                                                                                                   posts=posts))
         return Response(posts_serializer.data, status=status.HTTP_200_OK)
 
 
@@ -135,8 +141,11 @@ class TrendingPostsNew(APIView):
         count = data.get('count', 30)
         user = request.user
 
-        trending_posts = user.get_trending_posts(max_id=max_id, min_id=min_id).order_by('-id')[:count]
-        posts_serializer = AuthenticatedUserTrendingPostSerializer(trending_posts, many=True, context={"request": request})
+        trending_posts = list(user.get_trending_posts(max_id=max_id, min_id=min_id).order_by('-id')[:count])
+        posts = [trending_post.post for trending_post in trending_posts]
+        posts_serializer = AuthenticatedUserTrendingPostSerializer(trending_posts, many=True,
+                                                                   context=make_posts_viewer_state_context(
+                                                                       request=request, posts=posts))
         return Response(posts_serializer.data, status=status.HTTP_200_OK)
 
 
@@ -157,7 +166,11 @@ class TopPosts(APIView):
 
         user = request.user
 
-        top_posts = user.get_top_posts(max_id=max_id, min_id=min_id,
-                                       exclude_joined_communities=exclude_joined_communities).order_by('-id')[:count]
-        posts_serializer = AuthenticatedUserTopPostSerializer(top_posts, many=True, context={"request": request})
+        top_posts = list(user.get_top_posts(max_id=max_id, min_id=min_id,
+                                            exclude_joined_communities=exclude_joined_communities).order_by('-id')[
+                         :count])
+        posts = [top_post.post for top_post in top_posts]
+        posts_serializer = AuthenticatedUserTopPostSerializer(top_posts, many=True,
+                                                              context=make_posts_viewer_state_context(request=request,
+                                                                                                      posts=posts))
         return Response(posts_serializer.data, status=status.HTTP_200_OK)
@@ -0,0 +1,63 @@
+"""
+Search framework.
+
+The app defines a base search backend abstract class which maintains its own index
+of the searchable texts of users, communities and hashtags and returns the ids of
+the best matches for a query.
+
+This can be extended depending on the search engine one wants to use
+and configured accordingly in the settings.py
+
+"""
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+from openbook_search.backends.base import InvalidSearchBackendError
+
+DEFAULT_BACKEND_ALIAS = 'default'
+
+
+class SearchBackendManager:
+
+    def __init__(self, config_name=DEFAULT_BACKEND_ALIAS):
+        if config_name not in settings.OS_SEARCH_CONFIG:
+            raise InvalidSearchBackendError(
+                "Could not find config for '%s' in settings.OS_SEARCH_CONFIG" % config_name
+            )
+        self.config_name = config_name
+        self.backend_instance = None
+
+    def _create_search_backend(self, name, **kwargs):
+        try:
+            # Try to get the OS_SEARCH_CONFIG entry for the given name first
+            conf = settings.OS_SEARCH_CONFIG[name]
+            params = {**conf, **kwargs}
+            backend = params.pop('BACKEND')
+            backend_cls = import_string(backend)
+        except ImportError as e:
+            raise InvalidSearchBackendError(
+                "Could not find backend '%s': %s" % (backend, e))
+
+        return backend_cls(params)
+
+    def get_instance(self):
+        # Created on first use, backends can open files or connections
+        if self.backend_instance is None:
+            self.backend_instance = self._create_search_backend(self.config_name)
+        return self.backend_instance
+
+
+search_backend_managers = {}
+
+
+def get_search_backend():
+    # The backend is optional, its manager is created for the configured name on first use
+    config_name = settings.OS_SEARCH_BACKEND_NAME
+
+    if not config_name:
+        raise InvalidSearchBackendError('No search backend is configured in settings.OS_SEARCH_BACKEND_NAME')
+
+    if config_name not in search_backend_managers:
+        search_backend_managers[config_name] = SearchBackendManager(config_name)
+
+    return search_backend_managers[config_name].get_instance()
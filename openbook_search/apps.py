@@ -0,0 +1,5 @@
+from django.apps import AppConfig
+
+
+class OpenbookSearchConfig(AppConfig):
+    name = 'openbook_search'
@@ -0,0 +1,53 @@
+from abc import ABC, abstractmethod
+
+from django.core.exceptions import ImproperlyConfigured
+
+USERS_SEARCH_INDEX = 'users'
+COMMUNITIES_SEARCH_INDEX = 'communities'
+HASHTAGS_SEARCH_INDEX = 'hashtags'
+
+# Index name -> names of the fields of its documents.
+# Matches of the whole query or of its start in the first field are ranked first.
+SEARCH_INDEXES_FIELDS = {
+    USERS_SEARCH_INDEX: ('username', 'name'),
+    COMMUNITIES_SEARCH_INDEX: ('name', 'title'),
+    HASHTAGS_SEARCH_INDEX: ('name',),
+}
+
+
+class InvalidSearchBackendError(ImproperlyConfigured):
+    pass
+
+
+class SearchBackendError(Exception):
+    pass
+
+
+class BaseSearchBackend(ABC):
+
+    def __init__(self, params):
+        self.results_limit = int(params.pop('RESULTS_LIMIT', 500))
+        super().__init__()
+
+    @abstractmethod
+    def index_documents(self, index_name, documents):
+        """
+        Adds or replaces the given documents, id -> tuple with the text of each field of the index
+        """
+        pass
+
+    @abstractmethod
+    def delete_documents(self, index_name, ids):
+        pass
+
+    @abstractmethod
+    def clear_index(self, index_name):
+        pass
+
+    @abstractmethod
+    def search(self, index_name, query, limit=None):
+        """
+        Returns the ids of the documents which have the query in any of their fields, best matches first.
+        Returns at most limit ids, results_limit by default.
+        """
+        pass
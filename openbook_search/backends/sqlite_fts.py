@@ -0,0 +1,125 @@
+import sqlite3
+import threading
+
+from openbook_search.backends.base import BaseSearchBackend, SearchBackendError, SEARCH_INDEXES_FIELDS
+
+# Substring matching needs the trigram tokenizer, older SQLite versions fall back to word prefixes
+TRIGRAM_TOKENIZER_MIN_SQLITE_VERSION = (3, 34, 0)
+
+TRIGRAM_LENGTH = 3
+
+
+class SQLiteFTSSearchBackend(BaseSearchBackend):
+    """
+    Keeps the indexes in FTS5 tables of an embedded SQLite database, so it runs without external services.
+    Matches the query anywhere in the fields with the trigram tokenizer and ranks exact and prefix matches
+    of the first field first, then by bm25.
+    """
+
+    def __init__(self, params):
+        self.path = params.pop('PATH')
+        self.timeout = float(params.pop('TIMEOUT', 5))
+        super().__init__(params)
+        self.uses_trigrams = sqlite3.sqlite_version_info >= TRIGRAM_TOKENIZER_MIN_SQLITE_VERSION
+        # SQLite connections can't be shared between threads
+        self._local = threading.local()
+
+    def index_documents(self, index_name, documents):
+        fields = SEARCH_INDEXES_FIELDS[index_name]
+        table_name = self._get_table_name(index_name=index_name)
+
+        rows = [(document_id,) + tuple(value or '' for value in values) for document_id, values in
+                documents.items()]
+
+        if not rows:
+            return
+
+        # The table and field names come from SEARCH_INDEXES_FIELDS, the values are parameterized
+        with self._get_connection(index_name=index_name) as connection:
+            connection.executemany('DELETE FROM %s WHERE rowid = ?' % table_name,  # nosec
+                                   [(document_id,) for document_id in documents.keys()])
+            connection.executemany('INSERT INTO %s(rowid, %s) VALUES (?, %s)' % (  # nosec
+                table_name, ', '.join(fields), ', '.join('?' for field in fields)), rows)
+
+    def delete_documents(self, index_name, ids):
+        table_name = self._get_table_name(index_name=index_name)
+
+        # The table name comes from SEARCH_INDEXES_FIELDS, the ids are parameterized
+        with self._get_connection(index_name=index_name) as connection:
+            connection.executemany('DELETE FROM %s WHERE rowid = ?' % table_name,  # nosec
+                                   [(id,) for id in ids])
+
+    def clear_index(self, index_name):
+        table_name = self._get_table_name(index_name=index_name)
+
+        # The table name comes from SEARCH_INDEXES_FIELDS
+        with self._get_connection(index_name=index_name) as connection:
+            connection.execute('DELETE FROM %s' % table_name)  # nosec
+
+    def search(self, index_name, query, limit=None):
+        query = query.strip()
+
+        if not query:
+            return []
+
+        fields = SEARCH_INDEXES_FIELDS[index_name]
+        table_name = self._get_table_name(index_name=index_name)
+        first_field = fields[0]
+
+        # Exact matches of the first field, then matches of its start, then the rest
+        ranking = 'CASE WHEN lower(%s) = lower(?) THEN 0 WHEN %s LIKE ? ESCAPE \'\\\' THEN 1 ELSE 2 END' % (
+            first_field, first_field)
+        ranking_params = [query, self._escape_like(query) + '%']
+
+        # The table and field names of the queries come from SEARCH_INDEXES_FIELDS, the user input is parameterized
+        if self.uses_trigrams and len(query) < TRIGRAM_LENGTH:
+            # Too short for trigrams, scans the index
+            like_pattern = '%' + self._escape_like(query) + '%'
+            sql = 'SELECT rowid FROM %s WHERE %s ORDER BY %s, rowid LIMIT ?' % (  # nosec
+                table_name, ' OR '.join('%s LIKE ? ESCAPE \'\\\'' % field for field in fields), ranking)
+            params = [like_pattern for field in fields] + ranking_params
+        else:
+            sql = 'SELECT rowid FROM %s WHERE %s MATCH ? ORDER BY %s, bm25(%s), rowid LIMIT ?' % (  # nosec
+                table_name, table_name, ranking, table_name)
+            params = [self._make_match_query(query=query)] + ranking_params
+
+        params.append(limit if limit is not None else self.results_limit)
+
+        try:
+            connection = self._get_connection(index_name=index_name)
+            return [row[0] for row in connection.execute(sql, params)]
+        except sqlite3.Error as e:
+            raise SearchBackendError('Failed to search the %s index: %s' % (index_name, e))
+
+    def _make_match_query(self, query):
+        if self.uses_trigrams:
+            # One phrase, matches anywhere in the fields
+            return '"%s"' % query.replace('"', '""')
+
+        # Every word of the query must start a word of the fields
+        return ' '.join('"%s"*' % word.replace('"', '""') for word in query.split())
+
+    def _escape_like(self, value):
+        return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+    def _get_table_name(self, index_name):
+        return 'search_%s' % index_name
+
+    def _get_connection(self, index_name):
+        connection = getattr(self._local, 'connection', None)
+
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=self.timeout, uri=True, check_same_thread=True)
+            self._local.connection = connection
+            self._local.created_tables = set()
+
+        table_name = self._get_table_name(index_name=index_name)
+
+        if table_name not in self._local.created_tables:
+            tokenizer = 'trigram' if self.uses_trigrams else 'unicode61'
+            with connection:
+                connection.execute('CREATE VIRTUAL TABLE IF NOT EXISTS %s USING fts5(%s, tokenize=\'%s\')' % (
+                    table_name, ', '.join(SEARCH_INDEXES_FIELDS[index_name]), tokenizer))
+            self._local.created_tables.add(table_name)
+
+        return connection
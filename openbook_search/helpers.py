@@ -0,0 +1,144 @@
+import logging
+
+from django.conf import settings
+from django.db.models import Case, When, Value, IntegerField
+
+from openbook_common.utils.model_loaders import get_user_model, get_community_model, get_hashtag_model
+from openbook_search import get_search_backend
+from openbook_search.backends.base import USERS_SEARCH_INDEX, COMMUNITIES_SEARCH_INDEX, HASHTAGS_SEARCH_INDEX, \
+    SEARCH_INDEXES_FIELDS
+
+logger = logging.getLogger(__name__)
+
+
+def is_search_backend_enabled():
+    """
+    Without a search backend configured in OS_SEARCH_BACKEND_NAME, searches match in the database with icontains
+    """
+    return bool(settings.OS_SEARCH_BACKEND_NAME)
+
+
+def search_users_ids(query):
+    """
+    Returns the ranked ids of the users matching the query, None without a search backend
+    """
+    return _search(index_name=USERS_SEARCH_INDEX, query=query)
+
+
+def search_communities_ids(query):
+    return _search(index_name=COMMUNITIES_SEARCH_INDEX, query=query)
+
+
+def search_hashtags_ids(query):
+    return _search(index_name=HASHTAGS_SEARCH_INDEX, query=query)
+
+
+def order_by_search_rank(queryset, ranked_ids):
+    """
+    Orders the rows by their position in the given search results, if any
+    """
+    if ranked_ids is None:
+        return queryset
+
+    return queryset.order_by(make_search_rank_ordering(ranked_ids))
+
+
+def make_search_rank_ordering(ranked_ids):
+    """
+    Orders the rows by their position in the given search results
+    """
+    return Case(*[When(id=id, then=Value(position)) for position, id in enumerate(ranked_ids)],
+                default=Value(len(ranked_ids)), output_field=IntegerField())
+
+
+def index_users_with_ids(users_ids):
+    if not is_search_backend_enabled():
+        return
+
+    User = get_user_model()
+
+    documents = {user_id: (username, name) for user_id, username, name in
+                 User.objects.filter(id__in=users_ids, is_deleted=False).values_list('id', 'username',
+                                                                                       'profile__name')}
+
+    _update_index(index_name=USERS_SEARCH_INDEX, ids=users_ids, documents=documents)
+
+
+def index_communities_with_ids(communities_ids):
+    if not is_search_backend_enabled():
+        return
+
+    Community = get_community_model()
+
+    documents = {community_id: (name, title) for community_id, name, title in
+                 Community.objects.filter(id__in=communities_ids, is_deleted=False).values_list('id', 'name',
+                                                                                                 'title')}
+
+    _update_index(index_name=COMMUNITIES_SEARCH_INDEX, ids=communities_ids, documents=documents)
+
+
+def index_hashtags_with_ids(hashtags_ids):
+    if not is_search_backend_enabled():
+        return
+
+    Hashtag = get_hashtag_model()
+
+    documents = {hashtag_id: (name,) for hashtag_id, name in
+                 Hashtag.objects.filter(id__in=hashtags_ids).values_list('id', 'name')}
+
+    _update_index(index_name=HASHTAGS_SEARCH_INDEX, ids=hashtags_ids, documents=documents)
+
+
+def delete_users_with_ids_from_index(users_ids):
+    _delete_from_index(index_name=USERS_SEARCH_INDEX, ids=users_ids)
+
+
+def delete_communities_with_ids_from_index(communities_ids):
+    _delete_from_index(index_name=COMMUNITIES_SEARCH_INDEX, ids=communities_ids)
+
+
+def delete_hashtags_with_ids_from_index(hashtags_ids):
+    _delete_from_index(index_name=HASHTAGS_SEARCH_INDEX, ids=hashtags_ids)
+
+
+def clear_search_indexes():
+    if not is_search_backend_enabled():
+        return
+
+    search_backend = get_search_backend()
+
+    for index_name in SEARCH_INDEXES_FIELDS.keys():
+        search_backend.clear_index(index_name=index_name)
+
+
+def _search(index_name, query):
+    if not is_search_backend_enabled():
+        return None
+
+    return get_search_backend().search(index_name=index_name, query=query)
+
+
+def _update_index(index_name, ids, documents):
+    # Rows which are gone or soft deleted leave the index
+    removed_ids = set(ids) - set(documents.keys())
+
+    # The database stays the source of truth, a failed index write must not fail the request.
+    # The rebuild_search_indexes command repairs the index.
+    try:
+        search_backend = get_search_backend()
+        search_backend.index_documents(index_name=index_name, documents=documents)
+        if removed_ids:
+            search_backend.delete_documents(index_name=index_name, ids=removed_ids)
+    except Exception as e:
+        logger.error('Failed to update the %s search index: %s' % (index_name, e))
+
+
+def _delete_from_index(index_name, ids):
+    if not is_search_backend_enabled():
+        return
+
+    try:
+        get_search_backend().delete_documents(index_name=index_name, ids=ids)
+    except Exception as e:
+        # A log message, not a query
+        logger.error('Failed to delete from the %s search index: %s' % (index_name, e))  # nosec
@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand, CommandError
+import logging
+
+from openbook_common.utils.model_loaders import get_user_model, get_community_model, get_hashtag_model
+from openbook_search.helpers import index_users_with_ids, index_communities_with_ids, index_hashtags_with_ids, \
+    clear_search_indexes, is_search_backend_enabled
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Indexes the users, communities and hashtags in the search backend'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help='How many rows to index per query')
+        parser.add_argument('--clear', action='store_true',
+                            help='Empties the indexes first, also dropping the documents of deleted rows')
+
+    def handle(self, *args, **options):
+        if not is_search_backend_enabled():
+            raise CommandError('No search backend is configured in OS_SEARCH_BACKEND_NAME')
+
+        chunk_size = options.get('chunk_size')
+
+        if options.get('clear'):
+            logger.info('Clearing the search indexes')
+            clear_search_indexes()
+
+        self._index_rows_of_model(model=get_user_model(), index_rows_with_ids=index_users_with_ids,
+                                  chunk_size=chunk_size)
+        self._index_rows_of_model(model=get_community_model(), index_rows_with_ids=index_communities_with_ids,
+                                  chunk_size=chunk_size)
+        self._index_rows_of_model(model=get_hashtag_model(), index_rows_with_ids=index_hashtags_with_ids,
+                                  chunk_size=chunk_size)
+
+    def _index_rows_of_model(self, model, index_rows_with_ids, chunk_size):
+        model_name = model._meta.verbose_name_plural
+
+        logger.info('Indexing the %s' % model_name)
+
+        last_id = 0
+        indexed_rows = 0
+
+        while True:
+            ids = list(model.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:chunk_size])
+
+            if not ids:
+                break
+
+            index_rows_with_ids(ids)
+            indexed_rows += len(ids)
+            last_id = ids[-1]
+
+        logger.info('Indexed %d %s' % (indexed_rows, model_name))
@@ -2,6 +2,8 @@ import abc
 
 import six
 
+HLS_MASTER_PLAYLIST_NAME = 'master.m3u8'
+
 
 class BaseEncodingBackend(six.with_metaclass(abc.ABCMeta)):
     # used as key to get all defined formats from `VIDEO_ENCODING_FORMATS`
@@ -19,6 +21,15 @@ class BaseEncodingBackend(six.with_metaclass(abc.ABCMeta)):
         """
         pass
 
+    def encode_hls(self, source_path, target_dir, renditions, segment_duration):  # pragma: no cover
+        """
+        Encodes a video to an HLS ladder in `target_dir`, a directory with the
+        segments and playlist of each rendition plus a `master.m3u8` playlist.
+        Yields the progress like `encode`.
+        """
+        raise NotImplementedError(
+            '{} backend does not support HLS'.format(self.name))
+
     @abc.abstractmethod
     def get_media_info(self, video_path):  # pragma: no cover
         """
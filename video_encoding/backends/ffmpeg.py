@@ -1,3 +1,5 @@
+import collections
+import io
 import json
 import locale
 import logging
@@ -12,10 +14,11 @@ from django.core import checks
 from .. import exceptions
 from ..compat import which
 from ..config import settings
-from .base import BaseEncodingBackend
+from .base import BaseEncodingBackend, HLS_MASTER_PLAYLIST_NAME
 
 logger = logging.getLogger(__name__)
 RE_TIMECODE = re.compile(r'time=(\d+:\d+:\d+.\d+) ')
+OUTPUT_TAIL_LINES = 20
 
 console_encoding = locale.getdefaultlocale()[1] or 'UTF-8'
 
@@ -80,8 +83,7 @@ class FFmpegBackend(BaseEncodingBackend):
         self.stderr = stderr.decode(console_encoding)
         return self.stdout, self.stderr
 
-    # TODO reduce complexity
-    def encode(self, source_path, target_path, params):  # NOQA: C901
+    def encode(self, source_path, target_path, params):
         """
         Encodes a video to a specified file. All encoder specific options
         are passed in using `params`.
@@ -93,24 +95,99 @@ class FFmpegBackend(BaseEncodingBackend):
         cmds.extend(params)
         cmds.extend([target_path])
 
+        for percent in self._run_with_progress(cmds, total_time):
+            yield percent
+
+        if os.path.getsize(target_path) == 0:
+            raise exceptions.FFmpegError("File size of generated file is 0")
+
+        yield 100
+
+    def encode_hls(self, source_path, target_dir, renditions, segment_duration):
+        """
+        Encodes a video to an HLS ladder in `target_dir`. The video is decoded
+        once and split into a scaled stream per rendition, renditions taller
+        than the video are left out.
+        """
+        media_info = self._probe(source_path)
+        total_time = float(media_info['format']['duration'])
+        source_height = int(media_info['video'][0]['height'])
+        has_audio = bool(media_info['audio'])
+
+        renditions = [rendition for rendition in renditions if rendition['height'] <= source_height] or [
+            # Smaller than every rendition, kept at its own size
+            dict(renditions[0], height=source_height - source_height % 2)]
+
+        filters = ['[0:v]split={:d}{}'.format(
+            len(renditions), ''.join('[v{:d}]'.format(index) for index in range(len(renditions))))]
+        filters.extend('[v{index:d}]scale=-2:{height:d}[v{index:d}out]'.format(index=index, **rendition)
+                       for index, rendition in enumerate(renditions))
+
+        cmds = [self.ffmpeg_path, '-i', source_path]
+        cmds.extend(self.params)
+        cmds.extend(['-filter_complex', ';'.join(filters)])
+
+        streams_map = []
+
+        for index, rendition in enumerate(renditions):
+            cmds.extend([
+                '-map', '[v{:d}out]'.format(index),
+                '-codec:v:{:d}'.format(index), 'libx264',
+                '-b:v:{:d}'.format(index), rendition['video_bitrate'],
+                '-maxrate:v:{:d}'.format(index), rendition['maxrate'],
+                '-bufsize:v:{:d}'.format(index), rendition['bufsize'],
+            ])
+            stream_map = 'v:{:d}'.format(index)
+
+            if has_audio:
+                cmds.extend([
+                    '-map', '0:a:0',
+                    '-codec:a:{:d}'.format(index), 'aac',
+                    '-b:a:{:d}'.format(index), rendition['audio_bitrate'],
+                ])
+                stream_map += ',a:{:d}'.format(index)
+
+            streams_map.append('{},name:{}'.format(stream_map, rendition['name']))
+            # The muxer doesn't create the directories of the renditions
+            os.makedirs(os.path.join(target_dir, rendition['name']), exist_ok=True)
+
+        cmds.extend([
+            '-preset', 'veryfast',
+            # Same keyframes in every rendition, so players can switch between them at any segment
+            '-force_key_frames', 'expr:gte(t,n_forced*{:d})'.format(segment_duration),
+            '-sc_threshold', '0',
+            '-f', 'hls',
+            '-hls_time', str(segment_duration),
+            '-hls_playlist_type', 'vod',
+            '-hls_flags', 'independent_segments',
+            '-hls_segment_filename', os.path.join(target_dir, '%v', 'segment_%03d.ts'),
+            '-master_pl_name', HLS_MASTER_PLAYLIST_NAME,
+            '-var_stream_map', ' '.join(streams_map),
+            os.path.join(target_dir, '%v', 'playlist.m3u8'),
+        ])
+
+        for percent in self._run_with_progress(cmds, total_time):
+            yield percent
+
+        if not os.path.isfile(os.path.join(target_dir, HLS_MASTER_PLAYLIST_NAME)):
+            raise exceptions.FFmpegError("No master playlist was generated")
+
+        yield 100
+
+    def _run_with_progress(self, cmds, total_time):
         process = self._spawn(cmds)
 
-        buf = output = ''
-        # update progress
-        while True:
-            # any more data?
-            out = process.stderr.read(10)
-            if not out:
-                break
+        # The last lines are kept for the logs, ffmpeg writes one per progress update
+        output = collections.deque(maxlen=OUTPUT_TAIL_LINES)
+        has_output = False
 
-            out = out.decode(console_encoding)
-            output += out
-            buf += out
+        # Progress lines end with a carriage return, universal newlines split them
+        stderr = io.TextIOWrapper(process.stderr, encoding=console_encoding, errors='replace', newline='')
 
-            try:
-                line, buf = buf.split('\r', 1)
-            except ValueError:
-                continue
+        # update progress
+        for line in stderr:
+            has_output = True
+            output.append(line)
 
             try:
                 time_str = RE_TIMECODE.findall(line)[0]
@@ -122,22 +199,17 @@ class FFmpegBackend(BaseEncodingBackend):
             for part in time_str.split(':'):
                 time = 60 * time + float(part)
 
-            percent = time / total_time
+            percent = min(100 * time / total_time, 100) if total_time else 0
             logger.debug('yield {}%'.format(percent))
             yield percent
 
-        if os.path.getsize(target_path) == 0:
-            raise exceptions.FFmpegError("File size of generated file is 0")
-
         # wait for process to exit
         self._check_returncode(process)
 
-        logger.debug(output)
-        if not output:
+        logger.debug(''.join(output))
+        if not has_output:
             raise exceptions.FFmpegError("No output from FFmpeg.")
 
-        yield 100
-
     def _parse_media_info(self, data):
         media_info = json.loads(data)
         media_info['video'] = [stream for stream in media_info['streams']
@@ -149,10 +221,7 @@ class FFmpegBackend(BaseEncodingBackend):
         del media_info['streams']
         return media_info
 
-    def get_media_info(self, video_path):
-        """
-        Returns information about the given video as dict.
-        """
+    def _probe(self, video_path):
         cmds = [self.ffprobe_path, '-i', video_path]
         cmds.extend(['-print_format', 'json'])
         cmds.extend(['-show_format', '-show_streams'])
@@ -160,7 +229,13 @@ class FFmpegBackend(BaseEncodingBackend):
         process = self._spawn(cmds)
         stdout, __ = self._check_returncode(process)
 
-        media_info = self._parse_media_info(stdout)
+        return self._parse_media_info(stdout)
+
+    def get_media_info(self, video_path):
+        """
+        Returns information about the given video as dict.
+        """
+        media_info = self._probe(video_path)
 
         return {
             'duration': float(media_info['format']['duration']),
@@ -4,8 +4,40 @@ from django.conf import settings  # NOQA
 
 class VideoEncodingAppConf(AppConf):
     THREADS = 1
+    # Formats encoded at once, defaults to the amount of cores available to the process
+    MAX_WORKERS = None
+    # Minimum seconds between writes of the progress of a format
     PROGRESS_UPDATE = 30
     BACKEND = 'video_encoding.backends.ffmpeg.FFmpegBackend'
+    # Encodes an HLS ladder of the renditions no taller than the video, plus a master playlist
+    HLS_ENABLED = False
+    HLS_SEGMENT_DURATION = 6
+    HLS_RENDITIONS = [
+        {
+            'name': '360p',
+            'height': 360,
+            'video_bitrate': '800k',
+            'maxrate': '856k',
+            'bufsize': '1200k',
+            'audio_bitrate': '96k',
+        },
+        {
+            'name': '480p',
+            'height': 480,
+            'video_bitrate': '1400k',
+            'maxrate': '1498k',
+            'bufsize': '2100k',
+            'audio_bitrate': '128k',
+        },
+        {
+            'name': '720p',
+            'height': 720,
+            'video_bitrate': '2800k',
+            'maxrate': '2996k',
+            'bufsize': '4200k',
+            'audio_bitrate': '128k',
+        },
+    ]
     BACKEND_PARAMS = {}
     FORMATS = {
         'FFmpeg': [
@@ -24,8 +24,11 @@ class VideoField(ImageField):
     description = _("Video")
 
     def __init__(self, verbose_name=None, name=None, duration_field=None,
-                 **kwargs):
+                 probe=True, **kwargs):
         self.duration_field = duration_field
+        # Without probe the dimension and duration fields are left to be
+        # filled by the caller, for example off the request
+        self.probe = probe
         super(VideoField, self).__init__(verbose_name, name, **kwargs)
 
     def check(self, **kwargs):
@@ -42,6 +45,9 @@ class VideoField(ImageField):
         return super(ImageField, self).to_python(data)
 
     def update_dimension_fields(self, instance, force=False, *args, **kwargs):
+        if not self.probe:
+            return
+
         _file = getattr(instance, self.attname)
 
         # we need a real file
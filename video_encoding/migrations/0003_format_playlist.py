@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('video_encoding', '0002_update_field_definitions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='format',
+            name='playlist',
+            field=models.FileField(blank=True, editable=False, max_length=2048, upload_to='', verbose_name='Playlist'),
+        ),
+    ]
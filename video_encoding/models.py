@@ -1,3 +1,4 @@
+import uuid
 from os.path import splitext
 
 from django.contrib.contenttypes.fields import GenericForeignKey
@@ -16,6 +17,14 @@ def upload_format_to(i, f):
         splitext(f)[1].lower())
 
 
+def upload_hls_format_to(i):
+    # A directory per encoding, the playlists link to the segments by their names
+    return 'formats/%s/%s/%s/' % (
+        i.format,
+        splitext(getattr(i.video, i.field_name).name)[0],  # keep path
+        uuid.uuid4().hex)
+
+
 class Format(models.Model):
     object_id = models.PositiveIntegerField(
         editable=False,
@@ -48,6 +57,13 @@ class Format(models.Model):
         verbose_name=_("File"),
         width_field='width', height_field='height',
     )
+    # Master playlist of the formats encoded as an HLS ladder, which have no file
+    playlist = models.FileField(
+        blank=True,
+        editable=False,
+        max_length=2048,
+        verbose_name=_("Playlist"),
+    )
     width = models.PositiveIntegerField(
         editable=False,
         null=True,
@@ -71,20 +87,20 @@ class Format(models.Model):
         verbose_name_plural = _("Formats")
 
     def __str__(self):
-        return '{} ({:d}%)'.format(self.file.name, self.progress)
+        return '{} ({:d}%)'.format(self.file.name or self.playlist.name, self.progress)
 
     def unicode(self):
         return self.__str__()
 
     def update_progress(self, percent, commit=True):
-        if 0 > percent > 100:
+        if not 0 <= percent <= 100:
             raise ValueError("Invalid percent value.")
 
-        self.progress = percent
+        self.progress = int(percent)
         if commit:
-            self.save()
+            self.save(update_fields=['progress'])
 
     def reset_progress(self, commit=True):
-        self.percent = 0
+        self.progress = 0
         if commit:
-            self.save()
+            self.save(update_fields=['progress'])
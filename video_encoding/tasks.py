@@ -1,5 +1,10 @@
+import logging
 import os
+import queue
+import shutil
 import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 from django.apps import apps
 from django.contrib.contenttypes.models import ContentType
@@ -7,10 +12,19 @@ from django.core.files import File
 
 from video_encoding.utils import get_fieldfile_local_path
 from .backends import get_backend
+from .backends.base import HLS_MASTER_PLAYLIST_NAME
 from .config import settings
 from .exceptions import VideoEncodingError
 from .fields import VideoField
-from .models import Format
+from .models import Format, upload_hls_format_to
+
+logger = logging.getLogger(__name__)
+
+ENCODING_EVENT_PROGRESS = 'progress'
+ENCODING_EVENT_DONE = 'done'
+ENCODING_EVENT_FAILED = 'failed'
+
+HLS_FORMAT_NAME = 'hls'
 
 
 def convert_all_videos(app_label, model_name, object_pk):
@@ -34,64 +48,213 @@ def convert_all_videos(app_label, model_name, object_pk):
             convert_video(fieldfile)
 
 
-def convert_video(fieldfile, force=False):
+def convert_video(fieldfile, force=False, on_progress=None):
     """
     Converts a given video file into all defined formats.
+
+    Formats are encoded concurrently, each by its own ffmpeg process. Formats
+    finished by a previous call are kept, so a conversion interrupted by a
+    worker restart resumes with the missing ones. `on_progress` is called
+    whenever the progress of a format is written.
     """
     instance = fieldfile.instance
     field = fieldfile.field
 
-    local_path, temp_file = get_fieldfile_local_path(fieldfile=fieldfile)
+    encoding_backend = get_backend()
+    content_type = ContentType.objects.get_for_model(instance)
 
-    filename = os.path.basename(local_path)
-    source_path = local_path
+    formats_to_encode = []
+    formats_options = list(settings.VIDEO_ENCODING_FORMATS[encoding_backend.name])
 
-    encoding_backend = get_backend()
+    if settings.VIDEO_ENCODING_HLS_ENABLED:
+        formats_options.append({
+            'name': HLS_FORMAT_NAME,
+            'renditions': settings.VIDEO_ENCODING_HLS_RENDITIONS,
+            'segment_duration': settings.VIDEO_ENCODING_HLS_SEGMENT_DURATION,
+        })
 
-    for options in settings.VIDEO_ENCODING_FORMATS[encoding_backend.name]:
+    for options in formats_options:
         video_format, created = Format.objects.get_or_create(
             object_id=instance.pk,
-            content_type=ContentType.objects.get_for_model(instance),
+            content_type=content_type,
             field_name=field.name, format=options['name'])
 
         # do not reencode if not requested
-        if video_format.file and not force:
+        if (video_format.file or video_format.playlist) and not force:
             continue
         else:
             # set progress to 0
             video_format.reset_progress()
 
-        # TODO do not upscale videos
+        formats_to_encode.append((video_format, options))
 
-        _, target_path = tempfile.mkstemp(
-            suffix='_{name}.{extension}'.format(**options))
+    if not formats_to_encode:
+        return
+
+    local_path, temp_file = get_fieldfile_local_path(fieldfile=fieldfile)
+
+    try:
+        _encode_formats(source_path=local_path, formats_to_encode=formats_to_encode, on_progress=on_progress)
+    finally:
+        if temp_file:
+            temp_file.close()
+            os.unlink(temp_file.name)
+
+
+def get_encoding_workers_count():
+    if settings.VIDEO_ENCODING_MAX_WORKERS:
+        return settings.VIDEO_ENCODING_MAX_WORKERS
+
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+
+    return os.cpu_count() or 1
+
+
+def _encode_formats(source_path, formats_to_encode, on_progress=None):
+    """
+    The threads only wait on their ffmpeg process, every database and storage
+    write happens in the calling thread.
+    """
+    filename = os.path.basename(source_path)
+    video_formats = {video_format.pk: (video_format, options) for video_format, options in formats_to_encode}
+    progress_written_at = {video_format_id: 0 for video_format_id in video_formats.keys()}
+
+    events = queue.Queue()
+    workers_count = min(len(formats_to_encode), get_encoding_workers_count())
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers_count) as executor:
+            for video_format, options in formats_to_encode:
+                executor.submit(_encode_format, source_path=source_path, options=options,
+                                video_format_id=video_format.pk, events=events)
+
+            pending_formats_count = len(formats_to_encode)
+
+            while pending_formats_count:
+                video_format_id, event, value = events.get()
+                video_format, options = video_formats[video_format_id]
+
+                if event == ENCODING_EVENT_PROGRESS:
+                    now = time.monotonic()
+                    if now - progress_written_at[video_format_id] < settings.VIDEO_ENCODING_PROGRESS_UPDATE:
+                        continue
+
+                    progress_written_at[video_format_id] = now
+                    video_format.update_progress(value)
+
+                    if on_progress:
+                        on_progress(video_format)
+                    continue
+
+                pending_formats_count -= 1
+
+                if event == ENCODING_EVENT_FAILED:
+                    # TODO handle with more care
+                    logger.error('Failed to encode {} of {}: {}'.format(options['name'], filename, value))
+                    video_format.delete()
+                    continue
+
+                target_path = value
 
-        try:
-            encoding = encoding_backend.encode(
-                source_path, target_path, options['params'])
-            while encoding:
                 try:
-                    progress = next(encoding)
-                except StopIteration:
-                    break
-                video_format.update_progress(progress)
-        except VideoEncodingError:
-            # TODO handle with more care
-            video_format.delete()
-            os.remove(target_path)
-            continue
+                    if _is_hls_format(options):
+                        _save_hls_ladder(video_format=video_format, ladder_dir=target_path)
+                    else:
+                        # save encoded file
+                        with open(target_path, mode='rb') as target_file:
+                            video_format.file.save(
+                                '{filename}_{name}.{extension}'.format(filename=filename, **options),
+                                File(target_file))
 
-        # save encoded file
-        video_format.file.save(
-            '{filename}_{name}.{extension}'.format(filename=filename,
-                                                   **options),
-            File(open(target_path, mode='rb')))
+                    video_format.update_progress(100)  # now we are ready
+                finally:
+                    # remove temporary files
+                    _remove_encoding_target(target_path)
 
-        video_format.update_progress(100)  # now we are ready
+                if on_progress:
+                    on_progress(video_format)
 
-        # remove temporary file
-        os.remove(target_path)
+    finally:
+        # the executor waited for every thread, an error while saving a format leaves the others' results unread
+        _remove_unread_encoding_targets(events)
 
-        if temp_file:
-            os.unlink(temp_file.name)
-            temp_file.close()
+
+def _remove_unread_encoding_targets(events):
+    while True:
+        try:
+            video_format_id, event, value = events.get_nowait()
+        except queue.Empty:
+            return
+
+        if event == ENCODING_EVENT_DONE:
+            _remove_encoding_target(value)
+
+def _encode_format(source_path, options, video_format_id, events):
+    """
+    Always ends by putting a done or failed event, which _encode_formats waits for
+    """
+    target_path = None
+
+    try:
+        encoding_backend = get_backend()  # One backend per thread, it keeps the output of its last process
+
+        if _is_hls_format(options):
+            target_path = tempfile.mkdtemp(suffix='_{name}'.format(**options))
+            encoding = encoding_backend.encode_hls(source_path, target_path, options['renditions'],
+                                                   options['segment_duration'])
+        else:
+            target_file_descriptor, target_path = tempfile.mkstemp(
+                suffix='_{name}.{extension}'.format(**options))
+            os.close(target_file_descriptor)
+            encoding = encoding_backend.encode(source_path, target_path, options['params'])
+
+        for progress in encoding:
+            events.put((video_format_id, ENCODING_EVENT_PROGRESS, progress))
+    except Exception as e:
+        if target_path:
+            _remove_encoding_target(target_path)
+        events.put((video_format_id, ENCODING_EVENT_FAILED, e))
+        return
+
+    events.put((video_format_id, ENCODING_EVENT_DONE, target_path))
+
+
+def _is_hls_format(options):
+    return 'renditions' in options
+
+
+def _save_hls_ladder(video_format, ladder_dir):
+    """
+    Stores the playlists and segments keeping their relative paths, which the playlists refer to
+    """
+    storage = video_format.playlist.storage
+    storage_dir = upload_hls_format_to(video_format)
+
+    for dir_path, dir_names, file_names in os.walk(ladder_dir):
+        for file_name in file_names:
+            file_path = os.path.join(dir_path, file_name)
+            storage_name = storage_dir + os.path.relpath(file_path, ladder_dir).replace(os.sep, '/')
+
+            with open(file_path, mode='rb') as file:
+                saved_name = storage.save(storage_name, File(file))
+
+            if saved_name != storage_name:
+                raise VideoEncodingError('HLS file {} was stored as {}'.format(storage_name, saved_name))
+
+    # The dimensions are the ones of the source, the renditions are listed in the playlist
+    video = video_format.video
+    video_field = video._meta.get_field(video_format.field_name)
+
+    video_format.playlist.name = storage_dir + HLS_MASTER_PLAYLIST_NAME
+    video_format.width = getattr(video, video_field.width_field) if video_field.width_field else None
+    video_format.height = getattr(video, video_field.height_field) if video_field.height_field else None
+    video_format.duration = getattr(video, video_field.duration_field) if video_field.duration_field else None
+    video_format.save()
+
+
+def _remove_encoding_target(target_path):
+    if os.path.isdir(target_path):
+        shutil.rmtree(target_path, ignore_errors=True)
+    elif os.path.exists(target_path):
+        os.remove(target_path)
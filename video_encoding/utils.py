@@ -1,5 +1,9 @@
+import shutil
 import tempfile
 
+# Size of the chunks in which sources without a local path are downloaded
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
 
 def get_fieldfile_local_path(fieldfile):
     storage = fieldfile.storage
@@ -9,10 +13,13 @@ def get_fieldfile_local_path(fieldfile):
         # Try to access with path
         storage_local_path = storage.path(fieldfile.path)
     except (NotImplementedError, AttributeError):
-        # Storage doesnt support absolute paths, download file to a temp local dir
-        storage_file = storage.open(fieldfile.name, 'r')
+        # Storage doesnt support absolute paths, download file to a temp local dir in chunks
         local_temp_file = tempfile.NamedTemporaryFile(delete=False)
-        local_temp_file.write(storage_file.read())
+
+        with storage.open(fieldfile.name, 'rb') as storage_file:
+            shutil.copyfileobj(storage_file, local_temp_file, DOWNLOAD_CHUNK_SIZE)
+
+        local_temp_file.flush()
         local_temp_file.seek(0)
 
         storage_local_path = local_temp_file.name